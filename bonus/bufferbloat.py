@@ -7,12 +7,13 @@ from mininet.log import info
 from mininet.util import dumpNodeConnections
 
 from subprocess import Popen
-from time import sleep
 from multiprocessing import Process
 from argparse import ArgumentParser
 
 from monitor import monitor_qlen
+from orchestrator import Orchestrator, Aborted, SERVICE
 import os
+import sys
 
 # --- Argument Parser ---
 parser = ArgumentParser(description="Bufferbloat tests")
@@ -56,8 +57,25 @@ def start_qmon(iface, interval_sec=0.1, outfile="q.txt"):
     monitor.start()
     return monitor
 
+# --- Servidores e clientes supervisionados ---
+def run_flows(orch, pairs):
+    """pairs: (sender, receiver, arquivo de saída).  Os servidores são
+    reiniciados uma vez se caírem; os clientes têm prazo de args.time + 10 s."""
+    for _, receiver, _ in pairs:
+        orch.spawn(f"server_{receiver.name}", "iperf -s -w 16m", host=receiver,
+                   kind=SERVICE, restarts=1, ready='listening')
+    for _, receiver, _ in pairs:
+        # Até 3 s, como o sleep fixo de antes
+        orch.wait_ready(f"server_{receiver.name}", timeout=3)
+    for sender, receiver, outfile in pairs:
+        orch.spawn(f"client_{sender.name}", f"iperf -c {receiver.IP()} -t {args.time} -i 1",
+                   host=sender, output=outfile, deadline=args.time + 10)
+    # Termina quando os clientes terminam (ou assim que algo falhar)
+    orch.wait()
+    orch.release()
+
 # --- Experimento Bônus ---
-def run_bonus_experiment(net):
+def run_bonus_experiment(net, orch):
     h_reno, r_reno = net.get('h_reno', 'r_reno')
     h_bbr, r_bbr = net.get('h_bbr', 'r_bbr')
 
@@ -65,26 +83,16 @@ def run_bonus_experiment(net):
     h_reno.cmd("sysctl -w net.ipv4.tcp_congestion_control=reno")
     h_bbr.cmd("sysctl -w net.ipv4.tcp_congestion_control=bbr")
 
-    info("Starting iperf servers...\n")
-    r_reno.cmd("iperf -s -w 16m &")
-    r_bbr.cmd("iperf -s -w 16m &")
-    sleep(3)
-
-    info("Starting iperf clients...\n")
-    h_reno.cmd(f"iperf -c {r_reno.IP()} -t {args.time} -i 1 > {args.dir}/iperf_reno.txt 2>&1 &")
-    h_bbr.cmd(f"iperf -c {r_bbr.IP()} -t {args.time} -i 1 > {args.dir}/iperf_bbr.txt 2>&1 &")
-
-    # Espera o tempo total de execução
-    sleep(args.time + 2)
+    info("Starting iperf servers and clients...\n")
+    run_flows(orch, [(h_reno, r_reno, f"{args.dir}/iperf_reno.txt"),
+                     (h_bbr, r_bbr, f"{args.dir}/iperf_bbr.txt")])
 
     return [], []
 
 # --- Experimento Original (Partes 2 e 3) ---
-def run_original_experiment(net):
+def run_original_experiment(net, orch):
     h1, h2 = net.get('h1', 'h2')
-    h1.cmd(f"iperf -c {h2.IP()} -t {args.time} -i 1 > {args.dir}/iperf_output.txt 2>&1 &")
-    h2.cmd("iperf -s -w 16m &")
-    sleep(args.time + 2)
+    run_flows(orch, [(h1, h2, f"{args.dir}/iperf_output.txt")])
     return [], []
 
 # --- Função Principal ---
@@ -101,19 +109,26 @@ def main():
     net.pingAll()
 
     qmon = None
-    if args.bonus:
-        qmon = start_qmon(iface='s1-eth3', outfile=f'{args.dir}/q.txt')
-        run_bonus_experiment(net)
-    else:
-        os.system(f"sysctl -w net.ipv4.tcp_congestion_control={args.cong}")
-        qmon = start_qmon(iface='s0-eth2', outfile=f'{args.dir}/q.txt')
-        run_original_experiment(net)
-
-    if qmon:
-        qmon.terminate()
+    orch = Orchestrator(f'{args.dir}/events.jsonl').start()
+    try:
+        if args.bonus:
+            qmon = start_qmon(iface='s1-eth3', outfile=f'{args.dir}/q.txt')
+            run_bonus_experiment(net, orch)
+        else:
+            os.system(f"sysctl -w net.ipv4.tcp_congestion_control={args.cong}")
+            qmon = start_qmon(iface='s0-eth2', outfile=f'{args.dir}/q.txt')
+            run_original_experiment(net, orch)
+    except Aborted as e:
+        info(f"Experiment aborted: {e}\n")
+    finally:
+        orch.stop()
+        if qmon:
+            qmon.terminate()
 
     net.stop()
     Popen("pgrep -f iperf | xargs kill -9", shell=True).wait()
+    if orch.reason:
+        sys.exit(1)
     info("Experiment finished.\n")
 
 if __name__ == "__main__":
@@ -5,18 +5,18 @@ import os
 import matplotlib.pyplot as plt
 import numpy as np
 
+UNIDADES = {'': 1e-6, 'K': 1e-3, 'M': 1.0, 'G': 1e3}
+
 def parse_iperf_data(filename):
     """Lê um arquivo de log do iperf e extrai a vazão (em Mbits/sec)."""
     throughputs = []
-    regex = re.compile(r'(\d+\.\d+)\s+(Mbits/sec|Kbits/sec)')
+    regex = re.compile(r'(\d+(?:\.\d+)?)\s+([KMG]?)bits/sec')
     try:
         with open(filename, 'r') as f:
             for line in f:
                 match = regex.search(line)
                 if match and "0.0-" not in line:
-                    value = float(match.group(1))
-                    if match.group(2) == "Kbits/sec":
-                        value /= 1000
+                    value = float(match.group(1)) * UNIDADES[match.group(2)]
                     throughputs.append(value)
     except FileNotFoundError:
         print(f"Erro: {filename} não encontrado.")
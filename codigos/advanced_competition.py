@@ -19,9 +19,13 @@ from argparse import ArgumentParser
 import sys
 import os
 import json
+import random
 import numpy as np
 
 from monitor import monitor_qlen
+import iperf
+import memo
+import scheduler
 
 class AdvancedCompetitionTopo(Topo):
     """Advanced topology for multiple TCP flow competition."""
@@ -168,16 +172,68 @@ def run_scenario_3():
     server2 = h4.popen("iperf -s -p 5002")
     sleep(1)
     
-    # Start first flow (Reno)
-    client1 = h1.popen(f"iperf -c {h3.IP()} -p 5001 -t 40 -i 1 > {results_dir}/reno_output.txt", shell=True)
+    # Reno starts at t=0, BBR joins at t=10 (same clock, no sleep drift)
+    sched = scheduler.FlowScheduler(f'{results_dir}/flow_schedule.csv')
+    sched.add('reno', h1, f"iperf -c {h3.IP()} -p 5001 -t 40 -i 1 > {results_dir}/reno_output.txt", 0)
+    sched.add('bbr', h2, f"iperf -c {h4.IP()} -p 5002 -t 30 -i 1 > {results_dir}/bbr_output.txt", 10)
+    sched.run()
     
-    # Wait 10 seconds, then start second flow (BBR)
-    sleep(10)
-    client2 = h2.popen(f"iperf -c {h4.IP()} -p 5002 -t 30 -i 1 > {results_dir}/bbr_output.txt", shell=True)
+    # Wait for completion
+    sched.wait()
+    
+    # Cleanup
+    qmon.terminate()
+    server1.terminate()
+    server2.terminate()
+    net.stop()
+    
+    return results_dir
+
+def scenario_4_timeline(rate=0.5, mean_duration=5.0, seed=1, timeline=None):
+    """(start, duration, name) of the background Reno flows of scenario 4:
+    Poisson arrivals over 40 s, or the flows of a timeline file."""
+    if timeline:
+        flows = scheduler.read_timeline(timeline)
+    else:
+        flows = [(t, d, None) for t, d in
+                 scheduler.poisson_arrivals(rate, 40, mean_duration, random.Random(seed))]
+    return [(t, d, name or f'reno_bg_{i}') for i, (t, d, name) in enumerate(flows)]
+
+def run_scenario_4(background):
+    """Scenario 4: BBR joins a link loaded by Poisson (or trace) Reno arrivals"""
+    print("Executando Cenário 4: TCP BBR entrando em link com chegadas de fluxos TCP Reno")
+    
+    results_dir = "results/scenario4_bbr_joins_arrivals"
+    os.makedirs(results_dir, exist_ok=True)
+    
+    topo = AdvancedCompetitionTopo(num_pairs=2)
+    net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink)
+    net.start()
+    
+    h1, h2, h3, h4 = net.get('h1'), net.get('h2'), net.get('h3'), net.get('h4')
+    
+    # Configure TCP algorithms
+    set_tcp_algorithm(h1, 'reno')
+    set_tcp_algorithm(h2, 'bbr')
+    
+    # Start monitoring
+    qmon = Process(target=monitor_qlen, args=('s1-eth3', 0.1, f'{results_dir}/queue.txt'))
+    qmon.start()
+    
+    # One server per receiver serves every flow of its sender
+    server1 = h3.popen("iperf -s -p 5001")
+    server2 = h4.popen("iperf -s -p 5002")
+    sleep(1)
+    
+    sched = scheduler.FlowScheduler(f'{results_dir}/flow_schedule.csv')
+    for start, duration, name in background:
+        sched.add(name, h1, f"iperf -c {h3.IP()} -p 5001 -t {max(1, round(duration))} -i 1 "
+                            f"> {results_dir}/{name}_output.txt", start)
+    sched.add('bbr', h2, f"iperf -c {h4.IP()} -p 5002 -t 30 -i 1 > {results_dir}/bbr_output.txt", 10)
+    sched.run()
     
     # Wait for completion
-    client1.wait()
-    client2.wait()
+    sched.wait()
     
     # Cleanup
     qmon.terminate()
@@ -229,24 +285,10 @@ def analyze_scenario_results(results_dir):
 
 def parse_iperf_output(file_path):
     """Parse iperf output file to extract throughput values."""
-    throughputs = []
-    
     if not os.path.exists(file_path):
-        return throughputs
-    
-    with open(file_path, 'r') as f:
-        for line in f:
-            if 'Mbits/sec' in line and 'sec' in line:
-                parts = line.strip().split()
-                for i, part in enumerate(parts):
-                    if part == 'Mbits/sec' and i > 0:
-                        try:
-                            throughput = float(parts[i-1])
-                            throughputs.append(throughput)
-                        except ValueError:
-                            continue
-    
-    return throughputs
+        return []
+    
+    return iperf.read_throughputs(file_path)
 
 def generate_comparison_report():
     """Generate a comprehensive comparison report."""
@@ -254,7 +296,8 @@ def generate_comparison_report():
     scenarios = [
         "results/scenario1_reno_vs_bbr",
         "results/scenario2_multiple_reno_vs_bbr",
-        "results/scenario3_time_shifted"
+        "results/scenario3_time_shifted",
+        "results/scenario4_bbr_joins_arrivals"
     ]
     
     report = []
@@ -284,37 +327,77 @@ def generate_comparison_report():
     
     print("Relatório gerado em: results/competition_summary.md")
 
+# Fixed configuration of each scenario, hashed by memo to skip re-runs
+BOTTLENECK = {'bw': 10, 'delay_ms': 50, 'maxq': 100, 'access_bw': 1000, 'access_delay_ms': 1}
+SCENARIOS = {
+    1: (run_scenario_1, "results/scenario1_reno_vs_bbr",
+        {'num_pairs': 2, 'algorithms': ['reno', 'bbr'], 'duration': [30, 30], 'start': [0, 0]}),
+    2: (run_scenario_2, "results/scenario2_multiple_reno_vs_bbr",
+        {'num_pairs': 3, 'algorithms': ['reno', 'reno', 'bbr'], 'duration': [30, 30, 30],
+         'start': [0, 0, 0]}),
+    3: (run_scenario_3, "results/scenario3_time_shifted",
+        {'num_pairs': 2, 'algorithms': ['reno', 'bbr'], 'duration': [40, 30], 'start': [0, 10]}),
+    4: (run_scenario_4, "results/scenario4_bbr_joins_arrivals",
+        {'num_pairs': 2, 'algorithms': ['reno', 'bbr'], 'bbr_duration': 30, 'bbr_start': 10}),
+}
+
+def run_memoized(n, force=False, background=None):
+    """Run and analyze scenario n unless an identical complete run exists.
+    background is the Reno timeline of scenario 4 (scenario_4_timeline)."""
+    scenario, results_dir, config = SCENARIOS[n]
+    config = dict(config, experiment='advanced_competition', scenario=n,
+                  topology=dict(BOTTLENECK, cls='AdvancedCompetitionTopo'))
+    if n == 4:
+        background = scenario_4_timeline() if background is None else background
+        config['background'] = background
+    run_hash, fingerprint, cached = memo.lookup(results_dir, config, ['analysis.json'], force)
+    if cached:
+        print(f"Cenário {n}: reutilizando execução idêntica {run_hash[:12]} de {cached} (use --force para repetir)")
+        memo.reuse(cached, results_dir)
+        return results_dir
+    
+    results_dir = scenario(background) if n == 4 else scenario()
+    analyze_scenario_results(results_dir)
+    memo.write_meta(results_dir, run_hash, fingerprint)
+    return results_dir
+
 def main():
     parser = ArgumentParser(description="Advanced TCP Competition Scenarios")
-    parser.add_argument('--scenario', type=int, choices=[1, 2, 3], 
-                       help="Scenario to run (1=Reno vs BBR, 2=Multiple Reno vs BBR, 3=Time-shifted)")
+    parser.add_argument('--scenario', type=int, choices=[1, 2, 3, 4], 
+                       help="Scenario to run (1=Reno vs BBR, 2=Multiple Reno vs BBR, 3=Time-shifted, "
+                            "4=BBR joins Reno arrivals)")
     parser.add_argument('--all', action='store_true', help="Run all scenarios")
+    parser.add_argument('--force', action='store_true',
+                       help="Re-run scenarios even if an identical complete run exists")
+    
+    parser.add_argument('--arrival-rate', type=float, default=0.5,
+                       help="Scenario 4: Reno flow arrivals per second (Poisson)")
+    parser.add_argument('--mean-flow-duration', type=float, default=5.0,
+                       help="Scenario 4: mean duration (sec) of a Reno flow (exponential)")
+    parser.add_argument('--seed', type=int, default=1,
+                       help="Scenario 4: seed of the arrival process")
+    parser.add_argument('--timeline',
+                       help="Scenario 4: CSV of Reno flows (start,duration[,name]) instead of Poisson arrivals")
     
     args = parser.parse_args()
+    background = scenario_4_timeline(args.arrival_rate, args.mean_flow_duration, args.seed,
+                                     args.timeline)
     
     if args.all:
         print("Executando todos os cenários...")
-        scenarios = [run_scenario_1, run_scenario_2, run_scenario_3]
-        for scenario in scenarios:
-            results_dir = scenario()
-            analyze_scenario_results(results_dir)
+        for n in sorted(SCENARIOS):
+            run_memoized(n, args.force, background)
         generate_comparison_report()
     
-    elif args.scenario == 1:
-        results_dir = run_scenario_1()
-        analyze_scenario_results(results_dir)
-    elif args.scenario == 2:
-        results_dir = run_scenario_2()
-        analyze_scenario_results(results_dir)
-    elif args.scenario == 3:
-        results_dir = run_scenario_3()
-        analyze_scenario_results(results_dir)
+    elif args.scenario in SCENARIOS:
+        run_memoized(args.scenario, args.force, background)
     else:
         print("Especifique um cenário ou use --all")
         print("Cenários disponíveis:")
         print("  1: TCP Reno vs TCP BBR (1 vs 1)")
         print("  2: Múltiplos TCP Reno vs Single TCP BBR")
         print("  3: Fluxos com início em tempos diferentes")
+        print("  4: TCP BBR entrando em link com chegadas Poisson de TCP Reno")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+'''
+CPU affinity planner for monitors, traffic generators and emulated hosts.
+
+Queue monitors, link-trace drivers and captures run as children of the
+experiment driver; iperf, ping and curl run inside the CPULimitedHost
+namespaces; the softirq work of the emulated links runs on whichever CPU
+sent the packet.  Left to the scheduler they share cores, and the
+monitors' sampling instants drift with the load.
+
+The planner reads the core topology (sysfs: SMT siblings are kept
+together, so a role owns whole physical cores; cores listed in
+/sys/devices/system/cpu/isolated go to the monitors first) and splits
+the cores into four roles:
+
+    system      the driver itself, Open vSwitch and anything not pinned
+                (children inherit it)
+    monitors    monitor_qlen, linktrace and capture processes
+                (sched_setaffinity)
+    generators  cpuset of the hosts that send (iperf/ping/curl clients
+                and the softirq load of what they send)
+    hosts       cpuset of every other host (receivers, servers)
+
+With fewer than four cores the roles share: the monitors keep the last
+core if there are two or three, everything shares a single core.  The
+layout and every assignment actually applied are returned by
+AffinityPlan.record() for the run metadata, together with
+monitor_timing(): the spread of the queue monitor's sampling intervals,
+which is the noise the pinning is meant to reduce.
+
+Usage (print the plan of this box):
+    python3 affinity.py --monitor-cores 1
+'''
+
+import json
+import os
+from argparse import ArgumentParser
+
+SYSFS_CPU = '/sys/devices/system/cpu'
+ROLES = ('system', 'monitors', 'generators', 'hosts')
+
+
+def parse_cpu_list(text):
+    """CPUs of a sysfs list such as '0-3,8,10-11'."""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        lo, _, hi = part.partition('-')
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def isolated_cpus(sysfs=SYSFS_CPU):
+    """CPUs removed from the scheduler by isolcpus= (usually none)."""
+    return parse_cpu_list(_read(os.path.join(sysfs, 'isolated'), ''))
+
+
+def read_cpu_topology(sysfs=SYSFS_CPU, allowed=None):
+    """Physical cores usable by this process, in CPU order:
+    [{'package', 'core', 'cpus'}], SMT siblings grouped in one core."""
+    if allowed is None:
+        allowed = set(os.sched_getaffinity(0)) | set(isolated_cpus(sysfs))
+    cores = {}
+    for cpu in sorted(allowed):
+        base = os.path.join(sysfs, 'cpu%d' % cpu, 'topology')
+        package = int(_read(os.path.join(base, 'physical_package_id'), 0))
+        core = int(_read(os.path.join(base, 'core_id'), cpu))
+        cores.setdefault((package, core), []).append(cpu)
+    return [{'package': p, 'core': c, 'cpus': cpus}
+            for (p, c), cpus in sorted(cores.items(), key=lambda kv: kv[1][0])]
+
+
+def _cpus(cores):
+    return sorted(cpu for core in cores for cpu in core['cpus'])
+
+
+def plan_affinity(cores, monitor_cores=1, generator_cores=None, system_cores=1, isolated=()):
+    """Split physical cores between the ROLES.
+
+    generator_cores defaults to half (rounded up) of what is left after
+    the system and monitor cores.  Returns {'roles': {role: [cpus]},
+    'shared': bool, ...}.
+    """
+    n = len(cores)
+    isolated = set(isolated)
+    roles = {}
+    if n >= system_cores + monitor_cores + 2:
+        # Isolated cores first, then the highest ones, for the monitors
+        quiet = [c for c in cores if set(c['cpus']) & isolated]
+        rest = [c for c in cores if c not in quiet]
+        monitors = (quiet + rest[::-1])[:monitor_cores]
+        others = [c for c in cores if c not in monitors]
+        system, left = others[:system_cores], others[system_cores:]
+        k = generator_cores or (len(left) + 1) // 2
+        k = min(max(k, 1), len(left) - 1)
+        roles = {'system': system, 'monitors': monitors,
+                 'generators': left[:k], 'hosts': left[k:]}
+        shared = False
+    elif n >= 2:
+        roles = {'system': cores[:-1], 'monitors': cores[-1:],
+                 'generators': cores[:-1], 'hosts': cores[:-1]}
+        shared = True
+    else:
+        roles = {role: cores for role in ROLES}
+        shared = True
+    return {'physical_cores': n, 'cpus': _cpus(cores), 'isolated': sorted(isolated),
+            'roles': {role: _cpus(roles[role]) for role in ROLES}, 'shared': shared}
+
+
+class AffinityPlan(object):
+    """Applies a plan_affinity() layout and keeps track of what was pinned."""
+
+    def __init__(self, monitor_cores=1, generator_cores=None, system_cores=1,
+                 sysfs=SYSFS_CPU):
+        isolated = isolated_cpus(sysfs)
+        self.layout = plan_affinity(read_cpu_topology(sysfs), monitor_cores,
+                                    generator_cores, system_cores, isolated)
+        self.processes = {}
+        self.hosts = {}
+        self.errors = []
+
+    def cpus(self, role):
+        return self.layout['roles'][role]
+
+    def pin(self, name, pid, role):
+        """sched_setaffinity of one process (pid 0: this one) to role."""
+        cpus = self.cpus(role)
+        try:
+            os.sched_setaffinity(pid, cpus)
+        except OSError as e:
+            self.errors.append('%s: %s' % (name, e))
+            print("Cannot pin %s to CPUs %s: %s" % (name, cpus, e))
+            return False
+        self.processes[name] = {'pid': pid or os.getpid(), 'role': role, 'cpus': cpus}
+        return True
+
+    def pin_self(self):
+        """Move the driver (and every child it starts from now on) to the
+        system cores."""
+        return self.pin('driver', 0, 'system')
+
+    def assign_hosts(self, hosts, generators=()):
+        """Confine each host's cgroup to the generator or host cores."""
+        for host in hosts:
+            role = 'generators' if host.name in generators else 'hosts'
+            if not hasattr(host, 'setCPUs'):
+                self.errors.append('%s: not a CPULimitedHost' % host.name)
+                continue
+            try:
+                host.setCPUs(cores=self.cpus(role))
+            except Exception as e:
+                self.errors.append('%s: %s' % (host.name, e))
+                print("Cannot set the cpuset of %s: %s" % (host.name, e))
+                continue
+            self.hosts[host.name] = {'role': role, 'cpus': self.cpus(role)}
+
+    def describe(self):
+        for role in ROLES:
+            print("  %-10s CPUs %s" % (role, ','.join(map(str, self.cpus(role))) or '-'))
+        if self.layout['shared']:
+            print("  (too few cores: roles share CPUs)")
+
+    def record(self):
+        """Layout and assignments, for memo.write_meta's extra."""
+        return dict(self.layout, processes=self.processes, hosts=self.hosts,
+                    errors=self.errors)
+
+
+def monitor_timing(fname, interval_sec):
+    """Spread of a monitor's sampling intervals (first column of a
+    time,value file such as q.txt), or None if there are too few
+    samples.  lag is how late a sample came with respect to its interval."""
+    times = []
+    if not os.path.exists(fname):
+        return None
+    with open(fname) as f:
+        for line in f:
+            try:
+                times.append(float(line.split(',', 1)[0]))
+            except ValueError:
+                continue
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    if len(gaps) < 2:
+        return None
+    mean = sum(gaps) / len(gaps)
+    std = (sum((g - mean) ** 2 for g in gaps) / len(gaps)) ** 0.5
+    lags = sorted(max(g - interval_sec, 0) for g in gaps)
+    return {'samples': len(times), 'interval_ms': interval_sec * 1000,
+            'mean_interval_ms': mean * 1000, 'std_interval_ms': std * 1000,
+            'p99_lag_ms': lags[min(len(lags) - 1, int(0.99 * len(lags)))] * 1000,
+            'max_lag_ms': lags[-1] * 1000}
+
+
+def main():
+    parser = ArgumentParser(description="Show the CPU affinity plan of this box")
+    parser.add_argument('--monitor-cores', type=int, default=1)
+    parser.add_argument('--generator-cores', type=int, default=None)
+    parser.add_argument('--system-cores', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="Print the layout as JSON")
+    args = parser.parse_args()
+    plan = AffinityPlan(args.monitor_cores, args.generator_cores, args.system_cores)
+    if args.json:
+        print(json.dumps(plan.layout, indent=2))
+        return
+    print("%d physical cores, CPUs %s%s" % (
+        plan.layout['physical_cores'], ','.join(map(str, plan.layout['cpus'])),
+        '; isolated %s' % plan.layout['isolated'] if plan.layout['isolated'] else ''))
+    plan.describe()
+
+
+if __name__ == "__main__":
+    main()
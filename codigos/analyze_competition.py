@@ -7,6 +7,8 @@ import os
 import sys
 import argparse
 from helper import read_list
+from flowtrace import read_trace
+import aqm
 
 def parse_ping_results(ping_file):
     """Parse ping results to extract RTT statistics."""
@@ -37,8 +39,12 @@ def parse_ping_results(ping_file):
         }
     return None
 
-def parse_queue_results(queue_file):
-    """Parse queue length results."""
+def parse_queue_results(queue_file, maxq=None):
+    """Parse queue length results.
+
+    Utilization is measured against the configured maxq; files from runs
+    that did not record it fall back to the old 100-packet assumption.
+    """
     if not os.path.exists(queue_file):
         return None
     
@@ -63,10 +69,93 @@ def parse_queue_results(queue_file):
             'queue_lengths': queue_lengths,
             'avg_queue': np.mean(queue_lengths),
             'max_queue': np.max(queue_lengths),
-            'queue_utilization': np.mean(queue_lengths) / 100.0  # Assuming max queue is 100
+            'maxq': maxq or 100,
+            'queue_utilization': np.mean(queue_lengths) / float(maxq or 100)
         }
     return None
 
+def queueing_delay_ms(backlog_bytes, bw_mbps, delay_ms=0):
+    """Queueing delay of a byte backlog drained at bw_mbps.
+
+    netem's backlog (and that of the HTB above it) includes the packets
+    in its delay line, about bw * delay on a busy link: delay_ms of it is
+    propagation, only the excess is queueing.
+    """
+    drain_ms = np.asarray(backlog_bytes, dtype=float) * 8 / (bw_mbps * 1e6) * 1000
+    return np.clip(drain_ms - (delay_ms or 0), 0, None)
+
+def parse_queue_stats(stats_file, bw_mbps=None, maxq=None, delay_ms=None):
+    """Derive per-qdisc metrics from the full qdisc counter trace.
+
+    Returns {handle: metrics} with drop rate (drops / packets offered),
+    queueing delay from the byte backlog drained at the bottleneck rate
+    (less the delay line of the link's netem, delay_ms; see
+    queueing_delay_ms), and utilization of the configured maxq.
+    """
+    stats = read_trace(stats_file)
+    if not stats:
+        return None
+    
+    ret = {}
+    for handle, cols in stats.items():
+        times = np.array(cols['time'], dtype=float)
+        backlog_bytes = np.array([v or 0 for v in cols['backlog_bytes']], dtype=float)
+        backlog_pkts = np.array([v or 0 for v in cols['backlog_pkts']], dtype=float)
+        sent = np.array([v or 0 for v in cols['sent_pkts']], dtype=float)
+        dropped = np.array([v or 0 for v in cols['dropped']], dtype=float)
+        
+        # Counters are cumulative since the qdisc was created
+        d_sent = sent[-1] - sent[0]
+        d_dropped = dropped[-1] - dropped[0]
+        offered = d_sent + d_dropped
+        
+        m = {
+            'kind': cols['kind'][0],
+            'times': times.tolist(),
+            'backlog_bytes': backlog_bytes.tolist(),
+            'backlog_pkts': backlog_pkts.tolist(),
+            'avg_backlog_pkts': float(np.mean(backlog_pkts)),
+            'max_backlog_pkts': float(np.max(backlog_pkts)),
+            'avg_backlog_bytes': float(np.mean(backlog_bytes)),
+            'drops': int(d_dropped),
+            'drop_rate': d_dropped / offered if offered > 0 else 0.0,
+            'overlimits': int((cols['overlimits'][-1] or 0) - (cols['overlimits'][0] or 0)),
+            'requeues': int((cols['requeues'][-1] or 0) - (cols['requeues'][0] or 0)),
+        }
+        if bw_mbps:
+            # An AQM grafted under netem only holds packets past the delay line
+            line_ms = 0 if m['kind'] in aqm.QDISCS else delay_ms
+            qdelay = queueing_delay_ms(backlog_bytes, bw_mbps, line_ms)
+            m['queueing_delay_ms'] = qdelay.tolist()
+            m['avg_queueing_delay_ms'] = float(np.mean(qdelay))
+            m['p95_queueing_delay_ms'] = float(np.percentile(qdelay, 95))
+        sojourn = [v for v in cols.get('sojourn_us', []) if v is not None]
+        if sojourn:
+            m['avg_sojourn_ms'] = float(np.mean(sojourn)) / 1000
+            m['p95_sojourn_ms'] = float(np.percentile(sojourn, 95)) / 1000
+        ecn = [v for v in cols.get('ecn_marks', []) if v is not None]
+        if ecn:
+            m['ecn_marks'] = int(ecn[-1] - ecn[0])
+        if maxq:
+            m['utilization'] = float(np.mean(backlog_pkts)) / maxq
+            m['max_utilization'] = float(np.max(backlog_pkts)) / maxq
+        ret[handle] = m
+    return ret
+
+def bottleneck_qdisc(qstats):
+    """The qdisc that holds the standing queue (largest mean backlog)."""
+    if not qstats:
+        return None
+    return max(qstats.values(), key=lambda m: m['avg_backlog_pkts'])
+
+def load_configuration(results_dir):
+    """Experiment configuration recorded in competition_results.json."""
+    results_file = os.path.join(results_dir, 'competition_results.json')
+    if not os.path.exists(results_file):
+        return {}
+    with open(results_file, 'r') as f:
+        return json.load(f).get('configuration', {})
+
 def plot_competition_results(results_dir):
     """Create comprehensive plots of competition results."""
     
@@ -81,7 +170,8 @@ def plot_competition_results(results_dir):
     # Parse additional data
     ping_reno = parse_ping_results(os.path.join(results_dir, 'ping_reno.txt'))
     ping_bbr = parse_ping_results(os.path.join(results_dir, 'ping_bbr.txt'))
-    queue_data = parse_queue_results(os.path.join(results_dir, 'queue.txt'))
+    config = load_configuration(results_dir)
+    queue_data = parse_queue_results(os.path.join(results_dir, 'queue.txt'), config.get('queue_size'))
     
     # Create figure with subplots
     fig, axes = plt.subplots(2, 2, figsize=(15, 12))
@@ -245,13 +335,41 @@ def print_detailed_analysis(results_dir):
         else:
             print(f"  RTT Stability: TCP BBR is more stable (CV: {bbr_cv:.3f} vs {reno_cv:.3f})")
     
+    # Heterogeneous RTTs: share against each flow's own base RTT
+    if results.get('rtt_analysis'):
+        print(f"\nRTT FAIRNESS:")
+        print(f"  {'Flow':<14} {'Base RTT':>10} {'Ratio':>6} {'Share':>7} {'RTT-norm':>9}")
+        for flow, r in sorted(results['rtt_analysis'].items(), key=lambda x: x[1]['rtt_ratio']):
+            print(f"  {flow:<14} {r['base_rtt_ms']:>8.1f}ms {r['rtt_ratio']:>6.2f} "
+                  f"{r['share']*100:>6.1f}% {r['share_rtt_normalized']*100:>8.1f}%")
+    
     # Queue Analysis
-    queue_data = parse_queue_results(os.path.join(results_dir, 'queue.txt'))
+    config = load_configuration(results_dir)
+    queue_data = parse_queue_results(os.path.join(results_dir, 'queue.txt'), config.get('queue_size'))
     if queue_data:
         print(f"\nQUEUE ANALYSIS:")
         print(f"  Average Queue Length: {queue_data['avg_queue']:.1f} packets")
         print(f"  Maximum Queue Length: {queue_data['max_queue']} packets")
-        print(f"  Queue Utilization: {queue_data['queue_utilization']:.1%}")
+        print(f"  Queue Utilization: {queue_data['queue_utilization']:.1%} of {queue_data['maxq']} packets")
+        
+        qstats = parse_queue_stats(os.path.join(results_dir, 'queue_stats.csv'),
+                                   config.get('bandwidth'), config.get('queue_size'),
+                                   config.get('delay'))
+        for handle, m in (qstats or {}).items():
+            print(f"  qdisc {handle}:")
+            print(f"    Backlog: {m['avg_backlog_pkts']:.1f} packets avg, {m['avg_backlog_bytes']:.0f} bytes avg")
+            print(f"    Drops: {m['drops']} ({m['drop_rate']:.2%} of offered packets)")
+            print(f"    Overlimits: {m['overlimits']}, Requeues: {m['requeues']}")
+            if 'avg_queueing_delay_ms' in m:
+                print(f"    Queueing delay: {m['avg_queueing_delay_ms']:.1f} ms avg, "
+                      f"{m['p95_queueing_delay_ms']:.1f} ms p95")
+            if 'avg_sojourn_ms' in m:
+                print(f"    AQM sojourn time: {m['avg_sojourn_ms']:.2f} ms avg, "
+                      f"{m['p95_sojourn_ms']:.2f} ms p95")
+            if 'ecn_marks' in m:
+                print(f"    ECN marks: {m['ecn_marks']}")
+            if 'utilization' in m:
+                print(f"    Utilization: {m['utilization']:.1%} avg, {m['max_utilization']:.1%} max")
         
         if queue_data['queue_utilization'] > 0.8:
             print("  Assessment: High queue utilization - potential bufferbloat")
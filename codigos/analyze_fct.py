@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+'''
+Flow completion time percentiles by flow size bucket.
+
+Reads the fct_trace.npz of each result directory (written by
+workload.py, e.g. through bufferbloat.py --short-flows) and reports, per
+run (buffer size and congestion control, taken from run_meta.json) and
+per size bucket, the number of flows and the p50/p95/p99 of the FCT
+slowdown and of the FCT itself.
+
+Usage:
+    python3 analyze_fct.py --dirs results/bb-q20 results/bb-q100 --json fct_summary.json
+'''
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import memo
+from workload import load_fct
+
+FCT_FILE = 'fct_trace.npz'
+
+# Bucket upper bounds (bytes)
+BUCKETS = [10e3, 100e3, 1e6, np.inf]
+PERCENTILES = [50, 95, 99]
+
+
+def _fmt_size(b):
+    return '%gKB' % (b / 1e3) if b < 1e6 else '%gMB' % (b / 1e6)
+
+
+def bucket_names(edges):
+    names = []
+    lo = 0
+    for hi in edges:
+        names.append('>%s' % _fmt_size(lo) if hi == np.inf
+                     else '%s-%s' % (_fmt_size(lo), _fmt_size(hi)))
+        lo = hi
+    return names
+
+
+def run_label(results_dir):
+    """'<cong> q=<maxq>' from the run's memoized configuration, else the
+    directory name."""
+    meta_file = os.path.join(results_dir, memo.META_FILE)
+    if os.path.exists(meta_file):
+        with open(meta_file) as f:
+            config = json.load(f).get('fingerprint', {}).get('config', {})
+        if 'maxq' in config:
+            cong = config.get('cong') or config.get('scenario', '')
+            return '%s q=%d' % (cong, config['maxq'])
+    return os.path.basename(os.path.normpath(results_dir))
+
+
+def fct_percentiles(fct, edges=BUCKETS, percentiles=PERCENTILES):
+    """Per-bucket flow counts and slowdown/FCT percentiles of one trace.
+
+    Percentiles are over the completed flows; each bucket also counts its
+    unfinished ones (failed, cut off in flight or never started), which
+    would otherwise be the missing tail.
+    """
+    ok = fct['ok']
+    size, slowdown, t = fct['size'][ok], fct['slowdown'][ok], fct['fct'][ok]
+    edges = np.asarray(edges)
+    idx = np.searchsorted(edges, size, side='left')
+    idx_unfinished = np.searchsorted(edges, fct['size'][~ok], side='left')
+    ret = {}
+    names = ['p%d' % p for p in percentiles]
+    for b, name in enumerate(bucket_names(edges)):
+        sel = idx == b
+        unfinished = int((idx_unfinished == b).sum())
+        if not sel.any() and not unfinished:
+            continue
+        ret[name] = {
+            'flows': int(sel.sum()),
+            'unfinished': unfinished,
+            'slowdown': dict(zip(names, np.percentile(slowdown[sel], percentiles).tolist()
+                                 if sel.any() else [np.nan] * len(names))),
+            'fct_ms': dict(zip(names, (np.percentile(t[sel], percentiles) * 1000).tolist()
+                               if sel.any() else [np.nan] * len(names))),
+        }
+    ret['unfinished'] = int((~ok).sum())
+    ret['not_started'] = int(np.isnan(fct['start'][~ok]).sum())
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FCT percentiles by flow size bucket")
+    parser.add_argument('--dirs', '-d', nargs='+', required=True,
+                        help="Result directories with %s" % FCT_FILE)
+    parser.add_argument('--json', help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    summary = {}
+    for d in args.dirs:
+        fname = os.path.join(d, FCT_FILE)
+        if not os.path.exists(fname):
+            print("%s: no %s" % (d, FCT_FILE))
+            continue
+        label = run_label(d)
+        summary[label] = fct_percentiles(load_fct(fname))
+
+        print("\n=== %s (%s) ===" % (label, d))
+        print("%-14s %7s %7s %9s %9s %9s %11s %11s" %
+              ('size', 'flows', 'unfin', 'sd p50', 'sd p95', 'sd p99', 'fct p50 ms',
+               'fct p99 ms'))
+        for name, b in summary[label].items():
+            if not isinstance(b, dict):
+                continue
+            print("%-14s %7d %7d %9.2f %9.2f %9.2f %11.1f %11.1f" %
+                  (name, b['flows'], b['unfinished'], b['slowdown']['p50'],
+                   b['slowdown']['p95'], b['slowdown']['p99'], b['fct_ms']['p50'],
+                   b['fct_ms']['p99']))
+        if summary[label]['unfinished']:
+            print("unfinished flows: %d (%d never started)" %
+                  (summary[label]['unfinished'], summary[label]['not_started']))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
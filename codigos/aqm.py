@@ -0,0 +1,38 @@
+'''
+AQM (fq_codel, CoDel, PIE, CAKE) on the bottleneck of a TCLink.
+
+TCLink builds an HTB root (5:) that enforces the link rate and a netem
+leaf (10:) that adds the delay and whose `limit` is max_queue_size, i.e.
+a drop-tail queue.  install_aqm() grafts the chosen AQM under netem
+(handle 20:) and raises netem's limit, so netem only delays packets and
+the standing queue, with its drops and ECN marks, is managed by the AQM.
+'''
+
+QDISCS = ('droptail', 'fq_codel', 'codel', 'pie', 'cake')
+
+# netem must never drop before the AQM does
+NETEM_LIMIT = 100000
+
+def aqm_cmds(iface, qdisc, params='', delay_ms=None):
+    """tc commands that turn iface's TCLink netem into delay + AQM."""
+    if qdisc == 'droptail':
+        return []
+    netem = "tc qdisc change dev %s parent 5:1 handle 10: netem limit %d" % (iface, NETEM_LIMIT)
+    if delay_ms:
+        netem += " delay %fms" % delay_ms
+    if qdisc == 'cake' and 'bandwidth' not in params:
+        # HTB already shapes to the link rate
+        params = ('unlimited ' + params).strip()
+    aqm = ("tc qdisc add dev %s parent 10:1 handle 20: %s %s" % (iface, qdisc, params)).strip()
+    return [netem, aqm]
+
+def install_aqm(node, iface, qdisc, params='', delay_ms=None):
+    """Install qdisc on iface (owned by node).  Returns the tc output."""
+    out = []
+    for cmd in aqm_cmds(iface, qdisc, params, delay_ms):
+        print(cmd)
+        out.append(node.cmd(cmd))
+    check = node.cmd("tc qdisc show dev %s" % iface)
+    if qdisc != 'droptail' and qdisc not in check:
+        raise RuntimeError("Failed to install %s on %s:\n%s" % (qdisc, iface, ''.join(out)))
+    return ''.join(out)
@@ -0,0 +1,40 @@
+'''
+BBTopo, the topology of the bufferbloat experiment: h1 -- s0 -- h2.
+
+The s0 -> h2 link (s0-eth2) is the bottleneck.  Shared by bufferbloat.py
+and buffer_search.py's live mode, so both probe the same network.
+'''
+
+try:
+    from mininet.topo import Topo
+except ImportError:
+    Topo = object
+
+
+class BBTopo(Topo):
+    "Simple topology for bufferbloat experiment."
+
+    def build(self, n=2, bw_host=1000, bw_net=10, delay=20, maxq=100):
+        # TODO: create two hosts
+        # Criando os dois hosts h1 e h2
+        h1 = self.addHost('h1')
+        h2 = self.addHost('h2')
+
+        # Here I have created a switch.  If you change its name, its
+        # interface names will change from s0-eth1 to newname-eth1.
+        switch = self.addSwitch('s0')
+
+        # TODO: Add links with appropriate characteristics
+        # Adicionando links com características específicas
+        # Link h1 -> switch: largura de banda alta (1000 Mb/s), delay baixo
+        self.addLink(h1, switch, 
+                     bw=bw_host, 
+                     delay='%fms' % (delay/2), 
+                     max_queue_size=maxq)
+        
+        # Link switch -> h2: largura de banda baixa (bottleneck), delay baixo
+        # Este é o link gargalo que causa o bufferbloat
+        self.addLink(switch, h2, 
+                     bw=bw_net, 
+                     delay='%fms' % (delay/2), 
+                     max_queue_size=maxq)
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+
+'''
+Adaptive search over the bottleneck buffer (maxq) of the bufferbloat
+experiment.
+
+Utilization grows with the buffer and so does the queueing delay; the
+interesting buffer is the knee between the two.  Instead of a dense sweep
+this driver probes one maxq at a time and narrows the range:
+
+    bisect   smallest maxq whose utilization reaches --target (for the
+             rtt_* metrics: largest maxq whose RTT stays under --target).
+             Converges in about log2(range / tol) probes.
+    golden   golden-section search for the maxq maximizing --metric
+             (default `power`, throughput / mean RTT, which peaks at the
+             knee).  One new probe per step; the range shrinks by 0.618.
+
+--bdp gives --min/--max/--tol in multiples of the bandwidth-delay product
+(base RTT = 2 * --delay, as in BBTopo), converted to packets.
+
+A probe runs either
+
+    live     (default) on one BBTopo kept up for the whole search: the
+             bottleneck netem's limit is changed in place with tc between
+             probes, after the previous flow stops and the queue drains,
+             so no topology is rebuilt.  The hosts' TCP metrics cache is
+             flushed before each probe, so no probe starts from the
+             ssthresh/RTT the previous one left behind;
+    runs     as an ordinary bufferbloat.py run per maxq in
+             <dir>/maxq_<q> (memoized; works with -- --backend sim).
+
+Both modes put the same traffic on the link: the long iperf flow, pings
+every 0.1 s and bufferbloat.py's web fetches (3 curl fetches of
+index.html every 5 s).  Every probe gets a directory with its iperf log,
+ping.txt and q.txt.
+Metrics skip the first --warmup seconds (slow start):
+
+    utilization      mean throughput / --bw-net
+    throughput_mbps  mean throughput
+    rtt_mean_ms      mean ping RTT
+    rtt_p95_ms       95th percentile ping RTT
+    power            throughput_mbps / (rtt_mean_ms / 1000)
+
+probes.csv lists the probes in the order they ran; search.json holds the
+configuration, the answer and the sampled curve (probes sorted by maxq).
+
+Usage:
+    sudo python3 buffer_search.py --bw-net 10 --delay 20 --dir results/bufsearch \\
+        --search bisect --metric utilization --target 0.95 --bdp --min 0.05 --max 4
+    python3 buffer_search.py --mode runs --bw-net 10 --delay 20 --dir results/bufsearch \\
+        --search golden --min 5 --max 400 -- --backend sim
+'''
+
+import csv
+import json
+import math
+import os
+import sys
+from argparse import ArgumentParser, REMAINDER
+from multiprocessing import Process
+from subprocess import Popen, PIPE
+from time import sleep, time
+
+import numpy as np
+
+try:
+    from mininet.node import CPULimitedHost
+    from mininet.link import TCLink
+    from mininet.net import Mininet
+except ImportError:
+    # Only --mode runs works without Mininet
+    Mininet = None
+
+import iperf
+import linktrace
+from monitor import monitor_qlen
+from bbtopo import BBTopo
+
+MTU_BYTES = 1500
+GOLDEN = (math.sqrt(5) - 1) / 2
+
+# Metrics that grow with the buffer and must stay at or below the target
+UPPER_BOUND = ('rtt_mean_ms', 'rtt_p95_ms')
+METRICS = ('utilization', 'throughput_mbps', 'rtt_mean_ms', 'rtt_p95_ms', 'power')
+FIELDS = ['probe', 'maxq', 'maxq_bdp'] + list(METRICS)
+
+
+def bdp_packets(bw_mbps, delay_ms):
+    """Bandwidth-delay product (packets) of BBTopo: base RTT 2 * delay."""
+    return bw_mbps * 1e6 * (2 * delay_ms / 1000.0) / (8 * MTU_BYTES)
+
+
+def ping_rtts(fname):
+    rtts = []
+    if not os.path.exists(fname):
+        return rtts
+    with open(fname) as f:
+        for line in f:
+            if 'time=' in line:
+                try:
+                    rtts.append(float(line.split('time=')[1].split()[0]))
+                except ValueError:
+                    continue
+    return rtts
+
+
+def probe_metrics(probe_dir, bw_net, warmup, ping_interval=0.1):
+    """Metrics of one probe directory (None if it has no iperf output)."""
+    for name in ('iperf_output.txt', 'iperf_output.json'):
+        fname = os.path.join(probe_dir, name)
+        if os.path.exists(fname):
+            break
+    times, tputs = iperf.read_timeline(fname)
+    tputs = [tp for t, tp in zip(times, tputs) if t > warmup] or tputs
+    if not tputs:
+        return None
+    rtts = ping_rtts(os.path.join(probe_dir, 'ping.txt'))
+    rtts = rtts[int(warmup / ping_interval):] or rtts
+    tput = float(np.mean(tputs))
+    metrics = {'utilization': tput / bw_net, 'throughput_mbps': tput,
+               'rtt_mean_ms': None, 'rtt_p95_ms': None, 'power': None}
+    if rtts:
+        metrics['rtt_mean_ms'] = float(np.mean(rtts))
+        metrics['rtt_p95_ms'] = float(np.percentile(rtts, 95))
+        metrics['power'] = tput / (metrics['rtt_mean_ms'] / 1000.0)
+    return metrics
+
+
+class LiveProber(object):
+    """Probes maxq values on one running BBTopo."""
+
+    IFACE = 's0-eth2'
+    # bufferbloat.py's web fetches: FETCHES curl fetches every FETCH_PERIOD s
+    FETCHES = 3
+    FETCH_PERIOD = 5
+
+    def __init__(self, args):
+        self.args = args
+        os.system("sysctl -w net.ipv4.tcp_congestion_control=%s" % args.cong)
+        topo = BBTopo(bw_host=args.bw_host, bw_net=args.bw_net, delay=args.delay,
+                      maxq=int(args.max_packets))
+        self.net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink)
+        self.net.start()
+        self.net.pingAll()
+        self.h1, self.h2, self.s0 = self.net.get('h1', 'h2', 's0')
+        self.server = self.h2.popen("iperf -s -w 16m")
+        self.webserver = self.h1.popen("python webserver.py", shell=True)
+        sleep(1)
+
+    def fetch(self):
+        """One curl fetch of index.html from h1 to h2, as bufferbloat.py does."""
+        cmd = "curl -o /dev/null -s -w %%{time_total} http://%s/" % self.h1.IP()
+        self.h2.popen(cmd, shell=True, stdout=PIPE).communicate()
+
+    def probe(self, maxq, probe_dir):
+        args = self.args
+        # Change only netem's limit; HTB keeps the rate
+        netem = linktrace.tc_cmds(self.IFACE, args.bw_net, args.delay / 2, 0, maxq)[1]
+        self.s0.cmd('tc ' + netem)
+        # Forget the ssthresh/RTT cached by the previous probe's connection
+        for host in (self.h1, self.h2):
+            host.cmd('ip tcp_metrics flush all')
+        qmon = Process(target=monitor_qlen,
+                       args=(self.IFACE, 0.1, os.path.join(probe_dir, 'q.txt')))
+        qmon.start()
+        client = self.h1.popen(iperf.client_cmd('iperf', self.h2.IP(), 5001, args.time, 1,
+                                                os.path.join(probe_dir, 'iperf_output.txt')),
+                               shell=True)
+        ping = self.h1.popen("ping -i 0.1 -c %d %s > %s" % (
+            args.time * 10, self.h2.IP(), os.path.join(probe_dir, 'ping.txt')), shell=True)
+        while client.poll() is None:
+            for _ in range(self.FETCHES):
+                self.fetch()
+            end = time() + self.FETCH_PERIOD
+            while client.poll() is None and time() < end:
+                sleep(0.1)
+        ping.wait()
+        qmon.terminate()
+        # Let the queue drain before the next limit applies
+        sleep(max(1.0, 4 * args.delay / 1000.0))
+
+    def close(self):
+        self.server.terminate()
+        self.webserver.terminate()
+        self.net.stop()
+        Popen("pgrep -f webserver.py | xargs kill -9", shell=True).wait()
+
+
+class RunProber(object):
+    """Probes maxq values with one bufferbloat.py run each."""
+
+    def __init__(self, args, extra):
+        self.args = args
+        self.extra = extra
+        self.script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bufferbloat.py')
+
+    def probe(self, maxq, probe_dir):
+        args = self.args
+        cmd = [sys.executable, self.script, '--bw-host', str(args.bw_host),
+               '--bw-net', str(args.bw_net), '--delay', str(args.delay), '--maxq', str(maxq),
+               '--time', str(args.time), '--cong', args.cong, '--dir', probe_dir] + self.extra
+        print(' '.join(cmd))
+        Popen(cmd).wait()
+
+    def close(self):
+        pass
+
+
+class BufferSearch(object):
+    """Runs probes (cached by maxq) and records them."""
+
+    def __init__(self, prober, out_dir, bw_net, warmup, bdp):
+        self.prober = prober
+        self.out_dir = out_dir
+        self.bw_net = bw_net
+        self.warmup = warmup
+        self.bdp = bdp
+        self.probes = {}
+        self.order = []
+        self.csv = open(os.path.join(out_dir, 'probes.csv'), 'w', newline='')
+        self.writer = csv.DictWriter(self.csv, FIELDS)
+        self.writer.writeheader()
+
+    def measure(self, maxq):
+        maxq = int(maxq)
+        if maxq in self.probes:
+            return self.probes[maxq]
+        probe_dir = os.path.join(self.out_dir, 'maxq_%d' % maxq)
+        os.makedirs(probe_dir, exist_ok=True)
+        print("Probe %d: maxq %d (%.2f BDP)" % (len(self.order) + 1, maxq, maxq / self.bdp))
+        self.prober.probe(maxq, probe_dir)
+        metrics = probe_metrics(probe_dir, self.bw_net, self.warmup)
+        if metrics is None:
+            raise RuntimeError("probe maxq %d produced no iperf output (%s)" % (maxq, probe_dir))
+        self.probes[maxq] = metrics
+        self.order.append(maxq)
+        row = dict(metrics, probe=len(self.order), maxq=maxq, maxq_bdp=maxq / self.bdp)
+        self.writer.writerow(row)
+        self.csv.flush()
+        print("  " + "  ".join("%s %s" % (k, '-' if v is None else '%.3g' % v)
+                               for k, v in metrics.items()))
+        return metrics
+
+    def close(self):
+        self.csv.close()
+
+
+def bisect(search, metric, target, lo, hi, tol):
+    """Smallest maxq in [lo, hi] with metric >= target (largest with
+    metric <= target for UPPER_BOUND metrics), to within tol packets."""
+    upper = metric in UPPER_BOUND
+
+    def ok(q):
+        value = search.measure(q)[metric]
+        if value is None:
+            raise RuntimeError("probe maxq %d has no %s" % (q, metric))
+        return value <= target if upper else value >= target
+
+    if upper:
+        if not ok(lo):
+            return None, 'target_unreachable'
+        if ok(hi):
+            return hi, 'bound'
+        # Invariant: ok(lo) and not ok(hi)
+        while hi - lo > tol:
+            mid = (lo + hi) // 2
+            if ok(mid):
+                lo = mid
+            else:
+                hi = mid
+        return lo, 'converged'
+    if not ok(hi):
+        return None, 'target_unreachable'
+    if ok(lo):
+        return lo, 'bound'
+    # Invariant: not ok(lo) and ok(hi)
+    while hi - lo > tol:
+        mid = (lo + hi) // 2
+        if ok(mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi, 'converged'
+
+
+def golden(search, metric, lo, hi, tol):
+    """maxq in [lo, hi] maximizing metric (golden-section on integers)."""
+
+    def value(q):
+        v = search.measure(q)[metric]
+        return -math.inf if v is None else v
+
+    a, b = lo, hi
+    c = int(round(b - GOLDEN * (b - a)))
+    d = int(round(a + GOLDEN * (b - a)))
+    while b - a > tol and a < c < d < b:
+        # The surviving interior point is reused: one new probe per step
+        if value(c) >= value(d):
+            b, d = d, c
+            c = int(round(b - GOLDEN * (b - a)))
+        else:
+            a, c = c, d
+            d = int(round(a + GOLDEN * (b - a)))
+    best = max(search.probes, key=lambda q: value(q) if a <= q <= b else -math.inf)
+    return best, 'converged'
+
+
+def main():
+    parser = ArgumentParser(description="Search the bottleneck buffer for the utilization/latency knee")
+    parser.add_argument('--bw-host', '-B', type=float, default=1000)
+    parser.add_argument('--bw-net', '-b', type=float, required=True)
+    parser.add_argument('--delay', type=float, required=True,
+                        help="Link propagation delay (ms); base RTT is twice this")
+    parser.add_argument('--dir', '-d', required=True)
+    parser.add_argument('--time', '-t', type=int, default=20, help="Seconds per probe")
+    parser.add_argument('--warmup', type=float, default=5,
+                        help="Seconds at the start of a probe left out of its metrics")
+    parser.add_argument('--cong', default='reno')
+    parser.add_argument('--mode', choices=['live', 'runs'], default='live')
+    parser.add_argument('--search', choices=['bisect', 'golden'], default='bisect')
+    parser.add_argument('--metric', choices=METRICS, default=None,
+                        help="Target metric (default: utilization for bisect, power for golden)")
+    parser.add_argument('--target', type=float, default=0.95,
+                        help="Bisection target of the metric")
+    parser.add_argument('--bdp', action='store_true',
+                        help="--min/--max/--tol are in BDP multiples")
+    parser.add_argument('--min', type=float, default=2)
+    parser.add_argument('--max', type=float, default=1000)
+    parser.add_argument('--tol', type=float, default=None,
+                        help="Stop when the range is this narrow (default: 1 packet, or 5%% of max)")
+    parser.add_argument('extra', nargs=REMAINDER,
+                        help="Extra bufferbloat.py options (--mode runs), after --")
+    args = parser.parse_args()
+    extra = args.extra[1:] if args.extra and args.extra[0] == '--' else args.extra
+
+    metric = args.metric or ('utilization' if args.search == 'bisect' else 'power')
+    bdp = bdp_packets(args.bw_net, args.delay)
+    scale = bdp if args.bdp else 1.0
+    lo = max(1, int(math.floor(args.min * scale)))
+    hi = int(math.ceil(args.max * scale))
+    tol = max(1, int(round(args.tol * scale))) if args.tol is not None else \
+        max(1, int(0.05 * hi)) if args.search == 'golden' else 1
+    args.max_packets = hi
+    if hi <= lo:
+        parser.error("empty maxq range [%d, %d] packets" % (lo, hi))
+    if args.mode == 'live':
+        if Mininet is None:
+            parser.error("Mininet is not installed: use --mode runs (-- --backend sim)")
+        if extra:
+            parser.error("extra bufferbloat.py options only apply to --mode runs")
+
+    os.makedirs(args.dir, exist_ok=True)
+    print("BDP %.1f packets; searching maxq in [%d, %d] (%s on %s)" %
+          (bdp, lo, hi, args.search, metric))
+    prober = LiveProber(args) if args.mode == 'live' else RunProber(args, extra)
+    search = BufferSearch(prober, args.dir, args.bw_net, args.warmup, bdp)
+    try:
+        if args.search == 'bisect':
+            best, status = bisect(search, metric, args.target, lo, hi, tol)
+        else:
+            best, status = golden(search, metric, lo, hi, tol)
+    finally:
+        search.close()
+        prober.close()
+
+    curve = [dict(search.probes[q], maxq=q, maxq_bdp=q / bdp) for q in sorted(search.probes)]
+    report = {'search': args.search, 'metric': metric,
+              'target': args.target if args.search == 'bisect' else None,
+              'mode': args.mode, 'bw_net': args.bw_net, 'delay': args.delay, 'cong': args.cong,
+              'time': args.time, 'warmup': args.warmup, 'bdp_packets': bdp,
+              'range': [lo, hi], 'tol': tol, 'status': status, 'maxq': best,
+              'maxq_bdp': best / bdp if best is not None else None,
+              'probes': len(search.order), 'curve': curve}
+    with open(os.path.join(args.dir, 'search.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n%6s %6s %8s %9s %9s %9s %9s" % ('maxq', 'BDP', 'util', 'Mb/s', 'RTT ms', 'p95 ms', 'power'))
+    for p in curve:
+        print("%6d %6.2f %8.3f %9.2f %9s %9s %9s" % (
+            p['maxq'], p['maxq_bdp'], p['utilization'], p['throughput_mbps'],
+            *('-' if p[k] is None else '%.1f' % p[k] for k in ('rtt_mean_ms', 'rtt_p95_ms', 'power'))))
+    if best is None:
+        print("\nNo maxq in [%d, %d] meets %s %s %g (%d probes)" % (
+            lo, hi, metric, '<=' if metric in UPPER_BOUND else '>=', args.target, len(search.order)))
+    else:
+        print("\nmaxq %d (%.2f BDP): %s after %d probes" % (best, best / bdp, status, len(search.order)))
+
+
+if __name__ == "__main__":
+    main()
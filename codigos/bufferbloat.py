@@ -1,21 +1,38 @@
-from mininet.topo import Topo
-from mininet.node import CPULimitedHost
-from mininet.link import TCLink
-from mininet.net import Mininet
-from mininet.log import lg, info
-from mininet.util import dumpNodeConnections
-from mininet.cli import CLI
+try:
+    from mininet.node import CPULimitedHost
+    from mininet.link import TCLink
+    from mininet.net import Mininet
+    from mininet.log import lg, info
+    from mininet.util import dumpNodeConnections
+    from mininet.cli import CLI
+except ImportError:
+    # Only the simulator backend (--backend sim) runs without Mininet
+    Mininet = None
 
 from subprocess import Popen, PIPE
 from time import sleep, time
-from multiprocessing import Process
+from multiprocessing import Process, Value
 from argparse import ArgumentParser
 
 from monitor import monitor_qlen
+from bbtopo import BBTopo
+import iperf
+import aqm
+import memo
+import steady
+import workload
+import pageload
+import linktrace
+import highbw
+import affinity
+import orchestrator
+import metrics_export
+import packetsim
 
 import sys
 import os
 import math
+import random
 
 parser = ArgumentParser(description="Bufferbloat tests")
 parser.add_argument('--bw-host', '-B',
@@ -55,36 +72,161 @@ parser.add_argument('--cong',
                     help="Congestion control algorithm to use",
                     default="reno")
 
+parser.add_argument('--tool',
+                    help="Traffic generator (iperf3 logs JSON with cwnd/RTT/retransmits)",
+                    choices=iperf.TOOLS,
+                    default="iperf")
+
+parser.add_argument('--interval', '-i',
+                    type=float,
+                    help="iperf report interval (sec), down to 0.1 with iperf3",
+                    default=1)
+
 # Expt parameters
+parser.add_argument('--qdisc',
+                    help="Queue discipline on the bottleneck (droptail = TCLink's max_queue_size)",
+                    choices=aqm.QDISCS,
+                    default='droptail')
+
+parser.add_argument('--qdisc-params',
+                    help="Extra tc parameters for --qdisc, e.g. \"target 5ms interval 100ms ecn\"",
+                    default='')
+
+parser.add_argument('--highbw',
+                    help="Configure the qdiscs for multi-Gb/s links (HTB quantum/burst, pfifo without delay, rates above 1000 Mb/s; see highbw.py)",
+                    action='store_true')
+
+parser.add_argument('--offload',
+                    help="With --highbw, switch GSO/TSO/GRO on every interface",
+                    choices=highbw.OFFLOADS,
+                    default='keep')
+
+parser.add_argument('--affinity',
+                    help="Pin monitors, traffic generators and hosts to dedicated cores (see affinity.py)",
+                    action='store_true')
+
+parser.add_argument('--monitor-cores',
+                    type=int,
+                    help="With --affinity, physical cores reserved for the monitors",
+                    default=1)
+
+parser.add_argument('--metrics-port',
+                    type=int,
+                    help="Serve live Prometheus metrics of the run on 127.0.0.1:PORT (0: any free port; see metrics_export.py)",
+                    default=None)
+
+parser.add_argument('--force',
+                    help="Run even if a complete result of this exact configuration exists",
+                    action='store_true')
+
+parser.add_argument('--jitter',
+                    type=float,
+                    help="Delay the first webpage fetch by a random 0..JITTER seconds after the long flow starts",
+                    default=0)
+
+parser.add_argument('--seed',
+                    type=int,
+                    help="Seed of the start jitter and of --backend sim (repetitions of a configuration use different seeds)",
+                    default=None)
+
+parser.add_argument('--link-trace',
+                    help="Replay a bandwidth/delay/loss trace (Mahimahi or CSV, see linktrace.py) on the bottleneck",
+                    default=None)
+
+parser.add_argument('--link-trace-bin',
+                    type=int,
+                    help="Capacity bin (ms) of Mahimahi link traces",
+                    default=100)
+
+parser.add_argument('--adaptive',
+                    help="End the run once throughput and queue are steady (between --min-time and --max-time)",
+                    action='store_true')
+
+parser.add_argument('--min-time',
+                    type=float,
+                    help="Minimum duration (sec) of an adaptive run",
+                    default=10)
+
+parser.add_argument('--max-time',
+                    type=int,
+                    help="Maximum duration (sec) of an adaptive run (default: --time)",
+                    default=None)
+
+parser.add_argument('--steady-window',
+                    type=float,
+                    help="Averaging window (sec) of the steady-state detector",
+                    default=1.0)
+
+parser.add_argument('--steady-k',
+                    type=int,
+                    help="Consecutive stable windows required to stop",
+                    default=5)
+
+parser.add_argument('--steady-tol',
+                    type=float,
+                    help="Relative tolerance of the window means",
+                    default=0.1)
+
+parser.add_argument('--ping-interval',
+                    type=float,
+                    help="Seconds between pings (planner.py scales it to the RTT)",
+                    default=0.1)
+
+parser.add_argument('--queue-interval',
+                    type=float,
+                    help="Seconds between queue length samples",
+                    default=0.1)
+
+parser.add_argument('--short-flows',
+                    help="Run a short-flow workload (size CDF) alongside the long flow and record FCTs",
+                    choices=['websearch', 'datamining'],
+                    default=None)
+
+parser.add_argument('--short-load',
+                    type=float,
+                    help="Offered short-flow load as a fraction of the bottleneck",
+                    default=0.3)
+
+parser.add_argument('--short-scale',
+                    type=float,
+                    help="Multiply the short-flow sizes (the CDFs come from 10G datacenter links)",
+                    default=0.1)
+
+parser.add_argument('--short-pool',
+                    type=int,
+                    help="Concurrent short-flow connections",
+                    default=32)
+
+parser.add_argument('--pageload',
+                    help="Also load index.html with its (locally mirrored) subresources like a browser and record page load times",
+                    action='store_true')
+
+parser.add_argument('--backend',
+                    help="Run on Mininet (root) or on the packet-level simulator (packetsim.py)",
+                    choices=['mininet', 'sim'],
+                    default='mininet')
+
 args = parser.parse_args()
 
-class BBTopo(Topo):
-    "Simple topology for bufferbloat experiment."
-
-    def build(self, n=2):
-        # TODO: create two hosts
-        # Criando os dois hosts h1 e h2
-        h1 = self.addHost('h1')
-        h2 = self.addHost('h2')
-
-        # Here I have created a switch.  If you change its name, its
-        # interface names will change from s0-eth1 to newname-eth1.
-        switch = self.addSwitch('s0')
-
-        # TODO: Add links with appropriate characteristics
-        # Adicionando links com características específicas
-        # Link h1 -> switch: largura de banda alta (1000 Mb/s), delay baixo
-        self.addLink(h1, switch, 
-                     bw=args.bw_host, 
-                     delay='%fms' % (args.delay/2), 
-                     max_queue_size=args.maxq)
-        
-        # Link switch -> h2: largura de banda baixa (bottleneck), delay baixo
-        # Este é o link gargalo que causa o bufferbloat
-        self.addLink(switch, h2, 
-                     bw=args.bw_net, 
-                     delay='%fms' % (args.delay/2), 
-                     max_queue_size=args.maxq)
+if args.backend == 'mininet' and Mininet is None:
+    parser.error("Mininet is not installed: use --backend sim")
+if args.backend == 'sim':
+    if args.cong not in packetsim.CONGESTION_CONTROL:
+        parser.error("--backend sim supports --cong %s" % '/'.join(sorted(packetsim.CONGESTION_CONTROL)))
+    if args.adaptive or args.short_flows or args.pageload or args.qdisc != 'droptail':
+        parser.error("--backend sim does not support --adaptive, --short-flows, --pageload or AQMs")
+    if args.metrics_port is not None:
+        parser.error("--metrics-port needs --backend mininet")
+
+if args.max_time is None:
+    args.max_time = args.time
+if args.ping_interval <= 0 or args.queue_interval <= 0:
+    parser.error("--ping-interval and --queue-interval must be positive")
+
+# Longest the long flow may run: --time, or --max-time of an adaptive run
+RUN_TIME = args.max_time if args.adaptive else args.time
+# The iperf log is read while it is written (steady state, live metrics)
+FOLLOW_IPERF = args.adaptive or args.metrics_port is not None
 
 # Simple wrappers around monitoring utilities.  You are welcome to
 # contribute neatly written (using classes) monitoring scripts for
@@ -97,7 +239,10 @@ def start_iperf(net):
     # For those who are curious about the -w 16m parameter, it ensures
     # that the TCP flow is not receiver window limited.  If it is,
     # there is a chance that the router buffer may not get filled up.
-    server = h2.popen("iperf -s -w 16m")
+    if args.tool == 'iperf3':
+        server = h2.popen(iperf.server_cmd('iperf3', 5001, args.interval))
+    else:
+        server = h2.popen("iperf -s -w 16m")
 
     # TODO: Start the iperf client on h1.  Ensure that you create a
     # long lived TCP flow.
@@ -106,12 +251,27 @@ def start_iperf(net):
     # -t especifica a duração do teste (args.time)
     # -i especifica o intervalo de relatórios
     print("Starting iperf client...")
-    client = h1.popen("iperf -c %s -t %d -i 1" % (h2.IP(), args.time))
-    return server, client
-
-def start_qmon(iface, interval_sec=0.1, outfile="q.txt"):
+    if args.tool == 'iperf3':
+        # iperf3 applies the client's -w to both ends
+        outfile = '%s/iperf_output.json' % args.dir
+        json_stream = FOLLOW_IPERF and iperf.supports_json_stream(h1)
+        client = h1.popen(iperf.client_cmd('iperf3', h2.IP(), 5001, RUN_TIME,
+                                           args.interval, outfile, extra='-w 16m',
+                                           json_stream=json_stream,
+                                           line_buffered=FOLLOW_IPERF),
+                          shell=True)
+    else:
+        outfile = '%s/iperf_output.txt' % args.dir
+        client = h1.popen(iperf.client_cmd('iperf', h2.IP(), 5001, RUN_TIME,
+                                           args.interval, outfile,
+                                           line_buffered=FOLLOW_IPERF),
+                          shell=True)
+    return server, client, outfile
+
+def start_qmon(iface, interval_sec=0.1, outfile="q.txt", stats_file=None, capacity=None,
+               live=None):
     monitor = Process(target=monitor_qlen,
-                      args=(iface, interval_sec, outfile))
+                      args=(iface, interval_sec, outfile, stats_file, capacity, live))
     monitor.start()
     return monitor
 
@@ -125,21 +285,61 @@ def start_ping(net):
     # i.e. ping ... > /path/to/ping.
     
     # Iniciando ping de h1 para h2
-    # -i 0.1 especifica intervalo de 0.1 segundos entre pings (10 amostras/segundo)
-    # -c especifica número total de pings (duração * 10)
+    # -i especifica o intervalo entre pings (--ping-interval, 0.1 s por padrão)
+    # -c especifica número total de pings (duração / intervalo)
     h1 = net.get('h1')
     h2 = net.get('h2')
     print("Starting ping from h1 to h2...")
-    ping_cmd = "ping -i 0.1 -c %d %s > %s/ping.txt" % (args.time * 10, h2.IP(), args.dir)
+    ping_cmd = "ping -i %g -c %d %s > %s/ping.txt" % (args.ping_interval,
+                                                       int(RUN_TIME / args.ping_interval),
+                                                       h2.IP(), args.dir)
     ping = h1.popen(ping_cmd, shell=True)
     return ping
 
 def start_webserver(net):
     h1 = net.get('h1')
+    if args.pageload:
+        # Synthetic subresources next to index.html, served by webserver.py
+        pageload.build_bundle('index.html', pageload.BUNDLE_DIR)
     proc = h1.popen("python webserver.py", shell=True)
     sleep(1)
     return [proc]
 
+def start_short_flows(net):
+    """Short-flow workload: server on h1, client pool on h2 (the data
+    crosses the bottleneck with the long flow).  FCTs go to fct_trace.npz."""
+    h1 = net.get('h1')
+    h2 = net.get('h2')
+    server = h1.popen("python3 workload.py server --port %d" % workload.DEFAULT_PORT)
+    sleep(1)
+    cmd = ("python3 workload.py client --server %s --port %d --cdf %s --scale %g "
+           "--load %g --bw %g --rtt-ms %g --pool %d --duration %d --out %s/fct_trace.npz" %
+           (h1.IP(), workload.DEFAULT_PORT, args.short_flows, args.short_scale,
+            args.short_load, args.bw_net, 2 * args.delay, args.short_pool, RUN_TIME, args.dir))
+    if args.seed is not None:
+        cmd += " --seed %d" % args.seed
+    print("Starting %s short flows..." % args.short_flows)
+    client = h2.popen(cmd, shell=True)
+    return server, client
+
+def measure_page_load_time(net):
+    """
+    Carrega a página com todos os recursos (6 conexões persistentes,
+    respeitando dependências) e retorna o page load time, ou None
+    """
+    h1 = net.get('h1')
+    h2 = net.get('h2')
+    print("Loading page with subresources...")
+    cmd = "python3 pageload.py fetch --server %s --conns %d" % (h1.IP(), pageload.CONNECTIONS)
+    output = h2.popen(cmd, shell=True, stdout=PIPE).communicate()[0].decode().strip()
+    try:
+        plt = float(output.splitlines()[-1])
+    except (ValueError, IndexError):
+        print(f"Error parsing page load time: {output}")
+        return None
+    print(f"Page load time: {plt} seconds")
+    return plt
+
 def measure_webpage_fetch_time(net):
     """
     Mede o tempo de busca da página web usando curl
@@ -172,11 +372,77 @@ def measure_webpage_fetch_time(net):
     
     return fetch_times
 
+def write_fetch_stats(all_fetch_times, stop_reason, run_duration):
+    if not all_fetch_times:
+        return
+    import statistics
+    avg_fetch_time = statistics.mean(all_fetch_times)
+    std_fetch_time = statistics.stdev(all_fetch_times) if len(all_fetch_times) > 1 else 0
+    
+    print(f"\nWebpage fetch statistics:")
+    print(f"Average fetch time: {avg_fetch_time:.4f} seconds")
+    print(f"Standard deviation: {std_fetch_time:.4f} seconds")
+    print(f"Number of samples: {len(all_fetch_times)}")
+    
+    # Salvando estatísticas em arquivo
+    with open('%s/fetch_stats.txt' % args.dir, 'w') as f:
+        f.write(f"Average fetch time: {avg_fetch_time:.4f} seconds\n")
+        f.write(f"Standard deviation: {std_fetch_time:.4f} seconds\n")
+        f.write(f"Number of samples: {len(all_fetch_times)}\n")
+        f.write(f"All fetch times: {all_fetch_times}\n")
+        f.write(f"Queue discipline: {args.qdisc} {args.qdisc_params}\n")
+        f.write(f"Stop reason: {stop_reason} after {run_duration:.1f} seconds\n")
+
+def simulate():
+    """The same experiment on packetsim.py: long flow, pings and web
+    fetches of index.html, without Mininet or root."""
+    index = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+    start = time()
+    fetch_times = packetsim.simulate_bufferbloat(
+        args.dir, args.bw_net, args.bw_host, args.delay, args.maxq, args.cong, args.time,
+        os.path.getsize(index), seed=args.seed, link_trace=args.link_trace,
+        link_trace_bin=args.link_trace_bin, ping_interval=args.ping_interval,
+        queue_interval=args.queue_interval)
+    print("Simulated %ds in %.1fs" % (args.time, time() - start))
+    write_fetch_stats(fetch_times, 'fixed_time', args.time)
+
 def bufferbloat():
     if not os.path.exists(args.dir):
         os.makedirs(args.dir)
+
+    # Skip the emulation if this exact configuration already ran
+    config = {k: v for k, v in vars(args).items() if k not in ('dir', 'force', 'metrics_port')}
+    config['experiment'] = 'bufferbloat'
+    config['topology'] = {'class': 'BBTopo', 'hosts': 2, 'switches': 1}
+    if args.link_trace:
+        config['link_trace_sha256'] = linktrace.trace_digest(args.link_trace)
+    run_hash, fingerprint, cached = memo.lookup(args.dir, config,
+                                                ['q.txt', 'ping.txt', 'fetch_stats.txt'],
+                                                args.force)
+    if cached:
+        print("Reusing results of identical run %s from %s (use --force to re-run)" %
+              (run_hash[:12], cached))
+        memo.reuse(cached, args.dir)
+        return
+    if args.backend == 'sim':
+        simulate()
+        memo.write_meta(args.dir, run_hash, fingerprint,
+                        extra={'stop': {'reason': 'fixed_time', 'duration': args.time}})
+        return
+    # The endpoint must go away however the run ends
+    live = None
+    if args.metrics_port is not None:
+        live = metrics_export.LiveMetrics(args.dir, 'bufferbloat').start(args.metrics_port)
+    try:
+        emulate(run_hash, fingerprint, live)
+    finally:
+        if live:
+            live.stop()
+
+def emulate(run_hash, fingerprint, live=None):
+    """The Mininet run of bufferbloat(); live gets its metrics."""
     os.system("sysctl -w net.ipv4.tcp_congestion_control=%s" % args.cong)
-    topo = BBTopo()
+    topo = BBTopo(bw_host=args.bw_host, bw_net=args.bw_net, delay=args.delay, maxq=args.maxq)
     net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink)
     net.start()
     # This dumps the topology and how nodes are interconnected through
@@ -193,18 +459,68 @@ def bufferbloat():
     
     # Monitorando a interface s0-eth2 (link do switch para h2 - o gargalo)
     # eth1 seria h1->switch, eth2 seria switch->h2
-    qmon = start_qmon(iface='s0-eth2',
-                      outfile='%s/q.txt' % (args.dir))
+    if args.highbw:
+        # netem must stay where aqm.py or the link trace change it
+        keep = ['s0-eth2'] if args.qdisc != 'droptail' or args.link_trace else []
+        highbw.tune_net(net, args.offload, keep_netem=keep)
+    if args.qdisc != 'droptail':
+        aqm.install_aqm(net.get('s0'), 's0-eth2', args.qdisc, args.qdisc_params,
+                        delay_ms=args.delay / 2)
+    # A link trace varies the bottleneck's rate/delay/loss during the run;
+    # every change goes to capacity.txt and annotates the queue samples
+    capacity = None
+    if args.link_trace:
+        capacity = Value('d', args.bw_net)
+        limit = aqm.NETEM_LIMIT if args.qdisc != 'droptail' else args.maxq
+        tracer = Process(target=linktrace.run_link_trace,
+                         args=('s0-eth2', args.link_trace, args.delay / 2, limit, capacity,
+                               '%s/capacity.txt' % args.dir, True, args.link_trace_bin,
+                               None, args.highbw))
+    qmon = start_qmon(iface='s0-eth2', interval_sec=args.queue_interval,
+                      outfile='%s/q.txt' % (args.dir),
+                      stats_file='%s/q_stats.csv' % (args.dir),
+                      capacity=capacity, live=live.queue if live else None)
+    if args.link_trace:
+        tracer.start()
+    plan = None
+    if args.affinity:
+        # h1 sends the long flow and the pings; h2 receives and runs curl
+        plan = affinity.AffinityPlan(args.monitor_cores)
+        print("CPU affinity:")
+        plan.describe()
+        plan.assign_hosts(net.hosts, generators=['h1'])
+        plan.pin_self()
+        plan.pin('qmon', qmon.pid, 'monitors')
+        if args.link_trace:
+            plan.pin('linktrace', tracer.pid, 'monitors')
 
     # TODO: Start iperf, webservers, etc.
     # Iniciando o servidor web
     webserver_procs = start_webserver(net)
     
     # Iniciando iperf para criar fluxo TCP de longa duração
-    iperf_server, iperf_client = start_iperf(net)
+    iperf_server, iperf_client, iperf_outfile = start_iperf(net)
     
     # Iniciando ping para medir RTT
     ping_proc = start_ping(net)
+    
+    if args.short_flows:
+        short_server, short_client = start_short_flows(net)
+
+    if live:
+        live.follow_flow('iperf', iperf_outfile)
+        live.follow_ping('h1-%s' % net.get('h2').IP(), '%s/ping.txt' % args.dir)
+
+    # Supervise the traffic: a dead server or client ends the run at once
+    # instead of after RUN_TIME of empty samples
+    orch = orchestrator.Orchestrator('%s/events.jsonl' % args.dir).start()
+    orch.adopt('webserver', webserver_procs[0], kind=orchestrator.SERVICE)
+    orch.adopt('iperf_server', iperf_server, kind=orchestrator.SERVICE)
+    orch.adopt('iperf_client', iperf_client, deadline=RUN_TIME + 10)
+    orch.adopt('ping', ping_proc, critical=False)
+    if args.short_flows:
+        orch.adopt('short_server', short_server, kind=orchestrator.SERVICE)
+        orch.adopt('short_client', short_client, deadline=RUN_TIME + 10)
 
     # TODO: measure the time it takes to complete webpage transfer
     # from h1 to h2 (say) 3 times.  Hint: check what the following
@@ -218,40 +534,79 @@ def bufferbloat():
     # loop below useful.
     
     all_fetch_times = []
+    all_page_load_times = []
+    
+    # Start jitter: vary the phase of the fetches relative to the long flow
+    if args.jitter > 0:
+        offset = random.Random(args.seed).uniform(0, args.jitter)
+        print("Start jitter: %.3fs" % offset)
+        sleep(offset)
+    
+    # Adaptive runs stop once the long flow and the queue are steady
+    stop_reason = 'fixed_time'
+    if args.adaptive:
+        detector = steady.SteadyStateDetector(args.steady_window, args.steady_k,
+                                              args.steady_tol)
+        detector.expect('queue', abs_tol=max(1.0, 0.05 * args.maxq))
+        followers = [steady.FileFollower('%s/q.txt' % args.dir, steady.queue_samples('queue'))]
+        if args.tool == 'iperf' or iperf.supports_json_stream(net.get('h1')):
+            detector.expect('iperf', abs_tol=0.02 * args.bw_net)
+            followers.append(steady.flow_follower(iperf_outfile, 'iperf'))
     
     start_time = time()
     while True:
         # Mede o tempo de busca da página web 3 vezes a cada 5 segundos
         fetch_times = measure_webpage_fetch_time(net)
         all_fetch_times.extend(fetch_times)
+        if live:
+            for fetch_time in fetch_times:
+                live.observe_fetch(fetch_time)
+        if args.pageload:
+            plt = measure_page_load_time(net)
+            if plt is not None:
+                all_page_load_times.append(plt)
         
-        sleep(5)
+        if orch.sleep(5):
+            stop_reason = 'aborted'
+            break
         now = time()
         delta = now - start_time
-        if delta > args.time:
+        if args.adaptive:
+            steady.feed(detector, followers)
+            if delta >= args.min_time and detector.is_steady():
+                stop_reason = steady.STOP_STEADY
+                break
+        if delta > RUN_TIME:
+            if args.adaptive:
+                stop_reason = steady.STOP_MAX_TIME
             break
-        print("%.1fs left..." % (args.time - delta))
+        print("%.1fs left..." % (RUN_TIME - delta))
+    run_duration = time() - start_time
+    # The processes are stopped on purpose from here on
+    orch.release()
+    if args.adaptive:
+        for fol in followers:
+            fol.close()
+    print("Stopping after %.1fs: %s" % (run_duration, stop_reason))
 
     # TODO: compute average (and standard deviation) of the fetch
     # times.  You don't need to plot them.  Just note it in your
     # README and explain.
     
-    if all_fetch_times:
+    write_fetch_stats(all_fetch_times, stop_reason, run_duration)
+
+    if all_page_load_times:
         import statistics
-        avg_fetch_time = statistics.mean(all_fetch_times)
-        std_fetch_time = statistics.stdev(all_fetch_times) if len(all_fetch_times) > 1 else 0
-        
-        print(f"\nWebpage fetch statistics:")
-        print(f"Average fetch time: {avg_fetch_time:.4f} seconds")
-        print(f"Standard deviation: {std_fetch_time:.4f} seconds")
-        print(f"Number of samples: {len(all_fetch_times)}")
-        
-        # Salvando estatísticas em arquivo
-        with open('%s/fetch_stats.txt' % args.dir, 'w') as f:
-            f.write(f"Average fetch time: {avg_fetch_time:.4f} seconds\n")
-            f.write(f"Standard deviation: {std_fetch_time:.4f} seconds\n")
-            f.write(f"Number of samples: {len(all_fetch_times)}\n")
-            f.write(f"All fetch times: {all_fetch_times}\n")
+        avg_plt = statistics.mean(all_page_load_times)
+        std_plt = statistics.stdev(all_page_load_times) if len(all_page_load_times) > 1 else 0
+        print(f"\nPage load statistics:")
+        print(f"Average page load time: {avg_plt:.4f} seconds")
+        print(f"Standard deviation: {std_plt:.4f} seconds")
+        with open('%s/pageload_stats.txt' % args.dir, 'w') as f:
+            f.write(f"Average page load time: {avg_plt:.4f} seconds\n")
+            f.write(f"Standard deviation: {std_plt:.4f} seconds\n")
+            f.write(f"Number of samples: {len(all_page_load_times)}\n")
+            f.write(f"All page load times: {all_page_load_times}\n")
 
     # Hint: The command below invokes a CLI which you can use to
     # debug.  It allows you to run arbitrary commands inside your
@@ -260,19 +615,52 @@ def bufferbloat():
 
     # Terminando todos os processos
     qmon.terminate()
+    if args.link_trace:
+        tracer.terminate()
+        cap = linktrace.capacity_summary('%s/capacity.txt' % args.dir)
+        if cap:
+            print("Link capacity (trace): %.2f Mbps mean, %.2f-%.2f Mbps, %d changes" %
+                  (cap['mean_mbps'], cap['min_mbps'], cap['max_mbps'], cap['changes']))
     
     # Aguardando processos terminarem
     if 'iperf_server' in locals():
         iperf_server.terminate()
     if 'iperf_client' in locals():
+        if args.adaptive and iperf_client.poll() is None:
+            iperf_client.terminate()
         iperf_client.wait()
     if 'ping_proc' in locals():
         ping_proc.wait()
     
+    if args.short_flows:
+        # The client finishes the flows in flight and writes its trace
+        short_client.terminate()
+        short_client.wait()
+        short_server.terminate()
+    
+    # iperf3 intervals (throughput, retransmits, cwnd, RTT) in the shared
+    # trace format
+    if args.tool == 'iperf3':
+        iperf.write_flow_traces(args.dir)
+
+    orch.stop()
+    if live:
+        live.stop()
     net.stop()
     # Ensure that all processes you create within Mininet are killed.
     # Sometimes they require manual killing.
     Popen("pgrep -f webserver.py | xargs kill -9", shell=True).wait()
+    if orch.reason:
+        # Not a complete run: memo must not reuse it
+        print("Run aborted: %s" % orch.reason)
+        sys.exit(1)
+
+    memo.write_meta(args.dir, run_hash, fingerprint,
+                    extra={'stop': {'reason': stop_reason, 'duration': run_duration},
+                           'affinity': plan.record() if plan else None,
+                           'monitor_timing': affinity.monitor_timing('%s/q.txt' % args.dir,
+                                                                     args.queue_interval),
+                           'processes': orch.summary()})
 
 if __name__ == "__main__":
     bufferbloat()
\ No newline at end of file
@@ -8,6 +8,7 @@ HOST_BANDWIDTH=1000        # Largura de banda dos hosts (Mbps)
 
 # Parâmetros dos Experimentos
 EXPERIMENT_DURATION=60     # Duração de cada experimento (segundos)
+                           # (planner.py escala duração e amostragem ao RTT/BDP)
 BUFFER_SIZE_LARGE=100      # Tamanho do buffer grande (pacotes)
 BUFFER_SIZE_SMALL=20       # Tamanho do buffer pequeno (pacotes)
 
@@ -0,0 +1,79 @@
+'''
+Shared per-flow trace format.
+
+Every throughput source (iperf3 JSON, tcp_info sampler, pcap analyzer)
+writes the same CSV layout so analysis and plots only need one reader:
+
+    time,flow,<field>,<field>,...
+
+`time` is a Unix timestamp in seconds (same clock as q.txt), `flow` is a
+free-form flow label and the remaining columns depend on the source.
+Missing values are left empty.
+'''
+
+import os
+
+BASE_FIELDS = ['time', 'flow']
+IPERF_FIELDS = ['throughput_mbps', 'retransmits', 'cwnd', 'rtt_ms']
+
+
+class TraceWriter(object):
+    """Appends rows in the shared trace format to a file."""
+
+    def __init__(self, fname, fields=IPERF_FIELDS, append=False):
+        self.fields = list(fields)
+        exists = append and os.path.exists(fname) and os.path.getsize(fname) > 0
+        self.f = open(fname, 'a' if append else 'w')
+        if not exists:
+            self.f.write(','.join(BASE_FIELDS + self.fields) + '\n')
+
+    def write(self, t, flow, row):
+        values = ['%f' % t, str(flow)]
+        for field in self.fields:
+            v = row.get(field)
+            values.append('' if v is None else str(v))
+        self.f.write(','.join(values) + '\n')
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _to_number(v):
+    if v == '':
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        return v
+
+
+def read_trace(fname):
+    """Read a trace file into {flow: {field: [values...]}}.
+
+    Rows keep file order, so every column list of a flow has the same
+    length and index i of each list belongs to the same sample.
+    """
+    flows = {}
+    if not os.path.exists(fname):
+        return flows
+    with open(fname) as f:
+        header = f.readline().strip().split(',')
+        for line in f:
+            parts = line.rstrip('\n').split(',')
+            if len(parts) != len(header):
+                continue
+            row = dict(zip(header, parts))
+            cols = flows.setdefault(row['flow'], {h: [] for h in header if h != 'flow'})
+            for h in header:
+                if h != 'flow':
+                    cols[h].append(_to_number(row[h]))
+    return flows
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+
+'''
+Fluid-model simulator of the bufferbloat and competition bottlenecks.
+
+Screens the bw x delay x maxq x scenario grid without Mininet: every
+configuration is one row of a batch of ODEs integrated together with
+NumPy (fixed-step Euler, --dt), so the Python cost of a step is paid
+once per batch rather than once per configuration.
+
+Model (rates in packets/sec, 1500-byte packets):
+
+    queue     dq/dt = sum(x) - C while busy, drop-tail at maxq; the
+              output is shared in proportion to the arrival rates and the
+              overflow is lost in the same proportion
+    RTT       base RTT of the topology + q / C
+    Reno      x = W / RTT; W grows by one packet per delivered packet in
+              slow start and 1/W per packet in congestion avoidance; a
+              loss halves W one RTT later, at most once per RTT (fast
+              recovery), which keeps drop-tail's sawtooth and its
+              synchronization across flows
+    BBR (v1)  x = min(gain * BtlBw, cwnd_gain * BtlBw * RTprop / RTT) with
+              BtlBw the max delivery rate of the last 10 rounds, RTprop
+              the min RTT of the last 10 s, Startup/Drain, the 8-phase
+              ProbeBW gain cycle and ProbeRTT (4 packets for 200 ms)
+
+Topologies follow the emulated ones: the single-flow scenarios ('reno',
+'bbr') are bufferbloat.py's BBTopo (RTT = 2 * delay), the others are
+tcp_competition.py's CompetitionTopo (RTT = 2 * (1 + delay + 1) ms).
+
+The summary CSV has one row per configuration.  With --write-runs every
+configuration also gets a run directory with the files the emulated run
+would write (q.txt/queue.txt, ping files, iperf text logs, flow_trace.csv
+and, for competitions, competition_results.json), so the existing plots
+and analyses work on it unchanged.
+
+Usage:
+    python3 fluidsim.py --scenario reno_vs_bbr 2reno_vs_2bbr --bw 10 50 100 \\
+        --delay 5 20 50 --maxq 20 100 1000 --time 60 --out fluid_grid.csv
+'''
+
+import csv
+import itertools
+import json
+import os
+from argparse import ArgumentParser
+from time import time
+
+import numpy as np
+
+from flowtrace import TraceWriter, IPERF_FIELDS
+import iperf
+
+MSS_BITS = 1500 * 8
+IW = 10
+ACCESS_DELAY_MS = 1
+RECEIVER_DELAY_MS = 1
+
+RENO, BBR = 0, 1
+ALGORITHMS = {'reno': RENO, 'bbr': BBR}
+
+# Algorithms and flow labels (as tcp_competition.py names its files)
+SCENARIOS = {
+    'reno': ['reno'],
+    'bbr': ['bbr'],
+    'reno_vs_bbr': ['reno', 'bbr'],
+    '2reno_vs_2bbr': ['reno', 'reno', 'bbr', 'bbr'],
+    '2reno_vs_1bbr': ['reno', 'reno', 'bbr'],
+}
+FLOW_LABELS = {
+    'reno': ['iperf'],
+    'bbr': ['iperf'],
+    'reno_vs_bbr': ['reno_flow', 'bbr_flow'],
+    '2reno_vs_2bbr': ['reno_flow_1', 'reno_flow_2', 'bbr_flow_1', 'bbr_flow_2'],
+    '2reno_vs_1bbr': ['reno_flow_1', 'reno_flow_2', 'bbr_flow'],
+}
+
+
+def flow_labels(algorithms):
+    """Flow labels of a sender list: <algo>_flow, numbered <algo>_flow_<k>
+    when the algorithm has more than one flow."""
+    labels, seen = [], {}
+    for algo in algorithms:
+        seen[algo] = seen.get(algo, 0) + 1
+        labels.append('%s_flow_%d' % (algo, seen[algo]) if algorithms.count(algo) > 1
+                      else '%s_flow' % algo)
+    return labels
+
+
+# BBR v1 parameters
+HIGH_GAIN = 2.885
+CWND_GAIN = 2.0
+CYCLE = np.array([1.25, 0.75, 1, 1, 1, 1, 1, 1])
+BW_ROUNDS = 10
+RTPROP_WINDOW = 10.0
+PROBE_RTT_TIME = 0.2
+PROBE_RTT_CWND = 4
+STARTUP, DRAIN, PROBE_BW, PROBE_RTT = range(4)
+
+
+def single_flow(scenario):
+    """True for bufferbloat.py's one-flow BBTopo scenarios."""
+    return len(SCENARIOS[scenario]) == 1
+
+
+def base_rtts(config):
+    """Base RTT (ms) of every flow of a configuration."""
+    if single_flow(config['scenario']):
+        return [2.0 * config['delay']]
+    access = config.get('access_delay') or [ACCESS_DELAY_MS]
+    return [2.0 * (access[min(j, len(access) - 1)] + config['delay'] + RECEIVER_DELAY_MS)
+            for j in range(len(SCENARIOS[config['scenario']]))]
+
+
+def simulate(configs, duration=60, dt=0.001, sample=0.1, interval=1.0, seed=None):
+    """Integrate a batch of configurations (dicts with scenario, bw, delay,
+    maxq and optionally access_delay and starts).
+
+    Returns a dict of arrays: q (N, S) packets and rtt (N, F, S) ms every
+    `sample` seconds; tput (N, F, T) Mb/s, lost (N, F, T) packets and
+    cwnd (N, F, T) bytes every `interval` seconds.  Flows past a
+    configuration's own count are padding (algo -1).
+    """
+    rng = np.random.default_rng(seed)
+    N = len(configs)
+    F = max(len(SCENARIOS[c['scenario']]) for c in configs)
+    algo = np.full((N, F), -1)
+    prop = np.ones((N, F))
+    start = np.zeros((N, F))
+    for i, c in enumerate(configs):
+        for j, (name, rtt) in enumerate(zip(SCENARIOS[c['scenario']], base_rtts(c))):
+            algo[i, j] = ALGORITHMS[name]
+            prop[i, j] = rtt / 1000.0
+            starts = c.get('starts') or [0]
+            start[i, j] = starts[min(j, len(starts) - 1)]
+    C = np.array([c['bw'] for c in configs], dtype=float) * 1e6 / MSS_BITS
+    B = np.array([c['maxq'] for c in configs], dtype=float)
+    is_reno = algo == RENO
+    is_bbr = algo == BBR
+
+    # Reno
+    W = np.full((N, F), float(IW))
+    ssthresh = np.full((N, F), np.inf)
+    pending = np.full((N, F), np.inf)
+    last_cut = np.full((N, F), -np.inf)
+    # BBR: the max filter keeps the finished rounds in ring, the current
+    # round's max in cur and the filter output in btl
+    ring = np.zeros((N * F, BW_ROUNDS))
+    slot = np.zeros(N * F, dtype=int)
+    flat = np.arange(N * F)
+    cur = IW / prop
+    btl = cur.copy()
+    round_start = np.zeros((N, F))
+    cycle_start = np.zeros((N, F))
+    rtprop = prop.copy()
+    rtprop_stamp = np.zeros((N, F))
+    mode = np.full((N, F), STARTUP)
+    phase = np.zeros((N, F), dtype=int)
+    mode_end = np.zeros((N, F))
+    full_bw = np.zeros((N, F))
+    full_cnt = np.zeros((N, F), dtype=int)
+
+    q = np.zeros(N)
+    steps = int(round(duration / dt))
+    per_sample = max(int(round(sample / dt)), 1)
+    per_interval = max(int(round(interval / dt)), 1)
+    q_rec = np.zeros((N, steps // per_sample))
+    rtt_rec = np.zeros((N, F, steps // per_sample))
+    tput = np.zeros((N, F, steps // per_interval))
+    lost_rec = np.zeros((N, F, steps // per_interval))
+    cwnd_rec = np.zeros((N, F, steps // per_interval))
+    delivered = np.zeros((N, F))
+    lost_acc = np.zeros((N, F))
+    gains = np.empty((N, F))
+
+    for k in range(steps):
+        t = k * dt
+        active = (algo >= 0) & (t >= start)
+        rtt = prop + (q / C)[:, None]
+
+        # Sending rates
+        gains[:] = 1.0
+        gains[mode == STARTUP] = HIGH_GAIN
+        gains[mode == DRAIN] = 1.0 / HIGH_GAIN
+        probing = mode == PROBE_BW
+        gains[probing] = CYCLE[phase[probing]]
+        cwnd = np.where(mode == STARTUP, HIGH_GAIN, CWND_GAIN) * btl * rtprop
+        cwnd = np.where(mode == PROBE_RTT, PROBE_RTT_CWND, np.maximum(cwnd, PROBE_RTT_CWND))
+        x = np.where(is_reno, W / rtt, np.minimum(gains * btl, cwnd / rtt))
+        x *= active
+        A = x.sum(axis=1)
+
+        # Drop-tail queue
+        busy = (q > 0) | (A > C)
+        out = np.where(busy, C, A)
+        Asafe = np.maximum(A, 1e-9)
+        d = x * np.where(busy, C / Asafe, 1.0)[:, None]
+        qn = q + (A - out) * dt
+        over = np.maximum(qn - B, 0)
+        q = np.clip(qn, 0, B)
+        lost = (over / Asafe)[:, None] * x
+        delivered += d * dt
+        lost_acc += lost
+
+        # Reno: ACK-clocked growth, halving one RTT after a loss
+        reno = is_reno & active
+        acked = d * dt
+        W += np.where(reno, np.where(W < ssthresh, acked, acked / W), 0)
+        newloss = reno & (lost > 0) & np.isinf(pending) & (t - last_cut > rtt)
+        pending[newloss] = t + rtt[newloss]
+        fire = t >= pending
+        if fire.any():
+            W[fire] = np.maximum(W[fire] / 2, 2)
+            ssthresh[fire] = W[fire]
+            last_cut[fire] = t
+            pending[fire] = np.inf
+
+        # BBR: BtlBw max filter over rounds, RTprop min filter, state machine
+        bbr = is_bbr & active
+        if bbr.any():
+            np.maximum(cur, np.where(bbr, d, 0), out=cur)
+            np.maximum(btl, cur, out=btl)
+            lower = bbr & (rtt <= rtprop)
+            rtprop[lower] = rtt[lower]
+            rtprop_stamp[lower] = t
+
+            rnd = bbr & (t - round_start >= rtt)
+            if rnd.any():
+                round_start[rnd] = t
+                grew = btl >= 1.25 * full_bw
+                full_bw[rnd & grew] = btl[rnd & grew]
+                full_cnt[rnd] = np.where(grew[rnd], 0, full_cnt[rnd] + 1)
+                drain = rnd & (mode == STARTUP) & (full_cnt >= 3)
+                mode[drain] = DRAIN
+                mode_end[drain] = t + rtprop[drain]
+                fr = flat[rnd.ravel()]
+                ring[fr, slot[fr]] = cur.ravel()[fr]
+                slot[fr] = (slot[fr] + 1) % BW_ROUNDS
+                ring[fr, slot[fr]] = 0
+                cur[rnd] = 0
+                btl.ravel()[fr] = ring[fr].max(axis=1)
+
+            to_probe = bbr & (mode == DRAIN) & (t >= mode_end)
+            if to_probe.any():
+                mode[to_probe] = PROBE_BW
+                # Random phase, never the 0.75 drain phase
+                phase[to_probe] = rng.choice([0, 2, 3, 4, 5, 6, 7], to_probe.sum())
+                cycle_start[to_probe] = t
+            adv = bbr & (mode == PROBE_BW) & (t - cycle_start >= rtprop)
+            phase[adv] = (phase[adv] + 1) % len(CYCLE)
+            cycle_start[adv] = t
+
+            expired = bbr & (mode != PROBE_RTT) & (t - rtprop_stamp > RTPROP_WINDOW)
+            if expired.any():
+                mode[expired] = PROBE_RTT
+                mode_end[expired] = t + PROBE_RTT_TIME + rtt[expired]
+                rtprop[expired] = rtt[expired]
+            done = bbr & (mode == PROBE_RTT) & (t >= mode_end)
+            if done.any():
+                mode[done] = np.where(full_cnt[done] >= 3, PROBE_BW, STARTUP)
+                rtprop_stamp[done] = t
+                cycle_start[done] = t
+
+        if (k + 1) % per_sample == 0:
+            s = (k + 1) // per_sample - 1
+            q_rec[:, s] = q
+            rtt_rec[:, :, s] = (prop + (q / C)[:, None]) * 1000
+        if (k + 1) % per_interval == 0:
+            s = (k + 1) // per_interval - 1
+            tput[:, :, s] = delivered * MSS_BITS / interval / 1e6
+            lost_rec[:, :, s] = lost_acc
+            cwnd_rec[:, :, s] = np.where(is_reno, W, x * rtt) * MSS_BITS / 8
+            delivered[:] = 0
+            lost_acc[:] = 0
+
+    return {'q': q_rec, 'rtt': rtt_rec, 'tput': tput, 'lost': lost_rec, 'cwnd': cwnd_rec,
+            'algo': algo, 'prop': prop * 1000, 'sample': sample, 'interval': interval}
+
+
+def summarize(configs, res):
+    """One summary row per configuration."""
+    rows = []
+    interval = res['interval']
+    for i, c in enumerate(configs):
+        names = SCENARIOS[c['scenario']]
+        tput = res['tput'][i, :len(names)].mean(axis=1)
+        total = {a: float(sum(tp for n, tp in zip(names, tput) if n == a)) for a in ALGORITHMS}
+        sent = res['tput'][i, :len(names)].sum() * interval * 1e6 / MSS_BITS
+        lost = res['lost'][i, :len(names)].sum()
+        rtt = res['rtt'][i, 0]
+        rows.append({
+            'scenario': c['scenario'], 'bw': c['bw'], 'delay': c['delay'], 'maxq': c['maxq'],
+            'bdp_pkts': c['bw'] * 1e6 / MSS_BITS * base_rtts(c)[0] / 1000,
+            'reno_mbps': total['reno'], 'bbr_mbps': total['bbr'],
+            'bbr_share': total['bbr'] / tput.sum() if tput.sum() else 0,
+            'jain': float(tput.sum() ** 2 / (len(tput) * (tput ** 2).sum())) if tput.any() else 0,
+            'utilization': float(tput.sum() / c['bw']),
+            'avg_queue_pkts': float(res['q'][i].mean()),
+            'avg_rtt_ms': float(rtt.mean()),
+            'p95_rtt_ms': float(np.percentile(rtt, 95)),
+            'loss_rate': float(lost / (sent + lost)) if sent + lost else 0,
+        })
+    return rows
+
+
+def write_ping(fname, rtts, dst='10.0.0.2'):
+    """Ping-format RTT samples (as `ping -i 0.1` prints them)."""
+    with open(fname, 'w') as f:
+        f.write("PING %s (%s) 56(84) bytes of data.\n" % (dst, dst))
+        for seq, rtt in enumerate(rtts, 1):
+            f.write("64 bytes from %s: icmp_seq=%d ttl=64 time=%.1f ms\n" % (dst, seq, rtt))
+
+
+def write_iperf_text(fname, tputs, interval):
+    """iperf2-style interval report, summary line included."""
+    with open(fname, 'w') as f:
+        for s, mbps in enumerate(tputs):
+            f.write("[  3] %4.1f-%4.1f sec  %.2f MBytes  %.2f Mbits/sec\n" %
+                    (s * interval, (s + 1) * interval, mbps * interval / 8, mbps))
+        end = len(tputs) * interval
+        avg = float(np.mean(tputs)) if len(tputs) else 0.0
+        f.write("[  3]  0.0-%4.1f sec  %.2f MBytes  %.2f Mbits/sec\n" % (end, avg * end / 8, avg))
+
+
+def write_queue(fname, q, sample, t0, capacity=None):
+    """time,packets rows (time,packets,capacity_mbps with a capacity per
+    sample, like monitor_qlen under a link trace)."""
+    with open(fname, 'w') as f:
+        for s, pkts in enumerate(q):
+            if capacity is not None:
+                f.write('%f,%d,%f\n' % (t0 + (s + 1) * sample, int(round(pkts)), capacity[s]))
+            else:
+                f.write('%f,%d\n' % (t0 + (s + 1) * sample, int(round(pkts))))
+
+
+def competition_results(run_dir, config, flows, base_rtt, duration, backend):
+    """competition_results.json content, computed from the iperf logs of
+    run_dir the same way tcp_competition.py does."""
+    results = {}
+    for flow in flows:
+        tp = iperf.read_throughputs(os.path.join(run_dir, '%s_output.txt' % flow))
+        if tp:
+            mean = sum(tp) / len(tp)
+            results[flow] = {'throughputs': tp, 'avg_throughput': mean,
+                             'min_throughput': min(tp), 'max_throughput': max(tp),
+                             'std_throughput': float(np.std(tp))}
+    reno = [v for k, v in results.items() if 'reno' in k]
+    bbr = [v for k, v in results.items() if 'bbr' in k]
+    output = {
+        'scenario': config['scenario'],
+        'configuration': {
+            'bandwidth': config['bw'], 'delay': config['delay'], 'queue_size': config['maxq'],
+            'duration': duration, 'qdisc': 'droptail', 'tool': 'iperf',
+            'access_delay': config.get('access_delay') or [ACCESS_DELAY_MS],
+            'backend': backend,
+        },
+        'stop': {'reason': 'fixed_time', 'duration': duration},
+        'reno_flows': reno,
+        'bbr_flows': bbr,
+    }
+    total = sum(r['avg_throughput'] for r in results.values())
+    weighted = sum(r['avg_throughput'] * base_rtt[f] for f, r in results.items())
+    if len(results) >= 2:
+        output['rtt_analysis'] = {
+            f: {'avg_throughput': r['avg_throughput'], 'base_rtt_ms': base_rtt[f],
+                'rtt_ratio': base_rtt[f] / min(base_rtt.values()),
+                'share': r['avg_throughput'] / total if total else 0,
+                'share_rtt_normalized': (r['avg_throughput'] * base_rtt[f] / weighted
+                                         if weighted else 0)}
+            for f, r in results.items()}
+    if reno and bbr:
+        reno_total = sum(r['avg_throughput'] for r in reno)
+        bbr_total = sum(r['avg_throughput'] for r in bbr)
+        tps = [r['avg_throughput'] for r in results.values()]
+        output['fairness_index'] = sum(tps) ** 2 / (len(tps) * sum(x ** 2 for x in tps))
+        if reno_total > bbr_total:
+            output['winner'] = 'TCP Reno'
+            output['advantage'] = (reno_total - bbr_total) / bbr_total * 100 if bbr_total else 0
+        else:
+            output['winner'] = 'TCP BBR'
+            output['advantage'] = (bbr_total - reno_total) / reno_total * 100 if reno_total else 0
+        output.update(reno_total=reno_total, bbr_total=bbr_total,
+                      reno_flows_count=len(reno), bbr_flows_count=len(bbr),
+                      reno_avg_per_flow=reno_total / len(reno),
+                      bbr_avg_per_flow=bbr_total / len(bbr))
+    return output
+
+
+def write_run(run_dir, config, res, i, duration, backend='fluid', t0=None):
+    """Write configuration i of a simulation result as an emulated run of
+    bufferbloat.py (single flow) or tcp_competition.py would."""
+    if not os.path.exists(run_dir):
+        os.makedirs(run_dir)
+    t0 = time() if t0 is None else t0
+    flows = FLOW_LABELS[config['scenario']]
+    single = single_flow(config['scenario'])
+    sample, interval = res['sample'], res['interval']
+    write_queue(os.path.join(run_dir, 'q.txt' if single else 'queue.txt'),
+                res['q'][i], sample, t0)
+    with TraceWriter(os.path.join(run_dir, 'flow_trace.csv'), IPERF_FIELDS) as w:
+        for j, flow in enumerate(flows):
+            ping = 'ping.txt' if single else 'ping_%s.txt' % flow.replace('_flow', '')
+            write_ping(os.path.join(run_dir, ping), res['rtt'][i, j])
+            write_iperf_text(os.path.join(run_dir, '%s_output.txt' % flow),
+                             res['tput'][i, j], interval)
+            for s in range(res['tput'].shape[2]):
+                w.write(t0 + (s + 1) * interval, flow, {
+                    'throughput_mbps': res['tput'][i, j, s],
+                    'retransmits': int(round(res['lost'][i, j, s])),
+                    'cwnd': int(res['cwnd'][i, j, s]),
+                    'rtt_ms': res['rtt'][i, j, int((s + 1) * interval / sample) - 1],
+                })
+    if not single:
+        base = {flow: float(res['prop'][i, j]) for j, flow in enumerate(flows)}
+        with open(os.path.join(run_dir, 'competition_results.json'), 'w') as f:
+            json.dump(competition_results(run_dir, config, flows, base, duration, backend),
+                      f, indent=2)
+
+
+def run_name(config):
+    return '%s_bw%g_d%g_q%d' % (config['scenario'], config['bw'], config['delay'], config['maxq'])
+
+
+def main():
+    parser = ArgumentParser(description="Fluid-model screening of the bottleneck parameter space")
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS),
+                        default=['reno_vs_bbr'])
+    parser.add_argument('--bw', '-b', type=float, nargs='+', default=[10],
+                        help="Bottleneck bandwidths (Mb/s)")
+    parser.add_argument('--delay', type=float, nargs='+', default=[10],
+                        help="Delays (ms), as the emulated scripts take them")
+    parser.add_argument('--maxq', type=int, nargs='+', default=[100],
+                        help="Queue sizes (packets)")
+    parser.add_argument('--access-delay', type=float, nargs='+', default=None,
+                        help="Sender access delays (ms) of the competition scenarios")
+    parser.add_argument('--time', '-t', type=float, default=60)
+    parser.add_argument('--dt', type=float, default=0.001, help="Integration step (sec)")
+    parser.add_argument('--batch', type=int, default=2000,
+                        help="Configurations integrated together")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', '-o', default='fluid_grid.csv', help="Summary CSV")
+    parser.add_argument('--write-runs', metavar='DIR', default=None,
+                        help="Also write an emulation-format run directory per configuration")
+    args = parser.parse_args()
+
+    configs = [{'scenario': s, 'bw': bw, 'delay': d, 'maxq': mq,
+                'access_delay': args.access_delay}
+               for s, bw, d, mq in itertools.product(args.scenario, args.bw, args.delay, args.maxq)]
+    t_start = time()
+    rows = []
+    for b in range(0, len(configs), args.batch):
+        batch = configs[b:b + args.batch]
+        res = simulate(batch, args.time, args.dt, seed=args.seed)
+        rows.extend(summarize(batch, res))
+        if args.write_runs:
+            for i, c in enumerate(batch):
+                write_run(os.path.join(args.write_runs, run_name(c)), c, res, i, args.time)
+    elapsed = time() - t_start
+
+    with open(args.out, 'w') as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        w.writeheader()
+        w.writerows(rows)
+    print("%d configurations in %.1fs (%.0f/min) -> %s" %
+          (len(configs), elapsed, len(configs) / elapsed * 60, args.out))
+
+
+if __name__ == "__main__":
+    main()
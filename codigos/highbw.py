@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+
+'''
+High-bandwidth mode: qdiscs for multi-Gb/s TCLinks, and calibration.
+
+TCLink shapes with HTB at `burst 15k` and the default quantum
+(rate / r2q), puts every packet through netem even when the link has no
+delay, and refuses rates above 1000 Mb/s (the link is left unshaped).
+Past a few hundred Mb/s the emulator, not the link, is then the
+bottleneck.  tune_net() rebuilds the qdiscs of every shaped interface of
+a started Mininet with the same layout, so aqm.py, linktrace.py and the
+queue monitors keep working:
+
+    root 5: htb default 1
+      class 5:1 htb rate R burst B cburst B quantum Q
+        leaf 10: netem limit L delay D [loss P]   (delay > 0)
+        leaf 10: pfifo limit L                     (fast path: no delay)
+
+B holds --burst-ms of traffic at R and at least one GSO super-packet, so
+the HTB token bucket does not throttle below R between timer ticks; Q is
+rate / r2q clamped to [MTU, 200000], the range the kernel accepts without
+warnings.  Interfaces whose netem must stay (an AQM is grafted under it,
+or a link trace changes its delay) are listed in keep_netem.  GSO, TSO
+and GRO can be switched on or off on every interface (default: left as
+the kernel set them).
+
+Run as a script, it measures the maximum rate this box emulates
+faithfully: one h1 -- s0 -- h2 topology is kept up and, for each --rates
+value, the bottleneck s0-eth2 is re-tuned and one iperf run (--parallel
+streams) measures the goodput.  A rate is faithful when the goodput
+reaches --tol of the ideal goodput at that rate (R * MSS / (MTU +
+Ethernet header)); the answer is the highest rate below which every
+tested rate is faithful.  Every probe and the answer go to
+calibration.json.
+
+Usage:
+    sudo python3 tcp_competition.py --bw-net 5000 --bw-host 10000 --delay 1 \\
+        --highbw --offload on ...
+    sudo python3 highbw.py --dir results/highbw --rates 500 1000 2000 5000 10000 \\
+        --offload on --parallel 4
+'''
+
+import json
+import os
+import re
+from argparse import ArgumentParser
+from time import sleep
+
+try:
+    from mininet.topo import Topo
+    from mininet.node import CPULimitedHost
+    from mininet.link import TCLink
+    from mininet.net import Mininet
+except ImportError:
+    # tc command builders and the report work without Mininet
+    Topo = object
+    Mininet = None
+
+import iperf
+from monitor import parse_qdisc_stats
+
+MTU_BYTES = 1500
+ETH_HEADER = 14
+# TCP/IP headers with timestamps
+TCP_IP_HEADERS = 52
+# Largest GSO/TSO super-packet handed to the qdiscs
+GSO_MAX_BYTES = 65536
+HTB_R2Q = 10
+HTB_MAX_QUANTUM = 200000
+# TCLink's netem limit when max_queue_size is not given
+DEFAULT_LIMIT = 1000
+OFFLOADS = ('keep', 'on', 'off')
+
+pat_delay = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(us|ms|s)?\s*$')
+DELAY_UNITS = {'us': 0.001, 'ms': 1.0, 's': 1000.0, None: 1.0}
+
+
+def parse_delay(delay):
+    """Milliseconds of a TCLink delay parameter ('10ms', '500us', 2)."""
+    if delay is None:
+        return 0.0
+    if isinstance(delay, (int, float)):
+        return float(delay)
+    m = pat_delay.match(delay)
+    if not m:
+        raise ValueError("cannot parse delay %r" % delay)
+    return float(m.group(1)) * DELAY_UNITS[m.group(2)]
+
+
+def htb_params(bw_mbps, burst_ms=1.0, mtu=MTU_BYTES):
+    """(burst, quantum) bytes of an HTB class shaping to bw_mbps."""
+    rate = bw_mbps * 1e6 / 8
+    burst = int(max(15 * 1024, rate * burst_ms / 1000.0, GSO_MAX_BYTES + mtu))
+    quantum = int(min(HTB_MAX_QUANTUM, max(mtu + ETH_HEADER, rate / HTB_R2Q)))
+    return burst, quantum
+
+
+def highbw_cmds(iface, bw_mbps, delay_ms=0, limit=DEFAULT_LIMIT, loss_pct=None,
+                fast_path=True, burst_ms=1.0, mtu=MTU_BYTES):
+    """tc commands that rebuild iface's qdiscs for bw_mbps (see above).
+
+    The root is deleted first: TCLink may have left HTB+netem, a bare
+    netem (rates above 1000 Mb/s are ignored) or nothing.
+    """
+    burst, quantum = htb_params(bw_mbps, burst_ms, mtu)
+    cmds = ["tc qdisc del dev %s root" % iface,
+            "tc qdisc add dev %s root handle 5:0 htb default 1" % iface,
+            "tc class add dev %s parent 5:0 classid 5:1 htb rate %fMbit "
+            "burst %d cburst %d quantum %d" % (iface, bw_mbps, burst, burst, quantum)]
+    if delay_ms or loss_pct or not fast_path:
+        leaf = "tc qdisc add dev %s parent 5:1 handle 10: netem limit %d" % (iface, limit)
+        if delay_ms:
+            leaf += " delay %fms" % delay_ms
+        if loss_pct:
+            leaf += " loss %f%%" % loss_pct
+    else:
+        leaf = "tc qdisc add dev %s parent 5:1 handle 10: pfifo limit %d" % (iface, limit)
+    return cmds + [leaf]
+
+
+def offload_cmd(iface, state):
+    """ethtool command switching GSO/TSO/GRO of iface on or off."""
+    if state not in ('on', 'off'):
+        return None
+    return "ethtool -K %s gso %s tso %s gro %s" % (iface, state, state, state)
+
+
+def tune_intf(intf, bw_mbps, delay_ms=0, limit=DEFAULT_LIMIT, loss_pct=None,
+              fast_path=True, burst_ms=1.0):
+    """Rebuild the qdiscs of a Mininet interface; returns its layout."""
+    cmds = highbw_cmds(intf.name, bw_mbps, delay_ms, limit, loss_pct, fast_path, burst_ms)
+    for cmd in cmds:
+        intf.node.cmd(cmd)
+    check = intf.node.cmd("tc qdisc show dev %s" % intf.name)
+    leaf = 'netem' if 'netem' in cmds[-1] else 'pfifo'
+    if 'htb' not in check or leaf not in check:
+        raise RuntimeError("Failed to tune %s:\n%s" % (intf.name, check))
+    burst, quantum = htb_params(bw_mbps, burst_ms)
+    return {'iface': intf.name, 'bw_mbps': bw_mbps, 'delay_ms': delay_ms, 'limit': limit,
+            'leaf': leaf, 'burst': burst, 'quantum': quantum}
+
+
+def tune_net(net, offload='keep', fast_path=True, burst_ms=1.0, keep_netem=()):
+    """Apply the high-bandwidth layout to every shaped interface of net.
+
+    The rate, delay, loss and queue size come from each interface's
+    TCLink parameters; interfaces without `bw` are only touched by the
+    offload switch.  Returns the per-interface layouts.
+    """
+    layout = []
+    for link in net.links:
+        for intf in (link.intf1, link.intf2):
+            cmd = offload_cmd(intf.name, offload)
+            if cmd:
+                intf.node.cmd(cmd)
+            params = getattr(intf, 'params', {}) or {}
+            if not params.get('bw'):
+                continue
+            layout.append(tune_intf(intf, params['bw'], parse_delay(params.get('delay')),
+                                    params.get('max_queue_size') or DEFAULT_LIMIT,
+                                    params.get('loss'),
+                                    fast_path and intf.name not in keep_netem, burst_ms))
+    for entry in layout:
+        print("%(iface)s: %(bw_mbps)g Mb/s, %(leaf)s, burst %(burst)d quantum %(quantum)d" % entry)
+    return layout
+
+
+def ideal_goodput(bw_mbps, mtu=MTU_BYTES):
+    """TCP goodput (Mb/s) of a link shaped to bw_mbps at full-size segments."""
+    return bw_mbps * (mtu - TCP_IP_HEADERS) / float(mtu + ETH_HEADER)
+
+
+def iperf_goodput(fname, duration):
+    """Whole-run goodput (Mb/s) of an iperf2 log: the [SUM] line of a
+    parallel run, else the sum of the per-stream summaries."""
+    sums, streams = [], []
+    if not os.path.exists(fname):
+        return None
+    with open(fname) as f:
+        for line in f:
+            rec = iperf.parse_iperf_line(line)
+            if not rec or rec[0] != 0 or rec[1] < 0.9 * duration:
+                continue
+            (sums if 'SUM' in line else streams).append(rec[2])
+    if sums:
+        return sums[-1]
+    return sum(streams) if streams else None
+
+
+def max_faithful_rate(probes):
+    """Highest rate below which every probed rate was faithful."""
+    best = None
+    for p in sorted(probes, key=lambda p: p['rate_mbps']):
+        if not p['faithful']:
+            break
+        best = p['rate_mbps']
+    return best
+
+
+class CalibrationTopo(Topo):
+    """h1 -- s0 -- h2; s0-eth2 is shaped by highbw_cmds, not by TCLink."""
+
+    def build(self):
+        h1 = self.addHost('h1')
+        h2 = self.addHost('h2')
+        switch = self.addSwitch('s0')
+        self.addLink(h1, switch)
+        self.addLink(switch, h2)
+
+
+class Calibrator(object):
+    """Probes bottleneck rates on one running CalibrationTopo."""
+
+    IFACE = 's0-eth2'
+
+    def __init__(self, args):
+        self.args = args
+        self.net = Mininet(topo=CalibrationTopo(), host=CPULimitedHost, link=TCLink)
+        self.net.start()
+        self.net.pingAll()
+        self.h1, self.h2, self.s0 = self.net.get('h1', 'h2', 's0')
+        for link in self.net.links:
+            for intf in (link.intf1, link.intf2):
+                cmd = offload_cmd(intf.name, args.offload)
+                if cmd:
+                    intf.node.cmd(cmd)
+        self.server = self.h2.popen("iperf -s -w 16m")
+        sleep(1)
+
+    def probe(self, rate):
+        args = self.args
+        for cmd in highbw_cmds(self.IFACE, rate, args.delay, args.limit,
+                               fast_path=not args.no_fast_path, burst_ms=args.burst_ms):
+            self.s0.cmd(cmd)
+        fname = os.path.join(args.dir, 'iperf_%g.txt' % rate)
+        extra = '-f m' + (' -P %d' % args.parallel if args.parallel > 1 else '')
+        self.h1.popen(iperf.client_cmd('iperf', self.h2.IP(), 5001, args.time, 1, fname,
+                                       extra=extra), shell=True).wait()
+        qdiscs = parse_qdisc_stats(self.s0.cmd("tc -s qdisc show dev %s" % self.IFACE))
+        goodput = iperf_goodput(fname, args.time)
+        ideal = ideal_goodput(rate)
+        efficiency = goodput / ideal if goodput is not None else 0.0
+        return {'rate_mbps': rate, 'goodput_mbps': goodput, 'ideal_mbps': ideal,
+                'efficiency': efficiency, 'faithful': efficiency >= args.tol,
+                'dropped': sum(q.get('dropped', 0) for q in qdiscs),
+                'overlimits': qdiscs[0].get('overlimits', 0) if qdiscs else 0}
+
+    def close(self):
+        self.server.terminate()
+        self.net.stop()
+
+
+def main():
+    parser = ArgumentParser(description="Calibrate the maximum rate this box emulates faithfully")
+    parser.add_argument('--dir', '-d', required=True)
+    parser.add_argument('--rates', type=float, nargs='+',
+                        default=[100, 500, 1000, 2000, 5000, 10000],
+                        help="Bottleneck rates to probe (Mb/s)")
+    parser.add_argument('--delay', type=float, default=0,
+                        help="Bottleneck delay (ms); 0 uses the pfifo fast path")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help="Bottleneck queue (packets)")
+    parser.add_argument('--time', '-t', type=int, default=10, help="Seconds per probe")
+    parser.add_argument('--parallel', '-P', type=int, default=1, help="iperf streams")
+    parser.add_argument('--tol', type=float, default=0.9,
+                        help="Faithful when goodput >= TOL * ideal goodput")
+    parser.add_argument('--offload', choices=OFFLOADS, default='keep',
+                        help="Switch GSO/TSO/GRO on every interface")
+    parser.add_argument('--burst-ms', type=float, default=1.0,
+                        help="HTB burst, in milliseconds of traffic at the rate")
+    parser.add_argument('--no-fast-path', action='store_true',
+                        help="Keep netem on the bottleneck even without delay")
+    parser.add_argument('--keep-going', action='store_true',
+                        help="Probe every rate even after one is not faithful")
+    args = parser.parse_args()
+    if Mininet is None:
+        parser.error("Mininet is not installed")
+    if args.time < 2:
+        parser.error("--time must be at least 2 seconds")
+
+    os.makedirs(args.dir, exist_ok=True)
+    calibrator = Calibrator(args)
+    probes = []
+    try:
+        for rate in sorted(args.rates):
+            p = calibrator.probe(rate)
+            probes.append(p)
+            print("%9.0f Mb/s: goodput %s (%.0f%% of ideal) %s" % (
+                rate, '-' if p['goodput_mbps'] is None else '%.1f' % p['goodput_mbps'],
+                100 * p['efficiency'], 'ok' if p['faithful'] else 'NOT faithful'))
+            if not p['faithful'] and not args.keep_going:
+                break
+    finally:
+        calibrator.close()
+
+    best = max_faithful_rate(probes)
+    report = {'delay': args.delay, 'limit': args.limit, 'time': args.time,
+              'parallel': args.parallel, 'tol': args.tol, 'offload': args.offload,
+              'burst_ms': args.burst_ms, 'fast_path': not args.no_fast_path,
+              'max_faithful_mbps': best, 'probes': probes}
+    with open(os.path.join(args.dir, 'calibration.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    if best is None:
+        print("\nNo probed rate is emulated faithfully")
+    else:
+        print("\nMaximum faithful rate: %g Mb/s" % best)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+'''
+iperf/iperf3 command builders and output parsers.
+
+Text output (iperf2 or iperf3 without --json) is parsed line by line with
+unit-aware throughput; iperf3 --json / --json-stream output is parsed into
+interval records carrying retransmits, snd_cwnd and RTT, and can be
+converted to the shared trace format (see flowtrace.py).
+'''
+
+import json
+import os
+import re
+
+from flowtrace import TraceWriter, IPERF_FIELDS
+
+TOOLS = ('iperf', 'iperf3')
+
+# Multipliers to Mbits/sec
+UNITS = {'': 1e-6, 'K': 1e-3, 'M': 1.0, 'G': 1e3}
+
+pat_interval = re.compile(r'(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)\s+sec\s+.*?'
+                          r'(\d+(?:\.\d+)?)\s+([KMG]?)bits/sec')
+
+def output_ext(tool):
+    return '.json' if tool == 'iperf3' else '.txt'
+
+def server_cmd(tool='iperf', port=5001, interval=1, extra=''):
+    """Command line for an iperf server."""
+    if tool == 'iperf3':
+        return f"iperf3 -s -p {port} -i {interval} {extra}".strip()
+    return f"iperf -s -p {port} -i {interval} {extra}".strip()
+
+def client_cmd(tool, server_ip, port=5001, duration=30, interval=1,
+               outfile=None, extra='', json_stream=False, line_buffered=False,
+               congestion=None):
+    """Command line for an iperf client, optionally redirected to outfile.
+
+    iperf3 clients always report in JSON; json_stream asks for one JSON
+    event per line (iperf3 >= 3.17) so the output can be read while the
+    test is still running.  line_buffered flushes every report line into
+    outfile as it is printed (for readers following the file).
+    congestion sets the client socket's TCP_CONGESTION (iperf3 -C,
+    iperf -Z), overriding the namespace's default algorithm.
+    """
+    if tool == 'iperf3':
+        cmd = f"iperf3 -c {server_ip} -p {port} -t {duration} -i {interval} --json"
+        if json_stream:
+            cmd += " --json-stream"
+            if line_buffered:
+                cmd += " --forceflush"
+    else:
+        cmd = f"iperf -c {server_ip} -p {port} -t {duration} -i {interval}"
+        if line_buffered:
+            cmd = "stdbuf -oL " + cmd
+    if congestion:
+        cmd += f" {'-C' if tool == 'iperf3' else '-Z'} {congestion}"
+    if extra:
+        cmd += ' ' + extra
+    if outfile:
+        cmd += f" > {outfile}"
+    return cmd
+
+def supports_json_stream(host):
+    """True if the iperf3 on this host understands --json-stream."""
+    return '--json-stream' in host.cmd("iperf3 --help 2>&1")
+
+def parse_iperf_line(line):
+    """Return (start, end, Mbits/sec) for an interval line, else None."""
+    m = pat_interval.search(line)
+    if not m:
+        return None
+    start, end, value, unit = m.groups()
+    return float(start), float(end), float(value) * UNITS[unit]
+
+def parse_iperf_text(fname):
+    """All (start, end, Mbits/sec) interval lines of a text iperf log,
+    including the final summary line."""
+    ret = []
+    if not os.path.exists(fname):
+        return ret
+    with open(fname) as f:
+        for line in f:
+            rec = parse_iperf_line(line)
+            if rec:
+                ret.append(rec)
+    return ret
+
+def _iter_json_events(f):
+    """Yield (event, data) from either --json-stream or plain --json output.
+
+    --json-stream output is consumed one line at a time.  A plain --json
+    document is decoded once and replayed as start/interval/end events.
+    """
+    first = ''
+    for line in f:
+        if line.strip():
+            first = line
+            break
+    if not first:
+        return
+    try:
+        obj = json.loads(first)
+    except ValueError:
+        obj = None
+    if isinstance(obj, dict) and 'event' in obj:
+        yield obj['event'], obj.get('data', {})
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                # Truncated last line of a killed client
+                break
+            yield obj.get('event'), obj.get('data', {})
+        return
+    try:
+        doc = json.loads(first + f.read())
+    except ValueError:
+        return
+    yield 'start', doc.get('start', {})
+    for interval in doc.get('intervals', []):
+        yield 'interval', interval
+    yield 'end', doc.get('end', {})
+
+def parse_iperf3_json(fname):
+    """Yield one dict per stream and interval of an iperf3 JSON log.
+
+    Keys: time (Unix seconds at interval end), start, end (seconds since
+    test start), stream, streams (number of streams in the interval),
+    throughput_mbps, retransmits, cwnd (bytes) and rtt_ms.  TCP internals
+    are None when iperf3 did not report them (receiver side or non-Linux
+    senders).
+    """
+    if not os.path.exists(fname):
+        return
+    t0 = 0.0
+    with open(fname) as f:
+        for event, data in _iter_json_events(f):
+            if event == 'start':
+                t0 = float(data.get('timestamp', {}).get('timesecs', 0))
+            elif event == 'interval':
+                streams = data.get('streams', [])
+                for s in streams:
+                    rtt = s.get('rtt')
+                    yield {
+                        'time': t0 + s['end'],
+                        'start': s['start'],
+                        'end': s['end'],
+                        'stream': s.get('socket', 0),
+                        'streams': len(streams),
+                        'throughput_mbps': s['bits_per_second'] / 1e6,
+                        'retransmits': s.get('retransmits'),
+                        'cwnd': s.get('snd_cwnd'),
+                        'rtt_ms': rtt / 1000.0 if rtt is not None else None,
+                    }
+
+def iperf3_to_trace(json_fname, writer, flow):
+    """Append the intervals of an iperf3 JSON log to a TraceWriter.
+
+    Parallel streams (-P) get one flow label each, "<flow>.<socket>".
+    Returns the number of rows written.
+    """
+    n = 0
+    for r in parse_iperf3_json(json_fname):
+        label = flow if r['streams'] <= 1 else f"{flow}.{r['stream']}"
+        writer.write(r['time'], label, r)
+        n += 1
+    return n
+
+def read_throughputs(fname):
+    """Per-interval throughputs (Mbits/sec) of a text or JSON iperf log.
+
+    Text logs keep every matching line, summary included, as the old
+    Mbits/sec scraper did.
+    """
+    if fname.endswith('.json'):
+        return [r['throughput_mbps'] for r in parse_iperf3_json(fname)]
+    return [r[2] for r in parse_iperf_text(fname)]
+
+def read_timeline(fname):
+    """(interval end times, Mbits/sec) of a text or JSON iperf log,
+    without summary lines."""
+    if fname.endswith('.json'):
+        recs = [(r['start'], r['end'], r['throughput_mbps'])
+                for r in parse_iperf3_json(fname)]
+    else:
+        recs = parse_iperf_text(fname)
+    if not recs:
+        return [], []
+    span = min(end - start for start, end, _ in recs)
+    recs = [r for r in recs if r[1] - r[0] <= span * 1.5]
+    return [r[1] for r in recs], [r[2] for r in recs]
+
+def flow_name(fname):
+    """Flow label of a '<flow>_output.txt|json' file, else None."""
+    for ext in ('.txt', '.json'):
+        if fname.endswith('_output' + ext):
+            return fname[:-len('_output' + ext)]
+    return None
+
+def write_flow_traces(results_dir, outfile='flow_trace.csv'):
+    """Convert every iperf3 '<flow>_output.json' in results_dir into one
+    shared-format trace file.  Returns its path, or None if there was no
+    JSON output."""
+    jsons = sorted(f for f in os.listdir(results_dir)
+                   if f.endswith('_output.json'))
+    if not jsons:
+        return None
+    path = os.path.join(results_dir, outfile)
+    with TraceWriter(path, IPERF_FIELDS) as w:
+        for f in jsons:
+            iperf3_to_trace(os.path.join(results_dir, f), w, flow_name(f))
+    return path
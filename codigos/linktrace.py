@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+'''
+Trace-driven, time-varying bottleneck (cellular / Wi-Fi style links).
+
+A link trace gives the bottleneck capacity (and optionally delay and
+loss) over time.  Two formats are read:
+
+    Mahimahi   one integer per line: the millisecond at which one
+               1500-byte packet can be delivered; the trace loops.
+               Converted to a capacity per `bin_ms` bin (the last,
+               partial bin over its own length).
+    CSV        time,bw_mbps[,delay_ms[,loss_pct]] (seconds from the
+               start; a header line is optional).  Each row holds
+               until the next one, and the last one as long as the row
+               before it; that is where a looping trace starts over.
+
+LinkTraceDriver replays the trace on a TCLink interface: at every step it
+changes the HTB class 5:1 rate (with highbw.py's burst and quantum in
+high-bandwidth mode) and the netem 10: delay/loss through one
+long-lived `tc -batch` process, so a change costs a pipe write instead of
+a fork and lands within a millisecond of its schedule.  Every change is
+logged with its timestamp to capacity.txt (time,bw_mbps,delay_ms,loss_pct)
+and published in a shared multiprocessing.Value so the queue monitors can
+annotate their samples with the capacity in effect.
+
+Usage (standalone, on an existing interface):
+    python3 linktrace.py --iface s1-eth3 --trace trace.csv --delay 10 --limit 100
+'''
+
+import hashlib
+import os
+from argparse import ArgumentParser
+from subprocess import Popen, PIPE
+from time import monotonic, sleep, time
+
+from highbw import htb_params
+
+MTU_BITS = 1500 * 8
+SPIN = 0.002
+
+
+def read_mahimahi(fname, bin_ms=100):
+    """[(t, bw_mbps, None, None)] per bin of a Mahimahi packet trace and
+    the trace period (sec)."""
+    stamps = []
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                stamps.append(int(line))
+    if not stamps:
+        return [], 0
+    period_ms = max(stamps[-1], 1)
+    nbins = (period_ms + bin_ms - 1) // bin_ms
+    counts = [0] * nbins
+    for ms in stamps:
+        counts[min(ms // bin_ms, nbins - 1)] += 1
+    steps = []
+    for i, c in enumerate(counts):
+        width_ms = min(bin_ms, period_ms - i * bin_ms)
+        steps.append((i * bin_ms / 1000.0, c * MTU_BITS / (width_ms / 1000.0) / 1e6, None, None))
+    return steps, period_ms / 1000.0
+
+
+def read_csv_trace(fname):
+    """[(t, bw_mbps, delay_ms or None, loss_pct or None)] of a CSV trace
+    and its period (the last row holds as long as the one before it)."""
+    steps = []
+    with open(fname) as f:
+        for line in f:
+            row = [c.strip() for c in line.split(',')]
+            if not row[0] or row[0].startswith('#'):
+                continue
+            try:
+                t, bw = float(row[0]), float(row[1])
+            except (ValueError, IndexError):
+                # Header
+                continue
+            delay = float(row[2]) if len(row) > 2 and row[2] else None
+            loss = float(row[3]) if len(row) > 3 and row[3] else None
+            steps.append((t, bw, delay, loss))
+    steps.sort()
+    if len(steps) < 2:
+        return steps, 0
+    return steps, 2 * steps[-1][0] - steps[-2][0]
+
+
+def load_trace(fname, bin_ms=100):
+    """Read either format: one integer per line means Mahimahi."""
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                break
+    if line.isdigit():
+        return read_mahimahi(fname, bin_ms)
+    return read_csv_trace(fname)
+
+
+def trace_digest(fname):
+    """sha256 of a trace file, so memo tells different traces apart."""
+    with open(fname, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def read_capacity_log(fname):
+    """[(time, bw_mbps, delay_ms, loss_pct)] of a capacity.txt."""
+    ret = []
+    if not os.path.exists(fname):
+        return ret
+    with open(fname) as f:
+        for line in f:
+            try:
+                ret.append(tuple(float(v) for v in line.split(',')[:4]))
+            except ValueError:
+                continue
+    return ret
+
+
+def capacity_summary(fname, end=None):
+    """Time-weighted mean, min and max capacity of a capacity.txt, up to
+    `end` (Unix time; default: the last change)."""
+    log = read_capacity_log(fname)
+    if not log:
+        return None
+    end = end if end is not None else log[-1][0]
+    weighted = total = 0.0
+    for (t, bw, _, _), nxt in zip(log, log[1:] + [(end,)]):
+        dt = max(min(nxt[0], end) - t, 0)
+        weighted += bw * dt
+        total += dt
+    bws = [r[1] for r in log]
+    return {'mean_mbps': weighted / total if total else bws[0],
+            'min_mbps': min(bws), 'max_mbps': max(bws), 'changes': len(log)}
+
+
+def tc_cmds(iface, bw, delay_ms, loss_pct, limit, highbw=False):
+    """tc -batch lines setting TCLink's rate (HTB 5:1) and netem 10:.
+
+    netem's change replaces all of its options, so delay, loss and limit
+    are always given together.  With highbw the class keeps the burst
+    and quantum highbw.tune_net gives that rate instead of TCLink's 15k
+    burst.
+    """
+    if highbw:
+        burst, quantum = htb_params(bw)
+        htb = "htb rate %fMbit burst %d cburst %d quantum %d" % (bw, burst, burst, quantum)
+    else:
+        htb = "htb rate %fMbit burst 15k" % bw
+    netem = "qdisc change dev %s parent 5:1 handle 10: netem limit %d delay %fms" % (
+        iface, limit, delay_ms)
+    if loss_pct:
+        netem += " loss %f%%" % loss_pct
+    return ["class change dev %s parent 5:0 classid 5:1 %s" % (iface, htb), netem]
+
+
+class LinkTraceDriver(object):
+    """Replays a link trace on a TCLink interface (root namespace)."""
+
+    def __init__(self, iface, steps, period, delay_ms, limit, capacity=None,
+                 logfile=None, loop=True, highbw=False):
+        self.iface = iface
+        self.steps = steps
+        self.period = period
+        self.delay_ms = delay_ms
+        self.limit = limit
+        self.capacity = capacity
+        self.logfile = logfile
+        self.loop = loop
+        self.highbw = highbw
+
+    def _schedule(self):
+        """(offset, step) forever (looping) or once."""
+        base = 0.0
+        while True:
+            for step in self.steps:
+                yield base + step[0], step
+            if not self.loop or self.period <= 0:
+                return
+            base += self.period
+
+    def run(self, duration=None):
+        tc = Popen(['tc', '-force', '-batch', '-'], stdin=PIPE)
+        log = open(self.logfile, 'w') if self.logfile else None
+        last = None
+        t0 = monotonic()
+        try:
+            for offset, (_, bw, delay, loss) in self._schedule():
+                if duration is not None and offset >= duration:
+                    break
+                delay = self.delay_ms if delay is None else delay
+                loss = loss or 0.0
+                if (bw, delay, loss) == last:
+                    continue
+                target = t0 + offset
+                while True:
+                    left = target - monotonic()
+                    if left <= 0:
+                        break
+                    if left > SPIN:
+                        sleep(left - SPIN)
+                cmds = tc_cmds(self.iface, max(bw, 0.01), delay, loss, self.limit, self.highbw)
+                tc.stdin.write(('\n'.join(cmds) + '\n').encode())
+                tc.stdin.flush()
+                if self.capacity is not None:
+                    self.capacity.value = bw
+                if log:
+                    log.write('%f,%f,%f,%f\n' % (time(), bw, delay, loss))
+                    log.flush()
+                last = (bw, delay, loss)
+        finally:
+            if log:
+                log.close()
+            tc.stdin.close()
+            tc.wait()
+
+
+def run_link_trace(iface, trace_file, delay_ms, limit, capacity=None, logfile=None,
+                   loop=True, bin_ms=100, duration=None, highbw=False):
+    """Process target: load trace_file and replay it on iface."""
+    steps, period = load_trace(trace_file, bin_ms)
+    LinkTraceDriver(iface, steps, period, delay_ms, limit, capacity, logfile, loop,
+                    highbw).run(duration)
+
+
+def main():
+    parser = ArgumentParser(description="Replay a link trace on a TCLink interface")
+    parser.add_argument('--iface', required=True)
+    parser.add_argument('--trace', required=True, help="Mahimahi or CSV trace")
+    parser.add_argument('--delay', type=float, required=True,
+                        help="netem delay (ms) when the trace has none")
+    parser.add_argument('--limit', type=int, required=True,
+                        help="netem limit (packets), i.e. TCLink's max_queue_size")
+    parser.add_argument('--bin', type=int, default=100,
+                        help="Capacity bin (ms) of Mahimahi traces")
+    parser.add_argument('--no-loop', action='store_true', help="Play the trace once")
+    parser.add_argument('--duration', type=float, default=None)
+    parser.add_argument('--log', default='capacity.txt')
+    parser.add_argument('--highbw', action='store_true',
+                        help="The interface was set up by highbw.py: keep its HTB burst/quantum")
+    args = parser.parse_args()
+    if not os.path.exists(args.trace):
+        parser.error("no such trace: %s" % args.trace)
+    run_link_trace(args.iface, args.trace, args.delay, args.limit, None, args.log,
+                   not args.no_loop, args.bin, args.duration, args.highbw)
+
+
+if __name__ == "__main__":
+    main()
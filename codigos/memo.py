@@ -0,0 +1,181 @@
+'''
+Content-addressed memoization of experiment runs.
+
+Every run hashes its normalized configuration together with the versions
+of the tools that produce the data and the kernel congestion-control
+settings.  A finished run leaves a run_meta.json with that hash and the
+size of every output file; a later run with the same hash reuses it
+instead of emulating again, unless forced.
+'''
+
+import hashlib
+import json
+import os
+import platform
+import shutil
+from subprocess import Popen, PIPE
+from time import time
+
+META_FILE = 'run_meta.json'
+
+VERSION_CMDS = {
+    'iperf': 'iperf --version',
+    'iperf3': 'iperf3 --version',
+    'tc': 'tc -V',
+    'mininet': 'mn --version',
+}
+
+# Not the default net.ipv4.tcp_congestion_control: runs set it themselves
+# (--cong) after the lookup, so it would record the previous run's choice
+CC_SYSCTLS = [
+    'net.ipv4.tcp_available_congestion_control',
+    'net.ipv4.tcp_ecn',
+    'net.ipv4.tcp_no_metrics_save',
+    'net.core.default_qdisc',
+]
+
+def _run(cmd):
+    try:
+        p = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE)
+        out, err = p.communicate()
+    except OSError:
+        return None
+    if p.returncode == 127:
+        # Not installed
+        return None
+    text = (out or err).decode('utf-8', 'replace').strip()
+    # First line only: build dates and banners change without behaviour changes
+    return text.splitlines()[0] if text else None
+
+def tool_versions():
+    versions = {name: _run(cmd) for name, cmd in VERSION_CMDS.items()}
+    versions['kernel'] = platform.release()
+    versions['python'] = platform.python_version()
+    return versions
+
+def kernel_cc_settings():
+    settings = {}
+    for key in CC_SYSCTLS:
+        path = '/proc/sys/' + key.replace('.', '/')
+        try:
+            with open(path) as f:
+                settings[key] = ' '.join(f.read().split())
+        except IOError:
+            settings[key] = None
+    return settings
+
+def _normalize(v):
+    """Make equal configurations hash equally (10 == 10.0, key order)."""
+    if isinstance(v, bool) or v is None:
+        return v
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, dict):
+        return {str(k): _normalize(v[k]) for k in sorted(v)}
+    if isinstance(v, (list, tuple)):
+        return [_normalize(x) for x in v]
+    return str(v).strip()
+
+def fingerprint(config):
+    """Normalized configuration + environment that a run depends on."""
+    return {
+        'config': _normalize(config),
+        'tools': tool_versions(),
+        'kernel_cc': kernel_cc_settings(),
+    }
+
+def config_hash(fp):
+    blob = json.dumps(fp, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+def _validate(run_dir, meta, required):
+    if not meta.get('complete'):
+        return False
+    files = meta.get('files', {})
+    for pattern in required:
+        if not any(f == pattern or (pattern.startswith('*') and f.endswith(pattern[1:]))
+                   for f in files):
+            return False
+    for f, size in files.items():
+        path = os.path.join(run_dir, f)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return False
+    return True
+
+def find_result(h, search_dirs, required=(), depth=2):
+    """Directory of a complete, validated run with hash h, or None.
+
+    required lists file names (or '*suffix' patterns) the run must have
+    produced.
+    """
+    for top in search_dirs:
+        if not os.path.isdir(top):
+            continue
+        base = top.rstrip(os.sep).count(os.sep)
+        for d, subdirs, files in os.walk(top):
+            if d.count(os.sep) - base >= depth:
+                subdirs[:] = []
+            if META_FILE not in files:
+                continue
+            try:
+                with open(os.path.join(d, META_FILE)) as f:
+                    meta = json.load(f)
+            except ValueError:
+                continue
+            if meta.get('hash') == h and _validate(d, meta, required):
+                return d
+    return None
+
+def is_complete(run_dir, required=()):
+    """True if run_dir holds a run marked complete whose outputs (and the
+    required ones) are all there, unchanged."""
+    try:
+        with open(os.path.join(run_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return _validate(run_dir, meta, required)
+
+def reuse(src, dst):
+    """Make dst hold the outputs of the cached run in src."""
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return dst
+    os.makedirs(dst, exist_ok=True)
+    for f in os.listdir(src):
+        s = os.path.join(src, f)
+        if os.path.isdir(s):
+            shutil.copytree(s, os.path.join(dst, f), dirs_exist_ok=True)
+        else:
+            shutil.copy2(s, dst)
+    return dst
+
+def write_meta(run_dir, h, fp, extra=None):
+    """Mark run_dir as a complete run of hash h."""
+    files = {}
+    for d, _, names in os.walk(run_dir):
+        for n in names:
+            if n == META_FILE:
+                continue
+            path = os.path.join(d, n)
+            files[os.path.relpath(path, run_dir)] = os.path.getsize(path)
+    meta = {'hash': h, 'complete': True, 'finished': time(),
+            'fingerprint': fp, 'files': files}
+    if extra:
+        meta.update(extra)
+    with open(os.path.join(run_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+def lookup(run_dir, config, required=(), force=False):
+    """Hash config and look for a reusable run next to run_dir.
+
+    Returns (hash, fingerprint, cached_dir).  cached_dir is None when the
+    experiment has to run (nothing cached, or force).
+    """
+    fp = fingerprint(config)
+    h = config_hash(fp)
+    if force:
+        return h, fp, None
+    parent = os.path.dirname(os.path.abspath(run_dir))
+    cached = find_result(h, [os.path.abspath(run_dir), parent], required)
+    return h, fp, cached
@@ -0,0 +1,314 @@
+'''
+Live metrics of a running experiment over HTTP, in Prometheus text format.
+
+A LiveMetrics object lives in the driver (bufferbloat.py,
+tcp_competition.py with --metrics-port) and serves GET /metrics from a
+background thread.  A scrape only formats in-memory aggregates:
+
+    queue      the queue monitor process (monitor_qlen) writes its latest
+               sample into SharedGauges, a few doubles in shared memory:
+               backlog, drops, sample count and its sampling lag (how
+               late the sample came with respect to its interval)
+    flows      per-flow throughput and ping RTTs are fed into sliding
+               windows (RollingWindow, 10 s by default) by a feeder
+               thread that tails the monitors' outputs incrementally
+               (steady.FileFollower: every line is read once)
+    fetches    the driver observes each web fetch time directly
+    CPU        /proc/stat counters of the emulator box (rate() them)
+
+Every series carries a run label (the results directory), so one
+Prometheus can watch many concurrent runs.  With --metrics-port 0 the
+port is picked by the kernel; either way, while the run is up, the
+endpoint is written in Prometheus file_sd format to one file per run in
+TARGET_DIR (file_sd only globs the last path segment, so the files of all
+runs share one flat directory):
+
+    scrape_configs:
+      - job_name: experiments
+        file_sd_configs:
+          - files: ['/tmp/experiment_targets/*.json']
+'''
+
+import json
+import os
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import Array
+from socketserver import ThreadingMixIn
+from time import time
+
+import steady
+
+PREFIX = 'experiment_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+TARGET_DIR = '/tmp/experiment_targets'
+QUANTILES = (0.5, 0.95, 0.99)
+CPU_MODES = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+QUEUE_GAUGES = ('time', 'backlog_packets', 'backlog_bytes', 'dropped', 'samples',
+                'sample_lag_seconds', 'max_sample_lag_seconds')
+
+
+class SharedGauges(object):
+    """Named float gauges in shared memory: written by a monitor
+    process, read by the exporter in the driver."""
+
+    def __init__(self, names=QUEUE_GAUGES):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.values = Array('d', len(self.names))
+
+    def set(self, **values):
+        with self.values.get_lock():
+            for name, value in values.items():
+                self.values[self.index[name]] = value
+
+    def snapshot(self):
+        with self.values.get_lock():
+            return dict(zip(self.names, self.values[:]))
+
+
+class RollingWindow(object):
+    """Samples of the last `window` seconds (by arrival time), plus the
+    count and sum of every sample ever added."""
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.samples = deque()
+        self.last = None
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value, now=None):
+        now = time() if now is None else now
+        self.samples.append((now, value))
+        self.last = value
+        self.count += 1
+        self.total += value
+        self._prune(now)
+
+    def _prune(self, now):
+        while self.samples and self.samples[0][0] < now - self.window:
+            self.samples.popleft()
+
+    def values(self, now=None):
+        self._prune(time() if now is None else now)
+        return [v for _, v in self.samples]
+
+    @staticmethod
+    def quantile(values, q):
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def ping_samples(stream):
+    """FileFollower parser of ping output: (stream, None, rtt_ms)."""
+    def parse(line):
+        if 'time=' not in line:
+            return []
+        try:
+            return [(stream, None, float(line.split('time=')[1].split()[0]))]
+        except ValueError:
+            return []
+    return parse
+
+
+def read_cpu_times(fname='/proc/stat'):
+    """Seconds spent in each CPU_MODES mode, summed over all CPUs."""
+    hz = os.sysconf('SC_CLK_TCK')
+    with open(fname) as f:
+        fields = f.readline().split()[1:len(CPU_MODES) + 1]
+    return {mode: int(v) / float(hz) for mode, v in zip(CPU_MODES, fields)}
+
+
+def target_file(run_dir, target_dir=TARGET_DIR):
+    """file_sd file of the run in run_dir: its absolute path, flattened."""
+    name = os.path.abspath(run_dir).strip('/').replace('/', '_') or 'root'
+    return os.path.join(target_dir, name + '.json')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                             for k, v in labels.items())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class LiveMetrics(object):
+    """Rolling aggregates of one run and the HTTP endpoint serving them."""
+
+    def __init__(self, run_dir, experiment, window=10.0, fetch_window=60.0, poll_sec=0.5,
+                 target_dir=TARGET_DIR):
+        self.run_dir = run_dir
+        self.target = target_file(run_dir, target_dir)
+        self.base = {'run': run_dir}
+        self.experiment = experiment
+        self.window = window
+        self.fetch_window = fetch_window
+        self.poll_sec = poll_sec
+        self.queue = SharedGauges()
+        self.throughput = {}
+        self.rtt = {}
+        self.fetch = RollingWindow(fetch_window)
+        self.followers = []
+        self.lock = threading.Lock()
+        self.t0 = time()
+        self.server = None
+        self.stopped = threading.Event()
+        self.feeder = threading.Thread(target=self._feed, daemon=True)
+
+    # Feeding
+
+    def follow_flow(self, flow, outfile):
+        """Tail an iperf client log (line-buffered text or --json-stream)."""
+        with self.lock:
+            self.throughput.setdefault(flow, RollingWindow(self.window))
+            self.followers.append((steady.flow_follower(outfile, flow), self.throughput))
+
+    def follow_ping(self, path, fname):
+        """Tail a ping log; RTTs are labelled with path."""
+        with self.lock:
+            self.rtt.setdefault(path, RollingWindow(self.window))
+            self.followers.append((steady.FileFollower(fname, ping_samples(path)), self.rtt))
+
+    def observe_fetch(self, seconds):
+        with self.lock:
+            self.fetch.add(seconds)
+
+    def _feed(self):
+        while not self.stopped.wait(self.poll_sec):
+            with self.lock:
+                followers = list(self.followers)
+            for follower, windows in followers:
+                samples = follower.poll()
+                with self.lock:
+                    for stream, _, value in samples:
+                        windows[stream].add(value)
+        for follower, _ in self.followers:
+            follower.close()
+
+    # Exposition
+
+    def _summary(self, out, name, help_text, windows):
+        """Window quantiles, with the run's _sum and _count, of
+        [(labels, values, total, count)]."""
+        out.append('# HELP %s%s %s' % (PREFIX, name, help_text))
+        out.append('# TYPE %s%s summary' % (PREFIX, name))
+        for labels, vals, total, count in windows:
+            lab = dict(self.base, **labels)
+            for q in QUANTILES:
+                v = RollingWindow.quantile(vals, q)
+                if v is not None:
+                    out.append('%s%s%s %g' % (PREFIX, name, _labels(dict(lab, quantile=q)), v))
+            out.append('%s%s_sum%s %g' % (PREFIX, name, _labels(lab), total))
+            out.append('%s%s_count%s %d' % (PREFIX, name, _labels(lab), count))
+
+    def _metric(self, out, name, kind, help_text, samples):
+        out.append('# HELP %s%s %s' % (PREFIX, name, help_text))
+        out.append('# TYPE %s%s %s' % (PREFIX, name, kind))
+        for labels, value in samples:
+            out.append('%s%s%s %g' % (PREFIX, name, _labels(dict(self.base, **labels)), value))
+
+    def render(self):
+        now = time()
+        out = []
+        self._metric(out, 'info', 'gauge', "Experiment of the run",
+                     [({'experiment': self.experiment}, 1)])
+        self._metric(out, 'elapsed_seconds', 'gauge', "Seconds since the run started",
+                     [({}, now - self.t0)])
+
+        q = self.queue.snapshot()
+        if q['samples']:
+            self._metric(out, 'queue_backlog_packets', 'gauge',
+                         "Bottleneck queue backlog at the last sample", [({}, q['backlog_packets'])])
+            self._metric(out, 'queue_backlog_bytes', 'gauge',
+                         "Bottleneck queue backlog at the last sample", [({}, q['backlog_bytes'])])
+            self._metric(out, 'queue_dropped_total', 'counter',
+                         "Packets dropped by the bottleneck queue", [({}, q['dropped'])])
+            self._metric(out, 'monitor_samples_total', 'counter',
+                         "Queue monitor samples taken", [({}, q['samples'])])
+            self._metric(out, 'monitor_sample_age_seconds', 'gauge',
+                         "Seconds since the queue monitor's last sample", [({}, now - q['time'])])
+            self._metric(out, 'monitor_sample_lag_seconds', 'gauge',
+                         "Delay of the last queue sample beyond its interval",
+                         [({}, q['sample_lag_seconds'])])
+            self._metric(out, 'monitor_max_sample_lag_seconds', 'gauge',
+                         "Largest queue sample delay beyond its interval",
+                         [({}, q['max_sample_lag_seconds'])])
+
+        with self.lock:
+            tput = {f: (w.values(now), w.last) for f, w in self.throughput.items()}
+            rtt = [({'path': p}, w.values(now), w.total, w.count)
+                   for p, w in sorted(self.rtt.items())]
+            fetch = [({}, self.fetch.values(now), self.fetch.total, self.fetch.count)]
+        if tput:
+            self._metric(out, 'flow_throughput_mbps', 'gauge',
+                         "Mean throughput of each flow over the window (Mb/s)",
+                         [({'flow': f}, sum(v) / len(v)) for f, (v, _) in sorted(tput.items()) if v])
+            self._metric(out, 'flow_throughput_last_mbps', 'gauge',
+                         "Last reported interval throughput of each flow (Mb/s)",
+                         [({'flow': f}, last) for f, (_, last) in sorted(tput.items())
+                          if last is not None])
+        if rtt:
+            self._summary(out, 'rtt_ms', "Ping RTT (ms), quantiles over the window", rtt)
+        if self.fetch.count:
+            self._summary(out, 'fetch_seconds', "Web page fetch time, quantiles over the window",
+                          fetch)
+
+        self._metric(out, 'cpu_seconds_total', 'counter',
+                     "CPU time of the emulator box by mode, all CPUs",
+                     [({'mode': m}, v) for m, v in read_cpu_times().items()])
+        return '\n'.join(out) + '\n'
+
+    # Endpoint
+
+    def start(self, port=0, host='127.0.0.1'):
+        """Serve /metrics on host:port (0: any free port)."""
+        self.server = _Server((host, port), _Handler)
+        self.server.metrics = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.feeder.start()
+        self.port = self.server.server_address[1]
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        # Through a rename: Prometheus may read the file at any time
+        tmp = self.target + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump([{'targets': ['%s:%d' % (host, self.port)], 'labels': self.base}], f)
+        os.replace(tmp, self.target)
+        print("Live metrics at http://%s:%d/metrics" % (host, self.port))
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.feeder.is_alive():
+            self.feeder.join(2)
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        try:
+            os.remove(self.target)
+        except OSError:
+            pass
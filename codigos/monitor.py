@@ -2,24 +2,127 @@ from time import sleep, time
 from subprocess import *
 import re
 
+from flowtrace import TraceWriter
+
 default_dir = '.'
 
-def monitor_qlen(iface, interval_sec = 0.01, fname='%s/qlen.txt' % default_dir):
-    pat_queued = re.compile(rb'backlog\s[^\s]+\s([\d]+)p')
-    cmd = "tc -s qdisc show dev %s" % (iface)
+# One entry per qdisc in `tc -s qdisc show` output
+pat_qdisc = re.compile(r'^qdisc\s+(\S+)\s+(\S+)\s+(root|parent\s+\S+)', re.M)
+pat_sent = re.compile(r'Sent\s+(\d+)\s+bytes\s+(\d+)\s+pkt\s+\(dropped\s+(\d+),\s+'
+                      r'overlimits\s+(\d+)\s+requeues\s+(\d+)\)')
+pat_backlog = re.compile(r'backlog\s+(\d+(?:\.\d+)?)([KMG]?)b\s+(\d+)p')
+
+# AQM-specific statistics (fq_codel, codel, pie, cake)
+pat_sojourn = {
+    'codel': re.compile(r'ldelay\s+(\d+(?:\.\d+)?)(us|ms|s)\b'),
+    'pie': re.compile(r'\bdelay\s+(\d+(?:\.\d+)?)(us|ms|s)\b'),
+    'cake': re.compile(r'av_delay\s+(\d+(?:\.\d+)?)(us|ms|s)\b'),
+}
+pat_ecn = re.compile(r'(?:ecn_mark|\bmarks)\s+(\d+)')
+pat_drop_overlimit = re.compile(r'drop_overlimit\s+(\d+)')
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+TIME_UNITS = {'us': 1, 'ms': 1000, 's': 1000000}
+
+QSTATS_FIELDS = ['kind', 'parent', 'sent_bytes', 'sent_pkts', 'dropped',
+                 'overlimits', 'requeues', 'backlog_bytes', 'backlog_pkts',
+                 'sojourn_us', 'ecn_marks', 'drop_overlimit']
+
+def parse_qdisc_stats(output):
+    """Parse `tc -s qdisc show dev X` into a list of dicts, one per qdisc,
+    in the order tc prints them (root first)."""
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    heads = list(pat_qdisc.finditer(output))
     ret = []
-    open(fname, 'w').write('')
-    while 1:
-        p = Popen(cmd, shell=True, stdout=PIPE)
-        output = p.stdout.read()
-        # Not quite right, but will do for now
-        matches = pat_queued.findall(output)
-        if matches and len(matches) > 1:
-            ret.append(matches[1])
-            t = "%f" % time()
-            open(fname, 'a').write('{},{}\n'.format(t, matches[1].decode('utf-8')))
-        sleep(interval_sec)
-    #open('qlen.txt', 'w').write('\n'.join(ret))
+    for i, m in enumerate(heads):
+        end = heads[i + 1].start() if i + 1 < len(heads) else len(output)
+        block = output[m.start():end]
+        q = {
+            'kind': m.group(1),
+            'handle': m.group(2),
+            'parent': m.group(3).replace('parent ', ''),
+        }
+        s = pat_sent.search(block)
+        if s:
+            (q['sent_bytes'], q['sent_pkts'], q['dropped'],
+             q['overlimits'], q['requeues']) = map(int, s.groups())
+        b = pat_backlog.search(block)
+        if b:
+            q['backlog_bytes'] = int(float(b.group(1)) * SIZE_UNITS[b.group(2)])
+            q['backlog_pkts'] = int(b.group(3))
+        # AQM counters live below the header line
+        body = block[block.find('\n') + 1:]
+        if q['kind'] in pat_sojourn:
+            d = pat_sojourn[q['kind']].search(body)
+            if d:
+                q['sojourn_us'] = float(d.group(1)) * TIME_UNITS[d.group(2)]
+        e = pat_ecn.search(body)
+        if e:
+            q['ecn_marks'] = int(e.group(1))
+        o = pat_drop_overlimit.search(body)
+        if o:
+            q['drop_overlimit'] = int(o.group(1))
+        ret.append(q)
+    return ret
+
+def monitor_qlen(iface, interval_sec = 0.01, fname='%s/qlen.txt' % default_dir,
+                 stats_fname=None, capacity=None, live=None):
+    """Sample the qdiscs of iface every interval_sec.
+
+    fname gets "time,packets" rows for the queue that fills up (the
+    deepest qdisc: netem 10: under TCLink's HTB root, or the AQM grafted
+    under netem by aqm.install_aqm), as plot_queue.py expects.
+    If stats_fname is given, every counter of every qdisc in the chain is
+    also written there in the shared trace format, labelled by handle.
+    capacity is a multiprocessing.Value holding the link rate (Mb/s) set
+    by a linktrace driver; when given, every sample is annotated with it
+    (a third q.txt column and a capacity_mbps stats field).
+    live is a metrics_export.SharedGauges that gets the latest backlog
+    and drops of that queue (HTB and netem count their children's drops
+    too, so the chain is not summed) and how late each sample came, for
+    the live metrics endpoint.
+    """
+    cmd = "tc -s qdisc show dev %s" % (iface)
+    out = open(fname, 'w')
+    fields = QSTATS_FIELDS + (['capacity_mbps'] if capacity is not None else [])
+    stats = TraceWriter(stats_fname, fields) if stats_fname else None
+    prev, max_lag, samples = None, 0.0, 0
+    try:
+        while 1:
+            p = Popen(cmd, shell=True, stdout=PIPE)
+            output = p.communicate()[0]
+            t = time()
+            qdiscs = parse_qdisc_stats(output)
+            if qdiscs:
+                leaf = qdiscs[-1]
+                if 'backlog_pkts' in leaf:
+                    if capacity is not None:
+                        out.write('%f,%d,%f\n' % (t, leaf['backlog_pkts'], capacity.value))
+                    else:
+                        out.write('%f,%d\n' % (t, leaf['backlog_pkts']))
+                    out.flush()
+                if stats:
+                    for q in qdiscs:
+                        if capacity is not None:
+                            q['capacity_mbps'] = capacity.value
+                        stats.write(t, '%s %s' % (q['kind'], q['handle']), q)
+                    stats.flush()
+                if live is not None:
+                    lag = max(t - prev - interval_sec, 0.0) if prev else 0.0
+                    max_lag = max(max_lag, lag)
+                    samples += 1
+                    live.set(time=t, backlog_packets=leaf.get('backlog_pkts', 0),
+                             backlog_bytes=leaf.get('backlog_bytes', 0),
+                             dropped=leaf.get('dropped', 0),
+                             samples=samples, sample_lag_seconds=lag,
+                             max_sample_lag_seconds=max_lag)
+                prev = t
+            sleep(interval_sec)
+    finally:
+        out.close()
+        if stats:
+            stats.close()
     return
 
 def monitor_devs_ng(fname="%s/txrate.txt" % default_dir, interval_sec=0.01):
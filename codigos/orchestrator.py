@@ -0,0 +1,386 @@
+'''
+asyncio supervisor for the processes of an experiment.
+
+The drivers start servers, clients, pings and monitors with popen and then
+sleep for the length of the run, so a server that dies (or a client that
+cannot connect) goes unnoticed until the analysis finds empty files.  An
+Orchestrator runs an asyncio loop in a background thread and supervises
+every process it is given:
+
+    spawn()   starts a command, in a Mininet host's namespaces through
+              `mnexec -da <pid>` (and its cgroup for CPULimitedHost), and
+              reads its stdout as a stream: every line goes to the
+              output file as soon as it is printed, to an optional
+              on_line callback, and sets the task ready once it matches
+              `ready` (e.g. "Server listening"), which replaces the fixed
+              sleep before the clients start;
+    adopt()   supervises a Popen started elsewhere (e.g. by
+              scheduler.FlowScheduler), draining its stdout pipe if it
+              has one.
+
+Tasks are jobs (clients: they are expected to end, with exit code 0) or
+services (servers: they must outlive the jobs).  A task still running
+`deadline` seconds after it was first started is terminated; a spawned
+service that exits is restarted up to `restarts` times.  Anything else that fails (a failed critical job, a
+missed deadline, a service that dies for good) aborts the run: every
+task is terminated at once and wait()/sleep() return or raise
+immediately instead of at the end of the run.
+
+Every start, exit, restart, deadline and abort is appended to an
+events.jsonl file: one JSON object per line with the wall-clock time,
+the seconds since the orchestrator started, the event and the task.
+
+The driver side stays synchronous:
+
+    orch = Orchestrator('%s/events.jsonl' % args.dir).start()
+    orch.spawn('server', 'iperf -s', host=h2, kind='service', ready='listening')
+    orch.wait_ready('server', timeout=5)
+    orch.spawn('client', 'iperf -c ...', host=h1, output='iperf.txt', deadline=40)
+    orch.wait()          # returns when the jobs end, raises Aborted on failure
+    orch.stop()
+'''
+
+import asyncio
+import json
+import os
+import re
+import signal
+import threading
+from time import time
+
+JOB = 'job'
+SERVICE = 'service'
+
+
+class Aborted(Exception):
+    """The orchestrator aborted the run (see Orchestrator.reason)."""
+
+
+class EventLog(object):
+    """Append-only JSON-lines event log (nothing is written without a file)."""
+
+    def __init__(self, fname=None):
+        self.t0 = time()
+        self.f = open(fname, 'w') if fname else None
+        self.lock = threading.Lock()
+
+    def write(self, event, task=None, **fields):
+        now = time()
+        rec = {'time': now, 'elapsed': round(now - self.t0, 6), 'event': event}
+        if task is not None:
+            rec['task'] = task
+        rec.update(fields)
+        with self.lock:
+            if self.f:
+                self.f.write(json.dumps(rec) + '\n')
+                self.f.flush()
+        return rec
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+
+def host_argv(host, cmd):
+    """argv running shell command cmd in host's namespaces (and cgroup),
+    as Host.popen does; host None runs it in the root namespace."""
+    if host is None:
+        return ['sh', '-c', cmd]
+    mncmd = ['mnexec', '-da', str(host.pid)]
+    if getattr(host, 'cgroup', None):
+        mncmd = ['mnexec', '-g', host.name, '-da', str(host.pid)]
+    return mncmd + ['sh', '-c', cmd]
+
+
+class Task(object):
+    """One supervised process (respawned in place when restarted)."""
+
+    def __init__(self, name, kind=JOB, cmd=None, host=None, output=None, deadline=None,
+                 restarts=0, critical=True, ready=None, on_line=None):
+        self.name = name
+        self.kind = kind
+        self.cmd = cmd
+        self.host = host
+        self.output = output
+        self.deadline = deadline
+        self.restarts = restarts
+        self.critical = critical
+        self.ready_pat = re.compile(ready) if ready else None
+        self.on_line = on_line
+        self.proc = None
+        self.pid = None
+        self.t_start = time()
+        self.returncode = None
+        self.starts = 0
+        self.last_output = None
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        self.stopped = False
+
+
+class Orchestrator(object):
+    """Supervises the processes of one run from a background event loop."""
+
+    def __init__(self, events_file=None, grace=2.0, restart_delay=0.5):
+        self.events = EventLog(events_file)
+        self.grace = grace
+        self.restart_delay = restart_delay
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.tasks = {}
+        self.reason = None
+        self.failed = threading.Event()
+        self.changed = threading.Condition()
+        self.stopping = False
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        self.thread.start()
+        self.events.write('orchestrator_start')
+        return self
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    def emit(self, event, task=None, **fields):
+        rec = self.events.write(event, task.name if task else None, **fields)
+        if event not in ('orchestrator_start', 'ready'):
+            print("[%7.2fs] %s %s%s" % (rec['elapsed'], task.name if task else '-', event,
+                                        ''.join(' %s=%s' % kv for kv in fields.items())))
+
+    # Driver-side API (any thread)
+
+    def spawn(self, name, cmd, host=None, kind=JOB, output=None, deadline=None,
+              restarts=0, critical=True, ready=None, on_line=None):
+        """Start and supervise shell command cmd (in host, if given)."""
+        task = Task(name, kind, cmd, host, output, deadline, restarts, critical, ready, on_line)
+        self.tasks[name] = task
+        self._submit(self._supervise_spawned(task))
+        return task
+
+    def adopt(self, name, popen, kind=JOB, output=None, deadline=None, critical=True,
+              ready=None, on_line=None):
+        """Supervise an already started Popen (it cannot be restarted)."""
+        task = Task(name, kind, None, None, output, deadline, 0, critical, ready, on_line)
+        task.proc, task.pid, task.starts = popen, popen.pid, 1
+        self.tasks[name] = task
+        self._submit(self._supervise_adopted(task))
+        return task
+
+    def wait_ready(self, name, timeout=None):
+        """Block until task name printed its ready line (True), timed out,
+        ended or the run aborted (False)."""
+        task = self.tasks[name]
+        deadline = time() + timeout if timeout is not None else None
+        with self.changed:
+            while not task.ready.is_set():
+                if self.failed.is_set() or task.done.is_set():
+                    return False
+                left = None if deadline is None else deadline - time()
+                if left is not None and left <= 0:
+                    return False
+                self.changed.wait(left)
+        return True
+
+    def sleep(self, seconds):
+        """Sleep unless the run aborts first; True if it aborted."""
+        return self.failed.wait(seconds)
+
+    def wait(self, names=None, timeout=None):
+        """Block until the given jobs (default: all jobs) have ended.
+
+        Raises Aborted as soon as the run aborts.  Returns False if
+        timeout expires first."""
+        deadline = time() + timeout if timeout is not None else None
+        with self.changed:
+            while True:
+                if self.failed.is_set():
+                    raise Aborted(self.reason)
+                tasks = [self.tasks[n] for n in names] if names else \
+                    [t for t in self.tasks.values() if t.kind == JOB]
+                if all(t.done.is_set() for t in tasks):
+                    return True
+                left = None if deadline is None else deadline - time()
+                if left is not None and left <= 0:
+                    return False
+                self.changed.wait(left)
+
+    def check(self):
+        """Raise Aborted if the run was aborted."""
+        if self.failed.is_set():
+            raise Aborted(self.reason)
+
+    def release(self):
+        """The jobs are over: exits from now on (servers stopped by the
+        driver) are expected and no longer abort the run."""
+        self.stopping = True
+        self.events.write('release')
+
+    def abort(self, reason):
+        """Abort the run from the driver (e.g. a monitor found a problem)."""
+        self._submit(self._abort(reason)).result()
+
+    def stop(self):
+        """Terminate every task that is still running and stop the loop."""
+        self.stopping = True
+        self._submit(self._terminate_all()).result()
+        for task in self.tasks.values():
+            if not task.done.wait(self.grace):
+                self._kill(task, signal.SIGKILL)
+                task.done.wait(1)
+        self.events.write('orchestrator_stop', reason=self.reason)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.events.close()
+
+    def summary(self):
+        """{task: {kind, starts, returncode}} of every task."""
+        return {t.name: {'kind': t.kind, 'starts': t.starts, 'returncode': t.returncode}
+                for t in self.tasks.values()}
+
+    # Event loop side
+
+    async def _pump(self, task, reader):
+        """Copy a task's output stream line by line."""
+        out = open(task.output, 'ab' if task.starts > 1 else 'wb') if task.output else None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task.last_output = time()
+                if out:
+                    out.write(line)
+                    out.flush()
+                text = line.decode('utf-8', 'replace')
+                if task.ready_pat and not task.ready.is_set() and task.ready_pat.search(text):
+                    task.ready.set()
+                    self.emit('ready', task)
+                    self._notify()
+                if task.on_line:
+                    task.on_line(text)
+        finally:
+            if out:
+                out.close()
+
+    async def _pipe_reader(self, pipe):
+        reader = asyncio.StreamReader()
+        await self.loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        return reader
+
+    def _kill(self, task, sig=signal.SIGTERM):
+        """Signal the task's process group (mnexec -d and the spawn use a
+        new session), falling back to the process."""
+        if task.pid is None:
+            return
+        try:
+            os.killpg(task.pid, sig)
+        except OSError:
+            try:
+                os.kill(task.pid, sig)
+            except OSError:
+                pass
+
+    async def _wait_exit(self, task, exited):
+        """Wait for the exit future; enforce the deadline.  Returns
+        (returncode, missed_deadline)."""
+        timeout = None
+        if task.deadline is not None:
+            timeout = max(task.deadline - (time() - task.t_start), 0)
+        try:
+            return await asyncio.wait_for(asyncio.shield(exited), timeout), False
+        except asyncio.TimeoutError:
+            self._kill(task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(exited), self.grace), True
+            except asyncio.TimeoutError:
+                self._kill(task, signal.SIGKILL)
+                return await exited, True
+
+    async def _supervise_spawned(self, task):
+        try:
+            while True:
+                task.starts += 1
+                proc = await asyncio.create_subprocess_exec(
+                    *host_argv(task.host, task.cmd), stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT, start_new_session=True)
+                task.proc, task.pid = proc, proc.pid
+                self.emit('start', task, pid=proc.pid, attempt=task.starts)
+                pump = self.loop.create_task(self._pump(task, proc.stdout))
+                rc, late = await self._wait_exit(task, self.loop.create_task(proc.wait()))
+                await pump
+                task.returncode = rc
+                if await self._settle(task, rc, late):
+                    continue
+                break
+        except Exception as e:
+            await self._abort('%s: %s' % (task.name, e))
+        finally:
+            task.done.set()
+            self._notify()
+
+    async def _supervise_adopted(self, task):
+        try:
+            self.emit('adopt', task, pid=task.pid)
+            pump = None
+            pipe = getattr(task.proc, 'stdout', None)
+            if pipe is not None:
+                pump = self.loop.create_task(self._pump(task, await self._pipe_reader(pipe)))
+            exited = self.loop.run_in_executor(None, task.proc.wait)
+            rc, late = await self._wait_exit(task, exited)
+            if pump:
+                await pump
+            task.returncode = rc
+            await self._settle(task, rc, late)
+        except Exception as e:
+            await self._abort('%s: %s' % (task.name, e))
+        finally:
+            task.done.set()
+            self._notify()
+
+    async def _settle(self, task, rc, late):
+        """Decide what an exit means; True to restart the task."""
+        if self.stopping or task.stopped:
+            self.emit('stopped', task, returncode=rc)
+            return False
+        if late:
+            self.emit('deadline', task, returncode=rc, deadline=task.deadline)
+            if task.critical:
+                await self._abort('%s missed its deadline (%ss)' % (task.name, task.deadline))
+            return False
+        self.emit('exit', task, returncode=rc)
+        if task.kind == SERVICE:
+            if task.cmd is not None and task.starts <= task.restarts:
+                self.emit('restart', task, attempt=task.starts + 1)
+                await asyncio.sleep(self.restart_delay)
+                return not (self.stopping or self.failed.is_set())
+            if task.critical:
+                await self._abort('service %s exited (code %s)' % (task.name, rc))
+        elif rc != 0 and task.critical:
+            await self._abort('%s failed (code %s)' % (task.name, rc))
+        return False
+
+    async def _abort(self, reason):
+        if self.failed.is_set():
+            return
+        self.reason = reason
+        self.failed.set()
+        self.emit('abort', reason=reason)
+        self._notify()
+        await self._terminate_all()
+
+    async def _terminate_all(self):
+        running = [t for t in self.tasks.values() if not t.done.is_set()]
+        for task in running:
+            task.stopped = True
+            self._kill(task)
+        if running:
+            await asyncio.sleep(0)
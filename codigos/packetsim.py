@@ -0,0 +1,720 @@
+#!/usr/bin/env python3
+
+'''
+Packet-level discrete-event simulator of BBTopo and CompetitionTopo.
+
+The fluid model (fluidsim.py) has no packets, so it cannot show per-packet
+effects such as drop-tail synchronization, ACK clocking or pacing.  This
+simulator keeps those effects, needs no root and does not depend on how
+loaded the host is.  bufferbloat.py and tcp_competition.py use it through
+--backend sim.
+
+Events live in one heap of (time, seq, callback, arg).  Packets are
+__slots__ objects that carry their own path, a tuple of hops that all
+have arrive(pkt).  Each link reproduces TCLink's qdisc chain: netem
+holds a packet for the link delay and then HTB serializes it at the link
+rate.  The drop-tail limit (max_queue_size) counts every packet netem
+holds, including those still in the delay line, and that count is what
+the queue monitor reports.  ACKs and ping replies travel the reverse path
+as a pure delay, since it never congests.
+
+Senders keep a send-ordered scoreboard.  Paths are FIFO, so when a packet
+is delivered, any outstanding packet sent before it was lost.  Losses
+are recovered by retransmission, with at most one window reduction per
+round trip, and an RTO (200 ms minimum) covers lost tails.
+Congestion control:
+
+    reno    slow start and AIMD
+    cubic   RFC 8312 window growth with its TCP-friendly region, beta 0.7
+    bbr     BBR v1: delivery-rate samples, a BtlBw max filter over 10
+            rounds, a 10 s RTprop filter, Startup/Drain, ProbeBW gain
+            cycling, ProbeRTT and pacing
+
+Outputs use the emulated runs' formats, written by fluidsim's writers.
+'''
+
+import heapq
+import itertools
+import os
+import random
+from collections import deque
+from time import time
+
+from flowtrace import TraceWriter, IPERF_FIELDS
+import fluidsim
+import linktrace
+
+MSS_BYTES = 1500
+PING_BYTES = 98
+IW = 10
+MIN_RTO = 0.2
+SAMPLE = 0.1
+# Pings run this long before the competing flows (FlowScheduler's lead)
+LEAD = 0.5
+
+
+class Packet(object):
+    __slots__ = ('flow', 'seq', 'idx', 'size', 'sent', 'delivered', 'delivered_time',
+                 'path', 'hop')
+
+    def __init__(self, flow, seq, idx, size, sent, path):
+        self.flow = flow
+        self.seq = seq
+        self.idx = idx
+        self.size = size
+        self.sent = sent
+        self.path = path
+        self.hop = 0
+        self.delivered = 0
+        self.delivered_time = 0.0
+
+
+def forward(pkt):
+    """Hand pkt to the next hop of its path."""
+    pkt.hop += 1
+    pkt.path[pkt.hop].arrive(pkt)
+
+
+class Simulator(object):
+    """Event heap with a virtual clock."""
+
+    def __init__(self, seed=None):
+        self.now = 0.0
+        self.events = []
+        self.counter = itertools.count()
+        self.rng = random.Random(seed)
+
+    def at(self, t, fn, arg=None):
+        heapq.heappush(self.events, (t, next(self.counter), fn, arg))
+
+    def run(self, until):
+        events = self.events
+        pop = heapq.heappop
+        while events and events[0][0] <= until:
+            t, _, fn, arg = pop(events)
+            self.now = t
+            fn(arg)
+        self.now = until
+
+
+class Link(object):
+    """A TCLink interface: netem delay (and loss) then an HTB rate limit,
+    drop-tail at `limit` packets held by netem."""
+    __slots__ = ('sim', 'rate', 'delay', 'limit', 'loss', 'fifo', 'busy', 'backlog', 'drops')
+
+    def __init__(self, sim, rate_mbps, delay_ms, limit, loss=0.0):
+        self.sim = sim
+        self.rate = rate_mbps * 1e6
+        self.delay = delay_ms / 1000.0
+        self.limit = limit
+        self.loss = loss
+        self.fifo = deque()
+        self.busy = False
+        self.backlog = 0
+        self.drops = 0
+
+    def arrive(self, pkt):
+        if self.backlog >= self.limit or (self.loss and self.sim.rng.random() < self.loss):
+            self.drops += 1
+            return
+        self.backlog += 1
+        if self.delay > 0:
+            self.sim.at(self.sim.now + self.delay, self._ready, pkt)
+        else:
+            self._ready(pkt)
+
+    def _ready(self, pkt):
+        self.fifo.append(pkt)
+        if not self.busy:
+            self._start()
+
+    def _start(self):
+        pkt = self.fifo.popleft()
+        self.backlog -= 1
+        self.busy = True
+        self.sim.at(self.sim.now + pkt.size * 8 / self.rate, self._done, pkt)
+
+    def _done(self, pkt):
+        self.busy = False
+        forward(pkt)
+        if self.fifo:
+            self._start()
+
+
+class Reno(object):
+    def __init__(self):
+        self.cwnd = float(IW)
+        self.ssthresh = float('inf')
+        self.pacing_rate = None
+
+    def on_ack(self, flow, pkt, rtt):
+        if self.cwnd < self.ssthresh:
+            self.cwnd += 1
+        else:
+            self.cwnd += 1.0 / self.cwnd
+
+    def on_loss(self, flow):
+        self.ssthresh = max(self.cwnd / 2, 2)
+        self.cwnd = self.ssthresh
+
+    def on_rto(self, flow):
+        self.ssthresh = max(flow.inflight() / 2.0, 2)
+        self.cwnd = 1.0
+
+
+class Cubic(Reno):
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self):
+        Reno.__init__(self)
+        self.w_max = 0.0
+        self.epoch = None
+        self.k = 0.0
+        self.origin = 0.0
+        self.w_est = 0.0
+
+    def on_ack(self, flow, pkt, rtt):
+        if self.cwnd < self.ssthresh:
+            self.cwnd += 1
+            return
+        now = flow.sim.now
+        if self.epoch is None:
+            self.epoch = now
+            if self.cwnd < self.w_max:
+                self.k = ((self.w_max - self.cwnd) / self.C) ** (1.0 / 3)
+                self.origin = self.w_max
+            else:
+                self.k = 0.0
+                self.origin = self.cwnd
+            self.w_est = self.cwnd
+        t = now - self.epoch + (flow.srtt or rtt)
+        target = self.origin + self.C * (t - self.k) ** 3
+        if target > self.cwnd:
+            self.cwnd += (target - self.cwnd) / self.cwnd
+        else:
+            self.cwnd += 0.01 / self.cwnd
+        # TCP-friendly region: never slower than Reno would be
+        self.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) / self.cwnd
+        if self.w_est > self.cwnd:
+            self.cwnd = self.w_est
+
+    def on_loss(self, flow):
+        self.epoch = None
+        # Fast convergence
+        if self.cwnd < self.w_max:
+            self.w_max = self.cwnd * (1 + self.BETA) / 2
+        else:
+            self.w_max = self.cwnd
+        self.cwnd = max(self.cwnd * self.BETA, 2)
+        self.ssthresh = self.cwnd
+
+    def on_rto(self, flow):
+        self.epoch = None
+        self.w_max = self.cwnd
+        Reno.on_rto(self, flow)
+
+
+class Bbr(object):
+    HIGH_GAIN = 2.885
+    CWND_GAIN = 2.0
+    CYCLE = (1.25, 0.75, 1, 1, 1, 1, 1, 1)
+    BW_ROUNDS = 10
+    RTPROP_WINDOW = 10.0
+    PROBE_RTT_TIME = 0.2
+    PROBE_RTT_CWND = 4
+    STARTUP, DRAIN, PROBE_BW, PROBE_RTT = range(4)
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.mode = self.STARTUP
+        self.cwnd = float(IW)
+        self.pacing_rate = None
+        self.bw = [(0, 0.0)] * self.BW_ROUNDS
+        self.btlbw = 0.0
+        self.rtprop = float('inf')
+        self.rtprop_stamp = 0.0
+        self.round = 0
+        self.next_round_delivered = 0
+        self.full_bw = 0.0
+        self.full_cnt = 0
+        self.phase = 0
+        self.cycle_stamp = 0.0
+        self.probe_rtt_done = None
+
+    def _update_bw(self, rate):
+        slot = self.round % self.BW_ROUNDS
+        r, best = self.bw[slot]
+        self.bw[slot] = (self.round, max(best, rate) if r == self.round else rate)
+        self.btlbw = max(b for r, b in self.bw if r > self.round - self.BW_ROUNDS)
+
+    def on_ack(self, flow, pkt, rtt):
+        now = flow.sim.now
+        new_round = False
+        if pkt.delivered >= self.next_round_delivered:
+            self.next_round_delivered = flow.delivered
+            self.round += 1
+            new_round = True
+        interval = now - pkt.delivered_time
+        if interval > 0:
+            self._update_bw((flow.delivered - pkt.delivered) / interval)
+        if rtt is not None:
+            if rtt <= self.rtprop or now - self.rtprop_stamp > self.RTPROP_WINDOW:
+                expired = now - self.rtprop_stamp > self.RTPROP_WINDOW
+                self.rtprop = rtt
+                self.rtprop_stamp = now
+                if expired and self.mode != self.PROBE_RTT and self.btlbw > 0:
+                    self.mode = self.PROBE_RTT
+                    self.probe_rtt_done = None
+        bdp = self.btlbw * self.rtprop if self.rtprop < float('inf') else IW
+
+        if self.mode == self.STARTUP and new_round:
+            if self.btlbw >= self.full_bw * 1.25:
+                self.full_bw = self.btlbw
+                self.full_cnt = 0
+            else:
+                self.full_cnt += 1
+                if self.full_cnt >= 3:
+                    self.mode = self.DRAIN
+        if self.mode == self.DRAIN and flow.inflight() <= bdp:
+            self._enter_probe_bw(now)
+        if self.mode == self.PROBE_BW and now - self.cycle_stamp > self.rtprop:
+            self.phase = (self.phase + 1) % len(self.CYCLE)
+            self.cycle_stamp = now
+        if self.mode == self.PROBE_RTT:
+            if self.probe_rtt_done is None and flow.inflight() <= self.PROBE_RTT_CWND:
+                self.probe_rtt_done = now + max(self.PROBE_RTT_TIME, rtt or 0)
+            elif self.probe_rtt_done is not None and now >= self.probe_rtt_done:
+                self.rtprop_stamp = now
+                if self.full_cnt >= 3:
+                    self._enter_probe_bw(now)
+                else:
+                    self.mode = self.STARTUP
+
+        if self.mode == self.STARTUP:
+            gain, cwnd_gain = self.HIGH_GAIN, self.HIGH_GAIN
+        elif self.mode == self.DRAIN:
+            gain, cwnd_gain = 1.0 / self.HIGH_GAIN, self.HIGH_GAIN
+        elif self.mode == self.PROBE_BW:
+            gain, cwnd_gain = self.CYCLE[self.phase], self.CWND_GAIN
+        else:
+            gain, cwnd_gain = 1.0, self.CWND_GAIN
+        if self.btlbw > 0:
+            self.pacing_rate = gain * self.btlbw
+        if self.mode == self.PROBE_RTT:
+            self.cwnd = self.PROBE_RTT_CWND
+        else:
+            self.cwnd = max(cwnd_gain * bdp, self.PROBE_RTT_CWND)
+
+    def _enter_probe_bw(self, now):
+        self.mode = self.PROBE_BW
+        # Random phase, never the 0.75 drain phase
+        self.phase = self.rng.choice([0, 2, 3, 4, 5, 6, 7])
+        self.cycle_stamp = now
+
+    def on_loss(self, flow):
+        pass
+
+    def on_rto(self, flow):
+        self.cwnd = 1.0
+
+
+CONGESTION_CONTROL = {'reno': Reno, 'cubic': Cubic, 'bbr': Bbr}
+
+
+def make_cc(name, rng):
+    return Bbr(rng) if name == 'bbr' else CONGESTION_CONTROL[name]()
+
+
+class Flow(object):
+    """A TCP sender/receiver pair over a forward path of links and a
+    fixed-delay reverse path.
+
+    size (packets) None is a bulk iperf flow that sends until `stop`;
+    otherwise the flow is a request/response transfer: `done` is set and
+    on_done(flow) called when its last packet arrives.  handshake=True
+    first sends one packet forward and waits for the request before the
+    data (a web fetch).
+    """
+
+    def __init__(self, sim, name, cc, links, reverse_delay, start=0.0, stop=None,
+                 size=None, handshake=False, on_done=None):
+        self.sim = sim
+        self.name = name
+        self.cc = cc
+        self.path = tuple(links) + (self,)
+        self.reverse = reverse_delay
+        self.start = start
+        self.stop = stop
+        self.size = size
+        self.handshake = handshake
+        self.on_done = on_done
+        self.done = None
+        self.next_seq = 0
+        self.sent_count = 0
+        self.outstanding = {}
+        self.lost = deque()
+        self.delivered = 0
+        self.delivered_time = 0.0
+        self.recovery_point = -1
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = 1.0
+        self.rto_deadline = None
+        self.next_send = 0.0
+        self.send_pending = False
+        self.established = False
+        # Receiver
+        self.rcv_next = 0
+        self.rcv_ooo = set()
+        # Interval counters
+        self.goodput_pkts = 0
+        self.retransmits = 0
+        sim.at(start, self._open)
+
+    # Sender
+    def _open(self, _):
+        if not self.handshake:
+            self.established = True
+            self.delivered_time = self.sim.now
+            self.try_send()
+            return
+        # SYN over the reverse path, SYN/ACK through the forward queue
+        self.sim.at(self.sim.now + self.reverse, self._syn_ack)
+
+    def _syn_ack(self, _):
+        if self.established:
+            return
+        pkt = Packet(self, -1, -1, 60, self.sim.now, self.path)
+        self.path[0].arrive(pkt)
+        # Lost SYN/ACKs are resent after the initial 1 s RTO
+        self.sim.at(self.sim.now + 1.0, self._syn_ack)
+
+    def _request(self, _):
+        if self.established:
+            return
+        self.established = True
+        self.delivered_time = self.sim.now
+        self.try_send()
+
+    def inflight(self):
+        return len(self.outstanding)
+
+    def _has_data(self):
+        if self.lost:
+            return True
+        if self.size is not None:
+            return self.next_seq < self.size
+        return self.stop is None or self.sim.now < self.stop
+
+    def try_send(self, _=None):
+        self.send_pending = False
+        sim = self.sim
+        cc = self.cc
+        while self.established and len(self.outstanding) < int(cc.cwnd) and self._has_data():
+            if cc.pacing_rate and sim.now < self.next_send:
+                self.send_pending = True
+                sim.at(self.next_send, self.try_send)
+                return
+            if self.lost:
+                seq = self.lost.popleft()
+                self.retransmits += 1
+            else:
+                seq = self.next_seq
+                self.next_seq += 1
+            pkt = Packet(self, seq, self.sent_count, MSS_BYTES, sim.now, self.path)
+            pkt.delivered = self.delivered
+            pkt.delivered_time = self.delivered_time
+            self.sent_count += 1
+            self.outstanding[seq] = pkt
+            if cc.pacing_rate:
+                self.next_send = max(self.next_send, sim.now) + 1.0 / cc.pacing_rate
+            if self.rto_deadline is None:
+                self._arm_rto()
+            self.path[0].arrive(pkt)
+
+    def _arm_rto(self):
+        self.rto_deadline = self.sim.now + self.rto
+        self.sim.at(self.rto_deadline, self._on_rto_timer, self.rto_deadline)
+
+    def _on_rto_timer(self, deadline):
+        if deadline != self.rto_deadline:
+            return
+        if not self.outstanding:
+            self.rto_deadline = None
+            return
+        for seq in self.outstanding:
+            self.lost.append(seq)
+        self.outstanding.clear()
+        self.cc.on_rto(self)
+        self.recovery_point = self.sent_count
+        self.rto = min(self.rto * 2, 60.0)
+        self.rto_deadline = None
+        self.try_send()
+
+    def on_ack(self, pkt):
+        now = self.sim.now
+        cur = self.outstanding.get(pkt.seq)
+        if cur is None:
+            return
+        if cur is pkt:
+            # FIFO path: everything sent before pkt and still outstanding
+            # was lost
+            lost = False
+            for seq in list(self.outstanding):
+                if seq == pkt.seq:
+                    break
+                del self.outstanding[seq]
+                self.lost.append(seq)
+                lost = True
+            if lost and pkt.idx >= self.recovery_point:
+                self.cc.on_loss(self)
+                self.recovery_point = self.sent_count
+        del self.outstanding[pkt.seq]
+        self.delivered += 1
+        self.delivered_time = now
+        rtt = None
+        if cur is pkt:
+            rtt = now - pkt.sent
+            if self.srtt is None:
+                self.srtt, self.rttvar = rtt, rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+            self.rto = max(MIN_RTO, self.srtt + 4 * self.rttvar)
+        self.cc.on_ack(self, pkt, rtt)
+        self._arm_rto() if self.outstanding else setattr(self, 'rto_deadline', None)
+        if not self.send_pending:
+            self.try_send()
+
+    # Receiver
+    def arrive(self, pkt):
+        if pkt.seq < 0:
+            # SYN/ACK: the request goes back over the reverse path
+            self.sim.at(self.sim.now + self.reverse, self._request)
+            return
+        seq = pkt.seq
+        if seq >= self.rcv_next and seq not in self.rcv_ooo:
+            self.goodput_pkts += 1
+            if seq == self.rcv_next:
+                self.rcv_next += 1
+                while self.rcv_next in self.rcv_ooo:
+                    self.rcv_ooo.discard(self.rcv_next)
+                    self.rcv_next += 1
+            else:
+                self.rcv_ooo.add(seq)
+        if self.size is not None and self.done is None and self.rcv_next >= self.size:
+            self.done = self.sim.now
+            if self.on_done:
+                self.on_done(self)
+        self.sim.at(self.sim.now + self.reverse, self.on_ack, pkt)
+
+
+class Pinger(object):
+    """`ping -i <interval>` over a forward path; replies return as a pure delay."""
+
+    def __init__(self, sim, links, reverse_delay, stop, interval=SAMPLE):
+        self.sim = sim
+        self.path = tuple(links) + (self,)
+        self.reverse = reverse_delay
+        self.stop = stop
+        self.interval = interval
+        self.rtts = []
+        sim.at(0.0, self._send)
+
+    def _send(self, _):
+        if self.sim.now >= self.stop:
+            return
+        self.path[0].arrive(Packet(None, 0, 0, PING_BYTES, self.sim.now, self.path))
+        self.sim.at(self.sim.now + self.interval, self._send)
+
+    def arrive(self, pkt):
+        self.sim.at(self.sim.now + self.reverse, self._reply, pkt)
+
+    def _reply(self, pkt):
+        self.rtts.append((self.sim.now - pkt.sent) * 1000)
+
+
+class Recorder(object):
+    """Queue samples every `sample` s and per-flow interval statistics."""
+
+    def __init__(self, sim, queue_link, flows, end, interval=1.0, sample=SAMPLE,
+                 capacity=False):
+        self.sim = sim
+        self.link = queue_link
+        self.interval = interval
+        self.sample = sample
+        self.queue = []
+        # Link rate (Mb/s) at each sample, as the emulated monitor annotates
+        # its samples under a link trace
+        self.capacity = [] if capacity else None
+        self.rows = {f.name: [] for f in flows}
+        for k in range(1, int(round(end / sample)) + 1):
+            sim.at(k * sample, self._sample)
+        # Each flow reports from its own start, as its iperf client does
+        for f in flows:
+            stop = end if f.stop is None else f.stop
+            for k in range(1, int(round(stop - f.start, 9) / interval) + 1):
+                sim.at(f.start + k * interval, self._interval, f)
+
+    def _sample(self, _):
+        self.queue.append(self.link.backlog)
+        if self.capacity is not None:
+            self.capacity.append(self.link.rate / 1e6)
+
+    def _interval(self, f):
+        self.rows[f.name].append({
+            'throughput_mbps': f.goodput_pkts * MSS_BYTES * 8 / self.interval / 1e6,
+            'retransmits': f.retransmits,
+            'cwnd': int(f.cc.cwnd * MSS_BYTES),
+            'rtt_ms': f.srtt * 1000 if f.srtt else None,
+        })
+        f.goodput_pkts = 0
+        f.retransmits = 0
+
+
+def schedule_link_trace(sim, link, trace_file, duration, bin_ms=100, logfile=None, t0=0.0):
+    """Replay a linktrace.py trace on a simulated link, logging each
+    change to capacity.txt like the emulated driver does."""
+    steps, period = linktrace.load_trace(trace_file, bin_ms)
+    log = open(logfile, 'w') if logfile else None
+    delay_ms = link.delay * 1000
+
+    def apply(step):
+        _, bw, delay, loss = step
+        link.rate = max(bw, 0.01) * 1e6
+        link.delay = (delay_ms if delay is None else delay) / 1000.0
+        link.loss = (loss or 0.0) / 100.0
+        if log:
+            log.write('%f,%f,%f,%f\n' % (t0 + sim.now, bw, link.delay * 1000, link.loss * 100))
+
+    base = 0.0
+    while steps and base < duration:
+        for step in steps:
+            if base + step[0] < duration:
+                sim.at(base + step[0], apply, step)
+        if period <= 0:
+            break
+        base += period
+    return log
+
+
+def write_outputs(out_dir, recorder, flows, pingers, t0, queue_file, ping_files):
+    """q.txt/queue.txt, ping files, iperf text logs and flow_trace.csv."""
+    fluidsim.write_queue(os.path.join(out_dir, queue_file), recorder.queue, recorder.sample, t0,
+                         recorder.capacity)
+    for pinger, fname in zip(pingers, ping_files):
+        fluidsim.write_ping(os.path.join(out_dir, fname), pinger.rtts)
+    with TraceWriter(os.path.join(out_dir, 'flow_trace.csv'), IPERF_FIELDS) as w:
+        for f in flows:
+            rows = recorder.rows[f.name]
+            fluidsim.write_iperf_text(os.path.join(out_dir, '%s_output.txt' % f.name),
+                                      [r['throughput_mbps'] for r in rows], recorder.interval)
+            for s, r in enumerate(rows):
+                w.write(t0 + f.start + (s + 1) * recorder.interval, f.name, r)
+
+
+class FetchLoop(object):
+    """bufferbloat.py's measurement loop: `count` sequential web fetches,
+    then a pause of `every` seconds, until `duration`."""
+
+    def __init__(self, sim, links, reverse_delay, cong, size, every, count, duration):
+        self.sim = sim
+        self.links = links
+        self.reverse = reverse_delay
+        self.cong = cong
+        self.size = size
+        self.every = every
+        self.count = count
+        self.duration = duration
+        self.times = []
+        self.left = 0
+        sim.at(0.0, self._round)
+
+    def _round(self, _):
+        if self.sim.now > self.duration:
+            return
+        self.left = self.count
+        self._fetch()
+
+    def _fetch(self):
+        Flow(self.sim, 'fetch', make_cc(self.cong, self.sim.rng), self.links, self.reverse,
+             self.sim.now, size=self.size, handshake=True, on_done=self._done)
+
+    def _done(self, flow):
+        self.times.append(flow.done - flow.start)
+        self.left -= 1
+        if self.left > 0:
+            self._fetch()
+        else:
+            self.sim.at(self.sim.now + self.every, self._round)
+
+
+def simulate_bufferbloat(out_dir, bw_net, bw_host, delay, maxq, cong, duration,
+                         fetch_bytes, fetch_every=5.0, fetches=3, seed=None,
+                         link_trace=None, link_trace_bin=100, ping_interval=SAMPLE,
+                         queue_interval=SAMPLE):
+    """BBTopo: a long flow h1 -> h2, pings and periodic web fetches.
+
+    Writes q.txt, ping.txt, iperf_output.txt and flow_trace.csv (and
+    capacity.txt with a link trace) in out_dir; returns the fetch times
+    (sec).
+    """
+    sim = Simulator(seed)
+    t0 = time()
+    # h1 -> s0 (host link), s0 -> h2 (bottleneck); both delay/2
+    links = [Link(sim, bw_host, delay / 2.0, maxq), Link(sim, bw_net, delay / 2.0, maxq)]
+    reverse = delay / 1000.0
+    flow = Flow(sim, 'iperf', make_cc(cong, sim.rng), links, reverse, 0.0, duration)
+    pinger = Pinger(sim, links, reverse, duration, ping_interval)
+    recorder = Recorder(sim, links[1], [flow], duration, sample=queue_interval,
+                        capacity=bool(link_trace))
+    size = max(-(-fetch_bytes // (MSS_BYTES - 52)), 1)
+    fetch = FetchLoop(sim, links, reverse, cong, size, fetch_every, fetches, duration)
+    log = None
+    if link_trace:
+        log = schedule_link_trace(sim, links[1], link_trace, duration, link_trace_bin,
+                                  os.path.join(out_dir, 'capacity.txt'), t0)
+    sim.run(duration)
+    if log:
+        log.close()
+    write_outputs(out_dir, recorder, [flow], [pinger], t0, 'q.txt', ['ping.txt'])
+    return fetch.times
+
+
+def simulate_competition(out_dir, flows, bw_net, bw_host, delay, maxq, duration,
+                         access, starts=None, seed=None, link_trace=None,
+                         link_trace_bin=100, ping_interval=SAMPLE, queue_interval=SAMPLE):
+    """CompetitionTopo: flows is a list of (label, congestion control),
+    access the (bw, delay ms) of each sender's access link and starts the
+    start offset of each flow.  The run lasts duration from the start
+    barrier: a late flow ends with the others.
+
+    Writes queue.txt, ping_<flow>.txt, <flow>_output.txt and
+    flow_trace.csv (and capacity.txt with a link trace) in out_dir.
+    """
+    sim = Simulator(seed)
+    t0 = time()
+    end = LEAD + duration
+    # Access and receiver links keep netem's default 1000-packet limit
+    bottleneck = Link(sim, bw_net, delay, maxq)
+    senders, pingers = [], []
+    for j, (label, cc) in enumerate(flows):
+        bw, access_delay = access[min(j, len(access) - 1)]
+        links = [Link(sim, bw, access_delay, 1000), bottleneck,
+                 Link(sim, bw_host, fluidsim.RECEIVER_DELAY_MS, 1000)]
+        reverse = (access_delay + delay + fluidsim.RECEIVER_DELAY_MS) / 1000.0
+        start = LEAD + (starts or {}).get(label, 0.0)
+        senders.append(Flow(sim, label, make_cc(cc, sim.rng), links, reverse, start, end))
+        pingers.append(Pinger(sim, links, reverse, end, ping_interval))
+    recorder = Recorder(sim, bottleneck, senders, end, sample=queue_interval,
+                        capacity=bool(link_trace))
+    log = None
+    if link_trace:
+        log = schedule_link_trace(sim, bottleneck, link_trace, end, link_trace_bin,
+                                  os.path.join(out_dir, 'capacity.txt'), t0)
+    sim.run(end)
+    if log:
+        log.close()
+    write_outputs(out_dir, recorder, senders, pingers, t0, 'queue.txt',
+                  ['ping_%s.txt' % label.replace('_flow', '') for label, _ in flows])
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+'''
+Browser-like page load emulation for index.html.
+
+index.html references stylesheets, scripts and images on nyt.com hosts
+that do not exist inside Mininet, so curl only measures the HTML
+document.  build_bundle() mirrors the page locally: every subresource
+becomes a synthetic object of a realistic size for its type (under
+pageload/<host>/<path>), index.html is rewritten to point at them and a
+manifest lists each object with its dependencies:
+
+    - every object depends on the HTML document;
+    - a parser-blocking <script> (no async/defer) delays the discovery
+      of everything after it in the document until it has loaded.
+
+PageLoader then fetches the page the way a browser does: the document
+first, then the subresources in document order over a pool of 6
+persistent HTTP/1.1 connections, each object as soon as its
+dependencies have loaded.  The page load time (PLT) is the time until
+the last object has arrived.
+
+Usage:
+    python3 pageload.py build --index index.html --out pageload
+    python3 pageload.py fetch --server 10.0.0.1 --manifest pageload/manifest.json
+'''
+
+import json
+import os
+import re
+import threading
+from argparse import ArgumentParser
+from time import monotonic
+
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+BUNDLE_DIR = 'pageload'
+MANIFEST = 'manifest.json'
+CONNECTIONS = 6
+
+# Typical transfer sizes (bytes) by type, refined by name hints below
+TYPE_SIZES = {'css': 25000, 'js': 20000, 'gif': 1500, 'png': 8000, 'jpg': 18000}
+NAME_SIZES = [
+    (re.compile(r'Large|span', re.I), 60000),
+    (re.compile(r'thumb|moth', re.I), 6000),
+    (re.compile(r'icon|button|logo', re.I), 1000),
+]
+
+pat_tag = re.compile(r'<(script|link|img)\b([^>]*)>', re.I)
+pat_attr = re.compile(r'''\b(src|href|rel|async|defer)\b(?:\s*=\s*["']([^"']*)["'])?''', re.I)
+pat_url = re.compile(r'^https?://([^/]+)(/[^?#]*)')
+
+
+def _kind(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return 'jpg' if ext == 'jpeg' else ext
+
+
+def object_size(path):
+    kind = _kind(path)
+    if kind in ('gif', 'png', 'jpg'):
+        for pat, size in NAME_SIZES:
+            if pat.search(os.path.basename(path)):
+                return size
+    return TYPE_SIZES.get(kind, 10000)
+
+
+def extract_resources(html):
+    """(url, local path, blocking) of every subresource, in document
+    order and without duplicates (a browser fetches each URL once)."""
+    seen = set()
+    ret = []
+    for m in pat_tag.finditer(html):
+        tag = m.group(1).lower()
+        attrs = {k.lower(): (v if v is not None else True)
+                 for k, v in pat_attr.findall(m.group(2))}
+        if tag == 'link':
+            if 'stylesheet' not in str(attrs.get('rel', '')).lower():
+                continue
+            url = attrs.get('href')
+        else:
+            url = attrs.get('src')
+        if not isinstance(url, str):
+            continue
+        u = pat_url.match(url.replace('&amp;', '&'))
+        if not u or _kind(u.group(2)) not in TYPE_SIZES:
+            continue
+        path = '/%s/%s%s' % (BUNDLE_DIR, u.group(1), u.group(2))
+        if path in seen:
+            continue
+        seen.add(path)
+        blocking = tag == 'script' and 'async' not in attrs and 'defer' not in attrs
+        ret.append((url, path, blocking))
+    return ret
+
+
+def build_bundle(index='index.html', out=BUNDLE_DIR):
+    """Write the synthetic objects, the rewritten document and the
+    manifest under out.  Returns the manifest."""
+    with open(index) as f:
+        html = f.read()
+    resources = extract_resources(html)
+    objects = []
+    blocking = []
+    doc = '/%s/index.html' % BUNDLE_DIR
+    for url, path, is_blocking in resources:
+        size = object_size(path)
+        fname = os.path.join(out, path[len(BUNDLE_DIR) + 2:])
+        if not os.path.isdir(os.path.dirname(fname)):
+            os.makedirs(os.path.dirname(fname))
+        with open(fname, 'wb') as f:
+            f.write(os.urandom(size))
+        objects.append({'path': path, 'size': size, 'kind': _kind(path),
+                        'deps': [doc] + list(blocking)})
+        if is_blocking:
+            blocking.append(path)
+        html = html.replace(url, path).replace(url.replace('&', '&amp;'), path)
+    with open(os.path.join(out, 'index.html'), 'w') as f:
+        f.write(html)
+    manifest = {'document': doc, 'objects': objects}
+    with open(os.path.join(out, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class PageLoader(object):
+    """Loads a bundle over a pool of persistent HTTP/1.1 connections."""
+
+    def __init__(self, server, manifest, port=80, conns=CONNECTIONS, timeout=60):
+        self.server = server
+        self.port = port
+        self.manifest = manifest
+        self.conns = conns
+        self.timeout = timeout
+
+    def _get(self, conn, path):
+        conn.request('GET', path)
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            raise IOError("GET %s: %d" % (path, resp.status))
+        return len(body)
+
+    def load(self):
+        """Fetch the page; returns (PLT in seconds, per-object timings)."""
+        objects = self.manifest['objects']
+        done = set()
+        pending = list(objects)
+        timings = []
+        cond = threading.Condition()
+        errors = []
+        start = monotonic()
+
+        conns = [HTTPConnection(self.server, self.port, timeout=self.timeout)
+                 for _ in range(self.conns)]
+        t = monotonic()
+        self._get(conns[0], self.manifest['document'])
+        done.add(self.manifest['document'])
+        timings.append((self.manifest['document'], t - start, monotonic() - start))
+
+        def worker(conn):
+            while True:
+                with cond:
+                    while True:
+                        if errors or not pending:
+                            return
+                        ready = [o for o in pending if all(d in done for d in o['deps'])]
+                        if ready:
+                            # Document order among the discovered objects
+                            obj = ready[0]
+                            pending.remove(obj)
+                            break
+                        cond.wait()
+                t0 = monotonic()
+                try:
+                    self._get(conn, obj['path'])
+                except (IOError, OSError) as e:
+                    with cond:
+                        errors.append(e)
+                        cond.notify_all()
+                    return
+                with cond:
+                    done.add(obj['path'])
+                    timings.append((obj['path'], t0 - start, monotonic() - start))
+                    cond.notify_all()
+
+        threads = [threading.Thread(target=worker, args=(c,)) for c in conns]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        for c in conns:
+            c.close()
+        if errors:
+            raise errors[0]
+        return max(end for _, _, end in timings), timings
+
+
+def main():
+    parser = ArgumentParser(description="Browser-like page load emulation")
+    sub = parser.add_subparsers(dest='mode')
+    b = sub.add_parser('build', help="Mirror index.html's subresources locally")
+    b.add_argument('--index', default='index.html')
+    b.add_argument('--out', default=BUNDLE_DIR)
+    f = sub.add_parser('fetch', help="Load the page and print its load time (sec)")
+    f.add_argument('--server', required=True)
+    f.add_argument('--port', type=int, default=80)
+    f.add_argument('--conns', type=int, default=CONNECTIONS,
+                   help="Persistent connections per host")
+    f.add_argument('--manifest', default=os.path.join(BUNDLE_DIR, MANIFEST))
+    f.add_argument('--log', help="Write per-object start/end times (JSON)")
+    args = parser.parse_args()
+
+    if args.mode == 'build':
+        manifest = build_bundle(args.index, args.out)
+        total = sum(o['size'] for o in manifest['objects'])
+        print("%d objects, %d bytes" % (len(manifest['objects']), total))
+    elif args.mode == 'fetch':
+        with open(args.manifest) as fm:
+            manifest = json.load(fm)
+        plt, timings = PageLoader(args.server, manifest, args.port, args.conns).load()
+        if args.log:
+            with open(args.log, 'w') as fl:
+                json.dump([{'path': p, 'start': s, 'end': e} for p, s, e in timings], fl, indent=2)
+        print("%.4f" % plt)
+    else:
+        parser.error("mode must be build or fetch")
+
+
+if __name__ == "__main__":
+    main()
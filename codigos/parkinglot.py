@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+'''
+Multi-bottleneck parking-lot topology with per-hop queue monitoring.
+
+    hm1..hmN                                          rm1..rmN
+        \\                                             /
+         s1 ==hop1== s2 ==hop2== s3 ... ==hopK== s(K+1)
+         |           | |         | |              |
+        c1 -------> d1 c2 -----> d2 ...  cK ----> dK
+
+The main flows (one per --flows algorithm) cross every hop from s1 to
+s(K+1).  Cross traffic enters at s(j) and leaves at s(j+1), so each hop
+has its own congestion.  Every inter-switch link has its own bandwidth,
+delay and queue size (lists; the last value repeats for the remaining
+hops) and a queue monitor on the forward interface.
+
+After the run parkinglot_results.json holds, per hop, the queueing delay
+(backlog drained at the hop's rate, minus the packets netem holds for the
+propagation delay), drops and utilization; and per main flow, its
+throughput, RTT, base RTT and how much of its queueing delay each hop
+contributed.
+
+Usage:
+    sudo python3 parkinglot.py --hops 3 --bw 10 8 10 --delay 5 --maxq 100 \\
+        --flows reno bbr --cross reno --dir results/parkinglot
+'''
+
+from mininet.topo import Topo
+from mininet.node import CPULimitedHost
+from mininet.link import TCLink
+from mininet.net import Mininet
+from mininet.util import dumpNodeConnections
+
+from subprocess import Popen
+from time import sleep
+from multiprocessing import Process
+from argparse import ArgumentParser
+import os
+import json
+
+import numpy as np
+
+from monitor import monitor_qlen
+import iperf
+import memo
+import scheduler
+from analyze_competition import parse_ping_results, parse_queue_stats, bottleneck_qdisc
+
+ACCESS_DELAY_MS = 1
+
+
+def per_hop(values, hops):
+    """Expand a per-hop option: the last value repeats."""
+    return [values[min(i, len(values) - 1)] for i in range(hops)]
+
+
+class ParkingLotTopo(Topo):
+    """K hops in a chain, main flows end to end, cross traffic per hop."""
+
+    def build(self, hops=2, bw=(10,), delay=(10,), maxq=(100,), flows=2,
+              cross=1, bw_host=1000):
+        switches = [self.addSwitch('s%d' % (i + 1)) for i in range(hops + 1)]
+        for j in range(hops):
+            self.addLink(switches[j], switches[j + 1],
+                         bw=bw[j], delay='%fms' % delay[j], max_queue_size=maxq[j])
+        access = dict(bw=bw_host, delay='%dms' % ACCESS_DELAY_MS)
+        for i in range(flows):
+            self.addLink(self.addHost('hm%d' % (i + 1)), switches[0], **access)
+            self.addLink(switches[-1], self.addHost('rm%d' % (i + 1)), **access)
+        for j in range(hops):
+            for c in range(cross):
+                self.addLink(self.addHost('c%d_%d' % (j + 1, c + 1)), switches[j], **access)
+                self.addLink(switches[j + 1], self.addHost('d%d_%d' % (j + 1, c + 1)), **access)
+
+
+def hop_interfaces(net, hops):
+    """Forward interface (on s(j), towards s(j+1)) of every hop."""
+    ifaces = []
+    for j in range(hops):
+        a, b = net.get('s%d' % (j + 1), 's%d' % (j + 2))
+        link = net.linksBetween(a, b)[0]
+        ifaces.append(link.intf1.name if link.intf1.node == a else link.intf2.name)
+    return ifaces
+
+
+def set_cc(host, algorithm):
+    host.cmd("sysctl -w net.ipv4.tcp_congestion_control=%s" % algorithm)
+
+
+def run(args, bw, delay, maxq):
+    topo = ParkingLotTopo(hops=args.hops, bw=bw, delay=delay, maxq=maxq,
+                          flows=len(args.flows), cross=args.cross_flows if args.cross != 'none' else 0,
+                          bw_host=args.bw_host)
+    net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink)
+    net.start()
+    dumpNodeConnections(net.hosts)
+
+    ifaces = hop_interfaces(net, args.hops)
+    monitors = []
+    for j, iface in enumerate(ifaces):
+        print("Monitoring hop %d on %s" % (j + 1, iface))
+        mon = Process(target=monitor_qlen,
+                      args=(iface, 0.1, '%s/hop%d_queue.txt' % (args.dir, j + 1),
+                            '%s/hop%d_queue_stats.csv' % (args.dir, j + 1)))
+        mon.start()
+        monitors.append(mon)
+
+    sched = scheduler.FlowScheduler('%s/flow_schedule.csv' % args.dir)
+    servers, pings = [], []
+    ext = iperf.output_ext(args.tool)
+    port = 5001
+    for i, algo in enumerate(args.flows):
+        src, dst = net.get('hm%d' % (i + 1), 'rm%d' % (i + 1))
+        set_cc(src, algo)
+        name = '%s_main_%d' % (algo, i + 1)
+        servers.append(dst.popen(iperf.server_cmd(args.tool, port)))
+        pings.append(src.popen("ping -i 0.1 -c %d %s > %s/ping_%s.txt" %
+                               (args.time * 10, dst.IP(), args.dir, name), shell=True))
+        sched.add(name, src, iperf.client_cmd(args.tool, dst.IP(), port, args.time, 1,
+                                              '%s/%s_output%s' % (args.dir, name, ext)))
+        port += 1
+    if args.cross != 'none':
+        for j in range(args.hops):
+            for c in range(args.cross_flows):
+                src = net.get('c%d_%d' % (j + 1, c + 1))
+                dst = net.get('d%d_%d' % (j + 1, c + 1))
+                set_cc(src, args.cross)
+                name = '%s_cross_hop%d_%d' % (args.cross, j + 1, c + 1)
+                servers.append(dst.popen(iperf.server_cmd(args.tool, port)))
+                sched.add(name, src, iperf.client_cmd(args.tool, dst.IP(), port, args.time, 1,
+                                                      '%s/%s_output%s' % (args.dir, name, ext)))
+                port += 1
+    sleep(1)
+
+    try:
+        sched.run()
+        sched.wait()
+    finally:
+        sched.terminate()
+        for p in pings + servers:
+            if p.poll() is None:
+                p.terminate()
+        for mon in monitors:
+            mon.terminate()
+        net.stop()
+        Popen("pgrep -f 'iperf' | xargs -r kill -9", shell=True).wait()
+
+
+def analyze(args, bw, delay, maxq):
+    """Per-hop queueing delay and per-flow throughput/RTT breakdown."""
+    hops = []
+    for j in range(args.hops):
+        qstats = parse_queue_stats('%s/hop%d_queue_stats.csv' % (args.dir, j + 1), bw[j], maxq[j],
+                                   delay[j])
+        q = bottleneck_qdisc(qstats)
+        hop = {'hop': j + 1, 'bw': bw[j], 'delay_ms': delay[j], 'maxq': maxq[j]}
+        if q:
+            qdelay = np.array(q['queueing_delay_ms'])
+            hop.update({
+                'avg_queueing_delay_ms': float(qdelay.mean()),
+                'p95_queueing_delay_ms': float(np.percentile(qdelay, 95)),
+                'avg_backlog_pkts': q['avg_backlog_pkts'],
+                'drops': q['drops'],
+                'drop_rate': q['drop_rate'],
+                'utilization': q.get('utilization'),
+            })
+        hops.append(hop)
+
+    total_q = sum(h.get('avg_queueing_delay_ms', 0) for h in hops)
+    base_rtt = 2 * (sum(delay) + 2 * ACCESS_DELAY_MS)
+    flows = {}
+    for f in sorted(os.listdir(args.dir)):
+        name = iperf.flow_name(f)
+        if not name:
+            continue
+        tput = iperf.read_throughputs(os.path.join(args.dir, f))
+        flow = {'avg_throughput': float(np.mean(tput)) if tput else 0.0}
+        if '_main_' in name:
+            flow['hops'] = list(range(1, args.hops + 1))
+            flow['base_rtt_ms'] = base_rtt
+            ping = parse_ping_results('%s/ping_%s.txt' % (args.dir, name))
+            if ping:
+                flow['avg_rtt_ms'] = float(ping['avg_rtt'])
+                flow['min_rtt_ms'] = float(ping['min_rtt'])
+            flow['queueing_by_hop_ms'] = {str(h['hop']): h.get('avg_queueing_delay_ms', 0)
+                                          for h in hops}
+            flow['queueing_share_by_hop'] = {
+                str(h['hop']): h.get('avg_queueing_delay_ms', 0) / total_q if total_q else 0
+                for h in hops}
+        else:
+            flow['hops'] = [int(name.split('hop')[1].split('_')[0])]
+        flows[name] = flow
+
+    results = {
+        'configuration': {'hops': args.hops, 'bw': bw, 'delay': delay, 'maxq': maxq,
+                          'flows': args.flows, 'cross': args.cross,
+                          'cross_flows': args.cross_flows, 'duration': args.time},
+        'hops': hops,
+        'flows': flows,
+    }
+    with open('%s/parkinglot_results.json' % args.dir, 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def print_summary(results):
+    print("\n" + "=" * 50)
+    print("PARKING LOT RESULTS")
+    print("=" * 50)
+    for h in results['hops']:
+        print("Hop %d (%g Mb/s, %g ms, q=%d): queueing %.1f ms avg, %.1f ms p95, %s drops" %
+              (h['hop'], h['bw'], h['delay_ms'], h['maxq'], h.get('avg_queueing_delay_ms', 0),
+               h.get('p95_queueing_delay_ms', 0), h.get('drops', '-')))
+    for name, fl in results['flows'].items():
+        line = "%-24s %.2f Mbps" % (name, fl['avg_throughput'])
+        if 'avg_rtt_ms' in fl:
+            line += "  RTT %.1f ms (base %.1f)" % (fl['avg_rtt_ms'], fl['base_rtt_ms'])
+            line += "  by hop: " + ', '.join('%s=%.0f%%' % (h, s * 100)
+                                            for h, s in fl['queueing_share_by_hop'].items())
+        print(line)
+
+
+def main():
+    parser = ArgumentParser(description="Parking-lot (multi-bottleneck) TCP competition")
+    parser.add_argument('--hops', '-k', type=int, default=2,
+                        help="Number of inter-switch links")
+    parser.add_argument('--bw', '-b', type=float, nargs='+', default=[10],
+                        help="Bandwidth of each hop (Mb/s); the last value repeats")
+    parser.add_argument('--delay', type=float, nargs='+', default=[10],
+                        help="Propagation delay of each hop (ms)")
+    parser.add_argument('--maxq', type=int, nargs='+', default=[100],
+                        help="Queue size of each hop (packets)")
+    parser.add_argument('--bw-host', '-B', type=float, default=1000,
+                        help="Bandwidth of access links (Mb/s)")
+    parser.add_argument('--flows', nargs='+', default=['reno', 'bbr'],
+                        help="Congestion control of each end-to-end flow")
+    parser.add_argument('--cross', default='reno',
+                        help="Congestion control of the per-hop cross traffic ('none' to disable)")
+    parser.add_argument('--cross-flows', type=int, default=1,
+                        help="Cross-traffic flows per hop")
+    parser.add_argument('--tool', choices=iperf.TOOLS, default='iperf')
+    parser.add_argument('--time', '-t', type=int, default=30)
+    parser.add_argument('--dir', '-d', required=True)
+    parser.add_argument('--force', action='store_true',
+                        help="Run even if a complete result of this exact configuration exists")
+    args = parser.parse_args()
+
+    bw, delay, maxq = (per_hop(args.bw, args.hops), per_hop(args.delay, args.hops),
+                       per_hop(args.maxq, args.hops))
+    if not os.path.exists(args.dir):
+        os.makedirs(args.dir)
+
+    config = {k: v for k, v in vars(args).items() if k not in ('dir', 'force')}
+    config.update(experiment='parkinglot', bw=bw, delay=delay, maxq=maxq,
+                  access_delay_ms=ACCESS_DELAY_MS)
+    run_hash, fingerprint, cached = memo.lookup(args.dir, config, ['parkinglot_results.json'],
+                                                args.force)
+    if cached:
+        print("Reusing results of identical run %s from %s (use --force to re-run)" %
+              (run_hash[:12], cached))
+        memo.reuse(cached, args.dir)
+        with open('%s/parkinglot_results.json' % args.dir) as f:
+            print_summary(json.load(f))
+        return
+
+    run(args, bw, delay, maxq)
+    print_summary(analyze(args, bw, delay, maxq))
+    memo.write_meta(args.dir, run_hash, fingerprint)
+
+
+if __name__ == "__main__":
+    main()
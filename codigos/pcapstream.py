@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+'''
+Bottleneck packet capture and a memory-bounded streaming pcap analyzer.
+
+start_capture() runs tcpdump on the bottleneck interface with a small
+snaplen (headers only) and a ring of fixed-size files.  analyze_pcaps()
+then walks those files record by record through one reusable buffer,
+decodes only the Ethernet/IPv4/TCP header fields it needs with
+struct.unpack_from and keeps a constant amount of state per flow.  Every
+`window` seconds it emits per-flow throughput, retransmissions and
+inter-packet time statistics in the shared trace format (flowtrace.py),
+so memory does not grow with the size of the capture.
+
+Usage:
+    python3 pcapstream.py --out pcap_trace.csv --window 0.1 results/x/bottleneck.pcap*
+'''
+
+import glob
+import math
+import os
+import socket
+import struct
+from argparse import ArgumentParser
+from subprocess import Popen
+
+from flowtrace import TraceWriter
+
+TRACE_FIELDS = ['throughput_mbps', 'retransmits', 'pkts', 'iat_mean_ms',
+                'iat_std_ms', 'iat_max_ms']
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+
+# Enough for Ethernet + VLAN + IPv4 options + TCP options
+DEFAULT_SNAPLEN = 128
+
+
+def start_capture(iface, prefix, snaplen=DEFAULT_SNAPLEN, filesize_mb=100,
+                  files=10, node=None):
+    """Capture TCP headers on iface into a ring of `files` files of
+    `filesize_mb` MB each (prefix.pcap0, prefix.pcap1, ...).
+
+    Switch interfaces live in the root namespace, so node is only needed
+    to capture on a host interface.
+    """
+    # -Z root: keep writing into the (root-owned) results directory
+    cmd = ("tcpdump -i %s -n -Z root -s %d -B 16384 -C %d -W %d -w %s.pcap tcp" %
+           (iface, snaplen, filesize_mb, files, prefix))
+    if node is not None:
+        return node.popen(cmd, shell=True)
+    return Popen(cmd, shell=True)
+
+
+def ring_files(prefix):
+    """Capture files of a ring, oldest first."""
+    files = glob.glob(prefix + '.pcap*')
+    return sorted(files, key=lambda f: (os.path.getmtime(f), f))
+
+
+class _FlowWindow(object):
+    __slots__ = ('label', 'bytes', 'pkts', 'retrans', 'max_seq',
+                 'last_ts', 'iat_n', 'iat_sum', 'iat_sq', 'iat_max')
+
+    def __init__(self, label):
+        self.label = label
+        self.max_seq = None
+        self.last_ts = None
+        self.reset()
+
+    def reset(self):
+        self.bytes = 0
+        self.pkts = 0
+        self.retrans = 0
+        self.iat_n = 0
+        self.iat_sum = 0.0
+        self.iat_sq = 0.0
+        self.iat_max = 0.0
+
+
+def _seq_after(a, b):
+    """True if 32-bit sequence number a is after b (RFC 1982)."""
+    return ((a - b) & 0xffffffff) < 0x80000000 and a != b
+
+
+class PcapFlowAnalyzer(object):
+    """Windowed per-flow statistics over a stream of pcap records."""
+
+    def __init__(self, writer, window=0.1, labels=None):
+        self.writer = writer
+        self.window = window
+        self.labels = labels or {}
+        self.flows = {}
+        self.window_end = None
+        self.buf = bytearray(65536)
+        self.hdr = bytearray(16)
+
+    def add_file(self, fname):
+        with open(fname, 'rb') as f:
+            ghdr = f.read(24)
+            if len(ghdr) < 24:
+                return
+            magic = ghdr[:4]
+            if magic in (b'\xd4\xc3\xb2\xa1', b'\x4d\x3c\xb2\xa1'):
+                endian = '<'
+            elif magic in (b'\xa1\xb2\xc3\xd4', b'\xa1\xb2\x3c\x4d'):
+                endian = '>'
+            else:
+                raise ValueError("%s: not a pcap file (pcapng is not supported)" % fname)
+            tsdiv = 1e9 if magic in (b'\x4d\x3c\xb2\xa1', b'\xa1\xb2\x3c\x4d') else 1e6
+            linktype = struct.unpack(endian + 'I', ghdr[20:24])[0] & 0x0fffffff
+            rec = struct.Struct(endian + 'IIII')
+            hdr, buf = self.hdr, self.buf
+            while f.readinto(hdr) == 16:
+                sec, frac, incl, orig = rec.unpack(hdr)
+                if incl > len(buf):
+                    buf = self.buf = bytearray(incl)
+                if f.readinto(memoryview(buf)[:incl]) < incl:
+                    break
+                self._packet(sec + frac / tsdiv, buf, incl, orig, linktype)
+        return
+
+    def _packet(self, ts, buf, incl, orig, linktype):
+        if linktype == LINKTYPE_ETHERNET:
+            off = 14
+            ethertype = (buf[12] << 8) | buf[13]
+            if ethertype == ETH_P_8021Q:
+                ethertype = (buf[16] << 8) | buf[17]
+                off = 18
+        elif linktype == LINKTYPE_LINUX_SLL:
+            off = 16
+            ethertype = (buf[14] << 8) | buf[15]
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            off = 20
+            ethertype = (buf[0] << 8) | buf[1]
+        else:
+            return
+        if ethertype != ETH_P_IP or incl < off + 20:
+            return
+        ihl = (buf[off] & 0x0f) * 4
+        if buf[off + 9] != socket.IPPROTO_TCP:
+            return
+        tcp = off + ihl
+        if incl < tcp + 14:
+            return
+        tot_len = (buf[off + 2] << 8) | buf[off + 3]
+        doff = (buf[tcp + 12] >> 4) * 4
+        payload = tot_len - ihl - doff
+        if payload <= 0:
+            # Pure ACKs say nothing about the data direction's rate
+            return
+
+        if self.window_end is None:
+            self.window_end = ts + self.window
+        if ts >= self.window_end:
+            self._emit()
+            if ts >= self.window_end:
+                # Idle gap: skip the empty windows in one step
+                skip = math.floor((ts - self.window_end) / self.window) + 1
+                self.window_end += skip * self.window
+
+        key = bytes(buf[off + 12:off + 20]) + bytes(buf[tcp:tcp + 4])
+        fl = self.flows.get(key)
+        if fl is None:
+            fl = self.flows[key] = _FlowWindow(self._label(key))
+        seq = struct.unpack_from('>I', buf, tcp + 4)[0]
+        end = (seq + payload) & 0xffffffff
+
+        fl.bytes += orig
+        fl.pkts += 1
+        if fl.max_seq is None or _seq_after(end, fl.max_seq):
+            fl.max_seq = end
+        else:
+            fl.retrans += 1
+        if fl.last_ts is not None:
+            iat = ts - fl.last_ts
+            fl.iat_n += 1
+            fl.iat_sum += iat
+            fl.iat_sq += iat * iat
+            if iat > fl.iat_max:
+                fl.iat_max = iat
+        fl.last_ts = ts
+
+    def _label(self, key):
+        src, dst = socket.inet_ntoa(key[0:4]), socket.inet_ntoa(key[4:8])
+        sport, dport = struct.unpack('>HH', key[8:12])
+        if dport in self.labels:
+            return self.labels[dport]
+        return '%s:%d-%s:%d' % (src, sport, dst, dport)
+
+    def _emit(self):
+        t = self.window_end
+        for fl in self.flows.values():
+            if fl.pkts == 0:
+                continue
+            row = {
+                'throughput_mbps': fl.bytes * 8 / self.window / 1e6,
+                'retransmits': fl.retrans,
+                'pkts': fl.pkts,
+            }
+            if fl.iat_n:
+                mean = fl.iat_sum / fl.iat_n
+                var = max(fl.iat_sq / fl.iat_n - mean * mean, 0.0)
+                row['iat_mean_ms'] = mean * 1000
+                row['iat_std_ms'] = math.sqrt(var) * 1000
+                row['iat_max_ms'] = fl.iat_max * 1000
+            self.writer.write(t, fl.label, row)
+            fl.reset()
+        self.window_end += self.window
+
+    def finish(self):
+        if self.window_end is not None:
+            self._emit()
+
+
+def analyze_pcaps(files, outfile, window=0.1, labels=None):
+    """Stream the given capture files (in order) into a trace file."""
+    with TraceWriter(outfile, TRACE_FIELDS) as w:
+        analyzer = PcapFlowAnalyzer(w, window, labels)
+        for fname in files:
+            analyzer.add_file(fname)
+        analyzer.finish()
+    return outfile
+
+
+def main():
+    parser = ArgumentParser(description="Streaming per-flow pcap analyzer")
+    parser.add_argument('files', nargs='+', help="pcap files, oldest first")
+    parser.add_argument('--out', '-o', required=True, help="Output trace file")
+    parser.add_argument('--window', '-w', type=float, default=0.1,
+                        help="Statistics window (sec)")
+    args = parser.parse_args()
+    analyze_pcaps(args.files, args.out, args.window)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+'''
+BDP-normalized sweep planner.
+
+config.sh fixes the duration (60 s) and the ping/queue sampling (0.1 s)
+whatever the link, which oversamples a 1.5 Mb/s, 10 ms run in time and
+undersamples a 100 Mb/s, 200 ms one.  The planner expands a grid of
+bandwidths x delays x buffer sizes x algorithms into concrete
+bufferbloat.py or tcp_competition.py jobs whose parameters follow from
+each configuration's base RTT and bandwidth-delay product:
+
+    maxq        --bdp multiples of the BDP of queue, in packets, plus the
+                packets in the bottleneck netem's delay line (netem's
+                limit also counts those: bw * the link's delay), or
+                --maxq as is
+    duration    slow start plus --cycles congestion cycles, at least
+                --rtts base RTTs, within [--min-time, --max-time]:
+                  reno   a sawtooth lasts W/2 RTTs (W = (BDP + maxq) / flows)
+                  cubic  K = cbrt(W * (1 - beta) / C) seconds
+                  bbr    8-RTT gain cycle; runs of 10 s or more include
+                         a ProbeRTT
+    sampling    ping and queue intervals as fractions of the base RTT
+                (--ping-frac, --queue-frac), no finer than ping (2 ms)
+                or the queue monitor (20 ms: it forks tc through a shell
+                per sample; compare monitor_timing in run_meta.json) and
+                no more than --max-samples per run.  plot_ping.py reads
+                each run's ping interval from its run_meta.json
+
+Before anything runs it prints every job with its duration, sampling and
+estimated wall time (emulation plus --overhead per run on Mininet;
+from the packet rate on --backend sim) and the total, and saves the plan
+to plan.json.  --enqueue adds the jobs to a sweep.py queue; --budget
+refuses to enqueue a plan whose estimate exceeds it.
+
+Usage:
+    python3 planner.py --experiment bufferbloat --bw 1.5 10 100 --delay 10 50 200 \\
+        --bdp 0.5 1 4 --cong reno bbr --dir results/plan
+    python3 planner.py --experiment competition --bw 10 100 --delay 10 100 --bdp 1 4 \\
+        --scenario reno_vs_bbr 2reno_vs_1bbr --dir results/plan --enqueue results/q --budget 7200
+'''
+
+import itertools
+import json
+import math
+import os
+import sys
+from argparse import ArgumentParser, REMAINDER
+
+import fluidsim
+import sweep
+
+MTU_BYTES = 1500
+IW = 10
+CUBIC_C = 0.4
+CUBIC_BETA = 0.7
+BBR_CYCLE_RTTS = 8
+BBR_PROBE_RTT_PERIOD = 10.0
+# ping (as root) and the queue monitor's tc polling: a shell and a tc
+# fork per sample take several ms, and more on a loaded box (the p99 lag
+# of monitor_timing), so finer intervals are not honoured
+MIN_PING_INTERVAL = 0.002
+MIN_QUEUE_INTERVAL = 0.02
+# packetsim.py events per wall-clock second, in packets of the bottleneck
+SIM_PACKET_RATE = 35000.0
+SIM_STARTUP = 0.5
+
+EXPERIMENTS = {
+    'bufferbloat': {'script': 'bufferbloat.py', 'expect': ['q.txt', 'ping.txt']},
+    'competition': {'script': 'tcp_competition.py', 'expect': ['competition_results.json']},
+}
+
+
+def base_rtt_ms(experiment, delay):
+    """Base RTT (ms): BBTopo has delay/2 on each of two links; the
+    competition path adds 1 ms access and receiver links to --delay."""
+    if experiment == 'bufferbloat':
+        return 2.0 * delay
+    return 2.0 * (fluidsim.ACCESS_DELAY_MS + delay + fluidsim.RECEIVER_DELAY_MS)
+
+
+def bdp_packets(bw_mbps, rtt_ms):
+    return bw_mbps * 1e6 * rtt_ms / 1000.0 / (8 * MTU_BYTES)
+
+
+def delay_line_packets(experiment, bw, delay):
+    """Packets held by the bottleneck netem's delay on a busy link: netem's
+    limit counts them with the queue.  BBTopo's bottleneck has delay/2,
+    CompetitionTopo's s1-s2 link --delay."""
+    link_ms = delay / 2.0 if experiment == 'bufferbloat' else delay
+    return bdp_packets(bw, link_ms)
+
+
+def cycle_time(algorithm, rtt, window):
+    """Length (sec) of one congestion cycle of a flow with `window`
+    packets in flight at its peak."""
+    if algorithm == 'bbr':
+        return BBR_CYCLE_RTTS * rtt
+    if algorithm == 'cubic':
+        return max(rtt, (window * (1 - CUBIC_BETA) / CUBIC_C) ** (1 / 3.0))
+    return max(rtt, rtt * window / 2.0)
+
+
+def convergence_time(algorithms, rtt, bdp, maxq):
+    """Slow start plus one congestion cycle of the slowest algorithm (sec)."""
+    window = max((bdp + maxq) / len(algorithms), 1.0)
+    slow_start = rtt * math.log2(max(window / IW, 2.0))
+    return slow_start, max(cycle_time(a, rtt, window) for a in set(algorithms))
+
+
+def plan_job(experiment, bw, delay, maxq, algorithms, opts):
+    """Duration, sampling and cost of one configuration."""
+    rtt_ms = base_rtt_ms(experiment, delay)
+    rtt = rtt_ms / 1000.0
+    bdp = bdp_packets(bw, rtt_ms)
+    queue_pkts = max(maxq - delay_line_packets(experiment, bw, delay), 0)
+    slow_start, cycle = convergence_time(algorithms, rtt, bdp, queue_pkts)
+    wanted = max(slow_start + opts.cycles * cycle, opts.rtts * rtt)
+    if 'bbr' in algorithms:
+        wanted = max(wanted, BBR_PROBE_RTT_PERIOD)
+    duration = int(math.ceil(min(max(wanted, opts.min_time), opts.max_time)))
+    ping = max(MIN_PING_INTERVAL, rtt * opts.ping_frac, duration / float(opts.max_samples))
+    queue = max(MIN_QUEUE_INTERVAL, rtt * opts.queue_frac, duration / float(opts.max_samples))
+    if opts.backend == 'sim':
+        estimate = SIM_STARTUP + bw * 1e6 * duration / (8 * MTU_BYTES) / SIM_PACKET_RATE
+    else:
+        estimate = duration + opts.overhead
+    return {'rtt_ms': rtt_ms, 'bdp_packets': bdp, 'maxq': maxq, 'queue_packets': queue_pkts,
+            'slow_start_s': slow_start, 'cycle_s': cycle, 'duration': duration,
+            'capped': wanted > opts.max_time,
+            'ping_interval': round(ping, 3), 'queue_interval': round(queue, 3),
+            'estimate_s': estimate}
+
+
+def expand(opts, extra):
+    """Every grid point as a job: its parameters and command line."""
+    exp = EXPERIMENTS[opts.experiment]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), exp['script'])
+    if opts.experiment == 'bufferbloat':
+        variants = [(c, [c]) for c in opts.cong]
+    else:
+        variants = [(s, fluidsim.SCENARIOS[s]) for s in opts.scenario]
+    jobs = []
+    for bw, delay, (name, algorithms) in itertools.product(opts.bw, opts.delay, variants):
+        bdp = bdp_packets(bw, base_rtt_ms(opts.experiment, delay))
+        line = delay_line_packets(opts.experiment, bw, delay)
+        sizes = opts.maxq or [max(1, int(round(m * bdp + line))) for m in opts.bdp]
+        for maxq in sorted(set(sizes)):
+            job = plan_job(opts.experiment, bw, delay, maxq, algorithms, opts)
+            run_dir = os.path.join(opts.dir, '%s_%s_bw%g_d%g_q%d' % (
+                opts.experiment, name, bw, delay, maxq))
+            cmd = [sys.executable, script, '--bw-net', '%g' % bw, '--delay', '%g' % delay,
+                   '--maxq', str(maxq), '--time', str(job['duration']),
+                   '--ping-interval', '%g' % job['ping_interval'],
+                   '--queue-interval', '%g' % job['queue_interval'], '--dir', run_dir]
+            cmd += ['--cong', name] if opts.experiment == 'bufferbloat' else ['--scenario', name]
+            if opts.backend == 'sim':
+                cmd += ['--backend', 'sim']
+            job.update(experiment=opts.experiment, variant=name, bw=bw, delay=delay,
+                       maxq_bdp=job['queue_packets'] / bdp, dir=run_dir, cmd=cmd + extra)
+            jobs.append(job)
+    return jobs
+
+
+def format_duration(sec):
+    h, rest = divmod(int(round(sec)), 3600)
+    m, s = divmod(rest, 60)
+    return '%dh%02dm%02ds' % (h, m, s) if h else '%dm%02ds' % (m, s)
+
+
+def print_plan(jobs, workers):
+    print("%-14s %7s %6s %7s %6s %6s %6s %6s %7s %7s %9s" % (
+        'variant', 'bw', 'delay', 'RTT ms', 'BDP', 'maxq', 'q/BDP', 'time', 'ping', 'queue',
+        'estimate'))
+    for j in jobs:
+        print("%-14s %7g %6g %7.1f %6.1f %6d %6.2f %5ds%1s %7.3f %7.3f %9s" % (
+            j['variant'], j['bw'], j['delay'], j['rtt_ms'], j['bdp_packets'], j['maxq'],
+            j['maxq_bdp'],
+            j['duration'], '*' if j['capped'] else '', j['ping_interval'],
+            j['queue_interval'], format_duration(j['estimate_s'])))
+    total = sum(j['estimate_s'] for j in jobs)
+    print("\n%d jobs, %s of runs in total" % (len(jobs), format_duration(total)))
+    if workers > 1:
+        print("~%s with %d workers" % (format_duration(total / workers), workers))
+    if any(j['capped'] for j in jobs):
+        print("* capped at --max-time before the estimated convergence")
+    return total
+
+
+def main():
+    parser = ArgumentParser(description="Expand a sweep grid into BDP-normalized jobs")
+    parser.add_argument('--experiment', choices=sorted(EXPERIMENTS), default='bufferbloat')
+    parser.add_argument('--dir', '-d', required=True, help="Parent directory of the runs")
+    parser.add_argument('--bw', type=float, nargs='+', required=True,
+                        help="Bottleneck bandwidths (Mb/s)")
+    parser.add_argument('--delay', type=float, nargs='+', required=True,
+                        help="Bottleneck delays (ms), as the experiment's --delay")
+    parser.add_argument('--bdp', type=float, nargs='+', default=[0.5, 1, 4],
+                        help="Queue sizes in BDP multiples (maxq adds netem's delay line)")
+    parser.add_argument('--maxq', type=int, nargs='+', default=None,
+                        help="Buffer sizes in packets (instead of --bdp)")
+    parser.add_argument('--cong', nargs='+', default=['reno', 'bbr'],
+                        help="bufferbloat: congestion controls")
+    parser.add_argument('--scenario', nargs='+', default=['reno_vs_bbr'],
+                        choices=sorted(s for s in fluidsim.SCENARIOS if not fluidsim.single_flow(s)),
+                        help="competition: scenarios")
+    parser.add_argument('--backend', choices=['mininet', 'sim'], default='mininet')
+    parser.add_argument('--cycles', type=float, default=5,
+                        help="Congestion cycles after slow start")
+    parser.add_argument('--rtts', type=float, default=500,
+                        help="Minimum duration in base RTTs")
+    parser.add_argument('--min-time', type=float, default=10)
+    parser.add_argument('--max-time', type=float, default=300)
+    parser.add_argument('--ping-frac', type=float, default=0.5,
+                        help="Ping interval as a fraction of the base RTT")
+    parser.add_argument('--queue-frac', type=float, default=0.25,
+                        help="Queue sampling interval as a fraction of the base RTT")
+    parser.add_argument('--max-samples', type=int, default=20000,
+                        help="Upper bound on ping/queue samples per run")
+    parser.add_argument('--overhead', type=float, default=15,
+                        help="Setup and teardown seconds per Mininet run")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Parallel workers, for the wall-time estimate")
+    parser.add_argument('--enqueue', default=None, metavar='QUEUE',
+                        help="Add the jobs to this sweep.py queue")
+    parser.add_argument('--budget', type=float, default=None,
+                        help="Refuse to enqueue a plan estimated above this many seconds")
+    parser.add_argument('extra', nargs=REMAINDER,
+                        help="Extra options for every job, after --")
+    opts = parser.parse_args()
+    extra = opts.extra[1:] if opts.extra and opts.extra[0] == '--' else opts.extra
+
+    if opts.experiment == 'bufferbloat' and opts.backend == 'sim':
+        import packetsim
+        unknown = [c for c in opts.cong if c not in packetsim.CONGESTION_CONTROL]
+        if unknown:
+            parser.error("--backend sim supports --cong %s" % '/'.join(sorted(packetsim.CONGESTION_CONTROL)))
+
+    jobs = expand(opts, extra)
+    total = print_plan(jobs, opts.workers if opts.backend == 'sim' else 1)
+    os.makedirs(opts.dir, exist_ok=True)
+    with open(os.path.join(opts.dir, 'plan.json'), 'w') as f:
+        json.dump({'experiment': opts.experiment, 'backend': opts.backend,
+                   'estimate_s': total, 'jobs': jobs}, f, indent=2)
+
+    if opts.enqueue:
+        if opts.budget is not None and total > opts.budget:
+            print("Estimate %s exceeds the budget of %s: nothing enqueued" %
+                  (format_duration(total), format_duration(opts.budget)))
+            sys.exit(1)
+        queue = sweep.JobQueue(opts.enqueue)
+        exclusive = None if opts.backend == 'sim' else 'mininet'
+        added = sum(1 for j in jobs if queue.add(j['cmd'], j['dir'],
+                                                 EXPERIMENTS[opts.experiment]['expect'],
+                                                 exclusive=exclusive))
+        print("%d job(s) added to %s, %d already queued" % (added, opts.enqueue, len(jobs) - added))
+
+
+if __name__ == "__main__":
+    main()
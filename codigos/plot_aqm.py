@@ -0,0 +1,132 @@
+'''
+Compare queue disciplines side by side: RTT, web fetch time, queue
+occupancy and drops/ECN marks of several result directories (e.g.
+drop-tail q=100, drop-tail q=20, fq_codel, codel, pie, cake).
+'''
+from helper import *
+import plot_defaults
+import glob
+
+from matplotlib.ticker import MaxNLocator
+from pylab import figure
+
+from flowtrace import read_trace
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--dirs', '-d',
+                    help="Result directories to compare",
+                    required=True,
+                    nargs='+')
+
+parser.add_argument('--labels', '-l',
+                    help="Labels for each directory; directory names used as default.",
+                    nargs='+',
+                    default=None)
+
+parser.add_argument('--out', '-o',
+                    help="Output png file for the plot.",
+                    default=None) # Will show the plot
+
+args = parser.parse_args()
+
+if args.labels is None:
+    args.labels = [os.path.basename(os.path.normpath(d)) for d in args.dirs]
+
+def first_existing(d, names):
+    for n in names:
+        path = os.path.join(d, n)
+        if os.path.exists(path):
+            return path
+    return None
+
+def parse_rtts(d):
+    rtts = []
+    for fname in sorted(glob.glob(os.path.join(d, 'ping*.txt'))):
+        for line in open(fname):
+            if 'time=' not in line:
+                continue
+            try:
+                rtts.append(float(line.split('time=')[1].split()[0]))
+            except ValueError:
+                continue
+    return rtts
+
+def parse_fetch_times(d):
+    fname = os.path.join(d, 'fetch_stats.txt')
+    if not os.path.exists(fname):
+        return []
+    for line in open(fname):
+        if line.startswith('All fetch times:'):
+            values = line.split(':', 1)[1].strip().strip('[]')
+            return [float(v) for v in values.split(',') if v.strip()]
+    return []
+
+def parse_qlen(d):
+    fname = first_existing(d, ['q.txt', 'queue.txt'])
+    if not fname:
+        return [], []
+    data = read_list(fname)
+    if not data:
+        return [], []
+    t = list(map(float, col(0, data)))
+    q = list(map(float, col(1, data)))
+    return [x - t[0] for x in t], q
+
+def drops_and_marks(d):
+    """Drops and ECN marks of the deepest qdisc (the one holding the queue)."""
+    fname = first_existing(d, ['q_stats.csv', 'queue_stats.csv'])
+    if not fname:
+        return 0, 0
+    stats = read_trace(fname)
+    if not stats:
+        return 0, 0
+    leaf = list(stats.values())[-1]
+    drops = (leaf['dropped'][-1] or 0) - (leaf['dropped'][0] or 0)
+    marks = leaf.get('ecn_marks', [None])
+    marks = (marks[-1] or 0) - (marks[0] or 0)
+    return drops, marks
+
+m.rc('figure', figsize=(16, 12))
+fig = figure()
+ax_rtt = fig.add_subplot(221)
+ax_fetch = fig.add_subplot(222)
+ax_q = fig.add_subplot(223)
+ax_drop = fig.add_subplot(224)
+x = list(range(len(args.dirs)))
+
+rtts = [parse_rtts(d) or [0] for d in args.dirs]
+ax_rtt.boxplot(rtts, sym='')
+ax_rtt.set_xticks([i + 1 for i in x])
+ax_rtt.set_xticklabels(args.labels, rotation=30)
+ax_rtt.set_ylabel("RTT (ms)")
+
+fetch = [parse_fetch_times(d) for d in args.dirs]
+ax_fetch.bar(x, [avg(f) if f else 0 for f in fetch],
+             yerr=[stdev(f) if len(f) > 1 else 0 for f in fetch], color='gray')
+ax_fetch.set_xticks(x)
+ax_fetch.set_xticklabels(args.labels, rotation=30)
+ax_fetch.set_ylabel("Fetch time (s)")
+
+for i, d in enumerate(args.dirs):
+    t, q = parse_qlen(d)
+    ax_q.plot(t, q, label=args.labels[i], lw=1)
+ax_q.xaxis.set_major_locator(MaxNLocator(4))
+ax_q.set_xlabel("Seconds")
+ax_q.set_ylabel("Packets")
+ax_q.legend(fontsize='small')
+
+counts = [drops_and_marks(d) for d in args.dirs]
+width = 0.4
+ax_drop.bar([i - width / 2 for i in x], [c[0] for c in counts], width, label='drops', color='red')
+ax_drop.bar([i + width / 2 for i in x], [c[1] for c in counts], width, label='ECN marks', color='blue')
+ax_drop.set_xticks(x)
+ax_drop.set_xticklabels(args.labels, rotation=30)
+ax_drop.set_ylabel("Packets")
+ax_drop.legend(fontsize='small')
+
+plt.tight_layout()
+if args.out:
+    print('saving to', args.out)
+    plt.savefig(args.out)
+else:
+    plt.show()
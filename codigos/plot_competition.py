@@ -17,40 +17,44 @@ import pandas as pd
 from matplotlib.patches import Rectangle
 import seaborn as sns
 
+from iperf import read_timeline, flow_name as iperf_flow_name
+
 # Configurar estilo dos gráficos
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
 def parse_iperf_timeline(file_path):
     """Parse iperf output to extract throughput timeline."""
-    throughputs = []
-    timestamps = []
-    
     if not os.path.exists(file_path):
         return [], []
     
-    with open(file_path, 'r') as f:
-        for line in f:
-            if 'Mbits/sec' in line and 'sec' in line:
-                parts = line.strip().split()
-                
-                # Extract time interval
-                time_part = parts[2]  # Should be like "0.0-1.0"
-                if '-' in time_part:
-                    end_time = float(time_part.split('-')[1])
-                    timestamps.append(end_time)
-                
-                # Extract throughput
-                for i, part in enumerate(parts):
-                    if part == 'Mbits/sec' and i > 0:
-                        try:
-                            throughput = float(parts[i-1])
-                            throughputs.append(throughput)
-                        except ValueError:
-                            continue
-                        break
-    
-    return timestamps, throughputs
+    return read_timeline(file_path)
+
+ALGORITHM_NAMES = {'reno': 'TCP Reno', 'bbr': 'TCP BBR', 'cubic': 'TCP CUBIC'}
+ALGORITHM_COLORS = {'reno': '#3498db', 'bbr': '#e74c3c', 'cubic': '#2ecc71'}
+EXTRA_COLORS = ['#f39c12', '#9b59b6', '#8c564b', '#17becf']
+
+def algorithm_name(algorithm):
+    return ALGORITHM_NAMES.get(algorithm, 'TCP ' + algorithm.upper())
+
+def algorithm_color(algorithm, index):
+    return ALGORITHM_COLORS.get(algorithm, EXTRA_COLORS[index % len(EXTRA_COLORS)])
+
+def flows_by_algorithm(results):
+    """{algorithm: {flow: stats}} from the per-flow congestion control
+    labels of competition_results.json (older results only have the
+    reno_flows/bbr_flows lists)."""
+    by_algorithm = {}
+    if 'flows' in results:
+        for flow, stats in results['flows'].items():
+            by_algorithm.setdefault(stats['algorithm'], {})[flow] = stats
+        return by_algorithm
+    for algorithm in ('reno', 'bbr'):
+        flows = results.get(algorithm + '_flows') or []
+        for i, stats in enumerate(flows):
+            name = f'{algorithm}_flow_{i + 1}' if len(flows) > 1 else f'{algorithm}_flow'
+            by_algorithm.setdefault(algorithm, {})[name] = stats
+    return by_algorithm
 
 def create_competition_timeline_plot(results_dir):
     """Create animated timeline plot showing the competition."""
@@ -60,8 +64,8 @@ def create_competition_timeline_plot(results_dir):
     
     # Look for all flow output files
     for file in os.listdir(results_dir):
-        if file.endswith('_output.txt'):
-            flow_name = file.replace('_output.txt', '')
+        flow_name = iperf_flow_name(file)
+        if flow_name:
             times, throughputs = parse_iperf_timeline(os.path.join(results_dir, file))
             if times and throughputs:
                 flow_data[flow_name] = {'times': times, 'throughputs': throughputs}
@@ -169,41 +173,40 @@ def create_competition_dashboard(results_dir):
     # 1. Throughput comparison (top-left)
     ax1 = fig.add_subplot(gs[0, 0])
     
-    # Separate flows by algorithm
-    reno_flows = {k: v for k, v in results.items() if 'reno' in k.lower() and 'flow' in k}
-    bbr_flows = {k: v for k, v in results.items() if 'bbr' in k.lower() and 'flow' in k}
+    # Separate flows by the congestion control they ran
+    by_algorithm = flows_by_algorithm(results)
+    algorithms = sorted(by_algorithm)
+    totals = [sum(flow['avg_throughput'] for flow in by_algorithm[a].values())
+              for a in algorithms]
     
-    if reno_flows or bbr_flows:
-        # Calculate total throughput for each algorithm
-        reno_total = sum(flow['avg_throughput'] for flow in reno_flows.values())
-        bbr_total = sum(flow['avg_throughput'] for flow in bbr_flows.values())
-        
-        algorithms = ['TCP Reno', 'TCP BBR']
-        throughputs = [reno_total, bbr_total]
-        colors = ['#3498db', '#e74c3c']
+    if by_algorithm:
+        names = [algorithm_name(a) for a in algorithms]
+        colors = [algorithm_color(a, i) for i, a in enumerate(algorithms)]
         
-        bars = ax1.bar(algorithms, throughputs, color=colors, alpha=0.8)
+        bars = ax1.bar(names, totals, color=colors, alpha=0.8)
         ax1.set_ylabel('Total Throughput (Mbps)')
         ax1.set_title('🏆 Throughput Battle')
         
         # Add value labels
-        for bar, val in zip(bars, throughputs):
+        for bar, val in zip(bars, totals):
             ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
                     f'{val:.1f}', ha='center', va='bottom', fontweight='bold')
         
         # Show winner
-        winner_idx = np.argmax(throughputs)
+        winner_idx = np.argmax(totals)
         bars[winner_idx].set_edgecolor('gold')
         bars[winner_idx].set_linewidth(3)
     
     # 2. Individual flows comparison (top-center)
     ax2 = fig.add_subplot(gs[0, 1])
     
-    all_flows = {**reno_flows, **bbr_flows}
+    all_flows = {name: (i, flow) for i, a in enumerate(algorithms)
+                 for name, flow in by_algorithm[a].items()}
     if all_flows:
         flow_names = list(all_flows.keys())
-        flow_throughputs = [all_flows[name]['avg_throughput'] for name in flow_names]
-        flow_colors = ['blue' if 'reno' in name.lower() else 'red' for name in flow_names]
+        flow_throughputs = [all_flows[name][1]['avg_throughput'] for name in flow_names]
+        flow_colors = [algorithm_color(algorithms[all_flows[name][0]], all_flows[name][0])
+                       for name in flow_names]
         
         bars = ax2.bar(range(len(flow_names)), flow_throughputs, color=flow_colors, alpha=0.7)
         ax2.set_ylabel('Throughput (Mbps)')
@@ -223,25 +226,20 @@ def create_competition_dashboard(results_dir):
     # Create summary text
     summary_text = "🏁 COMPETITION SUMMARY\n\n"
     
-    if reno_flows and bbr_flows:
-        reno_total = sum(flow['avg_throughput'] for flow in reno_flows.values())
-        bbr_total = sum(flow['avg_throughput'] for flow in bbr_flows.values())
-        
-        winner = "TCP BBR" if bbr_total > reno_total else "TCP Reno"
-        advantage = abs(bbr_total - reno_total) / min(reno_total, bbr_total) * 100
+    if len(algorithms) >= 2:
+        ranked = sorted(zip(totals, algorithms), reverse=True)
+        (top, winner), (second, _) = ranked[0], ranked[1]
+        advantage = (top - second) / second * 100 if second else 0
         
-        summary_text += f"🏆 Winner: {winner}\n"
+        summary_text += f"🏆 Winner: {algorithm_name(winner)}\n"
         summary_text += f"📊 Advantage: {advantage:.1f}%\n\n"
-        summary_text += f"🔵 TCP Reno: {len(reno_flows)} flows, {reno_total:.1f} Mbps\n"
-        summary_text += f"🔴 TCP BBR: {len(bbr_flows)} flows, {bbr_total:.1f} Mbps\n\n"
+        for a, total in zip(algorithms, totals):
+            summary_text += f"{algorithm_name(a)}: {len(by_algorithm[a])} flows, {total:.1f} Mbps\n"
         
         # Calculate per-flow averages
-        reno_avg = reno_total / len(reno_flows) if reno_flows else 0
-        bbr_avg = bbr_total / len(bbr_flows) if bbr_flows else 0
-        
-        summary_text += f"Per-flow averages:\n"
-        summary_text += f"🔵 Reno: {reno_avg:.1f} Mbps/flow\n"
-        summary_text += f"🔴 BBR: {bbr_avg:.1f} Mbps/flow\n"
+        summary_text += f"\nPer-flow averages:\n"
+        for a, total in zip(algorithms, totals):
+            summary_text += f"{algorithm_name(a)}: {total / len(by_algorithm[a]):.1f} Mbps/flow\n"
     
     ax3.text(0.05, 0.95, summary_text, transform=ax3.transAxes, 
              verticalalignment='top', fontsize=10, 
@@ -281,26 +279,23 @@ def create_competition_dashboard(results_dir):
     # Parse timeline data for dashboard
     flow_data = {}
     for file in os.listdir(results_dir):
-        if file.endswith('_output.txt'):
-            flow_name = file.replace('_output.txt', '')
+        flow_name = iperf_flow_name(file)
+        if flow_name:
             times, throughputs = parse_iperf_timeline(os.path.join(results_dir, file))
             if times and throughputs:
                 flow_data[flow_name] = {'times': times, 'throughputs': throughputs}
     
     if flow_data:
+        flow_algorithms = {name: a for a in algorithms for name in by_algorithm[a]}
         for flow_name, data in flow_data.items():
-            if 'reno' in flow_name.lower():
-                color = 'blue'
-                alpha = 0.7
-            elif 'bbr' in flow_name.lower():
-                color = 'red'
-                alpha = 0.7
+            algorithm = flow_algorithms.get(flow_name)
+            if algorithm:
+                color = algorithm_color(algorithm, algorithms.index(algorithm))
             else:
                 color = 'green'
-                alpha = 0.7
             
             ax5.plot(data['times'], data['throughputs'], color=color, linewidth=1.5, 
-                    label=flow_name, alpha=alpha)
+                    label=flow_name, alpha=0.7)
         
         ax5.set_ylabel('Throughput (Mbps)')
         ax5.set_xlabel('Time (seconds)')
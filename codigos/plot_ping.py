@@ -3,6 +3,9 @@ Plot ping RTTs over time
 '''
 from helper import *
 import plot_defaults
+import json
+import os
+import memo
 
 from matplotlib.ticker import MaxNLocator
 from pylab import figure
@@ -15,9 +18,10 @@ parser.add_argument('--files', '-f',
                     nargs='+')
 
 parser.add_argument('--freq',
-                    help="Frequency of pings (per second)",
-                    type=int,
-                    default=10)
+                    help="Frequency of pings (per second); default: from the run's "
+                         "--ping-interval in its run_meta.json, else 10",
+                    type=float,
+                    default=None)
 
 parser.add_argument('--out', '-o',
                     help="Output png file for the plot.",
@@ -25,6 +29,19 @@ parser.add_argument('--out', '-o',
 
 args = parser.parse_args()
 
+def ping_freq(fname):
+    """Pings per second of the run that wrote fname (planner.py runs do
+    not all ping every 0.1 s)."""
+    if args.freq:
+        return args.freq
+    meta = os.path.join(os.path.dirname(os.path.abspath(fname)), memo.META_FILE)
+    try:
+        with open(meta) as f:
+            interval = json.load(f)['fingerprint']['config'].get('ping_interval')
+    except (IOError, ValueError, KeyError):
+        interval = None
+    return 1.0 / interval if interval else 10
+
 def parse_ping(fname):
     ret = []
     lines = open(fname).readlines()
@@ -49,7 +66,8 @@ for i, f in enumerate(args.files):
     data = parse_ping(f)
     xaxis = list(map(float, list(col(0, data))))
     start_time = xaxis[0]
-    xaxis = list(map(lambda x: (x - start_time) / args.freq, xaxis))
+    freq = ping_freq(f)
+    xaxis = list(map(lambda x: (x - start_time) / freq, xaxis))
     qlens = list(map(float, col(1, data)))
 
     ax.plot(xaxis, qlens, lw=2)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+'''
+Repetition driver with bootstrap confidence intervals and sequential
+early stopping.
+
+A single 30 s run says little about who "wins": start order and phase
+effects alone can flip the result.  This driver re-runs one experiment
+configuration (tcp_competition.py or bufferbloat.py) with a different
+start-jitter seed each time, extracts per-run metrics
+
+    share_<algo>   throughput share of each algorithm
+    jain           Jain's fairness index over the flows
+    rtt_p95_ms     95th percentile of the ping RTT samples
+    fetch_mean_s   mean webpage fetch time
+
+and after every run computes percentile-bootstrap confidence intervals of
+their means, all metrics and resamples at once with numpy.  It stops as
+soon as every tracked CI is narrower than the target, so emulation time
+is spent only on configurations whose results are noisy.
+
+Each repetition is an ordinary run in <dir>/rep_<i>, memoized like any
+other (memo.py): re-running the driver reuses finished repetitions.
+
+Usage:
+    sudo python3 repeat.py --dir results/rep --width 0.05 --metrics share_bbr jain -- \\
+        tcp_competition.py --bw-net 10 --delay 20 --time 30
+'''
+
+import glob
+import json
+import os
+import sys
+from argparse import ArgumentParser, REMAINDER
+from subprocess import Popen
+
+import numpy as np
+
+import memo
+
+SUMMARY_FILE = 'repeat_summary.json'
+# Written by a driver only at the end of a run that did not abort
+RESULT_FILES = ('competition_results.json', 'fetch_stats.txt')
+
+
+def _ping_rtts(run_dir):
+    rtts = []
+    for fname in sorted(glob.glob(os.path.join(run_dir, 'ping*.txt'))):
+        with open(fname) as f:
+            for line in f:
+                if 'time=' not in line:
+                    continue
+                try:
+                    rtts.append(float(line.split('time=')[1].split()[0]))
+                except ValueError:
+                    continue
+    return rtts
+
+
+def _fetch_times(run_dir):
+    fname = os.path.join(run_dir, 'fetch_stats.txt')
+    if not os.path.exists(fname):
+        return []
+    with open(fname) as f:
+        for line in f:
+            if line.startswith('All fetch times:'):
+                values = line.split(':', 1)[1].strip().strip('[]')
+                return [float(v) for v in values.split(',') if v.strip()]
+    return []
+
+
+def run_metrics(run_dir):
+    """Per-run metrics of one result directory (missing ones are left out)."""
+    metrics = {}
+    results_file = os.path.join(run_dir, 'competition_results.json')
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            results = json.load(f)
+        if results.get('algorithms'):
+            shares = {algo: a['share'] for algo, a in results['algorithms'].items()}
+            flows = [fl['avg_throughput'] for fl in results.get('flows', {}).values()]
+        else:
+            # Results written before per-algorithm entries existed
+            totals, flows = {}, []
+            for key, value in results.items():
+                if key.endswith('_flows') and isinstance(value, list):
+                    totals[key[:-len('_flows')]] = sum(fl['avg_throughput'] for fl in value)
+                    flows.extend(fl['avg_throughput'] for fl in value)
+            total = sum(totals.values())
+            shares = {algo: t / total for algo, t in totals.items()} if total > 0 else {}
+        x = np.array(flows)
+        if shares and (x ** 2).sum() > 0:
+            for algo, share in shares.items():
+                metrics['share_' + algo] = share
+            metrics['jain'] = float(x.sum() ** 2 / (len(x) * (x ** 2).sum()))
+    rtts = _ping_rtts(run_dir)
+    if rtts:
+        metrics['rtt_p95_ms'] = float(np.percentile(rtts, 95))
+    fetch = _fetch_times(run_dir)
+    if fetch:
+        metrics['fetch_mean_s'] = float(np.mean(fetch))
+    return metrics
+
+
+def run_complete(run_dir):
+    """True if run_dir holds a finished run: marked complete in its
+    run_meta.json, with its result file."""
+    return any(memo.is_complete(run_dir, [f]) for f in RESULT_FILES)
+
+
+def bootstrap_ci(samples, n_boot=10000, alpha=0.05, rng=None):
+    """Percentile bootstrap CI of the mean of every column of samples.
+
+    samples is (runs x metrics), NaN where a run lacks a metric.  All
+    n_boot resamples of all metrics are drawn in one index matrix.
+    Returns (mean, lo, hi), one value per column.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    samples = np.asarray(samples, dtype=float)
+    n = samples.shape[0]
+    idx = rng.integers(0, n, size=(n_boot, n))
+    with np.errstate(invalid='ignore'):
+        boot = np.nanmean(samples[idx], axis=1)
+    lo, hi = np.nanpercentile(boot, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return np.nanmean(samples, axis=0), lo, hi
+
+
+def summarize(reps, names, n_boot=10000, alpha=0.05, seed=0):
+    """CI of every metric over the repetitions so far."""
+    samples = [[r['metrics'].get(m, np.nan) for m in names] for r in reps]
+    mean, lo, hi = bootstrap_ci(samples, n_boot, alpha, np.random.default_rng(seed))
+    return {m: {'mean': float(mean[i]), 'lo': float(lo[i]), 'hi': float(hi[i]),
+                'width': float(hi[i] - lo[i])}
+            for i, m in enumerate(names)}
+
+
+def converged(ci, metrics, width=None, rel_width=None):
+    """True if every tracked CI meets the absolute or relative width target."""
+    for m in metrics:
+        c = ci.get(m)
+        if c is None or np.isnan(c['width']):
+            return False
+        if width is not None and c['width'] > width:
+            return False
+        if rel_width is not None and c['width'] > rel_width * abs(c['mean']):
+            return False
+    return True
+
+
+def winner(ci):
+    """Algorithm whose throughput share CI lies entirely above an even split."""
+    shares = {m[len('share_'):]: c for m, c in ci.items() if m.startswith('share_')}
+    if len(shares) < 2:
+        return None
+    fair = 1.0 / len(shares)
+    for algo, c in shares.items():
+        if c['lo'] > fair:
+            return algo
+    return 'undecided'
+
+
+def run_repetition(cmd, run_dir, seed, jitter):
+    script = cmd[0]
+    if script.endswith('.py'):
+        cmd = [sys.executable] + cmd
+    cmd = cmd + ['--dir', run_dir, '--seed', str(seed), '--jitter', str(jitter)]
+    print(' '.join(cmd))
+    return Popen(cmd).wait()
+
+
+def repeat(cmd, out_dir, metrics=None, width=None, rel_width=None, min_reps=3,
+           max_reps=20, jitter=1.0, n_boot=10000, alpha=0.05):
+    """Run cmd until the CIs of metrics are narrow enough (or max_reps)."""
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    reps = []
+    ci = {}
+    reason = 'max_reps'
+    for i in range(max_reps):
+        run_dir = os.path.join(out_dir, 'rep_%d' % i)
+        status = run_repetition(cmd, run_dir, i, jitter)
+        # An aborted run may still leave ping files behind: only a
+        # complete run is a sample
+        m = run_metrics(run_dir) if status == 0 and run_complete(run_dir) else {}
+        if not m:
+            print("Repetition %d failed (exit %d), skipping it" % (i, status))
+            continue
+        reps.append({'dir': run_dir, 'seed': i, 'metrics': m})
+        names = sorted(set().union(*(r['metrics'] for r in reps)))
+        tracked = metrics or names
+        if len(reps) < 2:
+            continue
+        ci = summarize(reps, names, n_boot, alpha)
+        print("After %d repetitions: %s" % (len(reps), ', '.join(
+            '%s %.4g [%.4g, %.4g]' % (k, ci[k]['mean'], ci[k]['lo'], ci[k]['hi'])
+            for k in tracked if k in ci)))
+        if len(reps) >= min_reps and converged(ci, tracked, width, rel_width):
+            reason = 'converged'
+            break
+    summary = {
+        'command': cmd,
+        'repetitions': reps,
+        'confidence': 1 - alpha,
+        'target_width': width,
+        'target_rel_width': rel_width,
+        'tracked': metrics,
+        'ci': ci,
+        'winner': winner(ci),
+        'stop_reason': reason,
+    }
+    with open(os.path.join(out_dir, SUMMARY_FILE), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = ArgumentParser(description="Repeat an experiment until its confidence intervals are narrow")
+    parser.add_argument('--dir', '-d', required=True,
+                        help="Output directory (repetitions go to DIR/rep_<i>)")
+    parser.add_argument('--metrics', '-m', nargs='+', default=None,
+                        help="Metrics whose CI must converge (default: all found)")
+    parser.add_argument('--width', type=float, default=None,
+                        help="Target CI width (absolute, in the metric's unit)")
+    parser.add_argument('--rel-width', type=float, default=None,
+                        help="Target CI width relative to the mean (e.g. 0.1)")
+    parser.add_argument('--min-reps', type=int, default=3,
+                        help="Repetitions before the stopping rule is checked")
+    parser.add_argument('--max-reps', type=int, default=20,
+                        help="Upper bound on repetitions")
+    parser.add_argument('--jitter', type=float, default=1.0,
+                        help="Start jitter of each repetition (sec)")
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help="Confidence level of the intervals")
+    parser.add_argument('--bootstrap', type=int, default=10000,
+                        help="Bootstrap resamples")
+    parser.add_argument('cmd', nargs=REMAINDER,
+                        help="Experiment command, after --, without --dir/--seed/--jitter")
+    args = parser.parse_args()
+
+    cmd = args.cmd[1:] if args.cmd and args.cmd[0] == '--' else args.cmd
+    if not cmd:
+        parser.error("missing experiment command")
+    if args.width is None and args.rel_width is None:
+        parser.error("one of --width or --rel-width is required")
+
+    summary = repeat(cmd, args.dir, args.metrics, args.width, args.rel_width,
+                     args.min_reps, args.max_reps, args.jitter, args.bootstrap,
+                     1 - args.confidence)
+    print("\nStopped after %d repetitions (%s)" % (len(summary['repetitions']),
+                                                   summary['stop_reason']))
+    for m, c in sorted(summary['ci'].items()):
+        print("  %-14s %.4g  [%.4g, %.4g]" % (m, c['mean'], c['lo'], c['hi']))
+    if summary['winner']:
+        print("Winner: %s" % summary['winner'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+'''
+Sweep the base-RTT ratio between the two flows of reno_vs_bbr.
+
+The first flow keeps a 1 ms access link; the second flow's access delay
+is set so that its base RTT is `ratio` times the first one's:
+
+    base RTT = 2 * (access + bottleneck delay + receiver access)
+
+Every ratio is an ordinary (memoized) tcp_competition.py run in
+<dir>/ratio_<r>.  rtt_sweep.json collects, per ratio, each flow's
+measured base RTT, throughput share and RTT-normalized share (from the
+rtt_analysis of competition_results.json).
+
+Usage:
+    sudo python3 rtt_sweep.py --bw-net 10 --delay 10 --dir results/rtt_sweep \\
+        --ratios 1 2 4 8 --long bbr -- --time 60
+'''
+
+import json
+import os
+import sys
+from argparse import ArgumentParser, REMAINDER
+from subprocess import Popen
+
+ACCESS_DELAY_MS = 1
+RECEIVER_DELAY_MS = 1
+
+
+def access_delays(ratio, delay, long_flow='bbr'):
+    """Access delays (ms) of [reno, bbr] giving the long flow `ratio`
+    times the base RTT of the other."""
+    base = ACCESS_DELAY_MS + delay + RECEIVER_DELAY_MS
+    longer = ratio * base - delay - RECEIVER_DELAY_MS
+    if long_flow == 'reno':
+        return [longer, ACCESS_DELAY_MS]
+    return [ACCESS_DELAY_MS, longer]
+
+
+def main():
+    parser = ArgumentParser(description="Throughput share vs base-RTT ratio sweep")
+    parser.add_argument('--bw-net', '-b', type=float, required=True)
+    parser.add_argument('--delay', type=float, required=True,
+                        help="Bottleneck propagation delay (ms)")
+    parser.add_argument('--dir', '-d', required=True)
+    parser.add_argument('--ratios', type=float, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--long', choices=['reno', 'bbr'], default='bbr',
+                        help="Which flow gets the longer RTT")
+    parser.add_argument('extra', nargs=REMAINDER,
+                        help="Extra tcp_competition.py options, after --")
+    args = parser.parse_args()
+    extra = args.extra[1:] if args.extra and args.extra[0] == '--' else args.extra
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tcp_competition.py')
+    sweep = []
+    for ratio in args.ratios:
+        delays = access_delays(ratio, args.delay, args.long)
+        run_dir = os.path.join(args.dir, 'ratio_%g' % ratio)
+        cmd = [sys.executable, script, '--bw-net', str(args.bw_net), '--delay', str(args.delay),
+               '--scenario', 'reno_vs_bbr', '--dir', run_dir,
+               '--access-delay'] + ['%g' % d for d in delays] + extra
+        print(' '.join(cmd))
+        Popen(cmd).wait()
+
+        results_file = os.path.join(run_dir, 'competition_results.json')
+        if not os.path.exists(results_file):
+            print("ratio %g: no results" % ratio)
+            continue
+        with open(results_file) as f:
+            results = json.load(f)
+        sweep.append({'ratio': ratio, 'access_delay': delays,
+                      'flows': results.get('rtt_analysis')})
+
+    with open(os.path.join(args.dir, 'rtt_sweep.json'), 'w') as f:
+        json.dump(sweep, f, indent=2)
+
+    print("\n%-7s %-12s %10s %8s %9s" % ('ratio', 'flow', 'base RTT', 'share', 'RTT-norm'))
+    for point in sweep:
+        for flow, r in sorted((point['flows'] or {}).items()):
+            print("%-7g %-12s %8.1fms %7.1f%% %8.1f%%" %
+                  (point['ratio'], flow, r['base_rtt_ms'], r['share'] * 100,
+                   r['share_rtt_normalized'] * 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/bin/bash
+
+# Script para comparar AQM (fq_codel, CoDel, PIE, CAKE) com drop-tail
+
+# Limpar qualquer configuração anterior do Mininet
+sudo mn -c
+
+# Configurações do experimento
+TIME=60          # Duração do experimento em segundos
+QSIZE_LARGE=100  # Tamanho grande do buffer (drop-tail e limite do AQM)
+QSIZE_SMALL=20   # Tamanho pequeno do buffer (drop-tail)
+BW_NET=1.5       # Largura de banda do link gargalo (Mb/s)
+DELAY=10         # Delay de propagação (ms) - RTT total será 20ms
+CONG=${CONG:-reno}
+
+mkdir -p results
+
+# Drop-tail com buffer grande e pequeno
+for q in $QSIZE_LARGE $QSIZE_SMALL; do
+    echo "Drop-tail (q=$q)"
+    sudo python3 bufferbloat.py --bw-net $BW_NET --delay $DELAY --time $TIME \
+        --maxq $q --cong $CONG --dir results/$CONG-droptail-q$q
+done
+
+# AQMs no gargalo
+for qdisc in fq_codel codel pie cake; do
+    echo "AQM: $qdisc"
+    sudo python3 bufferbloat.py --bw-net $BW_NET --delay $DELAY --time $TIME \
+        --maxq $QSIZE_LARGE --cong $CONG --qdisc $qdisc --dir results/$CONG-$qdisc
+done
+
+echo "Gerando gráfico comparativo..."
+python3 plot_aqm.py \
+    -d results/$CONG-droptail-q$QSIZE_LARGE results/$CONG-droptail-q$QSIZE_SMALL \
+       results/$CONG-fq_codel results/$CONG-codel results/$CONG-pie results/$CONG-cake \
+    -l "q=$QSIZE_LARGE" "q=$QSIZE_SMALL" fq_codel codel pie cake \
+    -o $CONG-aqm-comparison.png
+
+echo "Gráfico salvo como $CONG-aqm-comparison.png"
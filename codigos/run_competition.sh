@@ -12,6 +12,7 @@ DEFAULT_BANDWIDTH=10
 DEFAULT_DELAY=10
 DEFAULT_QUEUE=100
 DEFAULT_TIME=30
+DEFAULT_SWEEP_QUEUE=results/scenarios_queue
 
 # Função para mostrar uso
 show_usage() {
@@ -21,11 +22,17 @@ show_usage() {
     echo "  -d, --delay DELAY           Atraso de propagação em ms (padrão: $DEFAULT_DELAY)"
     echo "  -q, --queue QUEUE           Tamanho máximo da fila em pacotes (padrão: $DEFAULT_QUEUE)"
     echo "  -t, --time TIME             Duração do experimento em segundos (padrão: $DEFAULT_TIME)"
+    echo "  -f, --force                 Executa mesmo se já existir resultado idêntico"
+    echo "  -s, --scenarios             Executa os cinco cenários sem menu (retomável)"
+    echo "  -Q, --sweep-queue DIR       Diretório da fila de jobs (padrão: $DEFAULT_SWEEP_QUEUE)"
+    echo "  -w, --workers N             Processos que executam a fila (padrão: 1)"
+    echo "  -r, --retries N             Novas tentativas de um cenário que falhou (padrão: 2)"
     echo "  -h, --help                  Mostra esta ajuda"
     echo
     echo "Exemplos:"
     echo "  $0 -b 10 -d 10 -q 100 -t 30"
     echo "  $0 --bandwidth 5 --delay 50 --queue 20"
+    echo "  $0 --scenarios --retries 3"
 }
 
 # Análise dos parâmetros
@@ -33,6 +40,12 @@ BANDWIDTH=$DEFAULT_BANDWIDTH
 DELAY=$DEFAULT_DELAY
 QUEUE=$DEFAULT_QUEUE
 TIME=$DEFAULT_TIME
+FORCE=""
+SCENARIOS=""
+SWEEP_QUEUE=$DEFAULT_SWEEP_QUEUE
+WORKERS=1
+RETRIES=2
+NARGS=$#
 
 while [[ $# -gt 0 ]]; do
     case $1 in
@@ -52,6 +65,26 @@ while [[ $# -gt 0 ]]; do
             TIME="$2"
             shift 2
             ;;
+        -f|--force)
+            FORCE="--force"
+            shift
+            ;;
+        -s|--scenarios)
+            SCENARIOS=1
+            shift
+            ;;
+        -Q|--sweep-queue)
+            SWEEP_QUEUE="$2"
+            shift 2
+            ;;
+        -w|--workers)
+            WORKERS="$2"
+            shift 2
+            ;;
+        -r|--retries)
+            RETRIES="$2"
+            shift 2
+            ;;
         -h|--help)
             show_usage
             exit 0
@@ -117,7 +150,7 @@ run_experiment() {
         --maxq $QUEUE \
         --time $TIME \
         --scenario $SCENARIO \
-        --dir $RESULTS_DIR
+        --dir $RESULTS_DIR $FORCE
     
     if [ $? -eq 0 ]; then
         echo "Experimento concluído com sucesso!"
@@ -141,45 +174,44 @@ analyze_results() {
 }
 
 # Executar diferentes cenários
+# Os cinco cenários entram numa fila de jobs (sweep.py): se uma execução
+# falhar ela é repetida até $RETRIES vezes, e se o script for interrompido
+# basta executá-lo de novo para continuar de onde parou.
 run_scenarios() {
-    echo "Executando múltiplos cenários..."
-    
+    echo "Executando múltiplos cenários (fila: $SWEEP_QUEUE)..."
+
+    enqueue() {
+        python3 sweep.py add --queue $SWEEP_QUEUE --dir "$1" --expect competition_results.json \
+            --retries $RETRIES $FORCE --exclusive mininet -- \
+            python3 tcp_competition.py --bw-net 10 --delay $2 --maxq $3 --time 30 --scenario $4 $FORCE
+    }
+
     # Cenário 1: 1 Reno vs 1 BBR
-    echo "Cenário 1: 1 TCP Reno vs 1 TCP BBR"
-    SCENARIO_DIR="results/scenario1_1reno_vs_1bbr"
-    mkdir -p $SCENARIO_DIR
-    sudo python3 tcp_competition.py --bw-net 10 --delay 50 --maxq 100 --time 30 --scenario reno_vs_bbr --dir $SCENARIO_DIR
-    
+    enqueue results/scenario1_1reno_vs_1bbr 50 100 reno_vs_bbr
     # Cenário 2: 2 Reno vs 2 BBR
-    echo "Cenário 2: 2 TCP Reno vs 2 TCP BBR"
-    SCENARIO_DIR="results/scenario2_2reno_vs_2bbr"
-    mkdir -p $SCENARIO_DIR
-    sudo python3 tcp_competition.py --bw-net 10 --delay 50 --maxq 100 --time 30 --scenario 2reno_vs_2bbr --dir $SCENARIO_DIR
-    
+    enqueue results/scenario2_2reno_vs_2bbr 50 100 2reno_vs_2bbr
     # Cenário 3: 2 Reno vs 1 BBR
-    echo "Cenário 3: 2 TCP Reno vs 1 TCP BBR"
-    SCENARIO_DIR="results/scenario3_2reno_vs_1bbr"
-    mkdir -p $SCENARIO_DIR
-    sudo python3 tcp_competition.py --bw-net 10 --delay 50 --maxq 100 --time 30 --scenario 2reno_vs_1bbr --dir $SCENARIO_DIR
-    
+    enqueue results/scenario3_2reno_vs_1bbr 50 100 2reno_vs_1bbr
     # Cenário 4: Buffer pequeno
-    echo "Cenário 4: 1 vs 1 com buffer pequeno"
-    SCENARIO_DIR="results/scenario4_small_buffer"
-    mkdir -p $SCENARIO_DIR
-    sudo python3 tcp_competition.py --bw-net 10 --delay 50 --maxq 20 --time 30 --scenario reno_vs_bbr --dir $SCENARIO_DIR
-    
+    enqueue results/scenario4_small_buffer 50 20 reno_vs_bbr
     # Cenário 5: Alta latência
-    echo "Cenário 5: 1 vs 1 com alta latência"
-    SCENARIO_DIR="results/scenario5_high_latency"
-    mkdir -p $SCENARIO_DIR
-    sudo python3 tcp_competition.py --bw-net 10 --delay 100 --maxq 100 --time 30 --scenario reno_vs_bbr --dir $SCENARIO_DIR
-    
-    echo "Todos os cenários executados!"
+    enqueue results/scenario5_high_latency 100 100 reno_vs_bbr
+
+    sudo python3 sweep.py work --queue $SWEEP_QUEUE --workers $WORKERS
+    SWEEP_STATUS=$?
+    python3 sweep.py status --queue $SWEEP_QUEUE
+
+    if [ $SWEEP_STATUS -eq 0 ]; then
+        echo "Todos os cenários executados!"
+    else
+        echo "Alguns cenários falharam; veja os logs em $SWEEP_QUEUE/logs"
+        echo "Para tentar de novo: python3 sweep.py status --queue $SWEEP_QUEUE --retry-failed"
+    fi
     echo "Gerando relatório comparativo..."
-    
+
     # Gerar visualizações para cada cenário
     for scenario in results/scenario*; do
-        if [ -d "$scenario" ]; then
+        if [ -f "$scenario/competition_results.json" ]; then
             echo "Gerando visualizações para $scenario..."
             python3 plot_competition.py --dir $scenario --type dashboard
         fi
@@ -312,7 +344,10 @@ show_menu() {
 
 # Função principal
 main() {
-    if [ $# -eq 0 ]; then
+    if [ -n "$SCENARIOS" ]; then
+        check_dependencies
+        run_scenarios
+    elif [ $NARGS -eq 0 ]; then
         show_menu
     else
         check_dependencies
@@ -323,4 +358,4 @@ main() {
 }
 
 # Executar função principal
-main "$@"
+main
@@ -0,0 +1,196 @@
+'''
+Event-driven flow scheduler: timed flow arrivals and departures.
+
+Starting clients one after another with popen (or with sleep() between
+them) puts tens of milliseconds of fork/exec and namespace-entry cost
+between "simultaneous" flows and makes join times drift.  FlowScheduler
+instead spawns every flow up front, blocked on a read of its stdin, and
+then releases each one at its event time against a single monotonic
+clock: the release is a one-byte write, so flows start within a fraction
+of a millisecond of their target.  Stop events terminate the flow.
+
+For every flow the scheduler logs (flow_schedule.csv, shared trace
+format) the target offset and the achieved start error, both as seen by
+the scheduler (release) and by the flow's own shell right before it
+execs the client (bash $EPOCHREALTIME, no extra fork).
+
+Timelines can be written by hand, drawn from a Poisson process or read
+from a trace file:
+
+    start,duration[,name]
+    0,40,reno_1
+    10.5,30,bbr_1
+'''
+
+import csv
+import os
+import random
+from subprocess import Popen, PIPE
+from time import monotonic, sleep, time
+
+from flowtrace import TraceWriter
+
+SCHEDULE_FIELDS = ['target_offset', 'release_error_ms', 'start_error_ms',
+                   'stop_offset', 'stop_error_ms']
+
+# Time before the first event in which all flows are spawned
+DEFAULT_LEAD = 0.5
+# Busy-wait the last SPIN seconds before an event instead of sleeping
+SPIN = 0.002
+
+
+class Flow(object):
+    __slots__ = ('name', 'host', 'cmd', 'start', 'stop', 'proc', 'stampfile',
+                 'released', 'stopped')
+
+    def __init__(self, name, host, cmd, start, stop=None):
+        self.name = name
+        self.host = host
+        self.cmd = cmd
+        self.start = start
+        self.stop = stop
+        self.proc = None
+        self.stampfile = None
+        self.released = None
+        self.stopped = None
+
+
+class FlowScheduler(object):
+    """Runs flows at given offsets from a common start barrier."""
+
+    def __init__(self, logfile=None, lead=DEFAULT_LEAD, stampdir='/tmp'):
+        self.logfile = logfile
+        self.lead = lead
+        self.stampdir = stampdir
+        self.flows = []
+        self.t0 = None
+        self.t0_wall = None
+
+    def add(self, name, host, cmd, start=0.0, stop=None):
+        """Spawn cmd (a shell command line) on host, held until start
+        seconds after the barrier; terminate it at stop if given.
+        host None runs it in the root namespace.  Returns the Popen."""
+        fl = Flow(name, host, cmd, start, stop)
+        fl.stampfile = '%s/sched_%d_%s.start' % (self.stampdir, os.getpid(), name)
+        # read blocks until release; the timestamp is a bash builtin, so
+        # the client is exec'd right after it without another fork
+        script = 'read _go; echo $EPOCHREALTIME > %s; exec %s' % (fl.stampfile, cmd)
+        argv = ['bash', '-c', script]
+        if host is None:
+            fl.proc = Popen(argv, stdin=PIPE)
+        else:
+            fl.proc = host.popen(argv, stdin=PIPE)
+        self.flows.append(fl)
+        return fl.proc
+
+    def _events(self):
+        events = []
+        for fl in self.flows:
+            events.append((fl.start, 0, fl))
+            if fl.stop is not None:
+                events.append((fl.stop, 1, fl))
+        # Starts before stops at the same instant
+        events.sort(key=lambda e: (e[0], e[1]))
+        return events
+
+    def _wait_until(self, target):
+        while True:
+            left = target - monotonic()
+            if left <= 0:
+                return
+            if left > SPIN:
+                sleep(left - SPIN)
+
+    def run(self):
+        """Block until every start and stop event has been executed."""
+        self.t0 = monotonic() + self.lead
+        self.t0_wall = time() + (self.t0 - monotonic())
+        for offset, kind, fl in self._events():
+            self._wait_until(self.t0 + offset)
+            if kind == 0:
+                try:
+                    fl.proc.stdin.write(b'\n')
+                    fl.proc.stdin.close()
+                except (BrokenPipeError, OSError):
+                    print("Flow %s died before its start" % fl.name)
+                fl.released = monotonic() - self.t0
+            else:
+                if fl.proc.poll() is None:
+                    fl.proc.terminate()
+                fl.stopped = monotonic() - self.t0
+        if self.logfile:
+            self.write_log(self.logfile)
+        return self.flows
+
+    def wait(self):
+        for fl in self.flows:
+            fl.proc.wait()
+
+    def terminate(self):
+        for fl in self.flows:
+            if fl.proc.poll() is None:
+                fl.proc.terminate()
+
+    def start_error(self, fl):
+        """Achieved start error (sec) as stamped by the flow, or None."""
+        try:
+            with open(fl.stampfile) as f:
+                stamp = float(f.read().strip() or 'nan')
+        except (IOError, ValueError):
+            return None
+        if stamp != stamp:
+            # bash < 5 has no EPOCHREALTIME
+            return None
+        return stamp - (self.t0_wall + fl.start)
+
+    def write_log(self, fname):
+        with TraceWriter(fname, SCHEDULE_FIELDS) as w:
+            for fl in sorted(self.flows, key=lambda f: f.start):
+                start_err = self.start_error(fl)
+                row = {
+                    'target_offset': fl.start,
+                    'release_error_ms': (fl.released - fl.start) * 1000
+                    if fl.released is not None else None,
+                    'start_error_ms': start_err * 1000 if start_err is not None else None,
+                    'stop_offset': fl.stop,
+                    'stop_error_ms': (fl.stopped - fl.stop) * 1000
+                    if fl.stopped is not None else None,
+                }
+                w.write(self.t0_wall + fl.start, fl.name, row)
+                if os.path.exists(fl.stampfile):
+                    os.remove(fl.stampfile)
+
+
+def poisson_arrivals(rate, duration, mean_flow_duration=None, rng=None, start=0.0):
+    """(start, duration) of flows arriving as a Poisson process of `rate`
+    flows/sec during `duration` seconds, with exponential flow durations
+    of mean mean_flow_duration (None: until the end)."""
+    rng = rng or random.Random()
+    flows = []
+    t = start + rng.expovariate(rate)
+    while t < start + duration:
+        if mean_flow_duration:
+            d = min(rng.expovariate(1.0 / mean_flow_duration), start + duration - t)
+        else:
+            d = start + duration - t
+        flows.append((t, d))
+        t += rng.expovariate(rate)
+    return flows
+
+
+def read_timeline(fname):
+    """[(start, duration, name or None)] from a 'start,duration[,name]' CSV
+    (a header line is optional)."""
+    flows = []
+    with open(fname) as f:
+        for row in csv.reader(f):
+            if not row or row[0].strip().startswith('#'):
+                continue
+            try:
+                start, duration = float(row[0]), float(row[1])
+            except ValueError:
+                # Header
+                continue
+            name = row[2].strip() if len(row) > 2 and row[2].strip() else None
+            flows.append((start, duration, name))
+    return sorted(flows)
@@ -0,0 +1,207 @@
+'''
+Online steady-state detection to end runs adaptively.
+
+Once the flows have converged, the rest of a fixed-length run is more of
+the same sawtooth (Reno) or ProbeBW cycles (BBR).  SteadyStateDetector
+takes the streaming samples of a run (per-flow throughput, queue
+occupancy), averages them over fixed windows and calls a stream stable
+when its last K window means neither spread out nor drift by more than a
+tolerance.  The run is steady when every expected stream is stable.
+
+Samples are read from the files the monitors already write, with
+FileFollower tailing them as they grow:
+
+    queue_samples        "time,pkts" rows of monitor_qlen (q.txt, queue.txt)
+    iperf_text_samples   iperf2 interval lines (client run line-buffered)
+    iperf3_stream_samples  iperf3 --json-stream interval events
+
+wait_for_steady_state() drives the followers between a minimum and a
+maximum duration and returns why it stopped.
+'''
+
+import json
+import math
+import os
+from collections import deque
+from time import monotonic, sleep
+
+import iperf
+
+STOP_STEADY = 'steady'
+STOP_MAX_TIME = 'max_time'
+STOP_FLOWS_FINISHED = 'flows_finished'
+
+
+class _Stream(object):
+    __slots__ = ('window_idx', 'sum', 'n', 'means', 'rel_tol', 'abs_tol')
+
+    def __init__(self, k, rel_tol, abs_tol):
+        self.window_idx = None
+        self.sum = 0.0
+        self.n = 0
+        self.means = deque(maxlen=k)
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+
+
+class SteadyStateDetector(object):
+    """Windowed mean/variance stability test over several sample streams.
+
+    A stream is stable when its last k window means have a standard
+    deviation, and a first-to-last drift, of at most
+    max(rel_tol * |mean|, abs_tol).  The drift bound catches slow ramps
+    (e.g. a queue still filling) that a variance test alone would miss.
+    """
+
+    def __init__(self, window=1.0, k=5, rel_tol=0.1, abs_tol=0.0):
+        self.window = window
+        self.k = k
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.streams = {}
+
+    def expect(self, name, rel_tol=None, abs_tol=None):
+        """Register a stream that must be stable before the run is steady."""
+        if name not in self.streams:
+            self.streams[name] = _Stream(
+                self.k,
+                self.rel_tol if rel_tol is None else rel_tol,
+                self.abs_tol if abs_tol is None else abs_tol)
+        return self.streams[name]
+
+    def add(self, name, t, value):
+        s = self.streams.get(name) or self.expect(name)
+        idx = int(math.floor(t / self.window))
+        if s.window_idx is None:
+            s.window_idx = idx
+        if idx > s.window_idx:
+            if s.n:
+                s.means.append(s.sum / s.n)
+            s.window_idx, s.sum, s.n = idx, 0.0, 0
+        s.sum += value
+        s.n += 1
+
+    def stable(self, name):
+        s = self.streams[name]
+        if len(s.means) < self.k:
+            return False
+        means = list(s.means)
+        mean = sum(means) / len(means)
+        std = math.sqrt(sum((m - mean) ** 2 for m in means) / len(means))
+        bound = max(s.rel_tol * abs(mean), s.abs_tol)
+        return std <= bound and abs(means[-1] - means[0]) <= bound
+
+    def is_steady(self):
+        return bool(self.streams) and all(self.stable(n) for n in self.streams)
+
+    def status(self):
+        return {n: self.stable(n) for n in self.streams}
+
+
+class FileFollower(object):
+    """Returns the samples parsed from the lines appended to a file since
+    the previous poll.  The file does not have to exist yet."""
+
+    def __init__(self, fname, parse):
+        self.fname = fname
+        self.parse = parse
+        self.f = None
+        self.partial = ''
+
+    def poll(self):
+        if self.f is None:
+            if not os.path.exists(self.fname):
+                return []
+            self.f = open(self.fname)
+        data = self.partial + self.f.read()
+        lines = data.split('\n')
+        # Keep an incomplete last line for the next poll
+        self.partial = lines.pop()
+        samples = []
+        for line in lines:
+            samples.extend(self.parse(line))
+        return samples
+
+    def close(self):
+        if self.f:
+            self.f.close()
+
+
+def queue_samples(stream):
+    def parse(line):
+        try:
+            t, q = line.split(',')[:2]
+            return [(stream, float(t), float(q))]
+        except ValueError:
+            return []
+    return parse
+
+
+def iperf_text_samples(stream):
+    def parse(line):
+        rec = iperf.parse_iperf_line(line)
+        if rec is None:
+            return []
+        start, end, mbps = rec
+        return [(stream, end, mbps)]
+    return parse
+
+
+def iperf3_stream_samples(stream):
+    def parse(line):
+        if '"interval"' not in line:
+            return []
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            return []
+        total = obj.get('data', {}).get('sum', {})
+        if obj.get('event') != 'interval' or 'end' not in total:
+            return []
+        return [(stream, total['end'], total['bits_per_second'] / 1e6)]
+    return parse
+
+
+def flow_follower(outfile, stream):
+    """Follower of an iperf client log, by its extension."""
+    if outfile.endswith('.json'):
+        return FileFollower(outfile, iperf3_stream_samples(stream))
+    return FileFollower(outfile, iperf_text_samples(stream))
+
+
+def feed(detector, followers):
+    """Pass every new sample of the followers to detector."""
+    for fol in followers:
+        for name, t, value in fol.poll():
+            detector.add(name, t, value)
+
+
+def wait_for_steady_state(detector, followers, min_time, max_time, procs=(),
+                          poll_sec=0.5, progress_sec=2, start=None):
+    """Feed the followers into detector until the run is steady (after
+    min_time), max_time has passed or every process in procs has exited.
+    Times count from start (a monotonic() reading; default: now).
+
+    Returns (reason, elapsed seconds).
+    """
+    start = monotonic() if start is None else start
+    next_progress = 0
+    try:
+        while True:
+            feed(detector, followers)
+            elapsed = monotonic() - start
+            if elapsed >= min_time and detector.is_steady():
+                return STOP_STEADY, elapsed
+            if elapsed >= max_time:
+                return STOP_MAX_TIME, elapsed
+            if procs and all(p.poll() is not None for p in procs):
+                return STOP_FLOWS_FINISHED, elapsed
+            if elapsed >= next_progress:
+                stable = sum(detector.status().values())
+                print("Experiment running... %.1fs / %.0fs (%d/%d streams stable)" %
+                      (elapsed, max_time, stable, len(detector.streams)))
+                next_progress += progress_sec
+            sleep(poll_sec)
+    finally:
+        for fol in followers:
+            fol.close()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+
+'''
+Non-interactive sweep runner backed by a file-based job queue.
+
+A queue is a directory shared by every worker, on one box or on several
+boxes mounting the same filesystem:
+
+    <queue>/pending/<id>.json    waiting to run
+    <queue>/running/<id>.json    claimed by a worker (its lease)
+    <queue>/done/<id>.json       finished, expected outputs present
+    <queue>/failed/<id>.json     out of retries
+    <queue>/logs/<id>.log        stdout/stderr of every attempt
+
+A worker claims a job by rename()ing it from pending/ to running/: the
+rename is atomic, so exactly one worker wins and the others move on to
+the next file.  Plain directories are used instead of SQLite because
+SQLite's locking is not reliable on NFS, the usual way boxes share a
+results tree.
+
+While the job runs, its worker touches running/<id>.json every lease/3
+seconds.  A worker that crashes (or a box that reboots) stops touching
+it; once the file is older than the lease, any other worker moves it
+back to pending/ as a failed attempt.  A job that fails -- non-zero exit
+status, a timeout, a missing expected output or an expired lease -- is
+retried until it has used 1 + retries attempts, then parked in failed/.
+Since every job is an ordinary memoized run (memo.py), a retried or
+resumed job reuses whatever had already finished.
+
+tcp_competition.py and bufferbloat.py exit non-zero when a run aborts,
+but a run can still end without all of its outputs (a monitor that
+died, an analysis that found no data), so a job also lists the files
+its run must leave behind (--expect) and only counts as done when they
+exist.  Two Mininet runs cannot share a box
+(each one cleans up the other's hosts), so a job can name an exclusive
+resource (--exclusive mininet): a worker only claims it while holding a
+per-box flock on that name, and simulator jobs fill the other workers.
+
+Usage:
+    python3 sweep.py add --queue results/q --dir-template 'results/grid/{scenario}_d{delay}_q{maxq}' \\
+        --grid scenario=reno_vs_bbr,2reno_vs_2bbr delay=10,50 maxq=20,100 \\
+        --expect competition_results.json -- python3 tcp_competition.py --bw-net 10 --time 30
+    sudo python3 sweep.py work --queue results/q --workers 1
+    python3 sweep.py status --queue results/q
+'''
+
+import fcntl
+import hashlib
+import itertools
+import json
+import os
+import socket
+import sys
+from argparse import ArgumentParser, REMAINDER
+from multiprocessing import Process
+from subprocess import Popen, STDOUT, TimeoutExpired
+from time import sleep, time
+
+STATES = ('pending', 'running', 'done', 'failed')
+LOCK_DIR = '/tmp'
+
+
+def job_id(cmd):
+    """Content hash of a job's command: enqueuing it twice is a no-op."""
+    return hashlib.sha1(json.dumps(cmd).encode()).hexdigest()[:16]
+
+
+def _write_json(fname, obj):
+    """Write obj to fname through a rename, so readers never see half a file."""
+    tmp = '%s.%s.%d.tmp' % (fname, socket.gethostname(), os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, fname)
+
+
+def _read_json(fname):
+    with open(fname) as f:
+        return json.load(f)
+
+
+class JobQueue(object):
+    """A directory of job files moved between state subdirectories."""
+
+    def __init__(self, root, lease=60):
+        self.root = root
+        self.lease = lease
+        for d in STATES + ('logs', 'reaping'):
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+
+    def path(self, state, jid):
+        return os.path.join(self.root, state, jid + '.json')
+
+    def log_path(self, jid):
+        return os.path.join(self.root, 'logs', jid + '.log')
+
+    def ids(self, state):
+        return sorted(n[:-5] for n in os.listdir(os.path.join(self.root, state))
+                      if n.endswith('.json'))
+
+    def counts(self):
+        return {state: len(self.ids(state)) for state in STATES}
+
+    def state_of(self, jid):
+        for state in STATES:
+            if os.path.exists(self.path(state, jid)):
+                return state
+        return None
+
+    def add(self, cmd, run_dir=None, expect=(), retries=2, timeout=None, exclusive=None,
+            force=False):
+        """Enqueue cmd; returns its id, or None if it is already queued
+        (in any state).  With force, a done or failed job is queued again."""
+        jid = job_id(cmd)
+        state = self.state_of(jid)
+        if force and state in ('done', 'failed'):
+            try:
+                os.remove(self.path(state, jid))
+            except OSError:
+                return None
+            state = None
+        if state is not None:
+            return None
+        job = {'id': jid, 'cmd': cmd, 'dir': run_dir, 'expect': list(expect),
+               'retries': retries, 'timeout': timeout, 'exclusive': exclusive,
+               'attempts': 0, 'errors': [], 'added': time()}
+        _write_json(self.path('pending', jid), job)
+        return jid
+
+    def _move(self, src, state, job):
+        """Rewrite a job file we own, then publish it in `state`."""
+        _write_json(src, job)
+        os.rename(src, self.path(state, job['id']))
+
+    def claim(self, worker, locks):
+        """Claim the first pending job whose exclusive resource (if any)
+        this worker can lock; returns the job or None."""
+        for jid in self.ids('pending'):
+            src = self.path('pending', jid)
+            try:
+                exclusive = _read_json(src).get('exclusive')
+            except (OSError, ValueError):
+                continue
+            if exclusive and not locks.acquire(exclusive):
+                continue
+            dst = self.path('running', jid)
+            try:
+                # The lease runs from now: reap() must not see the pending
+                # file's old mtime before the claim is written
+                os.utime(src)
+                os.rename(src, dst)
+            except OSError:
+                # Another worker got there first
+                if exclusive:
+                    locks.release(exclusive)
+                continue
+            job = _read_json(dst)
+            job['attempts'] += 1
+            job['worker'] = worker
+            job['claimed'] = time()
+            _write_json(dst, job)
+            return job
+        return None
+
+    def heartbeat(self, jid):
+        try:
+            os.utime(self.path('running', jid))
+            return True
+        except OSError:
+            # Reaped behind our back: the job is no longer ours
+            return False
+
+    def finish(self, job, error=None):
+        """Move a claimed job to done/, back to pending/ or to failed/."""
+        src = self.path('running', job['id'])
+        if not os.path.exists(src):
+            print("%s: lease lost, result discarded" % job['id'])
+            return None
+        return self._settle(src, job, error)
+
+    def _settle(self, src, job, error):
+        job['finished'] = time()
+        if error is None:
+            state = 'done'
+        else:
+            job['errors'].append({'attempt': job['attempts'], 'worker': job.get('worker'),
+                                  'error': error, 'time': time()})
+            state = 'pending' if job['attempts'] <= job['retries'] else 'failed'
+        self._move(src, state, job)
+        return state
+
+    def reap(self):
+        """Return running jobs whose lease expired to pending/ (or failed/)."""
+        now = time()
+        reaped = []
+        for jid in self.ids('running'):
+            src = self.path('running', jid)
+            try:
+                if now - os.path.getmtime(src) < self.lease:
+                    continue
+            except OSError:
+                continue
+            # Claim the reaping itself, so two reapers don't both count it
+            tmp = os.path.join(self.root, 'reaping', '%s.%s.%d.json' % (
+                jid, socket.gethostname(), os.getpid()))
+            try:
+                os.rename(src, tmp)
+            except OSError:
+                continue
+            job = _read_json(tmp)
+            reaped.append((jid, self._settle(tmp, job, 'lease expired (worker %s)' % job.get('worker'))))
+        return reaped
+
+    def reset_failed(self):
+        """Give every failed job a fresh set of attempts."""
+        ids = self.ids('failed')
+        for jid in ids:
+            src = self.path('failed', jid)
+            job = _read_json(src)
+            job['attempts'] = 0
+            self._move(src, 'pending', job)
+        return ids
+
+
+class HostLocks(object):
+    """Per-box exclusive resources (flock on LOCK_DIR/sweep-<name>.lock)."""
+
+    def __init__(self):
+        self.held = {}
+
+    def acquire(self, name):
+        if name in self.held:
+            return True
+        f = open(os.path.join(LOCK_DIR, 'sweep-%s.lock' % name), 'w')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self.held[name] = f
+        return True
+
+    def release(self, name):
+        f = self.held.pop(name, None)
+        if f:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+
+def run_job(queue, job):
+    """Run one claimed job, heartbeating its lease; returns None on
+    success or an error string."""
+    with open(queue.log_path(job['id']), 'a') as log:
+        log.write("=== attempt %d on %s: %s\n" % (job['attempts'], job['worker'],
+                                                  ' '.join(job['cmd'])))
+        log.flush()
+        proc = Popen(job['cmd'], stdout=log, stderr=STDOUT)
+        start = time()
+        beat = max(queue.lease / 3.0, 0.5)
+        while True:
+            try:
+                proc.wait(timeout=beat)
+                break
+            except TimeoutExpired:
+                pass
+            if not queue.heartbeat(job['id']):
+                proc.terminate()
+                proc.wait()
+                return 'lease lost'
+            if job['timeout'] and time() - start > job['timeout']:
+                proc.terminate()
+                proc.wait()
+                return 'timeout after %ds' % job['timeout']
+    if proc.returncode != 0:
+        return 'exit status %d' % proc.returncode
+    missing = [f for f in job['expect']
+               if not os.path.exists(os.path.join(job['dir'] or '.', f))]
+    if missing:
+        return 'missing output: %s' % ', '.join(missing)
+    return None
+
+
+def work(root, lease=60, poll=5, wait=False):
+    """Worker loop: reap, claim, run, settle, until the queue drains (or
+    forever with wait=True)."""
+    queue = JobQueue(root, lease)
+    locks = HostLocks()
+    worker = '%s:%d' % (socket.gethostname(), os.getpid())
+    while True:
+        for jid, state in queue.reap():
+            print("[%s] %s: lease expired -> %s" % (worker, jid, state))
+        job = queue.claim(worker, locks)
+        if job is None:
+            counts = queue.counts()
+            if not wait and not counts['pending'] and not counts['running']:
+                return
+            sleep(poll)
+            continue
+        print("[%s] %s: attempt %d: %s" % (worker, job['id'], job['attempts'], job.get('dir') or ''))
+        try:
+            error = run_job(queue, job)
+        finally:
+            if job.get('exclusive'):
+                locks.release(job['exclusive'])
+        state = queue.finish(job, error)
+        print("[%s] %s: %s%s" % (worker, job['id'], state or 'lost',
+                                 '' if error is None else ' (%s)' % error))
+
+
+def run_workers(root, workers=1, lease=60, poll=5, wait=False):
+    """Run `workers` worker processes on this box until the queue drains;
+    returns the final job counts."""
+    if workers == 1:
+        work(root, lease, poll, wait)
+    else:
+        procs = [Process(target=work, args=(root, lease, poll, wait)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+    return JobQueue(root, lease).counts()
+
+
+def expand_grid(specs):
+    """[{key: value}] over the cartesian product of key=v1,v2,... specs."""
+    axes = []
+    for spec in specs:
+        key, _, values = spec.partition('=')
+        if not values:
+            raise ValueError("grid axis must be key=v1,v2,...: %s" % spec)
+        axes.append([(key, v) for v in values.split(',')])
+    return [dict(point) for point in itertools.product(*axes)]
+
+
+def grid_jobs(cmd, grid, dir_template=None):
+    """(cmd, run_dir) per grid point: each key is passed as --<key>
+    (underscores become dashes) and the run directory as --dir."""
+    jobs = []
+    for point in expand_grid(grid):
+        full = list(cmd)
+        for key, value in point.items():
+            full += ['--' + key.replace('_', '-'), value]
+        run_dir = dir_template.format(**point) if dir_template else None
+        if run_dir:
+            full += ['--dir', run_dir]
+        jobs.append((full, run_dir))
+    return jobs
+
+
+def print_status(queue, verbose=False):
+    counts = queue.counts()
+    print("  ".join("%s %d" % (s, counts[s]) for s in STATES))
+    for jid in queue.ids('running'):
+        job = _read_json(queue.path('running', jid))
+        print("running %s  attempt %d on %s  %s" % (jid, job['attempts'], job.get('worker'),
+                                                    job.get('dir') or ''))
+    for jid in queue.ids('failed'):
+        job = _read_json(queue.path('failed', jid))
+        print("failed  %s  %s: %s" % (jid, job.get('dir') or ' '.join(job['cmd']),
+                                      job['errors'][-1]['error'] if job['errors'] else '?'))
+    if verbose:
+        for state in ('pending', 'done'):
+            for jid in queue.ids(state):
+                job = _read_json(queue.path(state, jid))
+                print("%-7s %s  %s" % (state, jid, ' '.join(job['cmd'])))
+
+
+def main():
+    parser = ArgumentParser(description="File-based job queue for experiment sweeps")
+    sub = parser.add_subparsers(dest='action')
+    sub.required = True
+
+    add = sub.add_parser('add', help="Enqueue one job, or one per grid point")
+    add.add_argument('--queue', '-q', required=True)
+    add.add_argument('--grid', nargs='+', default=[],
+                     help="key=v1,v2,... axes, each passed as --key value")
+    add.add_argument('--dir', default=None, help="Run directory of a single job (passed as --dir)")
+    add.add_argument('--dir-template', default=None,
+                     help="Run directory per grid point, e.g. 'results/{scenario}_q{maxq}'")
+    add.add_argument('--expect', nargs='+', default=[],
+                     help="Files the run must leave in its directory to count as done")
+    add.add_argument('--retries', type=int, default=2,
+                     help="Extra attempts after a failure")
+    add.add_argument('--timeout', type=int, default=None,
+                     help="Kill an attempt after this many seconds")
+    add.add_argument('--exclusive', default=None,
+                     help="Per-box resource held while running (e.g. mininet)")
+    add.add_argument('--force', action='store_true',
+                     help="Queue again jobs that are already done or failed")
+    add.add_argument('cmd', nargs=REMAINDER, help="Job command, after --")
+
+    wk = sub.add_parser('work', help="Run jobs until the queue drains")
+    wk.add_argument('--queue', '-q', required=True)
+    wk.add_argument('--workers', '-n', type=int, default=1,
+                    help="Worker processes on this box")
+    wk.add_argument('--lease', type=int, default=60,
+                    help="Seconds without a heartbeat before a job is reclaimed")
+    wk.add_argument('--poll', type=float, default=5)
+    wk.add_argument('--wait', action='store_true',
+                    help="Keep polling for new jobs instead of exiting when drained")
+
+    st = sub.add_parser('status', help="Show queue state")
+    st.add_argument('--queue', '-q', required=True)
+    st.add_argument('--verbose', '-v', action='store_true')
+    st.add_argument('--retry-failed', action='store_true',
+                    help="Move failed jobs back to pending with fresh attempts")
+
+    args = parser.parse_args()
+
+    if args.action == 'add':
+        cmd = args.cmd[1:] if args.cmd and args.cmd[0] == '--' else args.cmd
+        if not cmd:
+            parser.error("missing job command")
+        if args.dir and args.grid:
+            parser.error("use --dir-template with --grid")
+        try:
+            jobs = grid_jobs(cmd, args.grid, args.dir_template) if args.grid else \
+                [(cmd + (['--dir', args.dir] if args.dir else []), args.dir)]
+        except (ValueError, KeyError) as e:
+            parser.error(str(e))
+        if args.expect and any(d is None for _, d in jobs):
+            parser.error("--expect needs --dir or --dir-template")
+        queue = JobQueue(args.queue)
+        added = 0
+        for full, run_dir in jobs:
+            if queue.add(full, run_dir, args.expect, args.retries, args.timeout, args.exclusive,
+                         args.force):
+                added += 1
+        print("%d job(s) added, %d already queued" % (added, len(jobs) - added))
+    elif args.action == 'work':
+        counts = run_workers(args.queue, args.workers, args.lease, args.poll, args.wait)
+        print("Queue drained: %d done, %d failed" % (counts['done'], counts['failed']))
+        if counts['failed']:
+            sys.exit(1)
+    else:
+        queue = JobQueue(args.queue)
+        if args.retry_failed:
+            print("%d failed job(s) re-queued" % len(queue.reset_failed()))
+        print_status(queue, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
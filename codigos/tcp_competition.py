@@ -1,23 +1,44 @@
 #!/usr/bin/env python
 
-from mininet.topo import Topo
-from mininet.node import CPULimitedHost
-from mininet.link import TCLink
-from mininet.net import Mininet
-from mininet.log import lg, info
-from mininet.util import dumpNodeConnections
-from mininet.cli import CLI
+try:
+    from mininet.topo import Topo
+    from mininet.node import CPULimitedHost
+    from mininet.link import TCLink
+    from mininet.net import Mininet
+    from mininet.log import lg, info
+    from mininet.util import dumpNodeConnections
+    from mininet.cli import CLI
+except ImportError:
+    # Only the simulator backend (--backend sim) runs without Mininet
+    Topo = object
+    Mininet = None
 
 from subprocess import Popen, PIPE
-from time import sleep, time
-from multiprocessing import Process
+from time import monotonic, sleep, time
+from multiprocessing import Process, Value
 from argparse import ArgumentParser
 import sys
 import os
 import math
 import json
+import random
 
 from monitor import monitor_qlen
+import iperf
+import aqm
+import memo
+import steady
+import scheduler
+from tcpinfo import write_tcpinfo_traces
+import pcapstream
+import linktrace
+import highbw
+import affinity
+import orchestrator
+import metrics_export
+import packetsim
+import fluidsim
+from tournament import available_congestion_control
 
 parser = ArgumentParser(description="TCP Competition: Reno vs BBR")
 parser.add_argument('--bw-host', '-B',
@@ -54,13 +75,260 @@ parser.add_argument('--scenario',
                     choices=['reno_vs_bbr', '2reno_vs_2bbr', '2reno_vs_1bbr', 'multiple_reno', 'multiple_bbr'],
                     default='reno_vs_bbr')
 
+parser.add_argument('--flows',
+                    nargs='+',
+                    help="Congestion control of each sender, overriding --scenario "
+                         "(e.g. --flows cubic cubic bbr)",
+                    default=None)
+
+parser.add_argument('--single-host',
+                    help="Run every flow from one sender host to one receiver host, each socket "
+                         "with its own congestion control (iperf -Z / iperf3 -C); flows are "
+                         "told apart by port",
+                    action='store_true')
+
+parser.add_argument('--tool',
+                    help="Traffic generator (iperf3 reports JSON with cwnd/RTT/retransmits)",
+                    choices=iperf.TOOLS,
+                    default='iperf')
+
+parser.add_argument('--interval', '-i',
+                    type=float,
+                    help="iperf report interval (sec), down to 0.1 with iperf3",
+                    default=1)
+
+parser.add_argument('--tcpinfo',
+                    help="Sample per-flow tcp_info (cwnd, srtt, pacing/delivery rate, bbr_info) on each sender",
+                    action='store_true')
+
+parser.add_argument('--tcpinfo-interval',
+                    type=float,
+                    help="tcp_info sampling interval (sec)",
+                    default=0.01)
+
+parser.add_argument('--capture',
+                    help="Capture TCP headers on the bottleneck (ring buffer) and analyze them per flow",
+                    action='store_true')
+
+parser.add_argument('--capture-snaplen',
+                    type=int,
+                    help="Bytes captured per packet",
+                    default=pcapstream.DEFAULT_SNAPLEN)
+
+parser.add_argument('--capture-ring',
+                    type=int,
+                    nargs=2,
+                    metavar=('FILES', 'MB'),
+                    help="Capture ring buffer: number of files and size of each (MB)",
+                    default=[10, 100])
+
+parser.add_argument('--capture-window',
+                    type=float,
+                    help="Statistics window of the pcap analyzer (sec)",
+                    default=0.1)
+
+parser.add_argument('--qdisc',
+                    help="Queue discipline on the bottleneck (droptail = TCLink's max_queue_size)",
+                    choices=aqm.QDISCS,
+                    default='droptail')
+
+parser.add_argument('--qdisc-params',
+                    help="Extra tc parameters for --qdisc, e.g. \"target 5ms interval 100ms ecn\"",
+                    default='')
+
+parser.add_argument('--highbw',
+                    help="Configure the qdiscs for multi-Gb/s links (HTB quantum/burst, pfifo without delay, rates above 1000 Mb/s; see highbw.py)",
+                    action='store_true')
+
+parser.add_argument('--offload',
+                    help="With --highbw, switch GSO/TSO/GRO on every interface",
+                    choices=highbw.OFFLOADS,
+                    default='keep')
+
+parser.add_argument('--affinity',
+                    help="Pin monitors, traffic generators and hosts to dedicated cores (see affinity.py)",
+                    action='store_true')
+
+parser.add_argument('--monitor-cores',
+                    type=int,
+                    help="With --affinity, physical cores reserved for the monitors",
+                    default=1)
+
+parser.add_argument('--metrics-port',
+                    type=int,
+                    help="Serve live Prometheus metrics of the run on 127.0.0.1:PORT (0: any free port; see metrics_export.py)",
+                    default=None)
+
+parser.add_argument('--force',
+                    help="Run even if a complete result of this exact configuration exists",
+                    action='store_true')
+
+parser.add_argument('--jitter',
+                    type=float,
+                    help="Delay each flow's start by a random 0..JITTER seconds",
+                    default=0)
+
+parser.add_argument('--flow-starts',
+                    type=float,
+                    nargs='+',
+                    help="Start offset (sec) of each flow, in scenario order (e.g. 0 10 to let BBR join a loaded link)",
+                    default=None)
+
+parser.add_argument('--seed',
+                    type=int,
+                    help="Seed of the start jitter (repetitions of a configuration use different seeds)",
+                    default=None)
+
+parser.add_argument('--access-delay',
+                    type=float,
+                    nargs='+',
+                    help="Access link delay (ms) of each sender, in scenario order; the last value repeats",
+                    default=[1])
+
+parser.add_argument('--access-bw',
+                    type=float,
+                    nargs='+',
+                    help="Access link bandwidth (Mb/s) of each sender (default: --bw-host)",
+                    default=None)
+
+parser.add_argument('--link-trace',
+                    help="Replay a bandwidth/delay/loss trace (Mahimahi or CSV, see linktrace.py) on the bottleneck",
+                    default=None)
+
+parser.add_argument('--link-trace-bin',
+                    type=int,
+                    help="Capacity bin (ms) of Mahimahi link traces",
+                    default=100)
+
+parser.add_argument('--adaptive',
+                    help="End the run once throughput and queue are steady (between --min-time and --max-time)",
+                    action='store_true')
+
+parser.add_argument('--min-time',
+                    type=float,
+                    help="Minimum duration (sec) of an adaptive run",
+                    default=10)
+
+parser.add_argument('--max-time',
+                    type=int,
+                    help="Maximum duration (sec) of an adaptive run (default: --time)",
+                    default=None)
+
+parser.add_argument('--steady-window',
+                    type=float,
+                    help="Averaging window (sec) of the steady-state detector",
+                    default=1.0)
+
+parser.add_argument('--steady-k',
+                    type=int,
+                    help="Consecutive stable windows required to stop",
+                    default=5)
+
+parser.add_argument('--steady-tol',
+                    type=float,
+                    help="Relative tolerance of the window means",
+                    default=0.1)
+
+parser.add_argument('--ping-interval',
+                    type=float,
+                    help="Seconds between pings (planner.py scales it to the RTT)",
+                    default=0.1)
+
+parser.add_argument('--queue-interval',
+                    type=float,
+                    help="Seconds between queue length samples",
+                    default=0.1)
+
+parser.add_argument('--backend',
+                    help="Run on Mininet (root) or on the packet-level simulator (packetsim.py)",
+                    choices=['mininet', 'sim'],
+                    default='mininet')
+
 args = parser.parse_args()
 
+if args.backend == 'mininet' and Mininet is None:
+    parser.error("Mininet is not installed: use --backend sim")
+if args.backend == 'sim' and (args.adaptive or args.capture or args.tcpinfo or
+                              args.qdisc != 'droptail'):
+    parser.error("--backend sim does not support --adaptive, --capture, --tcpinfo or AQMs")
+if args.backend == 'sim' and args.metrics_port is not None:
+    parser.error("--metrics-port needs --backend mininet")
+if args.single_host:
+    if args.backend == 'sim':
+        parser.error("--single-host only applies to --backend mininet")
+    if len(args.access_delay) > 1 or (args.access_bw and len(args.access_bw) > 1):
+        parser.error("--single-host flows share one access link: "
+                     "give one --access-delay/--access-bw")
+if args.flows:
+    known = (sorted(packetsim.CONGESTION_CONTROL) if args.backend == 'sim'
+             else available_congestion_control())
+    unknown = [a for a in args.flows if known and a not in known]
+    if unknown:
+        parser.error("congestion control not available: %s (available: %s)" %
+                     (' '.join(unknown), ' '.join(known)))
+    args.scenario = 'custom'
+
+if args.max_time is None:
+    args.max_time = args.time
+if args.ping_interval <= 0 or args.queue_interval <= 0:
+    parser.error("--ping-interval and --queue-interval must be positive")
+
+# Longest the run may last, from the start barrier (SCHED.t0): --time,
+# or --max-time of an adaptive run.  Late flows end with the rest.
+RUN_TIME = args.max_time if args.adaptive else args.time
+if args.flow_starts and max(args.flow_starts) + args.jitter >= RUN_TIME:
+    parser.error("every flow must start before the run ends (--flow-starts + --jitter < --time)")
+
+# The client logs are read while they are written (steady state, live metrics)
+FOLLOW_OUTPUT = args.adaptive or args.metrics_port is not None
+
+# iperf3 clients stream one JSON event per line (set once the hosts exist)
+JSON_STREAM = False
+
+# Why and when the run ended (adaptive runs stop early once steady)
+STOP = {'reason': 'fixed_time', 'duration': args.time}
+
+# Destination port -> flow label, filled as flows are started
+FLOW_LABELS = {}
+
+# Flow label -> start offset (sec): --flow-starts plus --jitter
+START_OFFSETS = {}
+jitter_rng = random.Random(args.seed)
+
+# Releases the clients of a run at their start offsets (see scheduler.py)
+SCHED = None
+
+# Per-interface qdisc layout applied by --highbw (see highbw.py)
+HIGHBW = []
+
+# Core assignments of --affinity (see affinity.py)
+AFFINITY = None
+
+# Supervisor of the servers, clients and pings of a Mininet run
+ORCH = None
+
+# Live metrics endpoint of --metrics-port (see metrics_export.py)
+LIVE = None
+
+# Seconds a client may outlive the run before it counts as hung
+CLIENT_GRACE = 10
+
+def access_link(i):
+    """bw/delay of the access link of the i-th sender (0-based)."""
+    delays = args.access_delay
+    bws = args.access_bw or [args.bw_host]
+    return dict(bw=bws[min(i, len(bws) - 1)],
+                delay='%fms' % delays[min(i, len(delays) - 1)])
+
 class CompetitionTopo(Topo):
     """Topology for TCP competition experiments."""
     
     def build(self, scenario='reno_vs_bbr'):
-        if scenario == 'reno_vs_bbr':
+        if args.single_host:
+            self.build_single_host()
+        elif args.flows:
+            self.build_flows(len(args.flows))
+        elif scenario == 'reno_vs_bbr':
             self.build_1v1()
         elif scenario == '2reno_vs_2bbr':
             self.build_2v2()
@@ -82,8 +350,8 @@ class CompetitionTopo(Topo):
         s2 = self.addSwitch('s2')  # Right switch
         
         # Links from senders to left switch (high bandwidth)
-        self.addLink(h1, s1, bw=args.bw_host, delay='1ms')
-        self.addLink(h2, s1, bw=args.bw_host, delay='1ms')
+        self.addLink(h1, s1, **access_link(0))
+        self.addLink(h2, s1, **access_link(1))
         
         # Bottleneck link between switches
         self.addLink(s1, s2, 
@@ -112,10 +380,10 @@ class CompetitionTopo(Topo):
         s2 = self.addSwitch('s2')  # Right switch
         
         # Links from senders to left switch
-        self.addLink(h1, s1, bw=args.bw_host, delay='1ms')
-        self.addLink(h2, s1, bw=args.bw_host, delay='1ms')
-        self.addLink(h3, s1, bw=args.bw_host, delay='1ms')
-        self.addLink(h4, s1, bw=args.bw_host, delay='1ms')
+        self.addLink(h1, s1, **access_link(0))
+        self.addLink(h2, s1, **access_link(1))
+        self.addLink(h3, s1, **access_link(2))
+        self.addLink(h4, s1, **access_link(3))
         
         # Bottleneck link between switches
         self.addLink(s1, s2, 
@@ -144,9 +412,9 @@ class CompetitionTopo(Topo):
         s2 = self.addSwitch('s2')  # Right switch
         
         # Links from senders to left switch
-        self.addLink(h1, s1, bw=args.bw_host, delay='1ms')
-        self.addLink(h2, s1, bw=args.bw_host, delay='1ms')
-        self.addLink(h3, s1, bw=args.bw_host, delay='1ms')
+        self.addLink(h1, s1, **access_link(0))
+        self.addLink(h2, s1, **access_link(1))
+        self.addLink(h3, s1, **access_link(2))
         
         # Bottleneck link between switches
         self.addLink(s1, s2, 
@@ -158,6 +426,41 @@ class CompetitionTopo(Topo):
         self.addLink(s2, h4, bw=args.bw_host, delay='1ms')
         self.addLink(s2, h5, bw=args.bw_host, delay='1ms')
         self.addLink(s2, h6, bw=args.bw_host, delay='1ms')
+    
+    def build_flows(self, n):
+        """Build n senders (h1..hn) and their receivers (h<n+1>..h<2n>)."""
+        s1 = self.addSwitch('s1')  # Left switch
+        s2 = self.addSwitch('s2')  # Right switch
+        
+        for i in range(n):
+            sender = self.addHost('h%d' % (i + 1))
+            self.addLink(sender, s1, **access_link(i))
+        
+        # Bottleneck link between switches
+        self.addLink(s1, s2, 
+                     bw=args.bw_net, 
+                     delay='%fms' % args.delay, 
+                     max_queue_size=args.maxq)
+        
+        for i in range(n):
+            receiver = self.addHost('h%d' % (n + i + 1))
+            self.addLink(s2, receiver, bw=args.bw_host, delay='1ms')
+
+    def build_single_host(self):
+        """Build one sender (h1) and one receiver (h2) for all flows."""
+        s1 = self.addSwitch('s1')
+        s2 = self.addSwitch('s2')
+        sender = self.addHost('h1')
+        receiver = self.addHost('h2')
+        self.addLink(sender, s1, **access_link(0))
+        
+        # Bottleneck link between switches
+        self.addLink(s1, s2, 
+                     bw=args.bw_net, 
+                     delay='%fms' % args.delay, 
+                     max_queue_size=args.maxq)
+        
+        self.addLink(s2, receiver, bw=args.bw_host, delay='1ms')
 
 def set_tcp_congestion_control(host, algorithm):
     """Set TCP congestion control algorithm on a host."""
@@ -165,44 +468,87 @@ def set_tcp_congestion_control(host, algorithm):
 
 def start_iperf_server(host, port=5001):
     """Start iperf server on a host."""
-    print(f"Starting iperf server on {host.name} port {port}")
-    return host.popen(f"iperf -s -p {port} -i 1")
+    print(f"Starting {args.tool} server on {host.name} port {port}")
+    server = host.popen(iperf.server_cmd(args.tool, port, args.interval))
+    ORCH.adopt(f'server_{host.name}_{port}', server, kind=orchestrator.SERVICE,
+               ready='[Ll]istening')
+    return server
+
+def wait_for_servers(timeout=1.0):
+    """Until every iperf server says it is listening (at most timeout)."""
+    deadline = time() + timeout
+    for name in [n for n in ORCH.tasks if n.startswith('server_')]:
+        ORCH.wait_ready(name, max(deadline - time(), 0))
 
 def start_iperf_client(host, server_ip, port=5001, duration=30, congestion_control=None):
     """Start iperf client with specific congestion control."""
     if congestion_control:
         set_tcp_congestion_control(host, congestion_control)
     
-    print(f"Starting iperf client on {host.name} to {server_ip}:{port} with {congestion_control}")
-    return host.popen(f"iperf -c {server_ip} -p {port} -t {duration} -i 1")
+    print(f"Starting {args.tool} client on {host.name} to {server_ip}:{port} with {congestion_control}")
+    return host.popen(iperf.client_cmd(args.tool, server_ip, port, duration, args.interval))
+
+def start_flow_client(host, server_ip, port, flow, congestion=None):
+    """Schedule the iperf client of a competing flow, logging to
+    <flow>_output.{txt,json}.  The client is spawned now and started by
+    SCHED.run() at its start offset; congestion sets its socket's
+    congestion control instead of the host's default."""
+    index = len(FLOW_LABELS)
+    FLOW_LABELS[port] = flow
+    outfile = f"{args.dir}/{flow}_output{iperf.output_ext(args.tool)}"
+    start = 0.0
+    if args.flow_starts:
+        start = args.flow_starts[min(index, len(args.flow_starts) - 1)]
+    if args.jitter > 0:
+        start += jitter_rng.uniform(0, args.jitter)
+    START_OFFSETS[flow] = start
+    # Every flow ends RUN_TIME after the barrier, whatever its start
+    duration = round(RUN_TIME - start, 3)
+    if args.tool == 'iperf3':
+        # iperf3 -t takes whole seconds
+        duration = max(1, int(round(duration)))
+    cmd = iperf.client_cmd(args.tool, server_ip, port, duration, args.interval, outfile,
+                           json_stream=FOLLOW_OUTPUT and JSON_STREAM,
+                           line_buffered=FOLLOW_OUTPUT, congestion=congestion)
+    if LIVE:
+        LIVE.follow_flow(flow, outfile)
+    return SCHED.add(flow, host, cmd, start)
+
+def start_tcpinfo_samplers(hosts, ports):
+    """Start one tcp_info sampler per sender namespace (if --tcpinfo)."""
+    if not args.tcpinfo:
+        return []
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tcpinfo.py')
+    samplers = []
+    for host in hosts:
+        print(f"Starting tcp_info sampler on {host.name}")
+        samplers.append(host.popen(f"python3 {script} --out {args.dir}/tcpinfo_{host.name}.bin "
+                                   f"--ports {ports} --interval {args.tcpinfo_interval}"))
+    return samplers
+
+def stop_processes(procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        proc.wait()
 
 def start_ping_monitor(host, target_ip, outfile):
     """Start continuous ping monitoring."""
     print(f"Starting ping from {host.name} to {target_ip}")
-    ping_cmd = f"ping -i 0.1 -c {args.time * 10} {target_ip} > {outfile}"
-    return host.popen(ping_cmd, shell=True)
+    ping_cmd = (f"ping -i {args.ping_interval:g} -c {int(RUN_TIME / args.ping_interval)} "
+                f"{target_ip} > {outfile}")
+    ping = host.popen(ping_cmd, shell=True)
+    ORCH.adopt(f'ping_{host.name}', ping, critical=False)
+    if LIVE:
+        LIVE.follow_ping(f'{host.name}-{target_ip}', outfile)
+    return ping
 
 def parse_iperf_output(output_file):
     """Parse iperf output to extract throughput and other metrics."""
     if not os.path.exists(output_file):
         return None
     
-    with open(output_file, 'r') as f:
-        lines = f.readlines()
-    
-    throughputs = []
-    for line in lines:
-        if 'Mbits/sec' in line and 'sec' in line:
-            parts = line.strip().split()
-            for i, part in enumerate(parts):
-                if part == 'Mbits/sec' and i > 0:
-                    try:
-                        throughput = float(parts[i-1])
-                        throughputs.append(throughput)
-                    except ValueError:
-                        continue
-    
-    return throughputs
+    return iperf.read_throughputs(output_file)
 
 def cleanup_network():
     """Clean up existing network interfaces and processes."""
@@ -225,14 +571,74 @@ def cleanup_network():
     
     print("Network cleanup completed.")
 
+def base_rtt(ping_file, samples=5):
+    """Base RTT (ms) of a flow: the minimum of the first ping samples,
+    taken before the flows load the queue."""
+    rtts = []
+    if not os.path.exists(ping_file):
+        return None
+    with open(ping_file) as f:
+        for line in f:
+            if 'time=' in line:
+                try:
+                    rtts.append(float(line.split('time=')[1].split()[0]))
+                except ValueError:
+                    continue
+                if len(rtts) == samples:
+                    break
+    return min(rtts) if rtts else None
+
+def mean_rtt(ping_file):
+    """Mean RTT (ms) over all ping samples of a flow."""
+    rtts = []
+    if not os.path.exists(ping_file):
+        return None
+    with open(ping_file) as f:
+        for line in f:
+            if 'time=' in line:
+                try:
+                    rtts.append(float(line.split('time=')[1].split()[0]))
+                except ValueError:
+                    continue
+    return sum(rtts) / len(rtts) if rtts else None
+
+def ping_file(results_dir, flow):
+    if args.single_host:
+        # All flows share the sender's path
+        return os.path.join(results_dir, 'ping.txt')
+    return os.path.join(results_dir, 'ping_%s.txt' % flow.replace('_flow', ''))
+
+def rtt_analysis(results_dir, results):
+    """Throughput share of each flow against its base RTT ratio.
+
+    share_rtt_normalized weights each flow's throughput by its own base
+    RTT (Reno's rate goes as 1/RTT), so 1/n means RTT-fair.
+    """
+    rows = {}
+    for flow, r in results.items():
+        rtt = base_rtt(ping_file(results_dir, flow))
+        if rtt:
+            rows[flow] = {'avg_throughput': r['avg_throughput'], 'base_rtt_ms': rtt}
+    if len(rows) < 2:
+        return None
+    total = sum(r['avg_throughput'] for r in rows.values())
+    weighted = sum(r['avg_throughput'] * r['base_rtt_ms'] for r in rows.values())
+    min_rtt = min(r['base_rtt_ms'] for r in rows.values())
+    for r in rows.values():
+        r['rtt_ratio'] = r['base_rtt_ms'] / min_rtt
+        r['share'] = r['avg_throughput'] / total if total else 0
+        r['share_rtt_normalized'] = (r['avg_throughput'] * r['base_rtt_ms'] / weighted
+                                     if weighted else 0)
+    return rows
+
 def analyze_competition_results(results_dir):
     """Analyze competition results and determine winner."""
     results = {}
     
     # Parse iperf results for each flow
     for file in os.listdir(results_dir):
-        if file.endswith('_output.txt'):
-            flow_name = file.replace('_output.txt', '')
+        flow_name = iperf.flow_name(file)
+        if flow_name:
             throughputs = parse_iperf_output(os.path.join(results_dir, file))
             
             if throughputs:
@@ -244,9 +650,14 @@ def analyze_competition_results(results_dir):
                     'std_throughput': math.sqrt(sum([(x - sum(throughputs)/len(throughputs))**2 for x in throughputs]) / len(throughputs))
                 }
     
-    # Separate flows by algorithm
-    reno_flows = {k: v for k, v in results.items() if 'reno' in k.lower()}
-    bbr_flows = {k: v for k, v in results.items() if 'bbr' in k.lower()}
+    # Separate flows by the congestion control they ran, not by file name
+    plan = dict(flow_plan())
+    by_algorithm = {}
+    for flow, r in results.items():
+        r['algorithm'] = plan.get(flow, flow.split('_flow')[0])
+        by_algorithm.setdefault(r['algorithm'], {})[flow] = r
+    reno_flows = by_algorithm.get('reno', {})
+    bbr_flows = by_algorithm.get('bbr', {})
     
     # Create structured output
     output = {
@@ -255,36 +666,62 @@ def analyze_competition_results(results_dir):
             'bandwidth': args.bw_net,
             'delay': args.delay,
             'queue_size': args.maxq,
-            'duration': args.time
+            'duration': args.time,
+            'qdisc': args.qdisc,
+            'qdisc_params': args.qdisc_params,
+            'tool': args.tool,
+            'interval': args.interval,
+            'jitter': args.jitter,
+            'seed': args.seed,
+            'start_offsets': START_OFFSETS,
+            'adaptive': args.adaptive,
+            'access_delay': args.access_delay,
+            'access_bw': args.access_bw or [args.bw_host],
+            'link_trace': args.link_trace,
+            'highbw': HIGHBW if args.highbw else None,
+            'offload': args.offload,
+            'single_host': args.single_host
         },
+        'stop': STOP,
+        'flows': results,
+        'flow_algorithms': {flow: r['algorithm'] for flow, r in results.items()},
+        'algorithms': algorithm_summary(results_dir, by_algorithm),
         'reno_flows': [v for v in reno_flows.values()],
         'bbr_flows': [v for v in bbr_flows.values()]
     }
     
-    if reno_flows and bbr_flows:
-        # Calculate total throughput for each algorithm
-        reno_total = sum(flow['avg_throughput'] for flow in reno_flows.values())
-        bbr_total = sum(flow['avg_throughput'] for flow in bbr_flows.values())
-        
+    if args.link_trace:
+        output['link_capacity'] = linktrace.capacity_summary(
+            os.path.join(results_dir, 'capacity.txt'))
+    
+    rtts = rtt_analysis(results_dir, results)
+    if rtts:
+        output['rtt_analysis'] = rtts
+    
+    if len(by_algorithm) >= 2:
         # Calculate fairness index (modified for multiple flows)
         all_throughputs = [flow['avg_throughput'] for flow in results.values()]
         n = len(all_throughputs)
-        if n > 0:
-            sum_throughputs = sum(all_throughputs)
-            sum_squared_throughputs = sum(x**2 for x in all_throughputs)
-            fairness_index = (sum_throughputs**2) / (n * sum_squared_throughputs)
+        sum_squared_throughputs = sum(x**2 for x in all_throughputs)
+        if sum_squared_throughputs > 0:
+            fairness_index = (sum(all_throughputs)**2) / (n * sum_squared_throughputs)
         else:
             fairness_index = 0
         
         output['fairness_index'] = fairness_index
         
-        # Determine winner
-        if reno_total > bbr_total:
-            output['winner'] = 'TCP Reno'
-            output['advantage'] = (reno_total - bbr_total) / bbr_total * 100
-        else:
-            output['winner'] = 'TCP BBR'
-            output['advantage'] = (bbr_total - reno_total) / reno_total * 100
+        # Determine winner: the algorithm with the most total throughput
+        ranked = sorted(output['algorithms'].items(),
+                        key=lambda kv: kv[1]['total_throughput'], reverse=True)
+        (first, top), (_, second) = ranked[0], ranked[1]
+        output['winner'] = algorithm_name(first)
+        output['advantage'] = ((top['total_throughput'] - second['total_throughput']) /
+                               second['total_throughput'] * 100
+                               if second['total_throughput'] else 0)
+    
+    if reno_flows and bbr_flows:
+        reno_total = sum(flow['avg_throughput'] for flow in reno_flows.values())
+        bbr_total = sum(flow['avg_throughput'] for flow in bbr_flows.values())
         
         # Additional statistics
         output['reno_total'] = reno_total
@@ -296,11 +733,109 @@ def analyze_competition_results(results_dir):
     
     return output
 
+SCENARIO_ALGORITHMS = {
+    'reno_vs_bbr': ['reno', 'bbr'],
+    '2reno_vs_2bbr': ['reno', 'reno', 'bbr', 'bbr'],
+    '2reno_vs_1bbr': ['reno', 'reno', 'bbr'],
+}
+
+ALGORITHM_NAMES = {'reno': 'TCP Reno', 'bbr': 'TCP BBR', 'cubic': 'TCP CUBIC'}
+
+def algorithm_name(algorithm):
+    return ALGORITHM_NAMES.get(algorithm, 'TCP ' + algorithm.upper())
+
+def flow_plan():
+    """[(flow label, congestion control)] of the senders, in order."""
+    algorithms = args.flows or SCENARIO_ALGORITHMS.get(args.scenario, ['reno', 'bbr'])
+    return list(zip(fluidsim.flow_labels(algorithms), algorithms))
+
+def algorithm_summary(results_dir, by_algorithm):
+    """Throughput share and delay of each congestion control of the run."""
+    total = sum(r['avg_throughput'] for flows in by_algorithm.values() for r in flows.values())
+    summary = {}
+    for algorithm, flows in by_algorithm.items():
+        tput = sum(r['avg_throughput'] for r in flows.values())
+        rtts = [mean_rtt(ping_file(results_dir, f)) for f in flows]
+        bases = [base_rtt(ping_file(results_dir, f)) for f in flows]
+        rtts = [r for r in rtts if r is not None]
+        queueing = [r - b for r, b in zip(rtts, bases) if r is not None and b is not None]
+        summary[algorithm] = {
+            'flows': len(flows),
+            'total_throughput': tput,
+            'avg_per_flow': tput / len(flows),
+            'share': tput / total if total else 0,
+            'avg_rtt_ms': sum(rtts) / len(rtts) if rtts else None,
+            'queueing_delay_ms': sum(queueing) / len(queueing) if queueing else None,
+        }
+    return summary
+
+def experiment_config():
+    """Everything that determines the outcome of this run (for memo)."""
+    config = {k: v for k, v in vars(args).items() if k not in ('dir', 'force', 'metrics_port')}
+    config['experiment'] = 'tcp_competition'
+    config['topology'] = {'class': 'CompetitionTopo', 'receiver_access_delay_ms': 1}
+    config['algorithms'] = [algorithm for _, algorithm in flow_plan()]
+    if args.link_trace:
+        config['link_trace_sha256'] = linktrace.trace_digest(args.link_trace)
+    return config
+
+def save_results(run_hash, fingerprint):
+    """Analyze the run in args.dir, save and print its results."""
+    results = analyze_competition_results(args.dir)
+    with open(f'{args.dir}/competition_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print_results_summary(results)
+    extra = {'stop': STOP}
+    if args.backend == 'mininet':
+        extra['affinity'] = AFFINITY.record() if AFFINITY else None
+        extra['monitor_timing'] = affinity.monitor_timing(f'{args.dir}/queue.txt',
+                                                          args.queue_interval)
+        extra['processes'] = ORCH.summary()
+    memo.write_meta(args.dir, run_hash, fingerprint, extra=extra)
+
+def simulate_competition():
+    """Run the scenario on packetsim.py instead of Mininet."""
+    plan = flow_plan()
+    access = []
+    for i, (flow, _) in enumerate(plan):
+        link = access_link(i)
+        access.append((link['bw'], float(link['delay'][:-2])))
+        start = 0.0
+        if args.flow_starts:
+            start = args.flow_starts[min(i, len(args.flow_starts) - 1)]
+        if args.jitter > 0:
+            start += jitter_rng.uniform(0, args.jitter)
+        START_OFFSETS[flow] = start
+    begin = time()
+    packetsim.simulate_competition(args.dir, plan, args.bw_net,
+                                   args.bw_host, args.delay, args.maxq, args.time, access,
+                                   START_OFFSETS, args.seed, args.link_trace,
+                                   args.link_trace_bin, args.ping_interval,
+                                   args.queue_interval)
+    print(f"Simulated {args.time}s in {time() - begin:.1f}s")
+
 def run_competition_experiment():
     """Run the TCP competition experiment."""
+    global JSON_STREAM, SCHED, AFFINITY, ORCH, LIVE
     if not os.path.exists(args.dir):
         os.makedirs(args.dir)
     
+    # Skip the emulation if this exact configuration already ran
+    run_hash, fingerprint, cached = memo.lookup(args.dir, experiment_config(),
+                                                ['competition_results.json', 'queue.txt'],
+                                                args.force)
+    if cached:
+        print(f"Reusing results of identical run {run_hash[:12]} from {cached} (use --force to re-run)")
+        memo.reuse(cached, args.dir)
+        with open(f'{args.dir}/competition_results.json') as f:
+            print_results_summary(json.load(f))
+        return
+    
+    if args.backend == 'sim':
+        simulate_competition()
+        save_results(run_hash, fingerprint)
+        return
+    
     # Clean up any existing Mininet processes and interfaces
     cleanup_network()
     
@@ -322,18 +857,19 @@ def run_competition_experiment():
     dumpNodeConnections(net.hosts)
     net.pingAll()
     
-    # Find the correct interface for queue monitoring
-    s1 = net.get('s1')
-    queue_interface = None
+    if FOLLOW_OUTPUT and args.tool == 'iperf3':
+        JSON_STREAM = iperf.supports_json_stream(net.hosts[0])
+        if not JSON_STREAM:
+            print("iperf3 lacks --json-stream: steady-state detection and live metrics "
+                  "use the queue only")
     
-    # Try to find the interface connected to s2
-    for intf in s1.intfNames():
-        if 'eth' in intf:
-            # Check if this interface is connected to s2
-            cmd_result = s1.cmd(f'ip link show {intf}')
-            if 'state UP' in cmd_result or 'UNKNOWN' in cmd_result:
-                queue_interface = intf
-                break
+    # Find the correct interface for queue monitoring: s1's side of the
+    # s1-s2 bottleneck link
+    s1, s2 = net.get('s1', 's2')
+    queue_interface = None
+    for link in net.linksBetween(s1, s2):
+        intf = link.intf1 if link.intf1.node == s1 else link.intf2
+        queue_interface = intf.name
     
     if not queue_interface:
         # Fallback to a common interface name
@@ -341,13 +877,72 @@ def run_competition_experiment():
     
     print(f"Using interface {queue_interface} for queue monitoring")
     
+    if args.highbw:
+        # netem must stay where aqm.py or the link trace change it
+        keep = [queue_interface] if args.qdisc != 'droptail' or args.link_trace else []
+        HIGHBW.extend(highbw.tune_net(net, args.offload, keep_netem=keep))
+    
+    if args.qdisc != 'droptail':
+        aqm.install_aqm(s1, queue_interface, args.qdisc, args.qdisc_params,
+                        delay_ms=args.delay)
+    
+    SCHED = scheduler.FlowScheduler(f'{args.dir}/flow_schedule.csv')
+    ORCH = orchestrator.Orchestrator(f'{args.dir}/events.jsonl').start()
+    
+    if args.affinity:
+        # Senders are h1..hn (a single h1 with --single-host)
+        n = 1 if args.single_host else len(flow_plan())
+        AFFINITY = affinity.AffinityPlan(args.monitor_cores)
+        print("CPU affinity:")
+        AFFINITY.describe()
+        AFFINITY.assign_hosts(net.hosts, generators=['h%d' % (i + 1) for i in range(n)])
+        AFFINITY.pin_self()
+    
+    # Replay the link trace on the bottleneck; the monitor annotates its
+    # samples with the capacity in effect
+    capacity = None
+    tracer = None
+    if args.link_trace:
+        capacity = Value('d', args.bw_net)
+        limit = aqm.NETEM_LIMIT if args.qdisc != 'droptail' else args.maxq
+        tracer = Process(target=linktrace.run_link_trace,
+                         args=(queue_interface, args.link_trace, args.delay, limit, capacity,
+                               f'{args.dir}/capacity.txt', True, args.link_trace_bin,
+                               None, args.highbw))
+    
+    if args.metrics_port is not None:
+        LIVE = metrics_export.LiveMetrics(args.dir, 'tcp_competition').start(args.metrics_port)
+    
     # Start queue monitoring
-    qmon = Process(target=monitor_qlen, args=(queue_interface, 0.1, f'{args.dir}/queue.txt'))
+    qmon = Process(target=monitor_qlen, args=(queue_interface, args.queue_interval,
+                                              f'{args.dir}/queue.txt',
+                                              f'{args.dir}/queue_stats.csv', capacity,
+                                              LIVE.queue if LIVE else None))
     qmon.start()
+    if tracer:
+        tracer.start()
+    if AFFINITY:
+        AFFINITY.pin('qmon', qmon.pid, 'monitors')
+        if tracer:
+            AFFINITY.pin('linktrace', tracer.pid, 'monitors')
+    
+    capture = None
+    if args.capture:
+        print(f"Capturing TCP headers on {queue_interface}")
+        capture = pcapstream.start_capture(queue_interface, f'{args.dir}/bottleneck',
+                                           args.capture_snaplen, args.capture_ring[1],
+                                           args.capture_ring[0])
+        if AFFINITY:
+            AFFINITY.pin('capture', capture.pid, 'monitors')
     
+    error = None
     try:
         # Run experiment based on scenario
-        if args.scenario == 'reno_vs_bbr':
+        if args.single_host:
+            run_single_host_experiment(net)
+        elif args.flows:
+            run_flows_experiment(net)
+        elif args.scenario == 'reno_vs_bbr':
             run_1v1_experiment(net)
         elif args.scenario == '2reno_vs_2bbr':
             run_2v2_experiment(net)
@@ -356,28 +951,52 @@ def run_competition_experiment():
         
         # Stop monitoring
         qmon.terminate()
+        if tracer:
+            tracer.terminate()
+        if capture:
+            Popen("pkill -f 'tcpdump -i %s'" % queue_interface, shell=True).wait()
+            capture.wait()
+            pcapstream.analyze_pcaps(pcapstream.ring_files(f'{args.dir}/bottleneck'),
+                                     f'{args.dir}/pcap_trace.csv',
+                                     args.capture_window, FLOW_LABELS)
         
-        # Analyze results
-        results = analyze_competition_results(args.dir)
-        
-        # Save results
-        with open(f'{args.dir}/competition_results.json', 'w') as f:
-            json.dump(results, f, indent=2)
+        # Convert iperf3 JSON logs to the shared trace format
+        if args.tool == 'iperf3':
+            iperf.write_flow_traces(args.dir)
+        if args.tcpinfo:
+            write_tcpinfo_traces(args.dir, FLOW_LABELS)
+        if LIVE:
+            LIVE.stop()
         
-        # Print summary
-        print_results_summary(results)
+        # Analyze, save and print results
+        save_results(run_hash, fingerprint)
         
     except Exception as e:
+        error = e
         print(f"Error during experiment: {e}")
         if qmon.is_alive():
             qmon.terminate()
+        if tracer and tracer.is_alive():
+            tracer.terminate()
+        SCHED.terminate()
+        if capture and capture.poll() is None:
+            Popen("pkill -f 'tcpdump -i %s'" % queue_interface, shell=True).wait()
     
     finally:
+        ORCH.stop()
+        if LIVE:
+            LIVE.stop()
+        
         # Clean up network
         net.stop()
         
         # Comprehensive cleanup
         cleanup_network()
+    
+    if error is not None:
+        # Not a complete run (no run_meta.json): tell the caller too
+        print(f"Run aborted: {ORCH.reason or error}")
+        sys.exit(1)
 
 def run_1v1_experiment(net):
     """Run 1 Reno vs 1 BBR experiment."""
@@ -394,24 +1013,30 @@ def run_1v1_experiment(net):
     server1 = start_iperf_server(h3, port=5001)
     server2 = start_iperf_server(h4, port=5002)
     
-    sleep(1)  # Give servers time to start
+    wait_for_servers()
     
     # Start ping monitoring
     ping1 = start_ping_monitor(h1, h3.IP(), f'{args.dir}/ping_reno.txt')
     ping2 = start_ping_monitor(h2, h4.IP(), f'{args.dir}/ping_bbr.txt')
     
+    samplers = start_tcpinfo_samplers([h1, h2], '5001-5002')
+    
     # Start iperf clients
-    client1 = h1.popen(f"iperf -c {h3.IP()} -p 5001 -t {args.time} -i 1 > {args.dir}/reno_flow_output.txt", shell=True)
-    client2 = h2.popen(f"iperf -c {h4.IP()} -p 5002 -t {args.time} -i 1 > {args.dir}/bbr_flow_output.txt", shell=True)
+    client1 = start_flow_client(h1, h3.IP(), 5001, 'reno_flow')
+    client2 = start_flow_client(h2, h4.IP(), 5002, 'bbr_flow')
+    
+    # Release the clients at their start offsets
+    SCHED.run()
     
     # Monitor experiment progress
-    monitor_experiment_progress()
+    monitor_experiment_progress([client1, client2])
     
     # Wait for clients to finish
     client1.wait()
     client2.wait()
     
     # Stop monitoring
+    stop_processes(samplers)
     ping1.terminate()
     ping2.terminate()
     
@@ -442,20 +1067,27 @@ def run_2v2_experiment(net):
     server3 = start_iperf_server(h7, port=5003)
     server4 = start_iperf_server(h8, port=5004)
     
-    sleep(1)
+    wait_for_servers()
     
-    # Start ping monitoring (sample from each algorithm)
+    # Start ping monitoring (one per flow: base RTTs may differ)
     ping1 = start_ping_monitor(h1, h5.IP(), f'{args.dir}/ping_reno_1.txt')
     ping2 = start_ping_monitor(h3, h7.IP(), f'{args.dir}/ping_bbr_1.txt')
+    ping3 = start_ping_monitor(h2, h6.IP(), f'{args.dir}/ping_reno_2.txt')
+    ping4 = start_ping_monitor(h4, h8.IP(), f'{args.dir}/ping_bbr_2.txt')
+    
+    samplers = start_tcpinfo_samplers([h1, h2, h3, h4], '5001-5004')
     
     # Start iperf clients
-    client1 = h1.popen(f"iperf -c {h5.IP()} -p 5001 -t {args.time} -i 1 > {args.dir}/reno_flow_1_output.txt", shell=True)
-    client2 = h2.popen(f"iperf -c {h6.IP()} -p 5002 -t {args.time} -i 1 > {args.dir}/reno_flow_2_output.txt", shell=True)
-    client3 = h3.popen(f"iperf -c {h7.IP()} -p 5003 -t {args.time} -i 1 > {args.dir}/bbr_flow_1_output.txt", shell=True)
-    client4 = h4.popen(f"iperf -c {h8.IP()} -p 5004 -t {args.time} -i 1 > {args.dir}/bbr_flow_2_output.txt", shell=True)
+    client1 = start_flow_client(h1, h5.IP(), 5001, 'reno_flow_1')
+    client2 = start_flow_client(h2, h6.IP(), 5002, 'reno_flow_2')
+    client3 = start_flow_client(h3, h7.IP(), 5003, 'bbr_flow_1')
+    client4 = start_flow_client(h4, h8.IP(), 5004, 'bbr_flow_2')
+    
+    # Release the clients at their start offsets
+    SCHED.run()
     
     # Monitor experiment progress
-    monitor_experiment_progress()
+    monitor_experiment_progress([client1, client2, client3, client4])
     
     # Wait for clients to finish
     client1.wait()
@@ -464,8 +1096,11 @@ def run_2v2_experiment(net):
     client4.wait()
     
     # Stop monitoring
+    stop_processes(samplers)
     ping1.terminate()
     ping2.terminate()
+    ping3.terminate()
+    ping4.terminate()
     
     # Stop servers
     server1.terminate()
@@ -492,20 +1127,25 @@ def run_2v1_experiment(net):
     server2 = start_iperf_server(h5, port=5002)
     server3 = start_iperf_server(h6, port=5003)
     
-    sleep(1)
+    wait_for_servers()
     
     # Start ping monitoring
     ping1 = start_ping_monitor(h1, h4.IP(), f'{args.dir}/ping_reno_1.txt')
     ping2 = start_ping_monitor(h2, h5.IP(), f'{args.dir}/ping_reno_2.txt')
     ping3 = start_ping_monitor(h3, h6.IP(), f'{args.dir}/ping_bbr.txt')
     
+    samplers = start_tcpinfo_samplers([h1, h2, h3], '5001-5003')
+    
     # Start iperf clients
-    client1 = h1.popen(f"iperf -c {h4.IP()} -p 5001 -t {args.time} -i 1 > {args.dir}/reno_flow_1_output.txt", shell=True)
-    client2 = h2.popen(f"iperf -c {h5.IP()} -p 5002 -t {args.time} -i 1 > {args.dir}/reno_flow_2_output.txt", shell=True)
-    client3 = h3.popen(f"iperf -c {h6.IP()} -p 5003 -t {args.time} -i 1 > {args.dir}/bbr_flow_output.txt", shell=True)
+    client1 = start_flow_client(h1, h4.IP(), 5001, 'reno_flow_1')
+    client2 = start_flow_client(h2, h5.IP(), 5002, 'reno_flow_2')
+    client3 = start_flow_client(h3, h6.IP(), 5003, 'bbr_flow')
+    
+    # Release the clients at their start offsets
+    SCHED.run()
     
     # Monitor experiment progress
-    monitor_experiment_progress()
+    monitor_experiment_progress([client1, client2, client3])
     
     # Wait for clients to finish
     client1.wait()
@@ -513,6 +1153,7 @@ def run_2v1_experiment(net):
     client3.wait()
     
     # Stop monitoring
+    stop_processes(samplers)
     ping1.terminate()
     ping2.terminate()
     ping3.terminate()
@@ -522,16 +1163,136 @@ def run_2v1_experiment(net):
     server2.terminate()
     server3.terminate()
 
-def monitor_experiment_progress():
-    """Monitor and display experiment progress."""
-    start_time = time()
-    while True:
-        now = time()
-        delta = now - start_time
-        if delta > args.time:
-            break
-        print(f"Experiment running... {delta:.1f}s / {args.time}s")
-        sleep(2)
+def run_flows_experiment(net):
+    """Run one flow per --flows entry, each sender with its own
+    congestion control."""
+    plan = flow_plan()
+    n = len(plan)
+    senders = [net.get('h%d' % (i + 1)) for i in range(n)]
+    receivers = [net.get('h%d' % (n + i + 1)) for i in range(n)]
+    
+    # Configure TCP algorithms
+    for host, (_, algorithm) in zip(senders, plan):
+        set_tcp_congestion_control(host, algorithm)
+    
+    # Start iperf servers
+    servers = [start_iperf_server(host, port=5001 + i) for i, host in enumerate(receivers)]
+    
+    wait_for_servers()
+    
+    # Start ping monitoring (one per flow: base RTTs may differ)
+    pings = [start_ping_monitor(src, dst.IP(), ping_file(args.dir, flow))
+             for src, dst, (flow, _) in zip(senders, receivers, plan)]
+    
+    samplers = start_tcpinfo_samplers(senders, '5001-%d' % (5000 + n))
+    
+    # Start iperf clients
+    clients = [start_flow_client(src, dst.IP(), 5001 + i, flow)
+               for i, (src, dst, (flow, _)) in enumerate(zip(senders, receivers, plan))]
+    
+    # Release the clients at their start offsets
+    SCHED.run()
+    
+    # Monitor experiment progress
+    monitor_experiment_progress(clients)
+    
+    # Wait for clients to finish
+    for client in clients:
+        client.wait()
+    
+    # Stop monitoring
+    stop_processes(samplers)
+    for ping in pings:
+        ping.terminate()
+    
+    # Stop servers
+    for server in servers:
+        server.terminate()
+
+def run_single_host_experiment(net):
+    """Run every flow of the plan from h1 to h2: flow i goes to port
+    5001 + i and its socket runs its own congestion control, so the
+    flow count grows without adding hosts."""
+    plan = flow_plan()
+    n = len(plan)
+    sender, receiver = net.get('h1', 'h2')
+    
+    # One server per flow: the port identifies the flow in every trace
+    servers = [start_iperf_server(receiver, port=5001 + i) for i in range(n)]
+    
+    wait_for_servers()
+    
+    ping = start_ping_monitor(sender, receiver.IP(), ping_file(args.dir, None))
+    
+    samplers = start_tcpinfo_samplers([sender], '5001-%d' % (5000 + n))
+    
+    clients = [start_flow_client(sender, receiver.IP(), 5001 + i, flow, congestion=algorithm)
+               for i, (flow, algorithm) in enumerate(plan)]
+    
+    # Release the clients at their start offsets
+    SCHED.run()
+    
+    # Monitor experiment progress
+    monitor_experiment_progress(clients)
+    
+    # Wait for clients to finish
+    for client in clients:
+        client.wait()
+    
+    # Stop monitoring
+    stop_processes(samplers)
+    ping.terminate()
+    
+    # Stop servers
+    for server in servers:
+        server.terminate()
+
+def monitor_experiment_progress(clients=()):
+    """Wait for the clients under ORCH's supervision.
+
+    The wait ends when the clients exit, and raises orchestrator.Aborted
+    as soon as a server dies, a client fails or outlives the run by
+    CLIENT_GRACE.  Adaptive runs end as soon as every flow's throughput
+    and the queue are steady: the clients are stopped and the reason
+    recorded in STOP.
+    """
+    labels = list(FLOW_LABELS.values())
+    names = []
+    # SCHED.run() returned at the last start offset: the run's clock
+    # started at the barrier, not now
+    t0 = SCHED.t0 if SCHED and SCHED.t0 is not None else monotonic()
+    remaining = max(0.0, RUN_TIME - (monotonic() - t0))
+    for i, client in enumerate(clients):
+        name = 'client_' + (labels[i] if len(labels) == len(clients) else str(i + 1))
+        ORCH.adopt(name, client, deadline=remaining + CLIENT_GRACE)
+        names.append(name)
+    if args.adaptive:
+        detector = steady.SteadyStateDetector(args.steady_window, args.steady_k,
+                                              args.steady_tol)
+        followers = []
+        detector.expect('queue', abs_tol=max(1.0, 0.05 * args.maxq))
+        followers.append(steady.FileFollower(f'{args.dir}/queue.txt',
+                                             steady.queue_samples('queue')))
+        for flow in FLOW_LABELS.values():
+            outfile = f"{args.dir}/{flow}_output{iperf.output_ext(args.tool)}"
+            if args.tool == 'iperf3' and not JSON_STREAM:
+                # Plain --json is only written at exit
+                continue
+            detector.expect(flow, abs_tol=0.02 * args.bw_net)
+            followers.append(steady.flow_follower(outfile, flow))
+        reason, elapsed = steady.wait_for_steady_state(detector, followers, args.min_time,
+                                                       args.max_time, clients, start=t0)
+        ORCH.check()
+        # From here on the clients and servers are stopped on purpose
+        ORCH.release()
+        print(f"Stopping after {elapsed:.1f}s: {reason}")
+        STOP['reason'], STOP['duration'] = reason, elapsed
+        for client in clients:
+            if client.poll() is None:
+                client.terminate()
+        return
+    ORCH.wait(names)
+    ORCH.release()
 
 def print_results_summary(results):
     """Print summary of competition results."""
@@ -539,8 +1300,33 @@ def print_results_summary(results):
     print("TCP COMPETITION RESULTS")
     print("="*50)
     
+    # Results keyed by congestion control (any mix of algorithms)
+    if 'algorithms' in results:
+        print(f"Scenario: {results['scenario']}")
+        for algorithm, a in sorted(results['algorithms'].items()):
+            rtt = f", RTT {a['avg_rtt_ms']:.1f} ms" if a['avg_rtt_ms'] is not None else ""
+            print(f"{algorithm_name(algorithm)}: {a['flows']} flow(s), "
+                  f"{a['total_throughput']:.2f} Mbps ({a['share']*100:.1f}%), "
+                  f"{a['avg_per_flow']:.2f} Mbps/flow{rtt}")
+        if results.get('link_capacity'):
+            cap = results['link_capacity']
+            print(f"Link capacity (trace): {cap['mean_mbps']:.2f} Mbps mean, "
+                  f"{cap['min_mbps']:.2f}-{cap['max_mbps']:.2f} Mbps, {cap['changes']} changes")
+        if 'winner' in results:
+            print(f"Winner: {results['winner']}")
+            print(f"Advantage: {results['advantage']:.1f}%")
+        if 'fairness_index' in results:
+            print(f"Fairness Index: {results['fairness_index']:.3f}")
+        if 'rtt_analysis' in results:
+            print("Base RTT / share / RTT-normalized share:")
+            for flow, r in results['rtt_analysis'].items():
+                print(f"  {flow}: {r['base_rtt_ms']:.1f} ms (x{r['rtt_ratio']:.1f})  "
+                      f"{r['share']*100:.1f}%  {r['share_rtt_normalized']*100:.1f}%")
+        if 'stop' in results:
+            print(f"Run ended after {results['stop']['duration']:.1f}s ({results['stop']['reason']})")
+    
     # Check if results have the new format with reno_flows and bbr_flows
-    if 'reno_flows' in results and 'bbr_flows' in results:
+    elif 'reno_flows' in results and 'bbr_flows' in results:
         reno_flows = results['reno_flows']
         bbr_flows = results['bbr_flows']
         
@@ -553,6 +1339,10 @@ def print_results_summary(results):
         print(f"TCP BBR flows: {len(bbr_flows)}")
         print(f"TCP Reno Total Throughput: {reno_total:.2f} Mbps")
         print(f"TCP BBR Total Throughput: {bbr_total:.2f} Mbps")
+        if results.get('link_capacity'):
+            cap = results['link_capacity']
+            print(f"Link capacity (trace): {cap['mean_mbps']:.2f} Mbps mean, "
+                  f"{cap['min_mbps']:.2f}-{cap['max_mbps']:.2f} Mbps, {cap['changes']} changes")
         
         # Determine winner
         if reno_total > bbr_total:
@@ -574,6 +1364,15 @@ def print_results_summary(results):
         # Fairness analysis
         if 'fairness_index' in results:
             print(f"Fairness Index: {results['fairness_index']:.3f}")
+        
+        if 'rtt_analysis' in results:
+            print("Base RTT / share / RTT-normalized share:")
+            for flow, r in results['rtt_analysis'].items():
+                print(f"  {flow}: {r['base_rtt_ms']:.1f} ms (x{r['rtt_ratio']:.1f})  "
+                      f"{r['share']*100:.1f}%  {r['share_rtt_normalized']*100:.1f}%")
+        
+        if 'stop' in results:
+            print(f"Run ended after {results['stop']['duration']:.1f}s ({results['stop']['reason']})")
     
     else:
         # Fallback for old format
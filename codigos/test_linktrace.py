@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Testes da leitura de traces de enlace (linktrace.py), sem tc nem Mininet.
+
+    python3 -m pytest test_linktrace.py
+    python3 test_linktrace.py
+"""
+
+import os
+import sys
+import tempfile
+
+import linktrace
+from highbw import htb_params
+
+
+def write(text, name='trace'):
+    fname = os.path.join(tempfile.mkdtemp(), name)
+    with open(fname, 'w') as f:
+        f.write(text)
+    return fname
+
+
+def close(a, b):
+    return abs(a - b) < 1e-9
+
+
+def test_mahimahi_bins():
+    """Pacotes por bin viram Mb/s; o último bin, parcial, usa a própria largura."""
+    fname = write('\n'.join(['0', '10', '50', '120', '150']) + '\n')
+    steps, period = linktrace.read_mahimahi(fname, bin_ms=100)
+    assert period == 0.15
+    assert [t for t, _, _, _ in steps] == [0.0, 0.1]
+    mbit = linktrace.MTU_BITS / 1e6
+    assert close(steps[0][1], 3 * mbit / 0.1)
+    # 100..150 ms: 2 pacotes em 50 ms
+    assert close(steps[1][1], 2 * mbit / 0.05)
+    assert steps[0][2:] == (None, None)
+
+
+def test_mahimahi_empty():
+    assert linktrace.read_mahimahi(write('\n')) == ([], 0)
+
+
+def test_csv_trace():
+    fname = write("time,bw_mbps,delay_ms,loss_pct\n"
+                  "# comentário\n"
+                  "2,5,30\n"
+                  "0,10\n"
+                  "4,20,,1.5\n")
+    steps, period = linktrace.read_csv_trace(fname)
+    assert steps == [(0.0, 10.0, None, None), (2.0, 5.0, 30.0, None), (4.0, 20.0, None, 1.5)]
+    # A última linha dura tanto quanto a anterior
+    assert period == 6.0
+
+
+def test_csv_trace_single_row():
+    assert linktrace.read_csv_trace(write("0,10\n")) == ([(0.0, 10.0, None, None)], 0)
+
+
+def test_load_trace_detects_format():
+    steps, period = linktrace.load_trace(write("# mahimahi\n0\n100\n"), bin_ms=50)
+    assert period == 0.1 and len(steps) == 2
+    steps, period = linktrace.load_trace(write("0,10\n1,20\n"))
+    assert steps[1][1] == 20.0 and period == 2.0
+
+
+def test_capacity_summary():
+    fname = write("100,10,20,0\n102,20,20,0\nlixo\n103,5,20,0\n")
+    assert len(linktrace.read_capacity_log(fname)) == 3
+    summary = linktrace.capacity_summary(fname, end=104)
+    assert close(summary['mean_mbps'], (10 * 2 + 20 * 1 + 5 * 1) / 4.0)
+    assert (summary['min_mbps'], summary['max_mbps'], summary['changes']) == (5, 20, 3)
+    assert linktrace.capacity_summary(write('')) is None
+
+
+def test_tc_cmds():
+    htb, netem = linktrace.tc_cmds('s1-eth3', 10, 20, 0, 100)
+    assert htb == "class change dev s1-eth3 parent 5:0 classid 5:1 htb rate 10.000000Mbit burst 15k"
+    assert netem.endswith("netem limit 100 delay 20.000000ms")
+    _, netem = linktrace.tc_cmds('s1-eth3', 10, 20, 1.5, 100)
+    assert netem.endswith(" loss 1.500000%")
+    htb, _ = linktrace.tc_cmds('s1-eth3', 10000, 20, 0, 100, highbw=True)
+    burst, quantum = htb_params(10000)
+    assert htb.endswith("burst %d cburst %d quantum %d" % (burst, burst, quantum))
+
+
+def test_driver_schedule_loops():
+    steps = [(0.0, 10.0, None, None), (1.0, 5.0, None, None)]
+    driver = linktrace.LinkTraceDriver('eth0', steps, 2.0, 20, 100)
+    schedule = driver._schedule()
+    assert [next(schedule)[0] for _ in range(4)] == [0.0, 1.0, 2.0, 3.0]
+    once = linktrace.LinkTraceDriver('eth0', steps, 2.0, 20, 100, loop=False)
+    assert len(list(once._schedule())) == 2
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print("✓ %s" % name)
+            except Exception as e:
+                print("✗ %s: %r" % (name, e))
+                failed += 1
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Testes do planejador de sweeps (planner.py) e da divisão de CPUs
+(affinity.plan_affinity).
+
+    python3 -m pytest test_planner.py
+    python3 test_planner.py
+"""
+
+import sys
+from argparse import Namespace
+
+import affinity
+import planner
+
+
+def options(**kw):
+    """Opções do planner.py com os defaults da linha de comando."""
+    opts = dict(experiment='bufferbloat', dir='/tmp/plan', bw=[10], delay=[20], bdp=[1],
+                maxq=None, cong=['reno'], scenario=['reno_vs_bbr'], backend='mininet',
+                cycles=5, rtts=500, min_time=10, max_time=300, ping_frac=0.5,
+                queue_frac=0.25, max_samples=20000, overhead=15)
+    opts.update(kw)
+    return Namespace(**opts)
+
+
+def arg(cmd, name):
+    return cmd[cmd.index(name) + 1]
+
+
+def test_bdp():
+    assert abs(planner.bdp_packets(10, 12) - 10) < 1e-9
+    assert planner.base_rtt_ms('bufferbloat', 20) == 40
+    assert planner.base_rtt_ms('competition', 20) == 44
+
+
+def test_maxq_includes_delay_line():
+    """maxq = BDPs de fila + os pacotes na linha de atraso do netem."""
+    job, = planner.expand(options(), [])
+    bdp = planner.bdp_packets(10, 40)
+    line = planner.bdp_packets(10, 10)
+    assert job['maxq'] == int(round(bdp + line))
+    assert abs(job['queue_packets'] - (job['maxq'] - line)) < 1e-9
+    assert abs(job['maxq_bdp'] - 1) < 0.05
+    assert arg(job['cmd'], '--maxq') == str(job['maxq'])
+    assert arg(job['cmd'], '--cong') == 'reno'
+
+    job, = planner.expand(options(experiment='competition'), [])
+    line = planner.bdp_packets(10, 20)
+    assert job['maxq'] == int(round(planner.bdp_packets(10, 44) + line))
+    assert arg(job['cmd'], '--scenario') == 'reno_vs_bbr'
+
+
+def test_explicit_maxq_and_extra():
+    jobs = planner.expand(options(maxq=[100, 20, 100], backend='sim'), ['--seed', '1'])
+    assert [j['maxq'] for j in jobs] == [20, 100]
+    assert jobs[0]['cmd'][-4:] == ['--backend', 'sim', '--seed', '1']
+
+
+def test_duration_and_sampling():
+    job = planner.plan_job('bufferbloat', 10, 20, 100, ['reno'], options())
+    assert 10 <= job['duration'] <= 300 and not job['capped']
+    # 500 RTTs de 40 ms
+    assert job['duration'] >= 20
+    assert job['ping_interval'] == 0.02
+    assert job['queue_interval'] == planner.MIN_QUEUE_INTERVAL
+    job = planner.plan_job('bufferbloat', 100, 200, 10000, ['reno'], options(max_time=60))
+    assert job['duration'] == 60 and job['capped']
+    job = planner.plan_job('bufferbloat', 10, 5, 100, ['bbr'], options(min_time=1))
+    assert job['duration'] >= planner.BBR_PROBE_RTT_PERIOD
+
+
+def cores(n, smt=True):
+    return [{'package': 0, 'core': i, 'cpus': [i, i + n] if smt else [i]} for i in range(n)]
+
+
+def test_plan_affinity_split():
+    plan = affinity.plan_affinity(cores(8))
+    roles = plan['roles']
+    assert not plan['shared'] and plan['physical_cores'] == 8
+    assert roles['system'] == [0, 8]
+    assert roles['monitors'] == [7, 15]
+    assert roles['generators'] == [1, 2, 3, 9, 10, 11]
+    assert roles['hosts'] == [4, 5, 6, 12, 13, 14]
+    # Nenhuma CPU em dois papéis
+    cpus = sum(roles.values(), [])
+    assert sorted(cpus) == plan['cpus']
+
+
+def test_plan_affinity_isolated_monitor():
+    plan = affinity.plan_affinity(cores(6, smt=False), generator_cores=1, isolated=[2])
+    assert plan['roles']['monitors'] == [2]
+    assert plan['roles']['generators'] == [1]
+    assert plan['roles']['hosts'] == [3, 4, 5]
+    assert plan['isolated'] == [2]
+
+
+def test_plan_affinity_small_boxes():
+    plan = affinity.plan_affinity(cores(2, smt=False))
+    assert plan['shared']
+    assert plan['roles']['monitors'] == [1] and plan['roles']['hosts'] == [0]
+    plan = affinity.plan_affinity(cores(1, smt=False))
+    assert plan['shared'] and all(cpus == [0] for cpus in plan['roles'].values())
+
+
+def test_parse_cpu_list():
+    assert affinity.parse_cpu_list('0-3,8,10-11\n') == [0, 1, 2, 3, 8, 10, 11]
+    assert affinity.parse_cpu_list('') == []
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print("✓ %s" % name)
+            except Exception as e:
+                print("✗ %s: %r" % (name, e))
+                failed += 1
+    sys.exit(1 if failed else 0)
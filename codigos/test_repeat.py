@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Testes do driver de repetições (repeat.py): métricas por execução,
+intervalos de confiança e critério de parada.
+
+    python3 -m pytest test_repeat.py
+    python3 test_repeat.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import repeat
+
+
+def competition_dir(flows):
+    """Diretório com um competition_results.json no formato atual:
+    flows é {rótulo: (algoritmo, vazão média)}."""
+    run_dir = tempfile.mkdtemp()
+    total = sum(tput for _, tput in flows.values())
+    algorithms = {}
+    for algo, tput in flows.values():
+        a = algorithms.setdefault(algo, {'flows': 0, 'total_throughput': 0.0})
+        a['flows'] += 1
+        a['total_throughput'] += tput
+    for a in algorithms.values():
+        a['share'] = a['total_throughput'] / total
+    results = {
+        'scenario': 'custom',
+        'flows': {f: {'avg_throughput': tput, 'algorithm': algo}
+                  for f, (algo, tput) in flows.items()},
+        'flow_algorithms': {f: algo for f, (algo, _) in flows.items()},
+        'algorithms': algorithms,
+        # Só fluxos reno/bbr entram nas chaves antigas
+        'reno_flows': [],
+        'bbr_flows': [{'avg_throughput': tput} for algo, tput in flows.values() if algo == 'bbr'],
+    }
+    with open(os.path.join(run_dir, 'competition_results.json'), 'w') as f:
+        json.dump(results, f)
+    return run_dir
+
+
+def test_metrics_cubic_vs_bbr():
+    run_dir = competition_dir({'cubic_flow_1': ('cubic', 3.0), 'cubic_flow_2': ('cubic', 3.0),
+                               'bbr_flow': ('bbr', 4.0)})
+    m = repeat.run_metrics(run_dir)
+    assert abs(m['share_cubic'] - 0.6) < 1e-9
+    assert abs(m['share_bbr'] - 0.4) < 1e-9
+    assert 'share_reno' not in m
+    x = np.array([3.0, 3.0, 4.0])
+    assert abs(m['jain'] - x.sum() ** 2 / (3 * (x ** 2).sum())) < 1e-9
+
+
+def test_metrics_legacy_results():
+    """Resultados antigos, só com <algo>_flows."""
+    run_dir = tempfile.mkdtemp()
+    with open(os.path.join(run_dir, 'competition_results.json'), 'w') as f:
+        json.dump({'reno_flows': [{'avg_throughput': 2.0}],
+                   'bbr_flows': [{'avg_throughput': 6.0}]}, f)
+    m = repeat.run_metrics(run_dir)
+    assert (m['share_reno'], m['share_bbr']) == (0.25, 0.75)
+    assert abs(m['jain'] - 0.8) < 1e-9
+
+
+def test_winner():
+    ci = {'share_cubic': {'lo': 0.55, 'hi': 0.7}, 'share_bbr': {'lo': 0.3, 'hi': 0.45},
+          'jain': {'lo': 0.9, 'hi': 0.95}}
+    assert repeat.winner(ci) == 'cubic'
+    ci['share_cubic']['lo'] = 0.45
+    assert repeat.winner(ci) == 'undecided'
+    assert repeat.winner({'jain': {'lo': 0.9, 'hi': 1}}) is None
+
+
+def test_summarize_and_converged():
+    reps = [{'metrics': {'share_bbr': 0.6 + 0.001 * i, 'jain': 0.9}} for i in range(5)]
+    reps.append({'metrics': {'share_bbr': 0.602}})
+    ci = repeat.summarize(reps, ['jain', 'share_bbr'], n_boot=2000)
+    assert ci['jain']['width'] == 0
+    assert ci['share_bbr']['lo'] <= ci['share_bbr']['mean'] <= ci['share_bbr']['hi']
+    assert repeat.converged(ci, ['jain', 'share_bbr'], width=0.01)
+    assert not repeat.converged(ci, ['share_bbr'], width=1e-6)
+    assert not repeat.converged(ci, ['rtt_p95_ms'], width=1)
+
+
+FAKE_DRIVER = """
+import argparse, json, os, sys
+sys.path.insert(0, %r)
+import memo
+p = argparse.ArgumentParser()
+p.add_argument('--dir'); p.add_argument('--seed', type=int); p.add_argument('--jitter')
+args = p.parse_args()
+os.makedirs(args.dir, exist_ok=True)
+with open(os.path.join(args.dir, 'ping.txt'), 'w') as f:
+    f.write('64 bytes from 10.0.0.2: icmp_seq=1 ttl=64 time=40.0 ms\\n')
+# Repetições pares abortam depois do ping, mas saem com 0
+if args.seed %% 2:
+    with open(os.path.join(args.dir, 'competition_results.json'), 'w') as f:
+        json.dump({'reno_flows': [{'avg_throughput': 4.0}],
+                   'bbr_flows': [{'avg_throughput': 6.0}]}, f)
+    memo.write_meta(args.dir, 'h%%d' %% args.seed, {})
+"""
+
+
+def test_run_complete():
+    run_dir = competition_dir({'reno_flow': ('reno', 4.0), 'bbr_flow': ('bbr', 6.0)})
+    # Sem run_meta.json: a execução não terminou
+    assert not repeat.run_complete(run_dir)
+    repeat.memo.write_meta(run_dir, 'h', {})
+    assert repeat.run_complete(run_dir)
+    # Saída reescrita por uma execução abortada depois
+    with open(os.path.join(run_dir, 'competition_results.json'), 'a') as f:
+        f.write(' ')
+    assert not repeat.run_complete(run_dir)
+    # Completa, mas sem arquivo de resultado
+    other = tempfile.mkdtemp()
+    with open(os.path.join(other, 'ping.txt'), 'w') as f:
+        f.write('64 bytes from 10.0.0.2: icmp_seq=1 ttl=64 time=40.0 ms\n')
+    repeat.memo.write_meta(other, 'h', {})
+    assert not repeat.run_complete(other)
+
+
+def test_partial_runs_are_not_samples():
+    out = tempfile.mkdtemp()
+    driver = os.path.join(out, 'driver.py')
+    with open(driver, 'w') as f:
+        f.write(FAKE_DRIVER % os.path.dirname(os.path.abspath(repeat.__file__)))
+    summary = repeat.repeat([driver], out, width=1.0, min_reps=10, max_reps=4, n_boot=100)
+    assert [r['seed'] for r in summary['repetitions']] == [1, 3]
+    assert summary['ci']['share_bbr']['mean'] == 0.6
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print("✓ %s" % name)
+            except Exception as e:
+                print("✗ %s: %r" % (name, e))
+                failed += 1
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Testes dos simuladores (packetsim.py e fluidsim.py), sem Mininet.
+
+    python3 -m pytest test_simulators.py
+    python3 test_simulators.py
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import fluidsim
+import iperf
+import packetsim
+
+
+class Sink(object):
+    """Último salto de um caminho: guarda o instante de cada chegada."""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.arrivals = []
+
+    def arrive(self, pkt):
+        self.arrivals.append(self.sim.now)
+
+
+def test_link_drop_tail():
+    """O enlace descarta acima de `limit` e serializa a `rate`."""
+    sim = packetsim.Simulator(1)
+    link = packetsim.Link(sim, 10, 0, 2)
+    sink = Sink(sim)
+    for seq in range(5):
+        link.arrive(packetsim.Packet(None, seq, seq, packetsim.MSS_BYTES, 0.0, [link, sink]))
+    sim.run(1.0)
+    # Um pacote em transmissão e dois na fila; os outros dois são descartados
+    assert link.drops == 2
+    assert len(sink.arrivals) == 3
+    gap = packetsim.MSS_BYTES * 8 / 10e6
+    assert np.allclose(np.diff(sink.arrivals), gap)
+
+
+def test_packetsim_bufferbloat():
+    """Um fluxo Reno ocupa o enlace e a fila fica limitada a maxq."""
+    out = tempfile.mkdtemp()
+    fetches = packetsim.simulate_bufferbloat(out, 10, 1000, 20, 100, 'reno', 5, 100000, seed=1)
+    for name in ('q.txt', 'ping.txt', 'iperf_output.txt', 'flow_trace.csv'):
+        assert os.path.exists(os.path.join(out, name))
+    with open(os.path.join(out, 'q.txt')) as f:
+        queue = [float(line.split(',')[1]) for line in f]
+    assert len(queue) == 50
+    assert max(queue) <= 100
+    intervals = iperf.parse_iperf_text(os.path.join(out, 'iperf_output.txt'))[:-1]
+    assert len(intervals) == 5
+    assert intervals[-1][2] > 9
+    assert fetches and all(t > 0 for t in fetches)
+
+
+def test_packetsim_late_flow_ends_with_run():
+    """Um fluxo que entra aos 3 s termina junto com os outros."""
+    out = tempfile.mkdtemp()
+    packetsim.simulate_competition(out, [('reno_flow', 'reno'), ('bbr_flow', 'bbr')],
+                                   10, 1000, 20, 100, 6, [(1000, 1)],
+                                   starts={'bbr_flow': 3}, seed=1)
+    reno = iperf.parse_iperf_text(os.path.join(out, 'reno_flow_output.txt'))[:-1]
+    bbr = iperf.parse_iperf_text(os.path.join(out, 'bbr_flow_output.txt'))[:-1]
+    assert len(reno) == 6
+    assert len(bbr) == 3
+
+
+def test_flow_labels():
+    assert fluidsim.flow_labels(['reno', 'bbr']) == ['reno_flow', 'bbr_flow']
+    assert fluidsim.flow_labels(['reno', 'reno', 'bbr']) == \
+        ['reno_flow_1', 'reno_flow_2', 'bbr_flow']
+
+
+def test_fluidsim_batch():
+    """Cada configuração de um lote evolui como se rodasse sozinha."""
+    single = {'scenario': 'reno', 'bw': 10, 'delay': 20, 'maxq': 100}
+    pair = {'scenario': 'reno_vs_bbr', 'bw': 10, 'delay': 20, 'maxq': 50}
+    res = fluidsim.simulate([single, pair], duration=10, seed=1)
+    alone = fluidsim.simulate([single], duration=10, seed=1)
+    assert res['q'].shape == (2, 100)
+    assert res['tput'].shape == (2, 2, 10)
+    assert np.allclose(res['q'][0], alone['q'][0])
+    # Drop-tail em maxq; a vazão total não passa da capacidade
+    assert res['q'][0].max() <= 100 and res['q'][1].max() <= 50
+    assert np.all(res['tput'][1].sum(axis=0) <= 10 + 1e-6)
+    assert res['tput'][0, 0, -5:].mean() > 9
+    # Fluxo de enchimento do lote: algo -1
+    assert res['algo'][0, 1] == -1
+    rows = fluidsim.summarize([single, pair], res)
+    assert [r['scenario'] for r in rows] == ['reno', 'reno_vs_bbr']
+    assert 0 < rows[1]['jain'] <= 1
+
+
+def test_write_queue_capacity():
+    fname = os.path.join(tempfile.mkdtemp(), 'queue.txt')
+    fluidsim.write_queue(fname, [1.4, 2.6], 0.1, 100.0, capacity=[10.0, 5.0])
+    with open(fname) as f:
+        rows = [line.strip().split(',') for line in f]
+    assert [(float(t), int(q), float(c)) for t, q, c in rows] == \
+        [(100.1, 1, 10.0), (100.2, 3, 5.0)]
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print("✓ %s" % name)
+            except Exception as e:
+                print("✗ %s: %r" % (name, e))
+                failed += 1
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Testes da detecção de regime (steady.py) e da exposição de métricas ao
+vivo (metrics_export.py).
+
+    python3 -m pytest test_steady.py
+    python3 test_steady.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+from time import monotonic
+from urllib.request import urlopen
+
+import metrics_export
+import steady
+
+
+def test_detector_stable_and_ramp():
+    det = steady.SteadyStateDetector(window=1.0, k=3, rel_tol=0.1)
+    det.expect('flat')
+    det.expect('ramp')
+    for t in range(6):
+        det.add('flat', t + 0.5, 10.0)
+        det.add('ramp', t + 0.5, 10.0 + 2 * t)
+    # k janelas fechadas: a janela corrente ainda não conta
+    assert det.status() == {'flat': True, 'ramp': False}
+    assert not det.is_steady()
+
+
+def test_detector_needs_k_windows():
+    det = steady.SteadyStateDetector(window=1.0, k=5)
+    for t in range(5):
+        det.add('q', t, 1.0)
+    assert not det.stable('q')
+    det.add('q', 5, 1.0)
+    assert det.is_steady()
+
+
+def test_file_follower_partial_lines():
+    fname = os.path.join(tempfile.mkdtemp(), 'queue.txt')
+    fol = steady.FileFollower(fname, steady.queue_samples('queue'))
+    assert fol.poll() == []
+    with open(fname, 'w') as f:
+        f.write('1.0,5\n2.0,')
+        f.flush()
+        assert fol.poll() == [('queue', 1.0, 5.0)]
+        f.write('7\n')
+        f.flush()
+        assert fol.poll() == [('queue', 2.0, 7.0)]
+    fol.close()
+
+
+def test_iperf_samples():
+    text = steady.iperf_text_samples('reno')
+    assert text("[  3]  1.0- 2.0 sec  1.19 MBytes  10.0 Mbits/sec") == [('reno', 2.0, 10.0)]
+    assert text("Client connecting to 10.0.0.2") == []
+    stream = steady.iperf3_stream_samples('bbr')
+    line = json.dumps({'event': 'interval',
+                       'data': {'sum': {'end': 1.5, 'bits_per_second': 2e6}}})
+    assert stream(line) == [('bbr', 1.5, 2.0)]
+    assert stream('{"event": "interval", "data": ') == []
+
+
+def test_wait_counts_from_start():
+    """O tempo conta a partir de `start`, não da chamada."""
+    det = steady.SteadyStateDetector()
+    det.expect('q')
+    reason, elapsed = steady.wait_for_steady_state(det, [], 0, 5, poll_sec=0.01,
+                                                   start=monotonic() - 10)
+    assert reason == steady.STOP_MAX_TIME and elapsed >= 10
+
+
+def test_rolling_window():
+    win = metrics_export.RollingWindow(window=10)
+    for t, v in enumerate([5, 1, 3, 2, 4]):
+        win.add(v, now=100 + t)
+    assert win.values(now=104) == [5, 1, 3, 2, 4]
+    assert win.values(now=112.5) == [2, 4]
+    assert (win.count, win.total, win.last) == (5, 15, 4)
+    assert metrics_export.RollingWindow.quantile([5, 1, 3, 2, 4], 0.5) == 3
+    assert metrics_export.RollingWindow.quantile([], 0.5) is None
+
+
+def test_render():
+    metrics = metrics_export.LiveMetrics('/tmp/runs/a"b', 'bufferbloat')
+    metrics.queue.set(time=1.0, backlog_packets=12, samples=3)
+    metrics.throughput['reno'] = metrics_export.RollingWindow()
+    metrics.throughput['reno'].add(9.5)
+    metrics.rtt['h1-10.0.0.2'] = metrics_export.RollingWindow()
+    metrics.rtt['h1-10.0.0.2'].add(40.0)
+    text = metrics.render()
+    run = 'run="/tmp/runs/a\\"b"'
+    assert 'experiment_info{%s,experiment="bufferbloat"} 1\n' % run in text
+    assert 'experiment_queue_backlog_packets{%s} 12\n' % run in text
+    assert 'experiment_flow_throughput_mbps{%s,flow="reno"} 9.5\n' % run in text
+    assert 'experiment_rtt_ms{%s,path="h1-10.0.0.2",quantile="0.5"} 40\n' % run in text
+    assert 'experiment_rtt_ms_count{%s,path="h1-10.0.0.2"} 1\n' % run in text
+    assert '# TYPE experiment_cpu_seconds_total counter' in text
+    # Sem fetches, sem a série
+    assert 'fetch_seconds' not in text
+
+
+def test_endpoint_and_target_file():
+    targets = tempfile.mkdtemp()
+    metrics = metrics_export.LiveMetrics('results/x', 'competition', target_dir=targets)
+    assert metrics.target == metrics_export.target_file('results/x', targets)
+    metrics.start(port=0)
+    try:
+        with open(metrics.target) as f:
+            sd = json.load(f)
+        assert sd == [{'targets': ['127.0.0.1:%d' % metrics.port],
+                       'labels': {'run': 'results/x'}}]
+        body = urlopen('http://127.0.0.1:%d/metrics' % metrics.port).read().decode()
+        assert 'experiment_elapsed_seconds' in body
+    finally:
+        metrics.stop()
+    assert not os.path.exists(metrics.target)
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print("✓ %s" % name)
+            except Exception as e:
+                print("✗ %s: %r" % (name, e))
+                failed += 1
+    sys.exit(1 if failed else 0)
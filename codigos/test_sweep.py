@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+"""
+Testes da fila de jobs do sweep.py (claim, lease, reap, retries).
+
+    python3 -m pytest test_sweep.py
+    python3 test_sweep.py
+"""
+
+import os
+import sys
+import tempfile
+from time import time
+
+import sweep
+
+
+def new_queue(lease=60):
+    return sweep.JobQueue(os.path.join(tempfile.mkdtemp(), 'q'), lease)
+
+
+def age(fname, seconds):
+    """Recua o mtime de fname, como se o worker tivesse parado de tocá-lo."""
+    t = time() - seconds
+    os.utime(fname, (t, t))
+
+
+def test_add_is_idempotent():
+    queue = new_queue()
+    jid = queue.add(['true'])
+    assert jid == sweep.job_id(['true'])
+    assert queue.add(['true']) is None
+    assert queue.counts() == {'pending': 1, 'running': 0, 'done': 0, 'failed': 0}
+
+
+def test_claim_once():
+    """Só um claim leva o job; o outro não acha nada pendente."""
+    queue = new_queue()
+    jid = queue.add(['true'])
+    job = queue.claim('w1', sweep.HostLocks())
+    assert job['id'] == jid and job['attempts'] == 1 and job['worker'] == 'w1'
+    assert queue.claim('w2', sweep.HostLocks()) is None
+    assert queue.state_of(jid) == 'running'
+
+
+def test_claim_starts_lease():
+    """Um job que esperou mais que o lease em pending/ não é colhido logo
+    depois do claim."""
+    queue = new_queue(lease=60)
+    jid = queue.add(['true'])
+    age(queue.path('pending', jid), 120)
+    queue.claim('w1', sweep.HostLocks())
+    assert queue.reap() == []
+    assert queue.state_of(jid) == 'running'
+
+
+def test_reap_expired_lease():
+    queue = new_queue(lease=60)
+    jid = queue.add(['true'], retries=0)
+    job = queue.claim('w1', sweep.HostLocks())
+    age(queue.path('running', jid), 120)
+    # Sem tentativas sobrando, o job vai para failed/
+    assert queue.reap() == [(jid, 'failed')]
+    assert 'lease expired' in sweep._read_json(queue.path('failed', jid))['errors'][0]['error']
+    # O worker antigo perdeu o job
+    assert not queue.heartbeat(jid)
+    assert queue.finish(job) is None
+    assert queue.state_of(jid) == 'failed'
+
+
+def test_retries_then_failed():
+    queue = new_queue()
+    jid = queue.add(['false'], retries=1)
+    locks = sweep.HostLocks()
+    assert queue.finish(queue.claim('w1', locks), 'exit status 1') == 'pending'
+    job = queue.claim('w1', locks)
+    assert job['attempts'] == 2
+    assert queue.finish(job, 'exit status 1') == 'failed'
+    assert queue.reset_failed() == [jid]
+    assert sweep._read_json(queue.path('pending', jid))['attempts'] == 0
+
+
+def test_force_requeues_done():
+    queue = new_queue()
+    jid = queue.add(['true'])
+    queue.finish(queue.claim('w1', sweep.HostLocks()))
+    assert queue.state_of(jid) == 'done'
+    assert queue.add(['true']) is None
+    assert queue.add(['true'], force=True) == jid
+    assert queue.state_of(jid) == 'pending'
+
+
+def test_exclusive_resource():
+    """Um job exclusivo só é pego por quem segura o lock do recurso."""
+    queue = new_queue()
+    name = 'test-%d' % os.getpid()
+    queue.add(['true'], exclusive=name)
+    holder, other = sweep.HostLocks(), sweep.HostLocks()
+    assert holder.acquire(name)
+    try:
+        assert queue.claim('w2', other) is None
+    finally:
+        holder.release(name)
+    job = queue.claim('w2', other)
+    assert job is not None
+    other.release(name)
+
+
+def test_run_job_expect():
+    queue = new_queue()
+    out = tempfile.mkdtemp()
+    queue.add([sys.executable, '-c', "open(%r, 'w')" % os.path.join(out, 'a.txt')],
+              run_dir=out, expect=['b.txt'])
+    job = queue.claim('w1', sweep.HostLocks())
+    assert sweep.run_job(queue, job) == 'missing output: b.txt'
+    job['expect'] = ['a.txt']
+    assert sweep.run_job(queue, job) is None
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print("✓ %s" % name)
+            except Exception as e:
+                print("✗ %s: %r" % (name, e))
+                failed += 1
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+'''
+Round-robin congestion-control tournament.
+
+Every pair of algorithms (by default all of the kernel's
+net.ipv4.tcp_available_congestion_control) meets at every mix ratio: a
+match m:n is one tcp_competition.py run with m flows of the first
+algorithm and n of the second (--flows a.. b..), in
+
+    <dir>/<a>_vs_<b>/<m>to<n>
+
+Matches are independent jobs of a sweep.py queue (<dir>/queue by
+default), so they can be run by local workers (--workers), or enqueued
+with --enqueue-only and run by `sweep.py work` on every box sharing the
+filesystem; re-running the tournament skips finished (memoized) matches.
+
+The report reads each match's competition_results.json, whose
+`algorithms` section is keyed by the congestion control each flow ran
+(not by file name), and builds pairwise matrices over the matches of
+each pair:
+
+    share[a][b]   per-flow throughput share of a against b, i.e.
+                  (a's Mb/s per flow) / (a's + b's Mb/s per flow), so 0.5
+                  is a fair split whatever the mix ratio
+    rtt[a][b]     mean ping RTT (ms) of a's flows against b
+    queue[a][b]   mean queueing delay (ms) of a's flows: RTT - base RTT
+
+a dominates b when share[a][b] > 0.5 + margin.  Everything is saved to
+tournament.json; the ranking orders algorithms by the number of
+opponents they dominate, then by mean share.
+
+Usage:
+    sudo python3 tournament.py --dir results/tournament --workers 1 -- \\
+        --bw-net 10 --delay 20 --maxq 100 --time 30
+    python3 tournament.py --dir results/tournament --algorithms reno cubic bbr \\
+        --workers 8 -- --backend sim --bw-net 10 --delay 20 --time 30
+'''
+
+import itertools
+import json
+import os
+import sys
+from argparse import ArgumentParser, REMAINDER
+
+import sweep
+
+AVAILABLE_CC = '/proc/sys/net/ipv4/tcp_available_congestion_control'
+RESULTS_FILE = 'competition_results.json'
+
+
+def available_congestion_control(path=AVAILABLE_CC):
+    """Congestion controls the kernel can use ([] if unknown)."""
+    try:
+        with open(path) as f:
+            return f.read().split()
+    except OSError:
+        return []
+
+
+def parse_mix(mix):
+    m, _, n = mix.partition(':')
+    return int(m), int(n)
+
+
+def match_dir(out_dir, a, b, mix):
+    m, n = parse_mix(mix)
+    return os.path.join(out_dir, '%s_vs_%s' % (a, b), '%dto%d' % (m, n))
+
+
+def matches(algorithms, mixes):
+    """(a, b, mix) of every pairing and mix ratio."""
+    return [(a, b, mix) for a, b in itertools.combinations(algorithms, 2) for mix in mixes]
+
+
+def enqueue(queue, out_dir, algorithms, mixes, extra, retries=2, exclusive='mininet'):
+    """Add one tcp_competition.py job per match; returns how many were new."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tcp_competition.py')
+    added = 0
+    for a, b, mix in matches(algorithms, mixes):
+        m, n = parse_mix(mix)
+        run_dir = match_dir(out_dir, a, b, mix)
+        cmd = [sys.executable, script, '--flows'] + [a] * m + [b] * n + \
+            ['--dir', run_dir] + extra
+        if queue.add(cmd, run_dir, [RESULTS_FILE], retries, exclusive=exclusive):
+            added += 1
+    return added
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def build_report(out_dir, algorithms, mixes, margin=0.1):
+    """Pairwise share/delay matrices and ranking from the match results."""
+    rows, missing = [], []
+    for a, b, mix in matches(algorithms, mixes):
+        fname = os.path.join(match_dir(out_dir, a, b, mix), RESULTS_FILE)
+        if not os.path.exists(fname):
+            missing.append('%s_vs_%s %s' % (a, b, mix))
+            continue
+        with open(fname) as f:
+            by_algorithm = json.load(f).get('algorithms') or {}
+        if a not in by_algorithm or b not in by_algorithm:
+            missing.append('%s_vs_%s %s' % (a, b, mix))
+            continue
+        ra, rb = by_algorithm[a], by_algorithm[b]
+        per_flow = ra['avg_per_flow'] + rb['avg_per_flow']
+        rows.append({'a': a, 'b': b, 'mix': mix,
+                     'share_a': ra['avg_per_flow'] / per_flow if per_flow else 0.5,
+                     'throughput_share_a': ra['share'],
+                     'rtt_a_ms': ra['avg_rtt_ms'], 'rtt_b_ms': rb['avg_rtt_ms'],
+                     'queueing_a_ms': ra['queueing_delay_ms'],
+                     'queueing_b_ms': rb['queueing_delay_ms']})
+
+    share = {a: {} for a in algorithms}
+    rtt = {a: {} for a in algorithms}
+    queue = {a: {} for a in algorithms}
+    for a, b in itertools.combinations(algorithms, 2):
+        pair = [r for r in rows if r['a'] == a and r['b'] == b]
+        if not pair:
+            continue
+        s = _mean([r['share_a'] for r in pair])
+        share[a][b], share[b][a] = s, 1 - s
+        rtt[a][b], rtt[b][a] = _mean([r['rtt_a_ms'] for r in pair]), _mean([r['rtt_b_ms'] for r in pair])
+        queue[a][b] = _mean([r['queueing_a_ms'] for r in pair])
+        queue[b][a] = _mean([r['queueing_b_ms'] for r in pair])
+
+    dominates = {a: sorted(b for b, s in share[a].items() if s > 0.5 + margin)
+                 for a in algorithms}
+    ranking = sorted(algorithms, key=lambda a: (len(dominates[a]),
+                                                _mean(share[a].values()) or 0), reverse=True)
+    return {'algorithms': algorithms, 'mixes': mixes, 'margin': margin,
+            'matches': rows, 'missing': missing, 'share': share, 'rtt_ms': rtt,
+            'queueing_delay_ms': queue, 'dominates': dominates,
+            'ranking': [{'algorithm': a, 'dominates': len(dominates[a]),
+                         'mean_share': _mean(share[a].values())} for a in ranking]}
+
+
+def print_matrix(title, algorithms, matrix, fmt):
+    print("\n%s (row vs column)" % title)
+    print("%-10s" % '' + ''.join("%10s" % b for b in algorithms))
+    for a in algorithms:
+        cells = []
+        for b in algorithms:
+            v = matrix[a].get(b)
+            cells.append("%10s" % ('-' if v is None else fmt % v))
+        print("%-10s" % a + ''.join(cells))
+
+
+def main():
+    parser = ArgumentParser(description="Round-robin congestion-control tournament")
+    parser.add_argument('--dir', '-d', required=True)
+    parser.add_argument('--algorithms', nargs='+', default=None,
+                        help="Algorithms to pit against each other (default: all available)")
+    parser.add_argument('--mixes', nargs='+', default=['1:1', '2:1', '1:2'],
+                        help="Flow ratios m:n of each pairing")
+    parser.add_argument('--queue', default=None,
+                        help="sweep.py queue directory (default: DIR/queue)")
+    parser.add_argument('--workers', '-n', type=int, default=1,
+                        help="Local worker processes")
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--enqueue-only', action='store_true',
+                        help="Only add the matches; run them with sweep.py work")
+    parser.add_argument('--report-only', action='store_true',
+                        help="Only build the report from finished matches")
+    parser.add_argument('--margin', type=float, default=0.1,
+                        help="a dominates b when its share exceeds 0.5 + margin")
+    parser.add_argument('extra', nargs=REMAINDER,
+                        help="Extra tcp_competition.py options, after --")
+    args = parser.parse_args()
+    extra = args.extra[1:] if args.extra and args.extra[0] == '--' else args.extra
+
+    sim = any(opt == '--backend' and val == 'sim' for opt, val in zip(extra, extra[1:]))
+    algorithms = args.algorithms
+    if not algorithms:
+        if sim:
+            import packetsim
+            algorithms = sorted(packetsim.CONGESTION_CONTROL)
+        else:
+            algorithms = available_congestion_control()
+        if not algorithms:
+            parser.error("cannot read %s: use --algorithms" % AVAILABLE_CC)
+    if len(algorithms) < 2:
+        parser.error("a tournament needs at least two algorithms, got: %s" % ' '.join(algorithms))
+    try:
+        for mix in args.mixes:
+            m, n = parse_mix(mix)
+            if m < 1 or n < 1:
+                raise ValueError(mix)
+    except ValueError:
+        parser.error("mixes must be m:n with m, n >= 1")
+
+    if not args.report_only:
+        queue = sweep.JobQueue(args.queue or os.path.join(args.dir, 'queue'))
+        added = enqueue(queue, args.dir, algorithms, args.mixes, extra, args.retries,
+                        exclusive=None if sim else 'mininet')
+        print("%d match(es) added, %d already queued" %
+              (added, len(matches(algorithms, args.mixes)) - added))
+        if args.enqueue_only:
+            return
+        counts = sweep.run_workers(queue.root, args.workers)
+        print("Matches: %d done, %d failed" % (counts['done'], counts['failed']))
+
+    report = build_report(args.dir, algorithms, args.mixes, args.margin)
+    with open(os.path.join(args.dir, 'tournament.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_matrix("Per-flow throughput share", algorithms, report['share'], '%.2f')
+    print_matrix("Mean RTT (ms)", algorithms, report['rtt_ms'], '%.1f')
+    print_matrix("Queueing delay (ms)", algorithms, report['queueing_delay_ms'], '%.1f')
+    print("\nRanking:")
+    for i, r in enumerate(report['ranking']):
+        print("  %d. %-10s dominates %d  mean share %s" % (
+            i + 1, r['algorithm'], r['dominates'],
+            '-' if r['mean_share'] is None else '%.2f' % r['mean_share']))
+    if report['missing']:
+        print("\nMissing matches: %s" % ', '.join(report['missing']))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,31 @@
-import SimpleHTTPServer
-import SocketServer
+try:
+    from http.server import SimpleHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
 
 PORT = 80
 
-class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+class Handler(SimpleHTTPRequestHandler):
+    # Keep-alive connections, like a browser's (files carry Content-Length)
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes: avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
     # Disable logging DNS lookups
     def address_string(self):
         return str(self.client_address[0])
 
-Handler = Handler
-httpd = SocketServer.TCPServer(("", PORT), Handler)
+    def log_message(self, format, *args):
+        pass
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    # One thread per connection: a page load keeps 6 of them open
+    daemon_threads = True
+    allow_reuse_address = True
+
+httpd = ThreadingServer(("", PORT), Handler)
 print("Server1: httpd serving at port", PORT)
 httpd.serve_forever()
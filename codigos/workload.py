@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+'''
+Short-flow workload generator: many concurrent transfers with
+heavy-tailed sizes, competing with the long iperf flows.
+
+The server (on the sending side of the bottleneck) answers each
+connection with as many bytes as the client asks for.  The client (on the
+receiving side) draws flow sizes from an empirical CDF, starts flows as a
+Poisson process sized to a target fraction of the bottleneck and runs
+them on a pool of worker threads.  For every flow it records the flow
+completion time (FCT) and the slowdown FCT / ideal FCT, where the ideal
+is two base RTTs (handshake, request) plus the serialization time at the
+bottleneck rate.  Results are saved column by column into an .npz trace
+(see FCT_COLUMNS) for analyze_fct.py.  Flows that fail, or have not
+finished when the run ends, are kept with ok=False: a flow cut off in
+flight has the time it ran so far as fct, one that never left the queue
+has start=NaN and its queueing time as wait.
+
+Size CDFs, in 1460-byte packets:
+    websearch   DCTCP web search workload (Alizadeh et al., SIGCOMM 2010)
+    datamining  VL2 data mining workload (Greenberg et al., SIGCOMM 2009)
+
+Usage:
+    python3 workload.py server --port 5555
+    python3 workload.py client --server 10.0.0.1 --port 5555 --cdf websearch \\
+        --load 0.3 --bw 10 --rtt-ms 20 --duration 60 --out fct_trace.npz
+'''
+
+import bisect
+import queue
+import random
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from argparse import ArgumentParser
+from time import monotonic, sleep, time
+
+import numpy as np
+
+MSS = 1460
+DEFAULT_PORT = 5555
+
+# (size in packets, cumulative probability)
+CDFS = {
+    'websearch': [(6, 0.0), (6, 0.15), (13, 0.2), (19, 0.3), (33, 0.4), (53, 0.53),
+                  (133, 0.6), (667, 0.7), (1333, 0.8), (3333, 0.9), (6667, 0.97),
+                  (20000, 1.0)],
+    'datamining': [(1, 0.0), (1, 0.5), (2, 0.6), (3, 0.7), (7, 0.8), (267, 0.9),
+                   (2107, 0.95), (66667, 0.99), (666667, 1.0)],
+}
+
+FCT_COLUMNS = ['arrival', 'start', 'size', 'fct', 'ideal', 'slowdown', 'wait', 'ok']
+
+REQUEST = struct.Struct('!Q')
+CHUNK = bytes(65536)
+
+
+class SizeDistribution(object):
+    """Inverse-transform sampling of a piecewise-linear size CDF."""
+
+    def __init__(self, cdf, scale=1.0):
+        self.sizes = [s * MSS * scale for s, _ in cdf]
+        self.probs = [p for _, p in cdf]
+
+    def sample(self, rng):
+        u = rng.random()
+        i = bisect.bisect_left(self.probs, u)
+        if i == 0:
+            return max(1, int(self.sizes[0]))
+        p0, p1 = self.probs[i - 1], self.probs[i]
+        s0, s1 = self.sizes[i - 1], self.sizes[i]
+        frac = (u - p0) / (p1 - p0) if p1 > p0 else 1.0
+        return max(1, int(s0 + frac * (s1 - s0)))
+
+    def mean(self):
+        m = 0.0
+        for i in range(1, len(self.sizes)):
+            m += (self.probs[i] - self.probs[i - 1]) * (self.sizes[i] + self.sizes[i - 1]) / 2
+        return m
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        req = b''
+        while len(req) < REQUEST.size:
+            data = sock.recv(REQUEST.size - len(req))
+            if not data:
+                return
+            req += data
+        left = REQUEST.unpack(req)[0]
+        view = memoryview(CHUNK)
+        try:
+            while left > 0:
+                left -= sock.send(view[:min(left, len(CHUNK))])
+        except OSError:
+            return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+def serve(port=DEFAULT_PORT):
+    server = _Server(('', port), _Handler)
+    print("workload server at port %d" % port)
+    server.serve_forever()
+
+
+def fetch(server, port, size, timeout=60):
+    """Download size bytes; returns (start, end) monotonic times."""
+    start = monotonic()
+    sock = socket.create_connection((server, port), timeout=timeout)
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(REQUEST.pack(size))
+        got = 0
+        buf = bytearray(65536)
+        while got < size:
+            n = sock.recv_into(buf)
+            if n == 0:
+                raise IOError("connection closed after %d of %d bytes" % (got, size))
+            got += n
+    finally:
+        sock.close()
+    return start, monotonic()
+
+
+class ShortFlowClient(object):
+    """Open-loop Poisson short flows on a pool of worker threads."""
+
+    def __init__(self, server, port, dist, rate, bw_mbps, rtt_s, pool=32, seed=None):
+        self.server = server
+        self.port = port
+        self.dist = dist
+        self.rate = rate
+        self.bw = bw_mbps * 1e6
+        self.rtt = rtt_s
+        self.pool = pool
+        self.rng = random.Random(seed)
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.records = []
+        # Flows being fetched: token -> (arrival, start, size, ideal)
+        self.inflight = {}
+        self.cut = False
+        self.stopping = False
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            arrival, size = job
+            ideal = self._ideal(size)
+            token = object()
+            with self.lock:
+                if self.cut:
+                    self.records.append(self._not_started(arrival, size, monotonic()))
+                    continue
+                self.inflight[token] = (arrival, monotonic(), size, ideal)
+            try:
+                start, end = fetch(self.server, self.port, size)
+                rec = (arrival, start, size, end - start, ideal,
+                       (end - start) / ideal, start - arrival, 1)
+            except (IOError, OSError):
+                rec = (arrival, monotonic(), size, np.nan, ideal, np.nan, 0.0, 0)
+            with self.lock:
+                # Already recorded as unfinished by run()
+                if self.inflight.pop(token, None) is not None:
+                    self.records.append(rec)
+
+    def _ideal(self, size):
+        return 2 * self.rtt + size * 8 / self.bw
+
+    def _not_started(self, arrival, size, now):
+        return (arrival, np.nan, size, np.nan, self._ideal(size), np.nan, now - arrival, 0)
+
+    def _cut_unfinished(self):
+        """Record the flows still in flight or queued as ok=False."""
+        now = monotonic()
+        with self.lock:
+            self.cut = True
+            for arrival, start, size, ideal in self.inflight.values():
+                self.records.append((arrival, start, size, now - start, ideal,
+                                     (now - start) / ideal, start - arrival, 0))
+            self.inflight.clear()
+            while True:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    self.records.append(self._not_started(job[0], job[1], now))
+
+    def run(self, duration, grace=10):
+        workers = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(self.pool)]
+        for w in workers:
+            w.start()
+        t0 = monotonic()
+        self.t0_wall = time()
+        nxt = t0 + self.rng.expovariate(self.rate)
+        while not self.stopping and nxt < t0 + duration:
+            left = nxt - monotonic()
+            if left > 0:
+                sleep(left)
+            self.jobs.put((nxt, self.dist.sample(self.rng)))
+            nxt += self.rng.expovariate(self.rate)
+        for _ in workers:
+            self.jobs.put(None)
+        deadline = monotonic() + grace
+        for w in workers:
+            w.join(max(0, deadline - monotonic()))
+        self._cut_unfinished()
+        self.t0 = t0
+
+    def save(self, fname):
+        """Write the per-flow records as columns of an .npz file."""
+        with self.lock:
+            recs = list(self.records)
+        arr = np.array(recs, dtype=float).reshape(-1, len(FCT_COLUMNS))
+        cols = {c: arr[:, i] for i, c in enumerate(FCT_COLUMNS)}
+        # Times relative to the first arrival
+        cols['arrival'] = cols['arrival'] - self.t0
+        cols['start'] = cols['start'] - self.t0
+        cols['ok'] = cols['ok'].astype(bool)
+        cols['size'] = cols['size'].astype(np.int64)
+        np.savez(fname, t0=self.t0_wall, **cols)
+        return len(recs)
+
+
+def load_fct(fname):
+    """Columns of an FCT trace as a dict of numpy arrays."""
+    with np.load(fname) as data:
+        return {k: data[k] for k in data.files}
+
+
+def main():
+    parser = ArgumentParser(description="Short-flow workload generator")
+    sub = parser.add_subparsers(dest='mode')
+    srv = sub.add_parser('server')
+    srv.add_argument('--port', type=int, default=DEFAULT_PORT)
+    cli = sub.add_parser('client')
+    cli.add_argument('--server', required=True)
+    cli.add_argument('--port', type=int, default=DEFAULT_PORT)
+    cli.add_argument('--cdf', choices=sorted(CDFS), default='websearch',
+                     help="Flow size distribution")
+    cli.add_argument('--scale', type=float, default=1.0,
+                     help="Multiply flow sizes (shrink the CDF for slow links)")
+    cli.add_argument('--load', type=float, default=0.3,
+                     help="Offered short-flow load as a fraction of --bw")
+    cli.add_argument('--bw', type=float, required=True,
+                     help="Bottleneck rate (Mb/s)")
+    cli.add_argument('--rtt-ms', type=float, required=True,
+                     help="Base RTT (ms)")
+    cli.add_argument('--pool', type=int, default=32,
+                     help="Concurrent connections")
+    cli.add_argument('--duration', type=float, default=60)
+    cli.add_argument('--seed', type=int, default=None)
+    cli.add_argument('--out', required=True, help="Output .npz trace")
+    args = parser.parse_args()
+
+    if args.mode == 'server':
+        serve(args.port)
+        return
+    if args.mode != 'client':
+        parser.error("mode must be server or client")
+
+    dist = SizeDistribution(CDFS[args.cdf], args.scale)
+    rate = args.load * args.bw * 1e6 / 8 / dist.mean()
+    print("%s flows, mean %.0f bytes, %.2f flows/s" % (args.cdf, dist.mean(), rate))
+    client = ShortFlowClient(args.server, args.port, dist, rate, args.bw,
+                             args.rtt_ms / 1000.0, args.pool, args.seed)
+
+    def stop(signum, frame):
+        client.stopping = True
+    signal.signal(signal.SIGTERM, stop)
+
+    client.run(args.duration)
+    n = client.save(args.out)
+    print("%d flows written to %s" % (n, args.out))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()